@@ -9,9 +9,11 @@ import os
 import subprocess
 import threading
 from pathlib import Path
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, send_file
 from flask_cors import CORS
 import time
+import queue
+from concurrent.futures import ThreadPoolExecutor
 from font_config import (
     get_font_for_language,
     build_font_family_string,
@@ -25,6 +27,27 @@ from subtitle_encoding import (
     is_utf8,
     convert_subtitle_encoding
 )
+from folder_watcher import FolderWatcher
+from font_index import get_font_index, subtitle_charset, check_coverage
+from font_workdir import build_fonts_dir, fonts_signature, evict_font_cache
+from fontconfig_env import ffmpeg_env
+from scheduler import BatchScheduler, STRATEGIES, record_seconds_per_cost
+from readahead import Prefetcher, format_bytes
+from staging import ScratchStager, DEFAULT_SCRATCH_LIMIT, partial_output_path
+from output_sinks import create_sink, UploadPool, SinkError, DEFAULT_UPLOAD_WORKERS
+from volume_throttle import VolumeThrottle, DiskSpaceError
+from output_dedup import OutputDeduplicator
+from ffmpeg_runner import FFmpegRun, task_log_path, task_time_limit, FFMPEG_BIN, FFMPEG_LOG_DIR, STALL_TIMEOUT
+from concurrency_controller import ConcurrencyController
+from scheduler import estimate_cost, load_seconds_per_cost, resolution_weight
+from executors import detect_executors, HybridScheduler
+from retry_policy import RetryPolicy, classify_failure, FAILURE_LABELS
+from media_probe import get_metadata_cache
+from subtitle_preflight import preflight_tasks, summarize_preflight
+from container_preflight import preflight_containers, TRANSCODE_AUDIO
+from output_verify import OutputVerifier
+from batch_planner import build_plan
+from subtitle_preview import render_preview
 
 app = Flask(__name__)
 CORS(app)
@@ -38,16 +61,68 @@ processing_status = {
     'logs': [],
     'completed': False,
     'error': None,
-    'stop_requested': False
+    'stop_requested': False,
+    'watching': False,
+    'watch': None,
+    'schedule': None,
+    'preflight': None,
+    'io': None,
+    'staging': None,
+    'upload': None,
+    'volumes': None,
+    'dedup': None,
+    'concurrency': None,
+    'executors': None,
+    'watchdog': None,
+    'retries': None,
+    'containers': None,
+    'verify': None
 }
 
-# 存储当前ffmpeg进程
-current_process = None
+# 认领 is_processing 的锁：手动批处理和监听模式的批次不能同时进入 batch_merge
+processing_lock = threading.Lock()
+
+
+def claim_processing():
+    """原子地把 is_processing 置为 True（由 batch_merge 结束时清除），已有批次在运行时返回 False"""
+    with processing_lock:
+        if processing_status['is_processing']:
+            return False
+        processing_status['is_processing'] = True
+        return True
+
+
+# 处理日志最多保留的行数（监听模式长时间运行时丢弃最早的日志）
+MAX_LOG_LINES = 2000
+
+# 存储当前正在运行的ffmpeg进程（并行时可能有多个）
+current_processes = set()
+current_processes_lock = threading.Lock()
 
 
 class SubtitleMerger:
     """视频字幕合成核心类"""
 
+    def __init__(self):
+        # 监听模式：文件夹监听器 + 任务队列 + 派发线程
+        self.task_queue = queue.Queue()
+        self.watcher = None
+        self.watch_options = {}
+        self._watch_worker = None
+        # ffmpeg 完整输出的压缩日志目录（None 时只保留最后几行用于错误报告）
+        self.ffmpeg_log_dir = None
+        # 当前批次的自适应并发控制器（None 时并发数固定）
+        self.controller = None
+        # 看门狗：-progress 停滞多少秒后结束 ffmpeg（None 不检测）；任务时长上限（'auto' 按实测吞吐计算，None 不限制）
+        self.stall_timeout = STALL_TIMEOUT
+        self.max_task_seconds = None
+        # 当前批次的上传池（状态接口实时读取上传进度）
+        self.uploader = None
+        # 当前批次的输出校验（None 时编码成功即视为输出完整）
+        self.verifier = None
+        # 是否同时把日志打印到终端（命令行模式）
+        self.echo = False
+
     def scan_languages(self, subtitle_folder):
         """扫描字幕文件夹，获取所有语种"""
         languages = []
@@ -79,9 +154,16 @@ class SubtitleMerger:
         except Exception as e:
             print(f"获取视频文件出错: {e}")
 
-        return sorted(video_files)
+        video_files = sorted(video_files)
 
-    def merge_subtitle(self, video_path, subtitle_path, output_path, use_gpu=False, gpu_type='auto', subtitle_style=None, language_code=None):
+        # 后台并行填充 ffprobe 元数据缓存，供调度、预检等模块共享
+        if video_files:
+            get_metadata_cache().warm_async([os.path.join(video_folder, f) for f in video_files])
+
+        return video_files
+
+    def merge_subtitle(self, video_path, subtitle_path, output_path, use_gpu=False, gpu_type='auto', subtitle_style=None, language_code=None,
+                       time_limit=None, report=None, audio_codec='copy'):
         """使用ffmpeg合并视频和字幕
 
         Args:
@@ -99,15 +181,29 @@ class SubtitleMerger:
                 - outline: 轮廓粗细 (可选)
                 - shadow: 阴影深度 (可选)
                 - auto_font: 是否启用自动字体映射 (默认: True)
+                - subset_fonts: 是否把大字体子集化为字幕用到的字形 (默认: False，需要 fontTools)
             language_code: 语种代码，用于自动字体映射 (如 'AR', 'CN')
+            time_limit: 最长运行时间（秒，可选，超过后由看门狗结束进程）
+            report: 字典（可选），看门狗结束进程时写入 'stalled' 诊断信息
+            audio_codec: 'copy' 直接复制音频，'aac' 转码（源音频无法封装到输出格式时，见 container_preflight）
         """
-        global current_process
+        process = None
 
         try:
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
             # 构建ffmpeg命令
-            cmd = ['ffmpeg']
+            cmd = [FFMPEG_BIN]
+
+            # 并发控制器根据 -progress 输出的帧数计算总帧率；看门狗根据进度是否前进判断卡住
+            on_progress = None
+            if self.controller is not None or self.stall_timeout:
+                cmd.extend(['-progress', 'pipe:1', '-nostats'])
+            if self.controller is not None:
+                controller, owner = self.controller, threading.get_ident()
+                # 每次运行 ffmpeg（包括重试）帧数都从 0 开始
+                controller.run_started(owner)
+                on_progress = lambda block: controller.report_progress(block, owner)
 
             # 添加硬件加速参数
             if use_gpu:
@@ -128,146 +224,8 @@ class SubtitleMerger:
             # 输入文件
             cmd.extend(['-i', video_path])
 
-            # 字幕滤镜 - 需要处理Windows路径：替换反斜杠为正斜杠，并转义冒号
-            filter_subtitle_path = subtitle_path.replace('\\', '/').replace(':', '\\:')
-
-            # 构建字幕样式参数
-            # 添加字符编码支持，确保FFmpeg正确解析UTF-8字幕
-            # 初始化滤镜参数列表
-            subtitle_filter_parts = [f"subtitles='{filter_subtitle_path}':charenc=UTF-8"]
-
-            # 用于跟踪是否已添加 fontsdir
-            fontsdir_added = False
-
-            # 初始化样式参数列表（即使没有自定义样式也要设置默认值）
-            style_params = []
-
-            if subtitle_style:
-                # 字体处理 - 支持自动映射、字体文件路径和字体名称
-                font_applied = False
-                auto_font = subtitle_style.get('auto_font', True)
-
-                # 优先级1: 明确指定的字体文件路径
-                if subtitle_style.get('font_file'):
-                    font_file = subtitle_style['font_file']
-                    if os.path.exists(font_file):
-                        normalized_font = normalize_font_path(font_file)
-                        subtitle_filter_parts.append(f"fontsdir='{os.path.dirname(normalized_font)}'")
-                        style_params.append(f"FontName={os.path.basename(font_file)}")
-                        font_applied = True
-                    else:
-                        self.log(f"⚠️ 字体文件不存在: {font_file}")
-
-                # 优先级2: 用户指定的字体名称
-                if not font_applied and subtitle_style.get('font_name'):
-                    font_name = subtitle_style['font_name']
-
-                    # 判断是否为文件路径
-                    if is_font_file_path(font_name):
-                        if os.path.exists(font_name):
-                            normalized_font = normalize_font_path(font_name)
-                            subtitle_filter_parts.append(f"fontsdir='{os.path.dirname(normalized_font)}'")
-                            style_params.append(f"FontName={os.path.basename(font_name)}")
-                            font_applied = True
-                        else:
-                            self.log(f"⚠️ 字体文件不存在: {font_name}")
-                    else:
-                        # 字体名称
-                        style_params.append(f"FontName={font_name}")
-                        font_applied = True
-
-                # 优先级3: 自动语种字体映射（启用且有语种代码）
-                if not font_applied and auto_font and language_code:
-                    # 获取系统中实际可用的字体
-                    font_type, font_value = get_available_font_for_language(language_code)
-
-                    if font_type == 'file':
-                        # 使用字体文件
-                        if os.path.exists(font_value):
-                            # 设置 fontsdir 参数（添加到主滤镜参数中）
-                            font_dir = os.path.dirname(font_value)
-                            normalized_dir = normalize_font_path(font_dir)
-
-                            if not fontsdir_added:
-                                subtitle_filter_parts[0] += f":fontsdir='{normalized_dir}'"
-                                fontsdir_added = True
-
-                            # 根据字体文件名确定 FontName
-                            # 测试验证：使用标准字体家族名称最可靠
-                            font_file_name = os.path.basename(font_value)
-
-                            # 字体文件名到标准字体名的映射
-                            font_name_map = {
-                                'NotoSansArabic': 'Noto Sans Arabic',
-                                'NotoSansCJKsc': 'Noto Sans CJK SC',
-                                'NotoSansCJKtc': 'Noto Sans CJK TC',
-                                'NotoSansCJKjp': 'Noto Sans CJK JP',
-                                'NotoSansCJKkr': 'Noto Sans CJK KR',
-                                'NotoSansThai': 'Noto Sans Thai',
-                                'NotoSansMyanmar': 'Noto Sans Myanmar',
-                                'NotoSansHebrew': 'Noto Sans Hebrew',
-                                'NotoSansDevanagari': 'Noto Sans Devanagari',
-                            }
-
-                            # 查找匹配的字体名称
-                            font_display_name = None
-                            for key, value in font_name_map.items():
-                                if key.lower() in font_file_name.lower():
-                                    font_display_name = value
-                                    break
-
-                            if font_display_name is None:
-                                # 如果没有匹配，使用文件名（去掉扩展名和variant）
-                                font_basename = os.path.splitext(font_file_name)[0]
-                                font_basename = font_basename.split('-')[0]
-                                font_display_name = font_basename
-
-                            style_params.append(f"FontName={font_display_name}")
-
-                            self.log(f"🎨 为 {language_code} 使用字体: {font_display_name}")
-                            self.log(f"   字体文件: {font_file_name}")
-                            font_applied = True
-                        else:
-                            self.log(f"⚠️ 字体文件不存在: {font_value}")
-                    elif font_type == 'name':
-                        # 使用系统字体名称
-                        style_params.append(f"FontName={font_value}")
-                        self.log(f"🎨 为 {language_code} 使用系统字体: {font_value}")
-
-                        # 如果是Arial回退，说明系统没有该语种的专用字体
-                        if font_value == 'Arial':
-                            recommended = get_font_for_language(language_code)[0]
-                            self.log(f"⚠️ 系统未安装 {recommended}，使用 Arial 回退（可能显示为方框）")
-                            self.log(f"💡 建议: 下载 {recommended} 字体并放入 fonts/ 目录")
-
-                        font_applied = True
-
-                # 其他样式参数
-                if subtitle_style.get('font_size'):
-                    style_params.append(f"FontSize={subtitle_style['font_size']}")
-                if subtitle_style.get('margin_v'):
-                    style_params.append(f"MarginV={subtitle_style['margin_v']}")
-                if subtitle_style.get('alignment'):
-                    style_params.append(f"Alignment={subtitle_style['alignment']}")
-
-            # 黑边和阴影参数 - 始终显式设置以覆盖ASS文件内部样式
-            # 如果用户设置了值则使用用户的值，否则默认为0（无黑边/无阴影）
-            if subtitle_style and subtitle_style.get('outline') is not None:
-                style_params.append(f"Outline={subtitle_style['outline']}")
-            else:
-                style_params.append("Outline=0")
-
-            if subtitle_style and subtitle_style.get('shadow') is not None:
-                style_params.append(f"Shadow={subtitle_style['shadow']}")
-            else:
-                style_params.append("Shadow=0")
-
-            # 应用样式参数
-            if style_params:
-                force_style = ','.join(style_params)
-                subtitle_filter_parts.append(f"force_style='{force_style}'")
-
-            subtitle_filter = ':'.join(subtitle_filter_parts)
+            # 字幕滤镜（字体、样式）
+            subtitle_filter = self.build_subtitle_filter(subtitle_path, subtitle_style, language_code)
 
             cmd.extend(['-vf', subtitle_filter])
 
@@ -292,8 +250,11 @@ class SubtitleMerger:
 
             cmd.extend(['-c:v', video_codec])
 
-            # 音频直接复制
-            cmd.extend(['-c:a', 'copy'])
+            # 音频直接复制；输出封装格式不支持源音频编码时转码
+            if audio_codec == 'copy':
+                cmd.extend(['-c:a', 'copy'])
+            else:
+                cmd.extend(['-c:a', audio_codec, '-b:a', TRANSCODE_AUDIO['bitrate']])
 
             # 覆盖输出文件
             cmd.extend(['-y', output_path])
@@ -301,27 +262,261 @@ class SubtitleMerger:
             # 打印完整命令以便调试
             # print("Executing:", " ".join(cmd)) 
 
-            # 使用Popen以便可以终止进程
-            current_process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                encoding='utf-8',
-                errors='replace'  # 遇到无法解码的字符时用替换字符代替
-            )
+            # 使用Popen以便可以终止进程；stderr 逐行读取，只保留最后几行（可选完整写入压缩日志）
+            log_path = task_log_path(output_path, self.ffmpeg_log_dir) if self.ffmpeg_log_dir else None
+            run = FFmpegRun(cmd, env=ffmpeg_env(), log_path=log_path,  # 共享预热过的 fontconfig 缓存
+                            on_progress=on_progress, stall_timeout=self.stall_timeout, time_limit=time_limit)
+            process = run.start()
+            with current_processes_lock:
+                current_processes.add(process)
 
             # 等待进程完成
-            stdout, stderr = current_process.communicate()
-            returncode = current_process.returncode
-            current_process = None
+            returncode = run.wait()
+
+            if run.stalled is not None:
+                message = run.stall_message()
+                if report is not None:
+                    report['stalled'] = dict(run.stalled, message=message)
+                return False, f"ffmpeg 已被看门狗终止: {message}\n{run.tail_text()}"
 
-            return returncode == 0, stderr
+            return returncode == 0, run.tail_text()
 
         except Exception as e:
-            current_process = None
             return False, str(e)
 
+        finally:
+            if process is not None:
+                with current_processes_lock:
+                    current_processes.discard(process)
+
+    def resolve_subtitle_font(self, subtitle_path, subtitle_style=None, language_code=None):
+        """决定字幕使用的字体和样式参数（只读取字幕和字体索引，不生成 fontsdir、不写日志）
+
+        build_subtitle_filter 和 render_signature 共用，保证两者的字体选择一致。
+
+        Args:
+            subtitle_path: 字幕文件路径
+            subtitle_style: 字幕样式配置字典 (可选，字段同 merge_subtitle)
+            language_code: 语种代码，用于自动字体映射
+
+        Returns:
+            dict: {'fonts': 需要放入 fontsdir 的字体（路径或 font_index 字体，可能为空）,
+                   'subset': 是否子集化, 'style_params': force_style 参数列表, 'messages': 待输出的日志}
+        """
+        fonts = []
+        style_params = []
+        messages = []
+        subset_fonts = False
+
+        if subtitle_style:
+            # 字体处理 - 支持自动映射、字体文件路径和字体名称
+            font_applied = False
+            auto_font = subtitle_style.get('auto_font', True)
+
+            # 字体子集化（需要 fontTools）：只保留字幕用到的字形，减少 libass 加载大字体的开销
+            subset_fonts = subtitle_style.get('subset_fonts', False)
+
+            # 优先级1: 明确指定的字体文件路径
+            if subtitle_style.get('font_file'):
+                font_file = subtitle_style['font_file']
+                if os.path.exists(font_file):
+                    fonts = [font_file]
+                    style_params.append(f"FontName={os.path.basename(font_file)}")
+                    font_applied = True
+                else:
+                    messages.append(f"⚠️ 字体文件不存在: {font_file}")
+
+            # 优先级2: 用户指定的字体名称
+            if not font_applied and subtitle_style.get('font_name'):
+                font_name = subtitle_style['font_name']
+
+                # 判断是否为文件路径
+                if is_font_file_path(font_name):
+                    if os.path.exists(font_name):
+                        fonts = [font_name]
+                        style_params.append(f"FontName={os.path.basename(font_name)}")
+                        font_applied = True
+                    else:
+                        messages.append(f"⚠️ 字体文件不存在: {font_name}")
+                else:
+                    # 字体名称
+                    style_params.append(f"FontName={font_name}")
+                    font_applied = True
+
+            # 优先级3: 按字幕实际用到的字符选择字形覆盖完整的字体（不依赖语种文件夹命名）
+            if not font_applied and auto_font:
+                try:
+                    selection = get_font_index().select_fonts(subtitle_charset(subtitle_path), language_code)
+                except (OSError, ValueError) as e:
+                    selection = {'fonts': [], 'missing': ''}
+                    messages.append(f"⚠️ 字形覆盖检查失败: {e}")
+
+                if selection['fonts']:
+                    primary = selection['fonts'][0]
+                    fonts = selection['fonts']
+                    style_params.append(f"FontName={primary['family']}")
+                    messages.append(f"🎨 按字形覆盖使用字体: {', '.join(face['family'] for face in selection['fonts'])}")
+                    if selection['missing']:
+                        messages.append(f"⚠️ 没有字体包含以下字符（将显示为方框）: {selection['missing'][:40]}")
+                    font_applied = True
+
+            # 优先级4: 自动语种字体映射（启用且有语种代码）
+            if not font_applied and auto_font and language_code:
+                # 获取系统中实际可用的字体
+                font_type, font_value = get_available_font_for_language(language_code)
+
+                if font_type == 'file':
+                    # 使用字体文件
+                    if os.path.exists(font_value):
+                        # 放入 fontsdir 的字体
+                        fonts = [font_value]
+
+                        # 根据字体文件名确定 FontName
+                        # 测试验证：使用标准字体家族名称最可靠
+                        font_file_name = os.path.basename(font_value)
+
+                        # 字体文件名到标准字体名的映射
+                        font_name_map = {
+                            'NotoSansArabic': 'Noto Sans Arabic',
+                            'NotoSansCJKsc': 'Noto Sans CJK SC',
+                            'NotoSansCJKtc': 'Noto Sans CJK TC',
+                            'NotoSansCJKjp': 'Noto Sans CJK JP',
+                            'NotoSansCJKkr': 'Noto Sans CJK KR',
+                            'NotoSansThai': 'Noto Sans Thai',
+                            'NotoSansMyanmar': 'Noto Sans Myanmar',
+                            'NotoSansHebrew': 'Noto Sans Hebrew',
+                            'NotoSansDevanagari': 'Noto Sans Devanagari',
+                        }
+
+                        # 查找匹配的字体名称
+                        font_display_name = None
+                        for key, value in font_name_map.items():
+                            if key.lower() in font_file_name.lower():
+                                font_display_name = value
+                                break
+
+                        if font_display_name is None:
+                            # 如果没有匹配，使用文件名（去掉扩展名和variant）
+                            font_basename = os.path.splitext(font_file_name)[0]
+                            font_basename = font_basename.split('-')[0]
+                            font_display_name = font_basename
+
+                        style_params.append(f"FontName={font_display_name}")
+
+                        messages.append(f"🎨 为 {language_code} 使用字体: {font_display_name}")
+                        messages.append(f"   字体文件: {font_file_name}")
+                        font_applied = True
+                    else:
+                        messages.append(f"⚠️ 字体文件不存在: {font_value}")
+                elif font_type == 'name':
+                    # 使用系统字体名称
+                    style_params.append(f"FontName={font_value}")
+                    messages.append(f"🎨 为 {language_code} 使用系统字体: {font_value}")
+
+                    # 如果是Arial回退，说明系统没有该语种的专用字体
+                    if font_value == 'Arial':
+                        recommended = get_font_for_language(language_code)[0]
+                        messages.append(f"⚠️ 系统未安装 {recommended}，使用 Arial 回退（可能显示为方框）")
+                        messages.append(f"💡 建议: 下载 {recommended} 字体并放入 fonts/ 目录")
+
+                    font_applied = True
+
+            # 其他样式参数
+            if subtitle_style.get('font_size'):
+                style_params.append(f"FontSize={subtitle_style['font_size']}")
+            if subtitle_style.get('margin_v'):
+                style_params.append(f"MarginV={subtitle_style['margin_v']}")
+            if subtitle_style.get('alignment'):
+                style_params.append(f"Alignment={subtitle_style['alignment']}")
+
+        # 黑边和阴影参数 - 始终显式设置以覆盖ASS文件内部样式
+        # 如果用户设置了值则使用用户的值，否则默认为0（无黑边/无阴影）
+        if subtitle_style and subtitle_style.get('outline') is not None:
+            style_params.append(f"Outline={subtitle_style['outline']}")
+        else:
+            style_params.append("Outline=0")
+
+        if subtitle_style and subtitle_style.get('shadow') is not None:
+            style_params.append(f"Shadow={subtitle_style['shadow']}")
+        else:
+            style_params.append("Shadow=0")
+
+        return {'fonts': fonts, 'subset': bool(subset_fonts), 'style_params': style_params, 'messages': messages}
+
+    def build_subtitle_filter(self, subtitle_path, subtitle_style=None, language_code=None):
+        """构建 subtitles 滤镜参数（合成与预览共用）
+
+        Args:
+            subtitle_path: 字幕文件路径
+            subtitle_style: 字幕样式配置字典 (可选，字段同 merge_subtitle)
+            language_code: 语种代码，用于自动字体映射
+
+        Returns:
+            str: -vf 使用的滤镜字符串
+        """
+        # 字幕滤镜 - 需要处理Windows路径：替换反斜杠为正斜杠，并转义冒号
+        filter_subtitle_path = subtitle_path.replace('\\', '/').replace(':', '\\:')
+
+        # 添加字符编码支持，确保FFmpeg正确解析UTF-8字幕
+        subtitle_filter_parts = [f"subtitles='{filter_subtitle_path}':charenc=UTF-8"]
+
+        resolved = self.resolve_subtitle_font(subtitle_path, subtitle_style, language_code)
+        for message in resolved['messages']:
+            self.log(message)
+
+        # 只包含所需字体的 fontsdir
+        if resolved['fonts']:
+            fonts_dir = self.task_fonts_dir(resolved['fonts'], subtitle_path, resolved['subset'])
+            subtitle_filter_parts.append(f"fontsdir='{normalize_font_path(fonts_dir)}'")
+
+        # 应用样式参数
+        if resolved['style_params']:
+            force_style = ','.join(resolved['style_params'])
+            subtitle_filter_parts.append(f"force_style='{force_style}'")
+
+        subtitle_filter = ':'.join(subtitle_filter_parts)
+        return subtitle_filter
+
+    def render_signature(self, task, subtitle_style=None):
+        """任务的渲染签名：字体文件（路径+大小+修改时间，子集化时加字符集）和样式参数，用于判断输出是否相同
+
+        只读取字幕和字体的元数据，不生成 fontsdir、不写日志；与 build_subtitle_filter 使用同一字体选择。
+        语种只通过字体选择影响签名，字幕内容相同的不同语种文件夹（如 ES 和 ES-419）仍可合并。
+        """
+        resolved = self.resolve_subtitle_font(task['subtitle_path'], subtitle_style, task.get('lang'))
+        chars = None
+        if resolved['fonts'] and resolved['subset']:
+            try:
+                chars = subtitle_charset(task['subtitle_path'])
+            except (OSError, ValueError):
+                chars = None
+        return '|'.join([fonts_signature(resolved['fonts'], chars, resolved['subset']),
+                         ','.join(resolved['style_params'])])
+
+    def task_fonts_dir(self, fonts, subtitle_path, subset=False):
+        """为任务生成只包含所需字体的 fontsdir（失败时退回第一个字体所在目录）
+
+        Args:
+            fonts: 字体文件路径或 font_index 字体列表
+            subtitle_path: 字幕文件路径（子集化时读取字符集）
+            subset: 是否子集化大字体
+
+        Returns:
+            str: fontsdir 路径
+        """
+        chars = None
+        try:
+            if subset:
+                chars = subtitle_charset(subtitle_path)
+            fonts_dir = build_fonts_dir(fonts, chars, subset)
+        except (OSError, ValueError) as e:
+            self.log(f"⚠️ 生成任务字体目录失败: {e}")
+            fonts_dir = None
+        if fonts_dir:
+            return fonts_dir
+        first = fonts[0] if isinstance(fonts[0], str) else fonts[0]['path']
+        return os.path.dirname(first)
+
     def _has_nvidia_gpu(self):
         """检测是否有NVIDIA GPU"""
         try:
@@ -344,7 +539,469 @@ class SubtitleMerger:
         except:
             return False
 
-    def batch_merge(self, video_folder, subtitle_folder, output_folder, use_gpu=False, gpu_type='auto', subtitle_style=None):
+    def find_subtitle_file(self, lang_subtitle_folder, video_name, lang):
+        """查找视频在某语种文件夹中对应的字幕文件名
+
+        Args:
+            lang_subtitle_folder: 语种字幕文件夹
+            video_name: 视频文件名（不含扩展名）
+            lang: 语种代码
+
+        Returns:
+            str: 字幕文件名，未找到返回None
+        """
+        for ext in ['.srt', '.str']:
+            potential_subtitle = f"{video_name}_{lang}{ext}"
+            if os.path.exists(os.path.join(lang_subtitle_folder, potential_subtitle)):
+                return potential_subtitle
+        return None
+
+    def build_task(self, video_folder, video_file, subtitle_folder, lang, subtitle_file, output_folder):
+        """构建单个合成任务（视频 × 语种）
+
+        Returns:
+            dict: 任务信息，包含视频/字幕/输出路径
+        """
+        video_name, video_ext = os.path.splitext(video_file)
+        output_file = f"{video_name}_{lang}{video_ext}"
+        return {
+            'video_file': video_file,
+            'video_path': os.path.join(video_folder, video_file),
+            'lang': lang,
+            'subtitle_path': os.path.join(subtitle_folder, lang, subtitle_file),
+            'output_file': output_file,
+            'output_path': os.path.join(output_folder, lang, output_file),
+        }
+
+    def process_task(self, task, use_gpu=False, gpu_type='auto', subtitle_style=None, stager=None):
+        """执行单个合成任务：字幕编码检查 + ffmpeg合成 + 日志
+
+        Args:
+            task: build_task 返回的任务字典
+            use_gpu: 是否使用GPU加速
+            gpu_type: GPU类型
+            subtitle_style: 字幕样式配置
+            stager: ScratchStager 实例（可选，启用本地暂存）
+
+        Returns:
+            bool: 是否成功
+        """
+        subtitle_path = task['subtitle_path']
+        output_file = task['output_file']
+        lang = task['lang']
+
+        # 更新当前任务
+        processing_status['current_task'] = f"{task['video_file']} -> {lang}"
+        self.log(f"正在处理: {output_file}")
+
+        # 检查并转换字幕编码为 UTF-8
+        if not is_utf8(subtitle_path):
+            self.log(f"⚠️ 检测到非UTF-8编码字幕，正在自动转换...")
+            encoding_result = detect_file_encoding(subtitle_path)
+            if encoding_result:
+                detected_encoding = encoding_result.get('encoding', 'unknown')
+                confidence = encoding_result.get('confidence', 0)
+                self.log(f"   检测到编码: {detected_encoding} (置信度: {confidence:.2f})")
+
+            conv_success, conv_message = convert_subtitle_encoding(subtitle_path, lang)
+            if conv_success:
+                self.log(f"✅ {conv_message}")
+            else:
+                self.log(f"⚠️ 编码转换失败: {conv_message}")
+                self.log(f"   将尝试使用原始编码处理...")
+
+        # 本地暂存：从本地副本读取源文件，输出先写本地临时文件；
+        # 不暂存时先写输出目录中的临时文件，成功后改名（中断的任务不会留下看似完成的输出）
+        video_path = task['video_path']
+        output_path = partial_output_path(task['output_path'])
+        if stager is not None:
+            video_path = stager.acquire_source(task['video_path'])
+            output_path = stager.output_temp_path(task['output_path'])
+
+        # 看门狗的时长上限按 libx264 的实测吞吐计算（重试可能改用 CPU，按最慢的编码路径预计）
+        time_limit = self.max_task_seconds
+        if time_limit == 'auto':
+            cost = estimate_cost(get_metadata_cache().get_info(task['video_path'], refresh=False))
+            time_limit = task_time_limit(cost * load_seconds_per_cost('libx264') if cost else None)
+
+        report = {}
+        try:
+            # 合成视频和字幕 - 传递语种代码用于自动字体映射
+            success, error_msg = self.merge_subtitle(video_path, subtitle_path, output_path, use_gpu, gpu_type, subtitle_style, language_code=lang,
+                                                     time_limit=time_limit, report=report,
+                                                     audio_codec=task.get('audio_codec', 'copy'))
+            task['stalled'] = report.get('stalled')
+
+            # 核对输出与源文件的时长、流和数据包数量，不一致按失败处理（由重试策略重新编码）
+            task['verify'] = None
+            if success and self.verifier is not None:
+                task['verify'] = self.verifier.verify(task, output_path)
+                if task['verify'] and not task['verify']['ok']:
+                    success, error_msg = False, f"输出校验失败: {'; '.join(task['verify']['problems'])}"
+
+            if stager is None:
+                if success:
+                    try:
+                        os.replace(output_path, task['output_path'])
+                    except OSError as e:
+                        success, error_msg = False, f"输出改名失败: {e}"
+                if not success and os.path.exists(output_path):
+                    os.remove(output_path)
+            else:
+                if success:
+                    try:
+                        stager.commit_output(output_path, task['output_path'])
+                    except OSError as e:
+                        success, error_msg = False, f"复制到输出目录失败: {e}"
+                if not success:
+                    stager.discard_output(output_path)
+        finally:
+            if stager is not None:
+                stager.release_source(task['video_path'])
+
+        # 保留错误信息的最后部分，供重试策略判断失败类型
+        task['error'] = None if success else (error_msg or '')[-2000:]
+
+        if success:
+            self.log(f"✓ 完成: {output_file}")
+        else:
+            # 检查是否因为终止导致失败
+            if processing_status['stop_requested']:
+                self.log(f"⚠ 已终止: {output_file}")
+            elif task['stalled'] is not None:
+                self.log(f"⏱ 卡住: {output_file} {task['stalled']['message']}")
+                self.log(f"  错误信息: ...{error_msg[-2000:]}")
+            elif task['verify'] is not None and not task['verify']['ok']:
+                self.log(f"🔍 {error_msg}: {output_file}")
+            else:
+                self.log(f"✗ 失败: {output_file}")
+                if error_msg:
+                    # 显示更多错误信息（取最后2000字符），因为ffmpeg错误通常在最后
+                    self.log(f"  错误信息: ...{error_msg[-2000:]}")
+
+        return success
+
+    def resolve_video_codec(self, use_gpu=False, gpu_type='auto'):
+        """根据GPU设置确定输出视频编码器（与 merge_subtitle 的选择一致）"""
+        if use_gpu:
+            if gpu_type == 'nvidia' or (gpu_type == 'auto' and self._has_nvidia_gpu()):
+                return 'h264_nvenc'
+            if gpu_type == 'apple' or (gpu_type == 'auto' and self._is_apple_silicon()):
+                return 'h264_videotoolbox'
+            if gpu_type == 'intel':
+                return 'h264_qsv'
+            if gpu_type == 'amd':
+                return 'h264_amf'
+        return 'libx264'
+
+    def run_tasks(self, scheduler, use_gpu=False, gpu_type='auto', subtitle_style=None, prefetch=False, stager=None,
+                  uploader=None, throttle=None, deduplicator=None, controller=None, executors=None, retry=None):
+        """按调度顺序在工作线程池中执行任务
+
+        Args:
+            scheduler: BatchScheduler 实例（任务已按调度策略排序）
+            use_gpu: 是否使用GPU加速
+            gpu_type: GPU类型
+            subtitle_style: 字幕样式配置
+            prefetch: 是否在编码当前源文件时预读下一个源文件
+            stager: ScratchStager 实例（可选，启用本地暂存）
+            uploader: UploadPool 实例（可选，任务完成后上传到输出目标）
+            throttle: VolumeThrottle 实例（可选，按存储卷限制并发并检查剩余空间）
+            deduplicator: OutputDeduplicator 实例（可选，编码成功后把输出复用到重复任务）
+            controller: ConcurrencyController 实例（可选，运行时调整并发任务数；线程池大小为其上限）
+            executors: Executor 列表（可选，CPU 与硬件编码器混合执行，忽略 use_gpu / gpu_type）
+            retry: RetryPolicy 实例（可选，按失败类型重试并熔断持续失败的执行器）
+        """
+        total_tasks = processing_status['total']
+        progress_lock = threading.Lock()
+        watchdog = {'stalled': 0, 'timed_out': 0, 'recent': []}
+        processing_status['watchdog'] = dict(watchdog)
+        if retry is not None:
+            processing_status['retries'] = retry.summary()
+
+        def note_stall(task, path_name):
+            with progress_lock:
+                key = 'timed_out' if task['stalled']['reason'] == 'timeout' else 'stalled'
+                watchdog[key] += 1
+                # 只保留最近 20 个卡住任务的诊断信息
+                watchdog['recent'] = (watchdog['recent'] + [dict(task['stalled'], task=task['output_file'],
+                                                                 executor=path_name)])[-20:]
+                processing_status['watchdog'] = dict(watchdog)
+        prefetcher = Prefetcher([t['video_path'] for t in scheduler.tasks], enabled=prefetch)
+
+        def run_one(task, executor=None):
+            # 检查是否请求停止
+            if processing_status['stop_requested']:
+                return False
+
+            # 等待自适应并发名额
+            if controller is not None and not controller.acquire(lambda: processing_status['stop_requested']):
+                return False
+            try:
+                return run_task(task, executor)
+            finally:
+                if controller is not None:
+                    controller.release()
+
+        def run_task(task, executor):
+            # 等待源卷和输出卷有空闲并发名额、输出卷空间足够
+            ticket = None
+            space_error = None
+            if throttle is not None:
+                try:
+                    ticket = throttle.acquire(task, lambda: processing_status['stop_requested'])
+                except DiskSpaceError as e:
+                    space_error = e
+                else:
+                    if ticket is None:
+                        return False
+
+            prefetcher.on_task_start(task['video_path'])
+            if controller is not None:
+                info = get_metadata_cache().get_info(task['video_path'], refresh=False) or {}
+                controller.task_started(resolution_weight(info.get('width'), info.get('height')))
+            started = time.time()
+            success = False
+            requeued = False
+            if space_error is not None:
+                self.log(f"✗ 跳过: {task['output_file']} {space_error}")
+            else:
+                if executor is not None:
+                    path, task_gpu, task_gpu_type = executor.name, executor.use_gpu, executor.gpu_type
+                else:
+                    path, task_gpu, task_gpu_type = ('gpu' if use_gpu else 'cpu'), use_gpu, gpu_type
+                    # GPU 熔断期间新任务直接使用 CPU
+                    if task_gpu and retry is not None and retry.cpu_fallback and not retry.breaker.allow('gpu'):
+                        path, task_gpu = 'cpu', False
+                        self.log(f"⚡ GPU 暂停中，使用 CPU: {task['output_file']}")
+                try:
+                    while True:
+                        success = self.process_task(task, task_gpu, task_gpu_type, subtitle_style, stager)
+                        if success:
+                            if retry is not None:
+                                retry.on_success(task, path)
+                            break
+                        if task.get('stalled'):
+                            note_stall(task, path)
+                        # 用户终止导致的失败不计入重试和熔断
+                        if retry is None or processing_status['stop_requested']:
+                            break
+                        failure_class = classify_failure(task.get('error'), task.get('stalled'))
+                        decision = retry.on_failure(task, path, failure_class, task_gpu)
+                        if decision is None:
+                            break
+                        if executor is not None:
+                            # 混合执行：放回队列；改用 CPU 时不再分配给当前执行器，由其他执行器接手
+                            requeued = hybrid.requeue(task, executor.name if decision['cpu'] else None)
+                            if requeued:
+                                self.log(f"↻ {decision['reason']}，"
+                                         f"{'换用其他执行器' if decision['cpu'] else '重新排队'}: {task['output_file']}")
+                            else:
+                                retry.abandon(decision)
+                            break
+                        if decision['cpu']:
+                            path, task_gpu = 'cpu', False
+                        self.log(f"↻ {decision['reason']}，{'改用 CPU ' if decision['cpu'] else ''}重试: {task['output_file']}")
+                        # 等待其他编码会话释放（可被停止请求打断）
+                        deadline = time.time() + decision['delay']
+                        while time.time() < deadline and not processing_status['stop_requested']:
+                            time.sleep(0.2)
+                except Exception as e:
+                    self.log(f"✗ 发生错误: {task['output_file']} {str(e)}")
+                finally:
+                    if throttle is not None:
+                        throttle.release(ticket, success)
+                    if retry is not None:
+                        with progress_lock:
+                            processing_status['retries'] = retry.summary()
+
+            if requeued:
+                return False
+
+            # 同组的重复输出直接复用编码结果
+            outputs = [task] if success else []
+            duplicates = task.get('duplicates', [])
+            if success and deduplicator is not None and duplicates:
+                for duplicate, method, error in deduplicator.link(task):
+                    if method:
+                        outputs.append(duplicate)
+                        self.log(f"🔗 复用输出 ({method}): {duplicate['output_file']}")
+                    else:
+                        self.log(f"✗ 复用输出失败: {duplicate['output_file']} {error}")
+            elif duplicates:
+                self.log(f"✗ 失败: {', '.join(d['output_file'] for d in duplicates)} (与 {task['output_file']} 相同)")
+
+            # 上传与后续编码并行；上传池排满时在这里等待
+            if uploader is not None:
+                for item in outputs:
+                    uploader.submit(item['output_path'], f"{item['lang']}/{item['output_file']}")
+
+            with progress_lock:
+                scheduler.record_completion(task, time.time() - started, success)
+                processing_status['progress'] += 1 + len(duplicates)
+                if deduplicator is not None:
+                    processing_status['dedup'] = deduplicator.summary()
+                processing_status['schedule'] = scheduler.summary()
+                processing_status['io'] = prefetcher.stats()
+                if stager is not None:
+                    processing_status['staging'] = stager.summary()
+                if uploader is not None:
+                    processing_status['upload'] = uploader.summary()
+                if throttle is not None:
+                    processing_status['volumes'] = throttle.summary()
+                if controller is not None:
+                    processing_status['concurrency'] = controller.summary()
+                if hybrid is not None:
+                    processing_status['executors'] = hybrid.summary()
+                if self.verifier is not None:
+                    processing_status['verify'] = self.verifier.summary()
+                completed_tasks = processing_status['progress']
+                progress_percent = (completed_tasks / total_tasks) * 100
+                self.log(f"总进度: {completed_tasks}/{total_tasks} ({progress_percent:.1f}%)")
+            return success
+
+        hybrid = None
+        if executors:
+            # 每个执行器的槽位从同一个队列取任务；熔断中的执行器暂不分配
+            available = (lambda e: retry.breaker.allow(e.name)) if retry is not None else None
+            hybrid = HybridScheduler(executors, scheduler.tasks, scheduler.seconds_per_cost, available)
+            processing_status['executors'] = hybrid.summary()
+
+        pool_size = controller.max_workers if controller is not None else scheduler.workers
+        if controller is not None:
+            controller.start()
+        try:
+            if hybrid is not None:
+                hybrid.run(run_one, lambda: processing_status['stop_requested'])
+            else:
+                with ThreadPoolExecutor(max_workers=pool_size) as pool:
+                    # 线程池按提交顺序取任务，保证最长优先
+                    for task in scheduler.tasks:
+                        pool.submit(run_one, task)
+        finally:
+            if hybrid is not None:
+                processing_status['executors'] = hybrid.summary()
+            if controller is not None:
+                controller.stop()
+                processing_status['concurrency'] = controller.summary()
+
+        prefetcher.stop()
+        io_stats = prefetcher.stats()
+        processing_status['io'] = io_stats
+        self.log(f"💾 从存储读取: {format_bytes(io_stats['bytes_read'])}"
+                 + (f", 预读 {io_stats['prefetched']} 个源文件" if prefetch else ""))
+
+        if processing_status['stop_requested']:
+            self.log("\n⚠ 用户请求终止任务")
+
+    def preflight_subtitles(self, tasks, repair=False, media_infos=None, subtitle_style=None):
+        """编码前检查所有字幕，返回可执行的任务
+
+        Args:
+            tasks: 任务列表
+            repair: 是否自动修复时间轴问题（写入规范化缓存，不修改原文件）
+            media_infos: {视频路径: 媒体信息}（可选）
+            subtitle_style: 字幕样式配置（用于检查字体能否显示全部字符）
+
+        Returns:
+            tuple: (通过预检的任务列表, 被拒绝的任务数)
+        """
+        self.log(f"🔍 预检 {len(tasks)} 个任务的字幕...")
+        results = preflight_tasks(tasks, repair=repair, media_infos=media_infos)
+        summary = summarize_preflight(results)
+        processing_status['preflight'] = summary
+
+        for result in results.values():
+            name = os.path.join(result['lang'] or '', os.path.basename(result['path']))
+            for message in result['fatal']:
+                self.log(f"✗ 预检失败: {name}: {message}")
+            for message in result['warnings']:
+                self.log(f"⚠ 预检警告: {name}: {message}")
+            for message in result['repairs']:
+                self.log(f"🔧 已修复: {name}: {message}")
+
+        # 字形覆盖检查：没有任何字体包含的字符会显示为方框，编码前拒绝（同一字幕+语种只检查一次）
+        coverage = {}
+        font_index = get_font_index()
+        for task in tasks:
+            result = results.get(task['subtitle_path'])
+            key = (task['subtitle_path'], task['lang'])
+            if not result or result['fatal'] or key in coverage:
+                continue
+            check = check_coverage(set(result['charset']), subtitle_style, task['lang'], font_index)
+            coverage[key] = check
+            name = os.path.join(task['lang'], os.path.basename(task['subtitle_path']))
+            if check['checked'] and check['missing']:
+                self.log(f"✗ 预检失败: {name}: 没有字体包含 {len(check['missing'])} 个字符: {check['missing'][:40]}")
+            elif check['fallback']:
+                self.log(f"⚠ 预检警告: {name}: {check['fonts'][0]['family']} 缺少 {len(check['fallback'])} 个字符，"
+                         f"将使用回退字体: {check['fallback'][:40]}")
+        summary['tofu'] = sum(1 for check in coverage.values() if check['checked'] and check['missing'])
+
+        accepted = []
+        rejected = 0
+        for task in tasks:
+            result = results.get(task['subtitle_path'])
+            if result and result['fatal']:
+                self.log(f"⚠ 跳过: {task['output_file']} (字幕预检失败)")
+                rejected += 1
+                continue
+            check = coverage.get((task['subtitle_path'], task['lang']))
+            if check and check['checked'] and check['missing']:
+                self.log(f"⚠ 跳过: {task['output_file']} (字体缺字)")
+                rejected += 1
+                continue
+            if result and result['normalized_path']:
+                task = dict(task, source_subtitle_path=task['subtitle_path'], subtitle_path=result['normalized_path'])
+            accepted.append(task)
+
+        self.log(f"🔍 预检完成: {summary['checked']} 个字幕, {summary['fatal']} 个致命, "
+                 f"{summary['warnings']} 个警告, {summary['repaired']} 个已修复, {summary['tofu']} 个缺字")
+        return accepted, rejected
+
+    def execute_plan(self, plan, preflight=True, repair_subtitles=False):
+        """按 build_plan 生成的计划执行（计划中的任务即为执行输入）"""
+        options = plan.get('options', {})
+        self.batch_merge(
+            plan['video_folder'], plan['subtitle_folder'], plan['output_folder'],
+            use_gpu=options.get('use_gpu', False),
+            gpu_type=options.get('gpu_type', 'auto'),
+            subtitle_style=options.get('subtitle_style'),
+            max_workers=options.get('max_workers', 1),
+            preflight=preflight,
+            repair_subtitles=repair_subtitles,
+            plan=plan,
+            ordering=options.get('ordering', 'longest-first'),
+            prefetch=options.get('prefetch'),
+            scratch_dir=options.get('scratch_dir'),
+            scratch_limit_gb=options.get('scratch_limit_gb'),
+            sink=options.get('sink'),
+            upload_workers=options.get('upload_workers', DEFAULT_UPLOAD_WORKERS),
+            delete_local_outputs=options.get('delete_local_outputs', False),
+            volume_throttle=options.get('volume_throttle', True),
+            volume_adaptive=options.get('volume_adaptive', False),
+            dedup=options.get('dedup', True),
+            ffmpeg_logs=options.get('ffmpeg_logs', False),
+            adaptive_workers=options.get('adaptive_workers', False),
+            max_workers_limit=options.get('max_workers_limit'),
+            executors=options.get('executors'),
+            gpu_slots=options.get('gpu_slots'),
+            stall_timeout=options.get('stall_timeout', STALL_TIMEOUT),
+            max_task_seconds=options.get('max_task_seconds'),
+            stall_retries=options.get('stall_retries', 1),
+            retry_policy=options.get('retry_policy'),
+            cpu_fallback=options.get('cpu_fallback', True),
+            container_preflight=options.get('container_preflight', True),
+            verify_outputs=options.get('verify_outputs', 'quick')
+        )
+
+    def batch_merge(self, video_folder, subtitle_folder, output_folder, use_gpu=False, gpu_type='auto', subtitle_style=None, max_workers=1,
+                    preflight=True, repair_subtitles=False, plan=None, ordering='longest-first', prefetch=None,
+                    scratch_dir=None, scratch_limit_gb=None, sink=None, upload_workers=DEFAULT_UPLOAD_WORKERS,
+                    delete_local_outputs=False, volume_throttle=True, volume_adaptive=False, dedup=True, ffmpeg_logs=False,
+                    adaptive_workers=False, max_workers_limit=None, executors=None, gpu_slots=None,
+                    stall_timeout=STALL_TIMEOUT, max_task_seconds=None, stall_retries=1, retry_policy=None,
+                    cpu_fallback=True, container_preflight=True, verify_outputs='quick'):
         """批量合成视频字幕
 
         Args:
@@ -354,15 +1011,63 @@ class SubtitleMerger:
             use_gpu: 是否使用GPU加速
             gpu_type: GPU类型
             subtitle_style: 字幕样式配置
+            max_workers: 并行处理的任务数
+            preflight: 编码前是否预检字幕
+            repair_subtitles: 是否自动修复字幕时间轴问题
+            plan: build_plan 生成的任务计划（可选，提供时不再重新扫描文件夹）
+            ordering: 调度策略 'longest-first' 或 'locality'（同一视频的语种任务相邻）
+            prefetch: 是否预读下一个源文件（默认 locality 模式下启用）
+            scratch_dir: 本地暂存目录（可选，'default' 使用系统临时目录；源文件和输出在网络存储上时启用）
+            scratch_limit_gb: 源文件暂存空间上限（GB）
+            sink: 输出目标（可选，本地目录 / s3://... / sftp://... 或配置字典），输出完成后立即上传
+            upload_workers: 并发上传数
+            delete_local_outputs: 上传成功后删除 output_folder 中的本地输出
+            volume_throttle: 输出卷空间不足时是否暂停/跳过任务（按 码率 × 时长 预估输出大小）
+            volume_adaptive: 是否按设备实测读写吞吐自适应限制每个存储卷的并发（需要 /proc/diskstats）
+            dedup: 是否合并输出完全相同的任务（相同源文件内容 + 相同字幕内容 + 相同渲染参数），每组只编码一次
+            ffmpeg_logs: 是否把每个任务的完整 ffmpeg 输出压缩保存到 cache/ffmpeg_logs（True 或目录路径）
+            adaptive_workers: 是否根据总帧率、CPU 利用率和内存压力在运行时调整并发数（从 max_workers 开始）
+            max_workers_limit: 自适应并发的上限（默认 CPU 核心数）
+            executors: 混合执行器（'auto' 或类型列表如 ['cpu', 'nvenc']），CPU 与硬件编码器同时工作；
+                       CPU 槽位数为 max_workers（0 表示只用硬件编码器）
+            gpu_slots: 硬件执行器槽位数 {类型: 数量}，如 {'nvenc': 3}
+            stall_timeout: ffmpeg 进度停滞多少秒后结束进程（None 或 0 不检测）
+            max_task_seconds: 单个任务的最长运行时间（秒；'auto' 按本机实测吞吐预计耗时的 10 倍计算；默认 None 不限制，只检测停滞）
+            stall_retries: 被看门狗结束的任务换一条编码路径（GPU 改用 CPU / 其他执行器）重试的次数
+            retry_policy: 按失败类型覆盖重试策略，如 {'gpu_error': {'retries': 3}}（False 表示失败不重试）
+            cpu_fallback: GPU 失败或熔断时是否改用 CPU (libx264) 重试
+            container_preflight: 编码前按源文件的音频编码和封装格式决定音频复制/转码及输出扩展名
+            verify_outputs: 编码后核对输出（'quick' 只比较 ffprobe 元数据，'deep' 额外抽样解码，False 不校验）
         """
         global processing_status
 
         processing_status['is_processing'] = True
-        processing_status['logs'] = []
+        # 监听模式下的各批次共用一份日志（由 MAX_LOG_LINES 限制长度）
+        if not processing_status['watching']:
+            processing_status['logs'] = []
         processing_status['completed'] = False
         processing_status['error'] = None
         processing_status['progress'] = 0
         processing_status['stop_requested'] = False
+        processing_status['staging'] = None
+        processing_status['upload'] = None
+        processing_status['volumes'] = None
+        processing_status['dedup'] = None
+        processing_status['concurrency'] = None
+        processing_status['executors'] = None
+        processing_status['watchdog'] = None
+        processing_status['retries'] = None
+        processing_status['containers'] = None
+        processing_status['verify'] = None
+
+        self.stall_timeout = float(stall_timeout) if stall_timeout else None
+        self.max_task_seconds = max_task_seconds if max_task_seconds == 'auto' else (float(max_task_seconds) if max_task_seconds else None)
+
+        if ffmpeg_logs:
+            self.ffmpeg_log_dir = FFMPEG_LOG_DIR if ffmpeg_logs is True else ffmpeg_logs
+            self.log(f"📝 ffmpeg 日志: {self.ffmpeg_log_dir}")
+        else:
+            self.ffmpeg_log_dir = None
 
         # 记录加速模式和字幕样式
         if use_gpu:
@@ -383,109 +1088,203 @@ class SubtitleMerger:
                 self.log(f"🎨 字幕样式: {', '.join(style_info)}")
 
         try:
-            # 获取所有视频文件
-            video_files = self.get_video_files(video_folder)
-            if not video_files:
-                processing_status['error'] = "未找到视频文件"
-                return
-
-            # 获取所有语种
-            languages = self.scan_languages(subtitle_folder)
-            if not languages:
-                processing_status['error'] = "未找到语种文件夹"
-                return
-
-            total_tasks = len(video_files) * len(languages)
+            # 按最近使用时间淘汰旧的任务字体目录和子集字体（批次开始时没有 ffmpeg 在使用）
+            evicted = evict_font_cache()
+            if evicted['removed'] or evicted['subsets_removed']:
+                self.log(f"🧹 字体缓存: 删除 {evicted['removed']} 个字体目录、{evicted['subsets_removed']} 个子集字体，"
+                         f"释放 {format_bytes(evicted['freed'])}")
+
+            if plan is None:
+                # 获取所有视频文件
+                video_files = self.get_video_files(video_folder)
+                if not video_files:
+                    processing_status['error'] = "未找到视频文件"
+                    return
+
+                # 获取所有语种
+                languages = self.scan_languages(subtitle_folder)
+                if not languages:
+                    processing_status['error'] = "未找到语种文件夹"
+                    return
+
+                plan = build_plan(self, video_folder, subtitle_folder, output_folder, use_gpu, gpu_type,
+                                  subtitle_style, max_workers, video_files=video_files, languages=languages,
+                                  ordering=ordering, container_preflight=container_preflight)
+
+            summary = plan['summary']
+            total_tasks = summary['pairs']
             processing_status['total'] = total_tasks
 
-            self.log(f"开始处理: {len(video_files)} 个视频 × {len(languages)} 种语言 = {total_tasks} 个任务")
-
-            completed_tasks = 0
-
-            # 遍历每个语种
-            for lang in languages:
-                # 检查是否请求停止
-                if processing_status['stop_requested']:
-                    self.log("\n⚠ 用户请求终止任务")
-                    break
-
-                self.log(f"\n=== 处理语种: {lang} ===")
-
-                lang_subtitle_folder = os.path.join(subtitle_folder, lang)
-                lang_output_folder = os.path.join(output_folder, lang)
-
-                # 遍历每个视频
-                for video_file in video_files:
-                    # 检查是否请求停止
-                    if processing_status['stop_requested']:
-                        self.log("\n⚠ 用户请求终止任务")
-                        break
-
-                    video_name = os.path.splitext(video_file)[0]
-                    video_ext = os.path.splitext(video_file)[1]
-
-                    # 构建路径
-                    video_path = os.path.join(video_folder, video_file)
-
-                    # 查找对应的字幕文件
-                    subtitle_file = None
-                    for ext in ['.srt', '.str']:
-                        potential_subtitle = f"{video_name}_{lang}{ext}"
-                        subtitle_path = os.path.join(lang_subtitle_folder, potential_subtitle)
-                        if os.path.exists(subtitle_path):
-                            subtitle_file = potential_subtitle
-                            break
-
-                    if not subtitle_file:
-                        self.log(f"⚠ 跳过: {video_file} (未找到对应字幕)")
-                        completed_tasks += 1
-                        processing_status['progress'] = completed_tasks
-                        continue
-
-                    subtitle_path = os.path.join(lang_subtitle_folder, subtitle_file)
-                    output_file = f"{video_name}_{lang}{video_ext}"
-                    output_path = os.path.join(lang_output_folder, output_file)
-
-                    # 更新当前任务
-                    processing_status['current_task'] = f"{video_file} -> {lang}"
-                    self.log(f"正在处理: {output_file}")
-
-                    # 检查并转换字幕编码为 UTF-8
-                    if not is_utf8(subtitle_path):
-                        self.log(f"⚠️ 检测到非UTF-8编码字幕，正在自动转换...")
-                        encoding_result = detect_file_encoding(subtitle_path)
-                        if encoding_result:
-                            detected_encoding = encoding_result.get('encoding', 'unknown')
-                            confidence = encoding_result.get('confidence', 0)
-                            self.log(f"   检测到编码: {detected_encoding} (置信度: {confidence:.2f})")
-
-                        conv_success, conv_message = convert_subtitle_encoding(subtitle_path, lang)
-                        if conv_success:
-                            self.log(f"✅ {conv_message}")
-                        else:
-                            self.log(f"⚠️ 编码转换失败: {conv_message}")
-                            self.log(f"   将尝试使用原始编码处理...")
-
-                    # 合成视频和字幕 - 传递语种代码用于自动字体映射
-                    success, error_msg = self.merge_subtitle(video_path, subtitle_path, output_path, use_gpu, gpu_type, subtitle_style, language_code=lang)
-
-                    if success:
-                        self.log(f"✓ 完成: {output_file}")
-                    else:
-                        # 检查是否因为终止导致失败
-                        if processing_status['stop_requested']:
-                            self.log(f"⚠ 已终止: {output_file}")
-                        else:
-                            self.log(f"✗ 失败: {output_file}")
-                            if error_msg:
-                                # 显示更多错误信息（取最后2000字符），因为ffmpeg错误通常在最后
-                                self.log(f"  错误信息: ...{error_msg[-2000:]}")
-
-                    completed_tasks += 1
-                    processing_status['progress'] = completed_tasks
+            self.log(f"开始处理: {summary['videos']} 个视频 × {summary['languages']} 种语言 = {total_tasks} 个任务")
+
+            # 缺少字幕的组合直接跳过
+            for item in plan['missing']:
+                self.log(f"⚠ 跳过: {item['video_file']} -> {item['lang']} (未找到对应字幕)")
+            skipped = len(plan['missing'])
+            tasks = plan['tasks']
+
+            # 探测时长（共享元数据缓存）
+            media_infos = get_metadata_cache().warm([t['video_path'] for t in tasks])
+
+            # 音频无法直接复制到输出封装格式的任务改为转码，不适合的封装格式改用 .mp4
+            # （build_plan 生成的计划已经处理过，监听模式等其他来源的计划在这里处理）
+            if container_preflight:
+                containers = plan.get('containers') if plan.get('options', {}).get('container_preflight') else None
+                if containers is None:
+                    containers = preflight_containers(tasks, media_infos)
+                processing_status['containers'] = containers
+                for reason, count in containers['reasons'].items():
+                    self.log(f"📦 {count} 个任务: {reason}")
+
+            # 编码前并行预检所有字幕，有致命问题的任务不进入队列
+            if preflight:
+                tasks, rejected = self.preflight_subtitles(tasks, repair_subtitles, media_infos, subtitle_style)
+                skipped += rejected
+
+            processing_status['progress'] = skipped
+
+            # 输出相同的任务每组只编码一次
+            deduplicator = None
+            if dedup:
+                deduplicator = OutputDeduplicator(lambda t: self.render_signature(t, subtitle_style))
+                tasks = deduplicator.group(tasks)
+                dedup_summary = deduplicator.summary()
+                processing_status['dedup'] = dedup_summary
+                if dedup_summary['duplicates']:
+                    self.log(f"🔗 发现 {dedup_summary['duplicates']} 个重复输出 ({dedup_summary['groups']} 组)，"
+                             f"只编码一次后复用")
+
+            # 按最长优先排序，长任务不会拖到最后；locality 模式下同一源文件的任务相邻
+            executor_list = None
+            if executors:
+                executor_list = detect_executors(self, cpu_slots=max_workers, gpu_slots=gpu_slots,
+                                                 enabled=None if executors == 'auto' else executors)
+                if not executor_list:
+                    processing_status['error'] = "没有可用的执行器"
+                    self.log("✗ 没有可用的执行器")
+                    return
+                self.log("⚙ 混合执行: " + ", ".join(f"{e.label} × {e.slots}" for e in executor_list))
+
+            if executor_list:
+                # 成本以 libx264 为基准，各执行器按自身编码器换算
+                scheduler = BatchScheduler(tasks, workers=sum(e.slots for e in executor_list), video_codec='libx264',
+                                           media_infos=media_infos, strategy=ordering)
+            else:
+                video_codec = self.resolve_video_codec(use_gpu, gpu_type)
+                scheduler = BatchScheduler(tasks, workers=max_workers, video_codec=video_codec,
+                                           media_infos=media_infos, strategy=ordering)
+            schedule = scheduler.summary()
+            processing_status['schedule'] = schedule
+            self.log(f"📋 调度: {STRATEGIES[scheduler.strategy]}, {schedule['workers']} 个并行任务, "
+                     f"预计完成时间 {schedule['predicted_finish_text']}")
+
+            if prefetch is None:
+                prefetch = scheduler.strategy == 'locality'
+
+            uploader = None
+            if sink:
+                try:
+                    uploader = UploadPool(create_sink(sink), workers=upload_workers,
+                                          delete_local=delete_local_outputs, log=self.log)
+                except SinkError as e:
+                    processing_status['error'] = str(e)
+                    self.log(f"✗ {e}")
+                    return
+                self.uploader = uploader
+                self.log(f"☁️ 输出目标: {uploader.sink.describe()} ({upload_workers} 个并发上传)")
+
+            stager = None
+            if scratch_dir:
+                limit = int(float(scratch_limit_gb) * 1024 ** 3) if scratch_limit_gb else DEFAULT_SCRATCH_LIMIT
+                stager = ScratchStager(None if scratch_dir == 'default' else scratch_dir, limit)
+                self.log(f"📦 本地暂存: {stager.root} (上限 {format_bytes(limit)})")
+
+            controller = None
+            if adaptive_workers:
+                ceiling = max(int(max_workers_limit or os.cpu_count() or 1), scheduler.workers)
+                controller = ConcurrencyController(scheduler.workers, ceiling)
+                self.controller = controller
+                processing_status['concurrency'] = controller.summary()
+                self.log(f"🎛 自适应并发: 初始 {controller.limit}, 上限 {ceiling}")
+
+            retry = None
+            if retry_policy is not False:
+                # 卡住和超时的重试次数沿用 stall_retries
+                overrides = {'stalled': {'retries': int(stall_retries or 0)}, 'timeout': {'retries': int(stall_retries or 0)}}
+                for name, rules in (retry_policy or {}).items():
+                    overrides.setdefault(name, {}).update(rules)
+                retry = RetryPolicy(overrides, cpu_fallback=cpu_fallback)
+
+            if verify_outputs:
+                self.verifier = OutputVerifier('quick' if verify_outputs is True else verify_outputs)
+                processing_status['verify'] = self.verifier.summary()
+
+            per_volume = controller.max_workers if controller is not None else scheduler.workers
+            throttle = VolumeThrottle(per_volume, media_infos, adaptive=volume_adaptive) if volume_throttle else None
 
-                    progress_percent = (completed_tasks / total_tasks) * 100
-                    self.log(f"总进度: {completed_tasks}/{total_tasks} ({progress_percent:.1f}%)")
+            try:
+                self.run_tasks(scheduler, use_gpu, gpu_type, subtitle_style, prefetch=prefetch, stager=stager,
+                               uploader=uploader, throttle=throttle, deduplicator=deduplicator, controller=controller,
+                               executors=executor_list, retry=retry)
+            finally:
+                self.controller = None
+                if self.verifier is not None:
+                    verify = self.verifier.summary()
+                    processing_status['verify'] = verify
+                    self.verifier = None
+                    self.log(f"🔍 输出校验 ({verify['mode']}): 通过 {verify['passed']} 个, 不一致 {verify['failed']} 个"
+                             + (f", 跳过 {verify['skipped']} 个" if verify['skipped'] else "")
+                             + (f", 平均 {verify['avg_ms']} ms" if verify['avg_ms'] is not None else ""))
+                if controller is not None:
+                    self.log(f"🎛 自适应并发: 最终 {controller.limit} ({controller.reason})")
+                if throttle is not None:
+                    volumes = throttle.summary()
+                    processing_status['volumes'] = volumes
+                    for volume in volumes['volumes']:
+                        self.log(f"🗄 存储卷 {volume['path']}: 读 {format_bytes(volume['read_bytes'])}, "
+                                 f"写 {format_bytes(volume['write_bytes'])}, 并发上限 {volume['limit']}/{volume['max_limit']}")
+                if uploader is not None:
+                    self.log("☁️ 等待剩余上传完成...")
+                    uploader.close()
+                    upload = uploader.summary()
+                    processing_status['upload'] = upload
+                    self.uploader = None
+                    self.log(f"☁️ 上传: 成功 {upload['uploaded']} 个, 失败 {upload['failed']} 个, "
+                             f"{format_bytes(upload['bytes'])} ({format_bytes(upload['throughput'])}/s)")
+                if stager is not None:
+                    staging = stager.summary()
+                    processing_status['staging'] = staging
+                    self.log(f"📦 暂存: 复制源文件 {staging['sources_staged']} 个 ({format_bytes(staging['bytes_in'])}), "
+                             f"复用 {staging['source_hits']} 次, 输出 {staging['outputs_committed']} 个 "
+                             f"({format_bytes(staging['bytes_out'])})")
+                    stager.cleanup()
+            if executor_list:
+                # 混合执行时整批吞吐混合了不同编码器，按各执行器自身的编码器分别保存
+                for executor in executor_list:
+                    if executor.completed:
+                        record_seconds_per_cost(executor.video_codec, executor.seconds_per_cost)
+            else:
+                scheduler.save_throughput()
+
+            watchdog = processing_status['watchdog']
+            if watchdog and (watchdog['stalled'] or watchdog['timed_out']):
+                self.log(f"⏱ 看门狗: 卡住 {watchdog['stalled']} 次, 超时 {watchdog['timed_out']} 次")
+            if retry is not None:
+                retries = retry.summary()
+                processing_status['retries'] = retries
+                if retries['retried'] or retries['gave_up']:
+                    by_class = ', '.join(f"{FAILURE_LABELS.get(name, name)} {count}"
+                                         for name, count in retries['failures'].items())
+                    self.log(f"↻ 重试: {retries['retried']} 次 (改用 CPU {retries['fallbacks']} 次), "
+                             f"重试后成功 {retries['recovered']} 个, 放弃 {retries['gave_up']} 个; 失败类型: {by_class}")
+                for name, breaker in retries['breakers'].items():
+                    if breaker['trips']:
+                        self.log(f"⚡ {name} 熔断 {breaker['trips']} 次")
+
+            if deduplicator is not None and deduplicator.stats['duplicates']:
+                dedup_summary = deduplicator.summary()
+                processing_status['dedup'] = dedup_summary
+                self.log(f"🔗 去重: 节省 {dedup_summary['encodes_saved']} 次编码")
 
             if processing_status['stop_requested']:
                 self.log(f"\n{'='*50}\n任务已被终止!")
@@ -501,9 +1300,116 @@ class SubtitleMerger:
         finally:
             processing_status['is_processing'] = False
 
+    def start_watch(self, video_folder, subtitle_folder, output_folder, use_gpu=False, gpu_type='auto',
+                    subtitle_style=None, settle_time=5.0, use_inotify=True, log=None, **batch_options):
+        """启动监听模式：新视频/字幕写入完成后自动派发新增的 (视频, 语种) 任务
+
+        派发的任务按批次交给 batch_merge，与手动批处理走相同的流程
+        （封装预检、字幕预检、去重、调度、重试/看门狗、存储卷限流、输出校验、上传）。
+
+        Args:
+            video_folder: 视频文件夹
+            subtitle_folder: 字幕文件夹
+            output_folder: 输出文件夹
+            use_gpu: 是否使用GPU加速
+            gpu_type: GPU类型
+            subtitle_style: 字幕样式配置
+            settle_time: 文件稳定等待时间（秒）
+            use_inotify: 是否优先使用inotify（否则轮询）
+            log: 监听器日志函数（默认写入处理日志）
+            **batch_options: 传给 batch_merge 的其他参数（如 max_workers、repair_subtitles、verify_outputs）
+
+        Returns:
+            bool: 是否成功启动
+        """
+        if self.watcher and self.watcher.is_running:
+            return False
+
+        processing_status['watching'] = True
+        processing_status['stop_requested'] = False
+        self.watch_options = dict(batch_options, use_gpu=use_gpu, gpu_type=gpu_type, subtitle_style=subtitle_style)
+
+        self.watcher = FolderWatcher(
+            self, video_folder, subtitle_folder, output_folder,
+            on_tasks=self.enqueue_tasks,
+            settle_time=settle_time,
+            use_inotify=use_inotify,
+            log=log or self.log
+        )
+        self.watcher.start()
+
+        self._watch_worker = threading.Thread(target=self._watch_dispatch_loop, daemon=True)
+        self._watch_worker.start()
+        return True
+
+    def stop_watch(self):
+        """停止监听模式（已派发但未开始的任务会被丢弃）"""
+        processing_status['watching'] = False
+        if self.watcher:
+            self.watcher.stop(timeout=5)
+        while not self.task_queue.empty():
+            try:
+                self.task_queue.get_nowait()
+            except queue.Empty:
+                break
+
+    def enqueue_tasks(self, tasks):
+        """把任务加入编码队列"""
+        for task in tasks:
+            self.task_queue.put(task)
+
+    def _watch_dispatch_loop(self):
+        """监听模式下的编码队列消费线程：把已派发的任务合成一批交给 batch_merge"""
+        while processing_status['watching']:
+            try:
+                tasks = [self.task_queue.get(timeout=1)]
+            except queue.Empty:
+                continue
+
+            # 等待手动启动的批量任务结束并认领处理状态，避免两路同时编码
+            claimed = False
+            while processing_status['watching'] and not claimed:
+                claimed = claim_processing()
+                if not claimed:
+                    time.sleep(1)
+            if not claimed:
+                break
+
+            # 等待期间新派发的任务并入同一批
+            while True:
+                try:
+                    tasks.append(self.task_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            watcher = self.watcher
+            plan = {
+                'video_folder': watcher.video_folder,
+                'subtitle_folder': watcher.subtitle_folder,
+                'output_folder': watcher.output_folder,
+                'tasks': tasks,
+                'missing': [],
+                'summary': {
+                    'videos': len({t['video_path'] for t in tasks}),
+                    'languages': len({t['lang'] for t in tasks}),
+                    'pairs': len(tasks),
+                },
+            }
+            try:
+                self.batch_merge(plan['video_folder'], plan['subtitle_folder'], plan['output_folder'],
+                                 plan=plan, **self.watch_options)
+            except Exception as e:
+                processing_status['is_processing'] = False
+                self.log(f"✗ 发生错误: {str(e)}")
+
     def log(self, message):
         """添加日志"""
-        processing_status['logs'].append(message)
+        logs = processing_status['logs']
+        logs.append(message)
+        if len(logs) > MAX_LOG_LINES:
+            del logs[:len(logs) - MAX_LOG_LINES]
+        if self.echo:
+            print(message)
 
 
 merger = SubtitleMerger()
@@ -587,6 +1493,29 @@ def validate_folder():
     return jsonify(result)
 
 
+def parse_subtitle_style(style_data):
+    """把前端提交的字幕样式转换为 merge_subtitle 使用的配置字典"""
+    if not style_data:
+        return None
+
+    subtitle_style = {}
+    if style_data.get('font_size'):
+        subtitle_style['font_size'] = int(style_data['font_size'])
+    if style_data.get('margin_v'):
+        subtitle_style['margin_v'] = int(style_data['margin_v'])
+    if style_data.get('alignment'):
+        subtitle_style['alignment'] = int(style_data['alignment'])
+    if style_data.get('font_name'):
+        subtitle_style['font_name'] = style_data['font_name']
+    if style_data.get('outline'):
+        subtitle_style['outline'] = int(style_data['outline'])
+    if style_data.get('shadow'):
+        subtitle_style['shadow'] = int(style_data['shadow'])
+    if style_data.get('subset_fonts'):
+        subtitle_style['subset_fonts'] = True
+    return subtitle_style
+
+
 @app.route('/api/start_merge', methods=['POST'])
 def start_merge():
     """开始批量合成"""
@@ -596,29 +1525,33 @@ def start_merge():
         return jsonify({'success': False, 'error': '正在处理中，请等待'})
 
     data = request.json
+    repair_subtitles = bool(data.get('repair_subtitles', False))
+
+    # 直接执行 /api/plan 返回的计划
+    if data.get('plan'):
+        plan = data['plan']
+        if not os.path.exists(plan.get('video_folder', '')):
+            return jsonify({'success': False, 'error': '原视频文件夹不存在'})
+        if not claim_processing():
+            return jsonify({'success': False, 'error': '正在处理中，请等待'})
+        thread = threading.Thread(
+            target=merger.execute_plan,
+            args=(plan,),
+            kwargs={'repair_subtitles': repair_subtitles}
+        )
+        thread.daemon = True
+        thread.start()
+        return jsonify({'success': True})
+
     video_folder = data.get('video_folder', '')
     subtitle_folder = data.get('subtitle_folder', '')
     output_folder = data.get('output_folder', '')
     use_gpu = data.get('use_gpu', False)
     gpu_type = data.get('gpu_type', 'auto')
+    max_workers = max(1, int(data.get('max_workers', 1)))
 
     # 获取字幕样式配置
-    subtitle_style = None
-    if data.get('subtitle_style'):
-        style_data = data['subtitle_style']
-        subtitle_style = {}
-        if style_data.get('font_size'):
-            subtitle_style['font_size'] = int(style_data['font_size'])
-        if style_data.get('margin_v'):
-            subtitle_style['margin_v'] = int(style_data['margin_v'])
-        if style_data.get('alignment'):
-            subtitle_style['alignment'] = int(style_data['alignment'])
-        if style_data.get('font_name'):
-            subtitle_style['font_name'] = style_data['font_name']
-        if style_data.get('outline'):
-            subtitle_style['outline'] = int(style_data['outline'])
-        if style_data.get('shadow'):
-            subtitle_style['shadow'] = int(style_data['shadow'])
+    subtitle_style = parse_subtitle_style(data.get('subtitle_style'))
 
     # 验证输入
     if not all([video_folder, subtitle_folder, output_folder]):
@@ -633,7 +1566,7 @@ def start_merge():
     # 检查ffmpeg
     try:
         subprocess.run(
-            ['ffmpeg', '-version'], 
+            [FFMPEG_BIN, '-version'],
             stdout=subprocess.PIPE, 
             stderr=subprocess.PIPE, 
             check=True,
@@ -643,10 +1576,37 @@ def start_merge():
     except (subprocess.CalledProcessError, FileNotFoundError):
         return jsonify({'success': False, 'error': '未检测到ffmpeg，请先安装'})
 
-    # 在新线程中执行处理
+    # 认领处理状态后在新线程中执行处理（监听模式的批次会等待本批结束）
+    if not claim_processing():
+        return jsonify({'success': False, 'error': '正在处理中，请等待'})
     thread = threading.Thread(
         target=merger.batch_merge,
-        args=(video_folder, subtitle_folder, output_folder, use_gpu, gpu_type, subtitle_style)
+        args=(video_folder, subtitle_folder, output_folder, use_gpu, gpu_type, subtitle_style, max_workers),
+        kwargs={
+            'repair_subtitles': repair_subtitles,
+            'ordering': data.get('ordering', 'longest-first'),
+            'prefetch': data.get('prefetch'),
+            'scratch_dir': data.get('scratch_dir'),
+            'scratch_limit_gb': data.get('scratch_limit_gb'),
+            'sink': data.get('sink'),
+            'upload_workers': max(1, int(data.get('upload_workers', DEFAULT_UPLOAD_WORKERS))),
+            'delete_local_outputs': data.get('delete_local_outputs', False),
+            'volume_throttle': data.get('volume_throttle', True),
+            'volume_adaptive': data.get('volume_adaptive', False),
+            'dedup': data.get('dedup', True),
+            'ffmpeg_logs': data.get('ffmpeg_logs', False),
+            'adaptive_workers': data.get('adaptive_workers', False),
+            'max_workers_limit': data.get('max_workers_limit'),
+            'executors': data.get('executors'),
+            'gpu_slots': data.get('gpu_slots'),
+            'stall_timeout': data.get('stall_timeout', STALL_TIMEOUT),
+            'max_task_seconds': data.get('max_task_seconds'),
+            'stall_retries': data.get('stall_retries', 1),
+            'retry_policy': data.get('retry_policy'),
+            'cpu_fallback': data.get('cpu_fallback', True),
+            'container_preflight': data.get('container_preflight', True),
+            'verify_outputs': data.get('verify_outputs', 'quick')
+        }
     )
     thread.daemon = True
     thread.start()
@@ -654,6 +1614,80 @@ def start_merge():
     return jsonify({'success': True})
 
 
+@app.route('/api/plan', methods=['POST'])
+def plan_batch():
+    """生成任务计划和耗时预估（不编码）"""
+    data = request.json
+    video_folder = data.get('video_folder', '')
+    subtitle_folder = data.get('subtitle_folder', '')
+    output_folder = data.get('output_folder', '')
+
+    if not all([video_folder, subtitle_folder, output_folder]):
+        return jsonify({'success': False, 'error': '请填写所有文件夹路径'})
+
+    if not os.path.exists(video_folder):
+        return jsonify({'success': False, 'error': '原视频文件夹不存在'})
+
+    if not os.path.exists(subtitle_folder):
+        return jsonify({'success': False, 'error': '字幕文件夹不存在'})
+
+    try:
+        plan = build_plan(
+            merger, video_folder, subtitle_folder, output_folder,
+            use_gpu=data.get('use_gpu', False),
+            gpu_type=data.get('gpu_type', 'auto'),
+            subtitle_style=parse_subtitle_style(data.get('subtitle_style')),
+            max_workers=max(1, int(data.get('max_workers', 1))),
+            probe=data.get('probe', True),
+            ordering=data.get('ordering', 'longest-first'),
+            container_preflight=data.get('container_preflight', True)
+        )
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+    return jsonify({'success': True, 'plan': plan})
+
+
+@app.route('/api/preview', methods=['POST'])
+def preview_subtitle():
+    """渲染字幕样式预览（单帧 JPEG 或几秒 MP4）"""
+    data = request.json
+    video_path = data.get('video_path', '')
+    lang = data.get('lang') or None
+    subtitle_path = data.get('subtitle_path', '')
+
+    # 未指定字幕文件时按命名规则在语种文件夹中查找
+    if not subtitle_path and data.get('subtitle_folder') and lang:
+        lang_folder = os.path.join(data['subtitle_folder'], lang)
+        video_name = os.path.splitext(os.path.basename(video_path))[0]
+        subtitle_file = merger.find_subtitle_file(lang_folder, video_name, lang)
+        if subtitle_file:
+            subtitle_path = os.path.join(lang_folder, subtitle_file)
+
+    if not video_path or not subtitle_path:
+        return jsonify({'success': False, 'error': '请指定视频和字幕文件'})
+
+    timestamp = data.get('timestamp')
+    kind = data.get('kind', 'frame')
+    result = render_preview(
+        merger, video_path, subtitle_path,
+        subtitle_style=parse_subtitle_style(data.get('subtitle_style')),
+        language_code=lang,
+        timestamp=float(timestamp) if timestamp not in (None, '') else None,
+        cue_index=int(data.get('cue_index', 0)),
+        kind=kind,
+        duration=float(data.get('duration', 3.0))
+    )
+    if not result['success']:
+        return jsonify(result)
+
+    response = send_file(result['path'], mimetype='video/mp4' if kind == 'clip' else 'image/jpeg')
+    response.headers['X-Preview-Cached'] = '1' if result['cached'] else '0'
+    response.headers['X-Preview-Timestamp'] = f"{result['timestamp']:.3f}"
+    response.headers['X-Preview-Elapsed'] = str(result['elapsed'])
+    return response
+
+
 @app.route('/api/detect_gpu', methods=['GET'])
 def detect_gpu():
     """检测可用的GPU"""
@@ -690,13 +1724,19 @@ def detect_gpu():
 @app.route('/api/status', methods=['GET'])
 def get_status():
     """获取处理状态"""
+    if merger.watcher:
+        processing_status['watch'] = dict(merger.watcher.stats, queued=merger.task_queue.qsize())
+    if merger.uploader:
+        processing_status['upload'] = merger.uploader.summary()
+    if merger.controller:
+        processing_status['concurrency'] = merger.controller.summary()
     return jsonify(processing_status)
 
 
 @app.route('/api/stop', methods=['POST'])
 def stop_processing():
     """停止处理"""
-    global processing_status, current_process
+    global processing_status
 
     if not processing_status['is_processing']:
         return jsonify({'success': False, 'error': '当前没有正在运行的任务'})
@@ -704,21 +1744,79 @@ def stop_processing():
     # 设置停止标志
     processing_status['stop_requested'] = True
 
-    # 如果有正在运行的ffmpeg进程，终止它
-    if current_process:
+    # 终止所有正在运行的ffmpeg进程
+    with current_processes_lock:
+        processes = list(current_processes)
+
+    for process in processes:
         try:
-            current_process.terminate()
-            current_process.wait(timeout=5)
+            process.terminate()
+            process.wait(timeout=5)
         except Exception as e:
             # 如果terminate失败，尝试强制kill
             try:
-                current_process.kill()
+                process.kill()
             except:
                 pass
 
     return jsonify({'success': True, 'message': '正在终止任务...'})
 
 
+# 监听模式可以传给 batch_merge 的参数
+WATCH_BATCH_OPTIONS = (
+    'max_workers', 'repair_subtitles', 'ordering', 'prefetch', 'scratch_dir', 'scratch_limit_gb', 'sink',
+    'upload_workers', 'delete_local_outputs', 'volume_throttle', 'volume_adaptive', 'dedup', 'ffmpeg_logs',
+    'adaptive_workers', 'max_workers_limit', 'executors', 'gpu_slots', 'stall_timeout', 'max_task_seconds',
+    'stall_retries', 'retry_policy', 'cpu_fallback', 'container_preflight', 'verify_outputs',
+)
+
+
+@app.route('/api/watch/start', methods=['POST'])
+def start_watch():
+    """启动文件夹监听模式"""
+    data = request.json
+    video_folder = data.get('video_folder', '')
+    subtitle_folder = data.get('subtitle_folder', '')
+    output_folder = data.get('output_folder', '')
+
+    if not all([video_folder, subtitle_folder, output_folder]):
+        return jsonify({'success': False, 'error': '请填写所有文件夹路径'})
+
+    if not os.path.isdir(video_folder):
+        return jsonify({'success': False, 'error': '原视频文件夹不存在'})
+
+    if not os.path.isdir(subtitle_folder):
+        return jsonify({'success': False, 'error': '字幕文件夹不存在'})
+
+    # 其余批处理参数与 /api/start_merge 相同
+    batch_options = {key: data[key] for key in WATCH_BATCH_OPTIONS if key in data}
+    if 'max_workers' in batch_options:
+        batch_options['max_workers'] = max(1, int(batch_options['max_workers']))
+
+    started = merger.start_watch(
+        video_folder, subtitle_folder, output_folder,
+        use_gpu=data.get('use_gpu', False),
+        gpu_type=data.get('gpu_type', 'auto'),
+        subtitle_style=parse_subtitle_style(data.get('subtitle_style')),
+        settle_time=float(data.get('settle_time', 5.0)),
+        **batch_options
+    )
+    if not started:
+        return jsonify({'success': False, 'error': '监听模式已在运行'})
+
+    return jsonify({'success': True})
+
+
+@app.route('/api/watch/stop', methods=['POST'])
+def stop_watch():
+    """停止文件夹监听模式"""
+    if not processing_status['watching']:
+        return jsonify({'success': False, 'error': '监听模式未运行'})
+
+    merger.stop_watch()
+    return jsonify({'success': True})
+
+
 @app.route('/api/font_files', methods=['GET'])
 def get_font_files():
     """获取fonts目录中的字体文件列表"""
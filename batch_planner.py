@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量任务规划模块 - 不编码，快速生成完整任务计划和耗时预估（可直接作为执行输入）
+Batch Planner Module - Builds the full task plan with cost estimates without encoding; reusable as execution input
+"""
+
+import json
+import os
+import time
+
+from container_preflight import preflight_containers
+from font_config import get_available_font_for_language, is_font_file_path
+from media_probe import get_metadata_cache
+from scheduler import estimate_cost, load_seconds_per_cost, order_by_locality, predict_makespan
+
+PLAN_VERSION = 1
+SUBTITLE_EXTENSIONS = ['.srt', '.str']
+
+
+def resolve_font(subtitle_style, language_code, font_cache=None):
+    """
+    按 merge_subtitle 的优先级确定任务使用的字体
+
+    Args:
+        subtitle_style: 字幕样式配置
+        language_code: 语种代码
+        font_cache: {语种: 结果} 缓存（同一语种只解析一次）
+
+    Returns:
+        dict: {'type': 'file'/'name'/'default', 'value': 字体文件路径或名称}
+    """
+    if not subtitle_style:
+        return {'type': 'default', 'value': None}
+
+    font_file = subtitle_style.get('font_file')
+    if font_file and os.path.exists(font_file):
+        return {'type': 'file', 'value': font_file}
+
+    font_name = subtitle_style.get('font_name')
+    if font_name:
+        if not is_font_file_path(font_name):
+            return {'type': 'name', 'value': font_name}
+        if os.path.exists(font_name):
+            return {'type': 'file', 'value': font_name}
+
+    if subtitle_style.get('auto_font', True) and language_code:
+        if font_cache is not None and language_code in font_cache:
+            return font_cache[language_code]
+        font_type, font_value = get_available_font_for_language(language_code)
+        result = {'type': font_type, 'value': font_value}
+        if font_cache is not None:
+            font_cache[language_code] = result
+        return result
+
+    return {'type': 'default', 'value': None}
+
+
+def _list_dir(folder):
+    try:
+        return set(os.listdir(folder))
+    except OSError:
+        return set()
+
+
+def build_plan(merger, video_folder, subtitle_folder, output_folder, use_gpu=False, gpu_type='auto',
+               subtitle_style=None, max_workers=1, probe=True, video_files=None, languages=None,
+               ordering='longest-first', container_preflight=True):
+    """
+    生成批量任务计划（不运行 ffmpeg 编码）
+
+    每个语种文件夹和输出文件夹只列目录一次，字体按语种解析一次，
+    时长来自共享元数据缓存，因此上万个任务也能在数秒内完成规划。
+
+    Args:
+        merger: SubtitleMerger 实例
+        video_folder: 视频文件夹
+        subtitle_folder: 字幕文件夹
+        output_folder: 输出文件夹
+        use_gpu: 是否使用GPU加速
+        gpu_type: GPU类型
+        subtitle_style: 字幕样式配置
+        max_workers: 并行任务数（用于估算总耗时）
+        probe: 元数据缓存未命中时是否并行运行 ffprobe
+        video_files: 预先获取的视频文件列表（可选）
+        languages: 预先扫描的语种列表（可选）
+        ordering: 执行顺序 'longest-first' 或 'locality'
+        container_preflight: 是否按源文件的音频编码决定音频复制/转码和输出封装格式
+
+    Returns:
+        dict: 任务计划，包含 options / tasks / missing / summary
+    """
+    started = time.perf_counter()
+
+    if video_files is None:
+        video_files = merger.get_video_files(video_folder)
+    if languages is None:
+        languages = merger.scan_languages(subtitle_folder)
+
+    video_codec = merger.resolve_video_codec(use_gpu, gpu_type)
+    cache = get_metadata_cache()
+
+    video_paths = [os.path.join(video_folder, f) for f in video_files]
+    cached = {path: cache.is_cached(path) for path in video_paths}
+    if probe:
+        media_infos = cache.warm(video_paths)
+    else:
+        media_infos = {path: cache.get_info(path, refresh=False) for path in video_paths}
+
+    seconds_per_cost = load_seconds_per_cost(video_codec)
+    font_cache = {}
+    tasks = []
+    missing = []
+    output_listings = {}
+
+    for lang in languages:
+        subtitle_listing = _list_dir(os.path.join(subtitle_folder, lang))
+        output_listing = output_listings[lang] = _list_dir(os.path.join(output_folder, lang))
+        font = resolve_font(subtitle_style, lang, font_cache)
+
+        for video_file in video_files:
+            video_name = os.path.splitext(video_file)[0]
+            subtitle_file = None
+            for ext in SUBTITLE_EXTENSIONS:
+                if f"{video_name}_{lang}{ext}" in subtitle_listing:
+                    subtitle_file = f"{video_name}_{lang}{ext}"
+                    break
+
+            if not subtitle_file:
+                missing.append({'video_file': video_file, 'lang': lang})
+                continue
+
+            task = merger.build_task(video_folder, video_file, subtitle_folder, lang, subtitle_file, output_folder)
+            info = media_infos.get(task['video_path'])
+            cost = estimate_cost(info, video_codec)
+            task.update({
+                'font': font,
+                'encoder': video_codec,
+                'output_exists': task['output_file'] in output_listing,
+                'metadata_cached': cached.get(task['video_path'], False),
+                'duration': info.get('duration') if info else None,
+                'cost': cost,
+                'cost_estimated': cost is None,
+            })
+            tasks.append(task)
+
+    # 音频复制/转码和输出封装格式（可能改变输出扩展名）
+    containers = {'audio_transcode': 0, 'container_changed': 0}
+    if container_preflight:
+        containers = preflight_containers(tasks, media_infos)
+    if containers['container_changed']:
+        for task in tasks:
+            task['output_exists'] = task['output_file'] in output_listings[task['lang']]
+
+    # 时长未知的任务按已知任务的平均成本估算
+    known = [t['cost'] for t in tasks if t['cost'] is not None]
+    fallback = sum(known) / len(known) if known else 1.0
+    for task in tasks:
+        if task['cost'] is None:
+            task['cost'] = fallback
+        task['estimated_seconds'] = round(task['cost'] * seconds_per_cost, 1)
+
+    tasks.sort(key=lambda t: t['cost'], reverse=True)
+    if ordering == 'locality':
+        tasks = order_by_locality(tasks)
+    total_cost = sum(t['cost'] for t in tasks)
+    makespan_seconds = predict_makespan([t['cost'] for t in tasks], max_workers) * seconds_per_cost
+    predicted_finish = time.time() + makespan_seconds
+
+    summary = {
+        'videos': len(video_files),
+        'languages': len(languages),
+        'pairs': len(video_files) * len(languages),
+        'tasks': len(tasks),
+        'missing_subtitles': len(missing),
+        'outputs_existing': sum(1 for t in tasks if t['output_exists']),
+        'metadata_hits': sum(1 for hit in cached.values() if hit),
+        'metadata_misses': sum(1 for hit in cached.values() if not hit),
+        'unknown_durations': sum(1 for t in tasks if t['cost_estimated']),
+        'audio_transcodes': containers['audio_transcode'],
+        'container_changes': containers['container_changed'],
+        'encoder': video_codec,
+        'workers': max(1, int(max_workers)),
+        'seconds_per_cost': round(seconds_per_cost, 3),
+        'total_encode_seconds': round(total_cost * seconds_per_cost, 1),
+        'makespan_seconds': round(makespan_seconds, 1),
+        'predicted_finish': predicted_finish,
+        'predicted_finish_text': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(predicted_finish)),
+        'planning_seconds': round(time.perf_counter() - started, 3),
+    }
+
+    return {
+        'version': PLAN_VERSION,
+        'created': time.time(),
+        'video_folder': video_folder,
+        'subtitle_folder': subtitle_folder,
+        'output_folder': output_folder,
+        'options': {
+            'use_gpu': use_gpu,
+            'gpu_type': gpu_type,
+            'subtitle_style': subtitle_style,
+            'max_workers': max(1, int(max_workers)),
+            'ordering': ordering,
+            'container_preflight': container_preflight,
+        },
+        'languages': languages,
+        'tasks': tasks,
+        'missing': missing,
+        'containers': containers if container_preflight else None,
+        'summary': summary,
+    }
+
+
+def format_duration(seconds):
+    """秒数格式化为 H:MM:SS"""
+    seconds = int(seconds or 0)
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="批量任务规划（不编码）/ 按计划执行")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    plan_parser = subparsers.add_parser('plan', help="生成任务计划")
+    plan_parser.add_argument('--video', required=True, help="原视频文件夹")
+    plan_parser.add_argument('--subtitle', required=True, help="字幕文件夹")
+    plan_parser.add_argument('--output', required=True, help="输出文件夹")
+    plan_parser.add_argument('--workers', type=int, default=1, help="并行任务数")
+    plan_parser.add_argument('--gpu', action='store_true', help="使用GPU加速")
+    plan_parser.add_argument('--gpu-type', default='auto', help="GPU类型")
+    plan_parser.add_argument('--no-probe', action='store_true', help="只使用已缓存的元数据")
+    plan_parser.add_argument('--locality', action='store_true', help="同一视频的语种任务相邻执行（减少重复读取源文件）")
+    plan_parser.add_argument('-o', '--out', help="把计划保存为JSON文件")
+
+    run_parser = subparsers.add_parser('run', help="按计划文件执行")
+    run_parser.add_argument('plan_file', help="plan 命令生成的JSON文件")
+
+    args = parser.parse_args()
+
+    from app import merger
+
+    if args.command == 'plan':
+        plan = build_plan(merger, args.video, args.subtitle, args.output,
+                          use_gpu=args.gpu, gpu_type=args.gpu_type,
+                          max_workers=args.workers, probe=not args.no_probe,
+                          ordering='locality' if args.locality else 'longest-first')
+        summary = plan['summary']
+        print(f"{summary['videos']} 个视频 × {summary['languages']} 种语言 = {summary['pairs']} 个组合")
+        print(f"可执行任务: {summary['tasks']}  缺少字幕: {summary['missing_subtitles']}  已有输出: {summary['outputs_existing']}")
+        print(f"元数据缓存: 命中 {summary['metadata_hits']} / 未命中 {summary['metadata_misses']}")
+        print(f"编码器: {summary['encoder']}  并行: {summary['workers']}")
+        if summary['audio_transcodes'] or summary['container_changes']:
+            print(f"音频转码: {summary['audio_transcodes']}  更换封装格式: {summary['container_changes']}")
+        print(f"预计总编码时间: {format_duration(summary['total_encode_seconds'])}  "
+              f"预计完成: {summary['predicted_finish_text']} (耗时 {format_duration(summary['makespan_seconds'])})")
+        print(f"规划耗时: {summary['planning_seconds']} 秒")
+        for item in plan['missing']:
+            print(f"  ⚠ 缺少字幕: {item['video_file']} -> {item['lang']}")
+        if args.out:
+            with open(args.out, 'w', encoding='utf-8') as f:
+                json.dump(plan, f, ensure_ascii=False, indent=2)
+            print(f"计划已保存: {args.out}")
+    else:
+        with open(args.plan_file, 'r', encoding='utf-8') as f:
+            plan = json.load(f)
+        merger.echo = True
+        merger.execute_plan(plan)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+fontconfig 缓存基准测试 - 对比每个 ffmpeg 任务在不同 fontconfig 环境下的启动开销
+Fontconfig Cache Benchmark - Compares per-task ffmpeg startup cost under different fontconfig environments
+
+用法: python bench_fontconfig.py [--runs 10] [--font-dir fonts]
+
+每次运行都用 lavfi 生成一帧画面并烧录一条字幕（只测启动 + libass 初始化，不含实际编码）：
+  - system: 系统默认 fontconfig 配置
+  - cold:   私有配置 + 每次全新的空缓存目录（相当于缓存不可写/未预热）
+  - warm:   私有配置 + 预热过的持久缓存（merge_subtitle 实际使用的环境）
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from ffmpeg_runner import FFMPEG_BIN
+from fontconfig_env import ffmpeg_env, uses_fontconfig
+
+SAMPLE_SRT = "1\n00:00:00,000 --> 00:00:05,000\nHello مرحبا 你好\n\n"
+
+
+def run_once(env, subtitle_path, fonts_dir):
+    """运行一次 ffmpeg，返回耗时（秒）"""
+    filter_path = subtitle_path.replace('\\', '/').replace(':', '\\:')
+    subtitle_filter = f"subtitles='{filter_path}':charenc=UTF-8"
+    if fonts_dir:
+        subtitle_filter += f":fontsdir='{fonts_dir}'"
+    cmd = [
+        FFMPEG_BIN, '-hide_banner', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', 'color=c=black:s=320x240:d=1',
+        '-vf', subtitle_filter,
+        '-frames:v', '1', '-f', 'null', '-',
+    ]
+    started = time.perf_counter()
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode('utf-8', errors='replace')[-500:])
+    return elapsed
+
+
+def cold_env(config_path, scratch):
+    """复制私有配置，但把缓存目录指向一个新的空目录"""
+    cache_dir = tempfile.mkdtemp(prefix='fc-cold-', dir=scratch)
+    with open(config_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    start = content.index('<cachedir>') + len('<cachedir>')
+    end = content.index('</cachedir>')
+    content = content[:start] + cache_dir + content[end:]
+    cold_config = os.path.join(cache_dir, 'fonts.conf')
+    with open(cold_config, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return dict(os.environ, FONTCONFIG_FILE=cold_config)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fontconfig 缓存基准测试")
+    parser.add_argument('--runs', type=int, default=10, help="每种环境运行次数")
+    parser.add_argument('--font-dir', default=None, help="传给 subtitles 滤镜的 fontsdir（可选）")
+    args = parser.parse_args()
+
+    if shutil.which(FFMPEG_BIN) is None:
+        print(f"未找到 {FFMPEG_BIN}，无法运行基准测试")
+        return 1
+    if not uses_fontconfig():
+        print("当前平台的 libass 不使用 fontconfig，无需此优化")
+        return 0
+
+    warm = ffmpeg_env()
+    if 'FONTCONFIG_FILE' not in warm:
+        print("私有 fontconfig 配置不可用")
+        return 1
+
+    scratch = tempfile.mkdtemp(prefix='bench-fontconfig-')
+    try:
+        subtitle_path = os.path.join(scratch, 'sample.srt')
+        with open(subtitle_path, 'w', encoding='utf-8') as f:
+            f.write(SAMPLE_SRT)
+
+        # 预热一次（warm 环境的首次运行也计入缓存建立）
+        run_once(warm, subtitle_path, args.font_dir)
+
+        results = {'system': [], 'cold': [], 'warm': []}
+        for _ in range(args.runs):
+            results['system'].append(run_once(dict(os.environ), subtitle_path, args.font_dir))
+            results['cold'].append(run_once(cold_env(warm['FONTCONFIG_FILE'], scratch), subtitle_path, args.font_dir))
+            results['warm'].append(run_once(warm, subtitle_path, args.font_dir))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    print(f"每种环境 {args.runs} 次（单位: 毫秒）")
+    print(f"{'环境':<8}{'中位数':>10}{'平均':>10}{'最小':>10}")
+    for name, samples in results.items():
+        print(f"{name:<8}{statistics.median(samples) * 1000:>10.1f}"
+              f"{statistics.mean(samples) * 1000:>10.1f}{min(samples) * 1000:>10.1f}")
+
+    saved_cold = statistics.median(results['cold']) - statistics.median(results['warm'])
+    saved_system = statistics.median(results['system']) - statistics.median(results['warm'])
+    print(f"\n相对未预热缓存，每个任务节省: {saved_cold * 1000:.1f} ms")
+    print(f"相对系统默认配置，每个任务节省: {saved_system * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
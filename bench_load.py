@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+压力测试 - 用 fake_ffmpeg.py 代替真实 ffmpeg 运行整批任务，测量调度开销、状态接口延迟和内存增长
+Load Benchmark - Runs a full batch with fake_ffmpeg.py in place of the real ffmpeg, measuring orchestration overhead, status API latency and memory growth
+
+用法: python bench_load.py [--scenario smoke|scale|faults|cancel] [--videos N] [--languages N] [--workers N] [--json out.json]
+
+场景:
+  smoke:  100 个任务，快速验证整条流水线
+  scale:  10000 个任务，编码立即完成，只测调度和状态接口本身的开销
+  faults: 400 个任务，模拟 NVENC：10% 编码会话超限、5% 源文件错误、2% 卡住（看门狗 5 秒无进度即结束并重试）
+  cancel: 2000 个任务，5 秒后请求停止，测量终止耗时
+
+每个视频是一个 JSON 格式的模拟媒体文件（时长、分辨率），fake_ffmpeg 按 FAKE_FFMPEG_SPEED 倍速模拟编码；
+理想耗时 = 各任务模拟编码时间之和 / 并行数，实际耗时超出的部分即调度开销。
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from fake_ffmpeg import CODEC_COST
+
+FAKE_FFMPEG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_ffmpeg.py')
+
+SCENARIOS = {
+    'smoke': {'videos': 25, 'languages': 4, 'workers': 4, 'speed': 1000.0},
+    'scale': {'videos': 2500, 'languages': 4, 'workers': 8, 'speed': 0.0, 'stderr_rate': 0.0},
+    'faults': {'videos': 100, 'languages': 4, 'workers': 4, 'speed': 500.0, 'gpu': True, 'gpu_fail_rate': 0.1,
+               'fail_rate': 0.05, 'hang_rate': 0.02, 'truncate_rate': 0.03, 'stall_timeout': 5.0, 'timeout': 120.0},
+    'cancel': {'videos': 500, 'languages': 4, 'workers': 4, 'speed': 100.0, 'stop_after': 5.0},
+}
+
+DEFAULTS = {'speed': 50.0, 'fail_rate': 0.0, 'gpu_fail_rate': 0.0, 'gpu': False, 'hang_rate': 0.0,
+            'hang_seconds': 3600.0, 'stderr_rate': 2.0, 'truncate_rate': 0.0, 'corrupt_rate': 0.0, 'verify': 'quick',
+            'stop_after': None, 'timeout': 3600.0, 'stall_timeout': None}
+
+LANGUAGES = ['EN', 'CN', 'JP', 'KR', 'AR', 'TH', 'RU', 'ES', 'FR', 'DE']
+
+RESOLUTIONS = [(1280, 720), (1920, 1080), (1920, 1080), (3840, 2160)]
+
+
+def rss_bytes():
+    """当前进程的常驻内存（字节），无法获取时返回None"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位为 KB，macOS 为字节
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        return None
+
+
+def format_mb(value):
+    return f"{value / 1024 ** 2:.1f} MB" if value is not None else '未知'
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def write_wrappers(bin_dir):
+    """生成调用 fake_ffmpeg.py 的 ffmpeg / ffprobe 可执行文件"""
+    os.makedirs(bin_dir, exist_ok=True)
+    paths = {}
+    for name in ('ffmpeg', 'ffprobe'):
+        mode = ' --probe' if name == 'ffprobe' else ''
+        if os.name == 'nt':
+            path = os.path.join(bin_dir, f"{name}.bat")
+            content = f'@"{sys.executable}" "{FAKE_FFMPEG}"{mode} %*\r\n'
+        else:
+            path = os.path.join(bin_dir, name)
+            content = f'#!/bin/sh\nexec "{sys.executable}" "{FAKE_FFMPEG}"{mode} "$@"\n'
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.chmod(path, 0o755)
+        paths[name] = path
+    return paths
+
+
+def build_dataset(root, videos, languages, seed=0):
+    """
+    生成模拟媒体文件和字幕
+
+    Returns:
+        dict: {'video_folder', 'subtitle_folder', 'output_folder', 'durations': [每个视频的时长]}
+    """
+    rng = random.Random(seed)
+    video_folder = os.path.join(root, 'videos')
+    subtitle_folder = os.path.join(root, 'subtitles')
+    output_folder = os.path.join(root, 'output')
+    os.makedirs(video_folder, exist_ok=True)
+    os.makedirs(output_folder, exist_ok=True)
+    langs = LANGUAGES[:languages]
+    for lang in langs:
+        os.makedirs(os.path.join(subtitle_folder, lang), exist_ok=True)
+
+    durations = []
+    for index in range(videos):
+        name = f"video_{index:05d}"
+        # 多数为短视频，少数长视频（最长优先调度的典型场景）
+        duration = rng.uniform(60, 600) if rng.random() < 0.7 else rng.uniform(1200, 3600)
+        width, height = rng.choice(RESOLUTIONS)
+        media = {'fake_media': 1, 'name': name, 'duration': round(duration, 3), 'width': width, 'height': height,
+                 'fps': 25, 'video_codec': 'h264', 'audio_codec': 'aac', 'bit_rate': 4000000}
+        with open(os.path.join(video_folder, f"{name}.mp4"), 'w', encoding='utf-8') as f:
+            json.dump(media, f)
+        durations.append(duration)
+        for lang in langs:
+            with open(os.path.join(subtitle_folder, lang, f"{name}_{lang}.srt"), 'w', encoding='utf-8') as f:
+                f.write(f"1\n00:00:01,000 --> 00:00:04,000\n{name} {lang} line one\n\n"
+                        f"2\n00:00:05,000 --> 00:00:09,000\n{name} {lang} line two\n\n")
+
+    return {'video_folder': video_folder, 'subtitle_folder': subtitle_folder, 'output_folder': output_folder,
+            'durations': durations}
+
+
+def run_scenario(config, work_dir, poll_interval=0.25, log=print):
+    """
+    运行一个场景（会修改环境变量并导入 app，每个进程只能运行一次）
+
+    Returns:
+        dict: 测量结果
+    """
+    dataset = build_dataset(work_dir, config['videos'], config['languages'])
+    wrappers = write_wrappers(os.path.join(work_dir, 'bin'))
+    os.environ.update({
+        'FFMPEG_BIN': wrappers['ffmpeg'],
+        'FFPROBE_BIN': wrappers['ffprobe'],
+        'BATCHSRT_CACHE_DIR': os.path.join(work_dir, 'cache'),
+        'FAKE_FFMPEG_SPEED': str(config['speed']),
+        'FAKE_FFMPEG_FAIL_RATE': str(config['fail_rate']),
+        'FAKE_FFMPEG_GPU_FAIL_RATE': str(config['gpu_fail_rate']),
+        'FAKE_FFMPEG_ENCODERS': 'h264_nvenc',
+        'FAKE_FFMPEG_HANG_RATE': str(config['hang_rate']),
+        'FAKE_FFMPEG_HANG_SECONDS': str(config['hang_seconds']),
+        'FAKE_FFMPEG_STDERR_RATE': str(config['stderr_rate']),
+        'FAKE_FFMPEG_TRUNCATE_RATE': str(config['truncate_rate']),
+        'FAKE_FFMPEG_CORRUPT_RATE': str(config['corrupt_rate']),
+    })
+
+    rss_before_import = rss_bytes()
+    # 环境变量在导入时读取
+    import app as web
+
+    client = web.app.test_client()
+    rss_start = rss_bytes()
+    threads_start = threading.active_count()
+    tasks = config['videos'] * config['languages']
+    log(f"场景: {tasks} 个任务 ({config['videos']} 个视频 × {config['languages']} 种语言), "
+        f"{config['workers']} 个并行, 模拟速度 {config['speed']}x")
+
+    started = time.perf_counter()
+    request = {
+        'video_folder': dataset['video_folder'],
+        'subtitle_folder': dataset['subtitle_folder'],
+        'output_folder': dataset['output_folder'],
+        'max_workers': config['workers'],
+        # 模拟 NVENC 编码（fake_ffmpeg 支持 h264_nvenc）
+        'use_gpu': config['gpu'],
+        'gpu_type': 'nvidia',
+        'verify_outputs': config['verify'] if config['verify'] != 'off' else False,
+    }
+    if config['stall_timeout'] is not None:
+        request['stall_timeout'] = config['stall_timeout']
+    response = client.post('/api/start_merge', json=request)
+    if not response.get_json().get('success'):
+        raise RuntimeError(response.get_json().get('error'))
+
+    latencies = []
+    payloads = []
+    samples = []
+    seen_processing = False
+    scheduled_at = None
+    rss_scheduled = None
+    stop_sent_at = None
+    status = {}
+    while True:
+        time.sleep(poll_interval)
+        t0 = time.perf_counter()
+        response = client.get('/api/status')
+        latency = time.perf_counter() - t0
+        status = response.get_json()
+        now = time.perf_counter() - started
+        latencies.append(latency)
+        payloads.append(len(response.data))
+        samples.append({'time': now, 'progress': status['progress'], 'rss': rss_bytes(),
+                        'threads': threading.active_count(), 'latency': latency})
+
+        if status['schedule'] is not None and scheduled_at is None:
+            scheduled_at = now
+            rss_scheduled = samples[-1]['rss']
+        seen_processing = seen_processing or status['is_processing']
+        if seen_processing and not status['is_processing']:
+            break
+        if not seen_processing and status['error']:
+            break
+
+        # stop_after 从开始编码（调度完成）算起，timeout 从提交算起
+        stop_due = config['stop_after'] is not None and scheduled_at is not None \
+            and now - scheduled_at >= config['stop_after']
+        if stop_sent_at is None and (stop_due or now >= config['timeout']):
+            reason = "按场景请求停止" if stop_due else "超时，请求停止"
+            log(f"{reason} ({now:.1f}s, 进度 {status['progress']}/{status['total']})")
+            client.post('/api/stop')
+            stop_sent_at = now
+
+    wall = time.perf_counter() - started
+    logs = status.get('logs', [])
+    completed = sum(1 for line in logs if line.startswith('✓ 完成'))
+    # 重试前的失败也会记录日志，按最终结果计算失败任务数
+    failed = max(status.get('progress', 0) - completed, 0) if stop_sent_at is None else \
+        sum(1 for line in logs if line.startswith('✗ 失败'))
+
+    # 理想耗时：模拟编码时间之和 / 并行数（fake_ffmpeg 的抖动均值为 0）
+    codec_cost = CODEC_COST['h264_nvenc'] if config['gpu'] else CODEC_COST['libx264']
+    encode_seconds = [d / config['speed'] * codec_cost for d in dataset['durations'] for _ in range(config['languages'])] \
+        if config['speed'] > 0 else [0.0]
+    ideal = max(sum(encode_seconds) / config['workers'], max(encode_seconds))
+    processed = max(completed + failed, 1)
+    encode_wall = wall - (scheduled_at or 0.0)
+    overhead_per_task = max(encode_wall * config['workers'] - sum(encode_seconds), 0.0) / processed \
+        if stop_sent_at is None else None
+
+    rss_values = [s['rss'] for s in samples if s['rss'] is not None]
+    # 内存增长从开始编码算起（不含导入和准备阶段的一次性开销），任务太少时不外推
+    growth = rss_values[-1] - rss_scheduled if rss_values and rss_scheduled else None
+    quarter = max(len(latencies) // 4, 1)
+    return {
+        'scenario': config,
+        'tasks': tasks,
+        'completed': completed,
+        'failed': failed,
+        'watchdog': status.get('watchdog'),
+        'retries': status.get('retries'),
+        'verify': status.get('verify'),
+        'progress': status.get('progress'),
+        'error': status.get('error'),
+        'wall_seconds': round(wall, 3),
+        'startup_seconds': round(scheduled_at, 3) if scheduled_at is not None else None,
+        'ideal_seconds': round(ideal, 3),
+        'overhead_per_task_ms': round(overhead_per_task * 1000, 2) if overhead_per_task is not None else None,
+        'stop_requested_at': round(stop_sent_at, 3) if stop_sent_at is not None else None,
+        'stop_seconds': round(wall - stop_sent_at, 3) if stop_sent_at is not None else None,
+        'status_latency_ms': {
+            'p50': round(percentile(latencies, 0.5) * 1000, 2),
+            'p95': round(percentile(latencies, 0.95) * 1000, 2),
+            'max': round(max(latencies) * 1000, 2) if latencies else 0.0,
+            'first_quarter_mean': round(statistics.mean(latencies[:quarter]) * 1000, 2) if latencies else 0.0,
+            'last_quarter_mean': round(statistics.mean(latencies[-quarter:]) * 1000, 2) if latencies else 0.0,
+        },
+        'status_payload_bytes': {'first': payloads[0] if payloads else 0, 'last': payloads[-1] if payloads else 0},
+        'log_lines': len(logs),
+        'memory': {
+            'before_import': rss_before_import,
+            'start': rss_start,
+            'peak': max(rss_values) if rss_values else None,
+            'end': rss_bytes(),
+            'growth': growth,
+            'growth_per_1k_tasks': round(growth / processed * 1000) if growth is not None and processed >= 100 else None,
+        },
+        'threads': {'start': threads_start, 'peak': max(s['threads'] for s in samples) if samples else threads_start,
+                    'end': threading.active_count()},
+        'samples': samples,
+    }
+
+
+def print_report(result):
+    latency = result['status_latency_ms']
+    memory = result['memory']
+    print(f"\n完成 {result['completed']} 个, 失败 {result['failed']} 个, 进度 {result['progress']}/{result['tasks']}"
+          + (f", 错误: {result['error']}" if result['error'] else ""))
+    print(f"总耗时 {result['wall_seconds']:.1f}s (准备 {result['startup_seconds'] or 0:.1f}s), "
+          f"理想耗时 {result['ideal_seconds']:.1f}s")
+    if result['overhead_per_task_ms'] is not None:
+        print(f"每个任务的调度开销: {result['overhead_per_task_ms']:.1f} ms")
+    watchdog = result.get('watchdog')
+    if watchdog and (watchdog['stalled'] or watchdog['timed_out']):
+        print(f"看门狗: 卡住 {watchdog['stalled']} 次, 超时 {watchdog['timed_out']} 次")
+    retries = result.get('retries')
+    if retries and (retries['retried'] or retries['gave_up']):
+        print(f"重试: {retries['retried']} 次 (改用 CPU {retries['fallbacks']} 次), 重试后成功 {retries['recovered']} 个, "
+              f"放弃 {retries['gave_up']} 个, 熔断 {retries['breaker_trips']} 次; 失败类型 {retries['failures']}")
+    verify = result.get('verify')
+    if verify:
+        print(f"输出校验 ({verify['mode']}): 通过 {verify['passed']} 个, 不一致 {verify['failed']} 个, "
+              f"平均 {verify['avg_ms'] or 0:.1f} ms")
+    if result['stop_seconds'] is not None:
+        print(f"请求停止后 {result['stop_seconds']:.1f}s 结束")
+    print(f"状态接口延迟: p50 {latency['p50']:.1f} ms, p95 {latency['p95']:.1f} ms, 最大 {latency['max']:.1f} ms "
+          f"(前 1/4 平均 {latency['first_quarter_mean']:.1f} ms → 后 1/4 平均 {latency['last_quarter_mean']:.1f} ms)")
+    print(f"状态响应大小: {result['status_payload_bytes']['first']} → {result['status_payload_bytes']['last']} 字节 "
+          f"({result['log_lines']} 行日志)")
+    print(f"内存: 启动 {format_mb(memory['start'])}, 峰值 {format_mb(memory['peak'])}, 结束 {format_mb(memory['end'])}"
+          + (f", 编码期间增长 {format_mb(memory['growth'])}" if memory['growth'] is not None else "")
+          + (f" (每千个任务 {format_mb(memory['growth_per_1k_tasks'])})"
+             if memory['growth_per_1k_tasks'] is not None else ""))
+    print(f"线程: 启动 {result['threads']['start']}, 峰值 {result['threads']['peak']}, 结束 {result['threads']['end']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量合成压力测试（模拟 ffmpeg）")
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='smoke', help="预设场景")
+    parser.add_argument('--videos', type=int, help="视频数")
+    parser.add_argument('--languages', type=int, help=f"语种数（最多 {len(LANGUAGES)}）")
+    parser.add_argument('--workers', type=int, help="并行任务数")
+    parser.add_argument('--speed', type=float, help="模拟编码速度（倍速，0 为立即完成）")
+    parser.add_argument('--fail-rate', type=float, help="随机失败概率")
+    parser.add_argument('--gpu', action='store_true', default=None, help="模拟 NVENC 编码")
+    parser.add_argument('--gpu-fail-rate', type=float, help="硬件编码器启动失败概率")
+    parser.add_argument('--hang-rate', type=float, help="随机卡住概率")
+    parser.add_argument('--hang-seconds', type=float, help="卡住时长（秒）")
+    parser.add_argument('--truncate-rate', type=float, help="输出被截断（正常退出）的概率")
+    parser.add_argument('--corrupt-rate', type=float, help="输出中间损坏（只有抽样解码能发现）的概率")
+    parser.add_argument('--verify', choices=['quick', 'deep', 'off'], help="输出校验模式（默认 quick）")
+    parser.add_argument('--stderr-rate', type=float, help="每秒 stderr 日志行数")
+    parser.add_argument('--stall-timeout', type=float, help="看门狗停滞超时（秒，默认使用应用设置）")
+    parser.add_argument('--stop-after', type=float, help="开始后多少秒请求停止")
+    parser.add_argument('--timeout', type=float, help="超过多少秒请求停止")
+    parser.add_argument('--poll-interval', type=float, default=0.25, help="状态接口轮询间隔（秒）")
+    parser.add_argument('--work-dir', help="数据目录（默认临时目录，结束后删除）")
+    parser.add_argument('--json', help="把完整结果（含采样）写入 JSON 文件")
+    args = parser.parse_args()
+
+    config = dict(DEFAULTS, **SCENARIOS[args.scenario])
+    for key in ('videos', 'languages', 'workers', 'speed', 'fail_rate', 'gpu', 'gpu_fail_rate', 'hang_rate', 'hang_seconds',
+                'stderr_rate', 'truncate_rate', 'corrupt_rate', 'verify', 'stall_timeout', 'stop_after', 'timeout'):
+        value = getattr(args, key)
+        if value is not None:
+            config[key] = value
+    config['languages'] = max(1, min(config['languages'], len(LANGUAGES)))
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='bench-load-')
+    try:
+        result = run_scenario(config, work_dir, args.poll_interval)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_report(result)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\n完整结果: {args.json}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+并发控制模块 - 采样总编码帧率（ffmpeg -progress）、CPU 利用率和内存压力，按 AIMD 方式在运行时调整并发任务数
+Concurrency Controller Module - Samples aggregate encode fps (ffmpeg -progress), CPU utilization and memory pressure, and adjusts the number of concurrent tasks at runtime AIMD-style
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 采样/决策间隔（秒）
+SAMPLE_INTERVAL = 10.0
+
+# 调整后等待几个采样周期再评估（让新任务进入稳定编码）
+SETTLE_INTERVALS = 2
+
+# CPU 利用率高于此值时不再增加并发
+CPU_HIGH = 0.92
+
+# 可用内存比例低于此值，或内存压力 (PSI some avg10) 高于此值时成倍减少并发
+MEMORY_AVAILABLE_LOW = 0.10
+MEMORY_PSI_HIGH = 10.0
+MEMORY_DECREASE_FACTOR = 0.5
+
+# 增加并发后总帧率至少提高多少才保留；低于调整前 (1 - DECREASE_TOLERANCE) 时成倍减少
+MIN_GAIN = 0.03
+DECREASE_TOLERANCE = 0.05
+DECREASE_FACTOR = 0.75
+
+# 增加无收益后，暂停多少个采样周期再试探
+INCREASE_COOLDOWN = 6
+
+# 保留的决策记录数
+HISTORY_SIZE = 20
+
+
+class SystemSampler:
+    """CPU 利用率和内存压力采样（优先 psutil，其次 /proc，最后 loadavg）"""
+
+    def __init__(self):
+        self._last_cpu = self._read_proc_stat()
+        if psutil is not None:
+            psutil.cpu_percent(interval=None)
+
+    @staticmethod
+    def _read_proc_stat():
+        try:
+            with open('/proc/stat', 'r') as f:
+                fields = [int(v) for v in f.readline().split()[1:]]
+        except (OSError, ValueError):
+            return None
+        idle = fields[3] + (fields[4] if len(fields) > 4 else 0)
+        return sum(fields), idle
+
+    def cpu_utilization(self):
+        """自上次调用以来的 CPU 利用率 (0~1)，无法获取时返回None"""
+        if psutil is not None:
+            return psutil.cpu_percent(interval=None) / 100.0
+        current = self._read_proc_stat()
+        if current is not None and self._last_cpu is not None:
+            total = current[0] - self._last_cpu[0]
+            idle = current[1] - self._last_cpu[1]
+            self._last_cpu = current
+            return 1.0 - idle / total if total > 0 else None
+        if hasattr(os, 'getloadavg'):
+            return min(os.getloadavg()[0] / (os.cpu_count() or 1), 1.0)
+        return None
+
+    @staticmethod
+    def memory_available():
+        """可用内存比例 (0~1)，无法获取时返回None"""
+        if psutil is not None:
+            memory = psutil.virtual_memory()
+            return memory.available / memory.total
+        try:
+            values = {}
+            with open('/proc/meminfo', 'r') as f:
+                for line in f:
+                    key, value = line.split(':', 1)
+                    values[key] = int(value.split()[0])
+            return values['MemAvailable'] / values['MemTotal']
+        except (OSError, KeyError, ValueError, ZeroDivisionError):
+            return None
+
+    @staticmethod
+    def memory_pressure():
+        """Linux PSI 内存压力 (some avg10, 百分比)，不支持时返回None"""
+        try:
+            with open('/proc/pressure/memory', 'r') as f:
+                for line in f:
+                    if line.startswith('some'):
+                        return float(line.split()[1].split('=')[1])
+        except (OSError, ValueError, IndexError):
+            pass
+        return None
+
+
+class ConcurrencyController:
+    """
+    AIMD 并发控制器：CPU 有余量时逐个增加并发，增加后总帧率下降或内存紧张时成倍减少
+
+    工作线程在开始任务前调用 acquire()，结束后调用 release()；
+    ffmpeg 的 -progress 输出通过 report_progress() 汇总为总帧率（按分辨率加权）。
+    """
+
+    def __init__(self, initial, max_workers, min_workers=1, interval=SAMPLE_INTERVAL, sampler=None):
+        """
+        Args:
+            initial: 初始并发数
+            max_workers: 并发上限（线程池大小）
+            min_workers: 并发下限
+            interval: 采样间隔（秒）
+            sampler: SystemSampler 实例（测试时可替换）
+        """
+        self.max_workers = max(1, int(max_workers))
+        self.min_workers = max(1, min(int(min_workers), self.max_workers))
+        self.limit = min(max(int(initial), self.min_workers), self.max_workers)
+        self.interval = interval
+        self.sampler = sampler or SystemSampler()
+
+        self.active = 0
+        self.history = deque(maxlen=HISTORY_SIZE)
+        self.reason = '初始并发'
+        self.last_sample = {}
+
+        # 线程 -> {'frame', 'weight'}
+        self._tasks = {}
+        self._weighted_frames = 0.0
+        self._last_tick = (time.time(), 0.0)
+        # 最近一次增加并发：{'fps_before', 'settle'}，稳定后评估收益
+        self._pending = None
+        self._cooldown = 0
+
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---- 工作线程接口 ----
+
+    def acquire(self, should_stop=None):
+        """
+        等待空闲并发名额
+
+        Returns:
+            bool: 获得名额返回 True，should_stop 为真时返回 False
+        """
+        with self._cond:
+            while self.active >= self.limit:
+                if should_stop and should_stop():
+                    return False
+                self._cond.wait(timeout=1.0)
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._tasks.pop(threading.get_ident(), None)
+            self._cond.notify_all()
+
+    def task_started(self, weight=1.0):
+        """登记当前线程的任务（weight: 分辨率权重，4K 一帧的工作量约为 1080p 的 4 倍）"""
+        with self._cond:
+            self._tasks[threading.get_ident()] = {'frame': 0, 'weight': weight}
+
+    def run_started(self, owner=None):
+        """
+        新的 ffmpeg 进程开始（重试时同一任务会运行多次），帧数从 0 重新计算
+
+        Args:
+            owner: 任务所在工作线程的标识（默认当前线程）
+        """
+        owner = owner if owner is not None else threading.get_ident()
+        with self._cond:
+            self._tasks.setdefault(owner, {'frame': 0, 'weight': 1.0})['frame'] = 0
+
+    def report_progress(self, progress, owner=None):
+        """
+        接收 ffmpeg 的 -progress 数据块
+
+        Args:
+            progress: {'frame': '123', 'fps': '25.0', ...}
+            owner: 任务所在工作线程的标识（进度在读取线程中回调时传入，默认当前线程）
+        """
+        try:
+            frame = int(progress.get('frame', 0))
+        except (TypeError, ValueError):
+            return
+        owner = owner if owner is not None else threading.get_ident()
+        with self._cond:
+            task = self._tasks.setdefault(owner, {'frame': 0, 'weight': 1.0})
+            delta = frame - task['frame']
+            if delta > 0:
+                self._weighted_frames += delta * task['weight']
+                task['frame'] = frame
+
+    # ---- 控制循环 ----
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+        with self._cond:
+            self._cond.notify_all()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.tick()
+
+    def _set_limit(self, limit, reason):
+        limit = min(max(int(limit), self.min_workers), self.max_workers)
+        changed = limit != self.limit
+        self.limit = limit
+        self.reason = reason
+        if changed:
+            self.history.append({'time': time.time(), 'limit': limit, 'reason': reason})
+            self._cond.notify_all()
+        return changed
+
+    def tick(self):
+        """采样一次并调整并发上限（控制线程每个周期调用）"""
+        now = time.time()
+        cpu = self.sampler.cpu_utilization()
+        available = self.sampler.memory_available()
+        pressure = self.sampler.memory_pressure()
+
+        with self._cond:
+            last_time, last_frames = self._last_tick
+            elapsed = now - last_time
+            fps = (self._weighted_frames - last_frames) / elapsed if elapsed > 0 else 0.0
+            self._last_tick = (now, self._weighted_frames)
+            self.last_sample = {
+                'fps': round(fps, 1),
+                'cpu': round(cpu, 3) if cpu is not None else None,
+                'memory_available': round(available, 3) if available is not None else None,
+                'memory_pressure': pressure,
+                'active': self.active,
+            }
+            self._decide(fps, cpu, available, pressure)
+
+    def _decide(self, fps, cpu, available, pressure):
+        # 内存紧张：立即成倍减少（不等待稳定）
+        if (available is not None and available < MEMORY_AVAILABLE_LOW) or \
+                (pressure is not None and pressure > MEMORY_PSI_HIGH):
+            detail = f"可用 {available:.0%}" if available is not None else f"PSI {pressure:.1f}"
+            self._set_limit(int(self.limit * MEMORY_DECREASE_FACTOR), f"内存紧张 ({detail})")
+            self._pending = None
+            self._cooldown = INCREASE_COOLDOWN
+            return
+
+        if self._pending is not None:
+            self._pending['settle'] -= 1
+            if self._pending['settle'] > 0:
+                return
+            before = self._pending['fps_before']
+            self._pending = None
+            if before > 0 and fps < before * (1 - DECREASE_TOLERANCE):
+                # 增加并发后总帧率下降：资源争用（内存带宽、磁盘等），成倍减少
+                self._set_limit(int(self.limit * DECREASE_FACTOR),
+                                f"总帧率下降 {before:.0f} → {fps:.0f} fps")
+                self._cooldown = INCREASE_COOLDOWN
+                return
+            if before > 0 and fps < before * (1 + MIN_GAIN):
+                # 没有收益：退回一档
+                self._set_limit(self.limit - 1, f"增加并发无收益 ({before:.0f} → {fps:.0f} fps)")
+                self._cooldown = INCREASE_COOLDOWN
+                return
+            self.reason = f"增加并发有效 ({before:.0f} → {fps:.0f} fps)"
+
+        if self._cooldown > 0:
+            self._cooldown -= 1
+            return
+        if self.active < self.limit:
+            self.reason = '等待任务（未达到并发上限）'
+            return
+        if self.limit >= self.max_workers:
+            self.reason = '已达到并发上限'
+            return
+        if cpu is not None and cpu >= CPU_HIGH:
+            self.reason = f"CPU 已饱和 ({cpu:.0%})"
+            return
+
+        # 加性增加，之后评估收益
+        cpu_text = f"{cpu:.0%}" if cpu is not None else '未知'
+        if self._set_limit(self.limit + 1, f"CPU 有余量 ({cpu_text})"):
+            self._pending = {'fps_before': fps, 'settle': SETTLE_INTERVALS}
+
+    def summary(self):
+        """当前并发上限、原因和采样值（用于状态接口）"""
+        with self._cond:
+            return {
+                'limit': self.limit,
+                'min_workers': self.min_workers,
+                'max_workers': self.max_workers,
+                'active': self.active,
+                'reason': self.reason,
+                'sample': dict(self.last_sample),
+                'history': list(self.history),
+            }
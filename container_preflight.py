@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+封装格式预检模块 - 编码前根据缓存的 ffprobe 信息逐个任务决定音频直接复制还是转码、输出使用哪种封装格式，避免编码完成后才在封装阶段失败
+Container Preflight Module - Uses cached ffprobe data to decide per task whether to copy or transcode audio and which output container to use, so no encode fails at the muxing step
+"""
+
+import os
+
+# 源文件扩展名 -> ffmpeg 封装格式
+EXTENSION_CONTAINERS = {
+    '.mp4': 'mp4',
+    '.m4v': 'mp4',
+    '.mov': 'mov',
+    '.mkv': 'matroska',
+    '.avi': 'avi',
+    '.flv': 'flv',
+    '.wmv': 'asf',
+}
+
+# 不适合承载 H.264 输出的封装格式 -> 改用的扩展名
+CONTAINER_REMAP = {
+    'asf': '.mp4',
+}
+
+# 各封装格式可以直接复制的音频编码（None 表示不限制）；pcm_* 单独按前缀判断
+CONTAINER_AUDIO = {
+    'mp4': {'aac', 'mp3', 'mp2', 'ac3', 'eac3', 'alac', 'opus'},
+    'mov': {'aac', 'mp3', 'mp2', 'ac3', 'eac3', 'alac', 'opus', 'adpcm_ima_qt'},
+    'matroska': None,
+    'avi': {'mp3', 'mp2', 'ac3', 'aac', 'dts', 'wmav2', 'adpcm_ms', 'adpcm_ima_wav'},
+    'flv': {'aac', 'mp3'},
+}
+
+# 支持 PCM 音频的封装格式
+PCM_CONTAINERS = {'mov', 'matroska', 'avi'}
+
+# 无法复制时的音频转码参数（所有输出封装格式都支持 AAC）
+TRANSCODE_AUDIO = {'codec': 'aac', 'bitrate': '192k'}
+
+
+def container_for(path):
+    """按扩展名确定封装格式，未知扩展名返回None"""
+    return EXTENSION_CONTAINERS.get(os.path.splitext(path)[1].lower())
+
+
+def audio_copyable(audio_codec, container):
+    """音频编码能否直接复制到该封装格式"""
+    if container not in CONTAINER_AUDIO:
+        return False
+    allowed = CONTAINER_AUDIO[container]
+    if allowed is None:
+        return True
+    if audio_codec.startswith('pcm_'):
+        return container in PCM_CONTAINERS
+    return audio_codec in allowed
+
+
+def plan_container(info, source_path):
+    """
+    决定单个源文件的输出封装格式和音频处理方式
+
+    Args:
+        info: summarize_probe 返回的媒体信息（可能为None）
+        source_path: 源文件路径
+
+    Returns:
+        dict: {'output_ext', 'audio': 'copy'/'aac', 'reason': 说明或None, 'known': 是否有媒体信息}
+    """
+    source_ext = os.path.splitext(source_path)[1].lower()
+    container = container_for(source_path)
+    output_ext = source_ext
+    reasons = []
+
+    if container in CONTAINER_REMAP:
+        output_ext = CONTAINER_REMAP[container]
+        reasons.append(f"{source_ext} 不适合 H.264 输出，改为 {output_ext}")
+        container = container_for(output_ext)
+
+    if not info:
+        # 没有媒体信息时保持原有行为（音频直接复制）
+        return {'output_ext': output_ext, 'audio': 'copy', 'reason': '; '.join(reasons) or None, 'known': False}
+
+    audio_codec = info.get('audio_codec')
+    audio = 'copy'
+    if audio_codec and not audio_copyable(audio_codec, container):
+        audio = TRANSCODE_AUDIO['codec']
+        reasons.append(f"{audio_codec} 音频无法封装到 {output_ext}，转码为 {audio.upper()}")
+
+    return {'output_ext': output_ext, 'audio': audio, 'reason': '; '.join(reasons) or None, 'known': True}
+
+
+def preflight_containers(tasks, media_infos):
+    """
+    逐个任务确定封装格式和音频处理方式（就地修改任务）
+
+    设置 task['audio_codec']；需要更换封装格式时同时修改 output_file / output_path。
+    更换扩展名后与其他任务的输出重名时（如 a.wmv 和 a.mp4），在文件名中保留源扩展名。
+
+    Args:
+        tasks: 任务字典列表
+        media_infos: {视频路径: summarize_probe 信息}
+
+    Returns:
+        dict: {'audio_copy', 'audio_transcode', 'container_changed', 'unknown', 'reasons': {说明: 任务数}}
+    """
+    summary = {'audio_copy': 0, 'audio_transcode': 0, 'container_changed': 0, 'unknown': 0, 'reasons': {}}
+    decisions = {}
+    taken = {os.path.normcase(t['output_path']) for t in tasks}
+
+    for task in tasks:
+        video_path = task['video_path']
+        if video_path not in decisions:
+            decisions[video_path] = plan_container(media_infos.get(video_path), video_path)
+        decision = decisions[video_path]
+
+        task['audio_codec'] = decision['audio']
+        summary['audio_copy' if decision['audio'] == 'copy' else 'audio_transcode'] += 1
+        if not decision['known']:
+            summary['unknown'] += 1
+        if decision['reason']:
+            summary['reasons'][decision['reason']] = summary['reasons'].get(decision['reason'], 0) + 1
+        if decision['output_ext'] != os.path.splitext(video_path)[1].lower():
+            summary['container_changed'] += 1
+
+        stem, ext = os.path.splitext(task['output_file'])
+        if ext.lower() == decision['output_ext']:
+            continue
+        output_dir = os.path.dirname(task['output_path'])
+        output_file = stem + decision['output_ext']
+        if os.path.normcase(os.path.join(output_dir, output_file)) in taken:
+            output_file = f"{stem}_{ext.lstrip('.').lower()}{decision['output_ext']}"
+        taken.discard(os.path.normcase(task['output_path']))
+        task['output_file'] = output_file
+        task['output_path'] = os.path.join(output_dir, output_file)
+        taken.add(os.path.normcase(task['output_path']))
+
+    return summary
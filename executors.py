@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+执行器模块 - CPU (libx264) 与各硬件编码器 (NVENC / QSV / VideoToolbox / AMF) 各自的并发槽位，混合调度器从同一个任务队列填满所有执行器
+Executor Module - Per-path slot limits for CPU (libx264) and each hardware encoder (NVENC / QSV / VideoToolbox / AMF); a hybrid scheduler fills all of them from one task queue
+"""
+
+import os
+import platform
+import subprocess
+import threading
+import time
+
+from ffmpeg_runner import FFMPEG_BIN
+from scheduler import ENCODER_COST
+
+# 执行器类型 -> 编码路径（merge_subtitle 的 use_gpu / gpu_type）和默认槽位
+EXECUTOR_TYPES = {
+    'cpu': {'label': 'CPU (libx264)', 'use_gpu': False, 'gpu_type': 'auto', 'video_codec': 'libx264', 'slots': 2},
+    # 消费级 NVIDIA 显卡驱动限制同时编码会话数（旧驱动 3 个，新驱动 5 个以上）
+    'nvenc': {'label': 'NVIDIA NVENC', 'use_gpu': True, 'gpu_type': 'nvidia', 'video_codec': 'h264_nvenc', 'slots': 3},
+    'qsv': {'label': 'Intel QSV', 'use_gpu': True, 'gpu_type': 'intel', 'video_codec': 'h264_qsv', 'slots': 2},
+    'videotoolbox': {'label': 'Apple VideoToolbox', 'use_gpu': True, 'gpu_type': 'apple',
+                     'video_codec': 'h264_videotoolbox', 'slots': 2},
+    'amf': {'label': 'AMD AMF', 'use_gpu': True, 'gpu_type': 'amd', 'video_codec': 'h264_amf', 'slots': 2},
+}
+
+# 实测耗时的指数滑动平均系数
+SPEED_SMOOTHING = 0.3
+
+_encoders_cache = None
+_encoders_lock = threading.Lock()
+
+
+def ffmpeg_encoders():
+    """
+    ffmpeg 编译时支持的编码器名称（只查询一次）
+
+    Returns:
+        set: 编码器名称集合，ffmpeg 不可用时为空集合
+    """
+    global _encoders_cache
+    with _encoders_lock:
+        if _encoders_cache is not None:
+            return _encoders_cache
+        encoders = set()
+        try:
+            result = subprocess.run([FFMPEG_BIN, '-hide_banner', '-encoders'],
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=30)
+            for line in result.stdout.decode('utf-8', errors='replace').splitlines():
+                parts = line.split()
+                # 形如 " V....D libx264  libx264 H.264 ..."
+                if len(parts) >= 2 and len(parts[0]) == 6:
+                    encoders.add(parts[1])
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+        _encoders_cache = encoders
+        return encoders
+
+
+class Executor:
+    """
+    一条编码路径及其并发槽位
+
+    run_one 回调负责实际执行任务；测试时可以用不调用 ffmpeg 的桩函数替代。
+    """
+
+    def __init__(self, name, slots=None, use_gpu=None, gpu_type=None, video_codec=None, label=None):
+        """
+        Args:
+            name: 执行器类型（EXECUTOR_TYPES 的键）或自定义名称
+            slots: 并发槽位数
+            use_gpu / gpu_type / video_codec / label: 覆盖 EXECUTOR_TYPES 中的默认值
+        """
+        defaults = EXECUTOR_TYPES.get(name, EXECUTOR_TYPES['cpu'])
+        self.name = name
+        self.label = label or defaults['label']
+        self.slots = max(1, int(slots if slots is not None else defaults['slots']))
+        self.use_gpu = defaults['use_gpu'] if use_gpu is None else use_gpu
+        self.gpu_type = gpu_type or defaults['gpu_type']
+        self.video_codec = video_codec or defaults['video_codec']
+        # 墙钟秒/成本（成本以 libx264 为基准），初始值按编码器相对耗时估算，运行中按实测修正
+        self.seconds_per_cost = None
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+
+    @property
+    def relative_cost(self):
+        return ENCODER_COST.get(self.video_codec, 1.0)
+
+    def summary(self):
+        return {
+            'name': self.name,
+            'label': self.label,
+            'video_codec': self.video_codec,
+            'slots': self.slots,
+            'active': self.active,
+            'completed': self.completed,
+            'failed': self.failed,
+            'busy_seconds': round(self.busy_seconds, 1),
+            'seconds_per_cost': round(self.seconds_per_cost, 3) if self.seconds_per_cost else None,
+        }
+
+
+def detect_executors(merger, cpu_slots=2, gpu_slots=None, enabled=None):
+    """
+    检测本机可用的编码路径
+
+    Args:
+        merger: SubtitleMerger 实例（复用 GPU 检测）
+        cpu_slots: CPU 执行器槽位数（0 表示不用 CPU 编码）
+        gpu_slots: {类型: 槽位数}，覆盖默认值
+        enabled: 只启用这些类型（可选）
+
+    Returns:
+        list: Executor 列表
+    """
+    gpu_slots = gpu_slots or {}
+    encoders = ffmpeg_encoders()
+    system = platform.system()
+
+    def has_encoder(codec):
+        # ffmpeg 编码器列表无法获取时不额外限制（由实际编码结果决定）
+        return not encoders or codec in encoders
+
+    available = []
+    if cpu_slots:
+        available.append('cpu')
+    if has_encoder('h264_nvenc') and merger._has_nvidia_gpu():
+        available.append('nvenc')
+    if encoders and 'h264_qsv' in encoders and (system == 'Windows' or os.path.exists('/dev/dri/renderD128')):
+        available.append('qsv')
+    if has_encoder('h264_videotoolbox') and merger._is_apple_silicon():
+        available.append('videotoolbox')
+    if encoders and 'h264_amf' in encoders and system == 'Windows':
+        available.append('amf')
+
+    executors = []
+    for name in available:
+        if enabled and name not in enabled:
+            continue
+        slots = cpu_slots if name == 'cpu' else gpu_slots.get(name)
+        executors.append(Executor(name, slots))
+    return executors
+
+
+class HybridScheduler:
+    """
+    混合调度：每个执行器的每个槽位一个线程，从同一个按成本降序排列的队列取任务
+
+    槽位空闲时取队首（最长）任务；如果某个更快的执行器空出来后能更早完成该任务，
+    就改取一个在本执行器上完成时间不晚于此的较短任务，避免慢速执行器拖长整批耗时。
+    """
+
+    def __init__(self, executors, tasks, seconds_per_cost=1.0, available=None):
+        """
+        Args:
+            executors: Executor 列表
+            tasks: 任务列表（含 'cost'，以 libx264 为基准），按执行优先级排列
+            seconds_per_cost: libx264 的 墙钟秒/成本 初始估计
+            available: 函数 executor -> bool（可选），返回 False 时暂不向该执行器分配任务（如熔断中）
+        """
+        if not executors:
+            raise ValueError("至少需要一个执行器")
+        self.executors = executors
+        self.available = available
+        for executor in executors:
+            if executor.seconds_per_cost is None:
+                executor.seconds_per_cost = seconds_per_cost * executor.relative_cost
+        self.queue = list(tasks)
+        self.assignments = {}
+        # 任务 -> 不再分配给这些执行器（在其上卡住或失败后重新排队）
+        self._excluded = {}
+        self._running = 0
+        self._cond = threading.Condition()
+        # 每个执行器各槽位预计空闲的时间点
+        self._slot_free = {id(e): [0.0] * e.slots for e in executors}
+
+    def _duration(self, executor, task):
+        return task.get('cost', 1.0) * executor.seconds_per_cost
+
+    def _earliest_elsewhere(self, executor, task, now):
+        """其他执行器最早能完成该任务的时间"""
+        best = None
+        excluded = self._excluded.get(id(task), ())
+        for other in self.executors:
+            if other is executor or other.name in excluded or not self._is_available(other):
+                continue
+            free_at = max(min(self._slot_free[id(other)]), now)
+            finish = free_at + self._duration(other, task)
+            if best is None or finish < best:
+                best = finish
+        return best
+
+    def _is_available(self, executor):
+        return self.available is None or self.available(executor)
+
+    def _pick(self, executor, now):
+        """为空闲槽位选择任务（需持有 _cond），没有合适的任务返回None"""
+        for index, task in enumerate(self.queue):
+            if executor.name in self._excluded.get(id(task), ()):
+                continue
+            finish_here = now + self._duration(executor, task)
+            elsewhere = self._earliest_elsewhere(executor, task, now)
+            if elsewhere is None or finish_here <= elsewhere:
+                return self.queue.pop(index)
+        return None
+
+    def _slot_loop(self, executor, slot, run_one, should_stop):
+        while True:
+            with self._cond:
+                while True:
+                    if should_stop and should_stop():
+                        return
+                    # 队列为空但仍有任务在运行时继续等待（运行中的任务可能重新排队）
+                    if not self.queue and not self._running:
+                        return
+                    now = time.time()
+                    task = self._pick(executor, now) if self.queue and self._is_available(executor) else None
+                    if task is not None:
+                        break
+                    # 暂时让给更快的执行器；其他槽位完成任务时重新评估
+                    self._slot_free[id(executor)][slot] = now
+                    self._cond.wait(timeout=1.0)
+                executor.active += 1
+                self._running += 1
+                self._slot_free[id(executor)][slot] = now + self._duration(executor, task)
+                self.assignments[id(task)] = executor.name
+                # 预计空闲时间变化，等待中的槽位重新评估
+                self._cond.notify_all()
+
+            started = time.time()
+            success = False
+            try:
+                success = bool(run_one(task, executor))
+            finally:
+                elapsed = time.time() - started
+                with self._cond:
+                    executor.active -= 1
+                    self._running -= 1
+                    executor.busy_seconds += elapsed
+                    self._slot_free[id(executor)][slot] = time.time()
+                    if success:
+                        executor.completed += 1
+                        cost = task.get('cost')
+                        if cost:
+                            measured = elapsed / cost
+                            executor.seconds_per_cost = (executor.seconds_per_cost * (1 - SPEED_SMOOTHING)
+                                                         + measured * SPEED_SMOOTHING)
+                    else:
+                        executor.failed += 1
+                    self._cond.notify_all()
+
+    def requeue(self, task, exclude=None):
+        """
+        把任务放回队首（在 run_one 中调用）
+
+        Args:
+            task: 任务字典
+            exclude: 执行器名称（可选），不再分配给该执行器
+
+        Returns:
+            bool: 是否已重新排队（没有其他可用执行器时返回 False）
+        """
+        with self._cond:
+            excluded = self._excluded.setdefault(id(task), set())
+            if exclude is not None:
+                excluded.add(exclude)
+            if all(e.name in excluded for e in self.executors):
+                return False
+            self.queue.insert(0, task)
+            self._cond.notify_all()
+            return True
+
+    def run(self, run_one, should_stop=None):
+        """
+        执行全部任务（阻塞到队列为空且所有槽位空闲）
+
+        Args:
+            run_one: 函数 (task, executor) -> bool，返回任务是否成功
+            should_stop: 返回 True 时不再派发新任务
+        """
+        threads = []
+        for executor in self.executors:
+            for slot in range(executor.slots):
+                thread = threading.Thread(target=self._slot_loop, args=(executor, slot, run_one, should_stop),
+                                          name=f"{executor.name}-{slot}", daemon=True)
+                thread.start()
+                threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+    def summary(self):
+        """各执行器的槽位、进行中和完成数（用于状态接口）"""
+        with self._cond:
+            return {
+                'queued': len(self.queue),
+                'executors': [e.summary() for e in self.executors],
+            }
+
+
+if __name__ == '__main__':
+    from app import merger
+
+    found = detect_executors(merger)
+    print(f"可用编码器: {len(ffmpeg_encoders())} 个")
+    for item in found:
+        print(f"  {item.label}: {item.slots} 个槽位 ({item.video_codec})")
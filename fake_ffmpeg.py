@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模拟 ffmpeg / ffprobe - 不做实际编码，按设定的速度输出 -progress 进度和 stderr 日志，可随机失败或卡住，用于调度和接口的压力测试
+Fake FFmpeg / FFprobe - Performs no real encoding; emits -progress blocks and stderr chatter at a configured speed and can fail or hang at random, for scheduler and API load testing
+
+用法: 把 FFMPEG_BIN / FFPROBE_BIN 指向调用本脚本的可执行文件（bench_load.py 会自动生成包装脚本）
+
+行为由环境变量控制:
+  FAKE_FFMPEG_SPEED          每秒编码的媒体时长（秒），默认 50（即 50x 实时）；0 表示立即完成
+  FAKE_FFMPEG_JITTER         编码耗时的随机浮动比例，默认 0.1
+  FAKE_FFMPEG_FAIL_RATE      随机失败（源文件解码错误）的概率，默认 0
+  FAKE_FFMPEG_GPU_FAIL_RATE  硬件编码器启动失败（编码会话数超限）的概率，默认 0
+  FAKE_FFMPEG_HANG_RATE      随机卡住（停止输出进度）的概率，默认 0
+  FAKE_FFMPEG_HANG_SECONDS   卡住的时长（秒），默认 3600
+  FAKE_FFMPEG_TRUNCATE_RATE  正常退出但输出被截断（时长和帧数变短）的概率，默认 0
+  FAKE_FFMPEG_CORRUPT_RATE   输出元数据完整但某一位置解码出错（只有抽样解码能发现）的概率，默认 0
+  FAKE_FFMPEG_STDERR_RATE    编码过程中每秒写入 stderr 的日志行数，默认 2
+  FAKE_FFMPEG_DURATION       输入不是模拟媒体文件时使用的时长（秒），默认 60
+  FAKE_FFMPEG_ENCODERS       额外支持的编码器（逗号分隔，如 h264_nvenc,h264_qsv）
+  FAKE_FFMPEG_SEED           随机种子（与输出路径和编码器组合，同一任务的结果可复现）
+
+模拟媒体文件是一个 JSON 文件: {"fake_media": 1, "duration": 120, "width": 1920, "height": 1080, "fps": 25, ...}
+编码成功时输出文件写入同样格式的内容，ffprobe 模式下按这些字段返回结果。
+输出为 "-f null -" 时模拟解码（支持 -ss / -t），解码到 corrupt_at 所在位置时输出解码错误。
+"""
+
+import json
+import os
+import random
+import sys
+import time
+
+# 各编码器相对 libx264 的耗时（与 scheduler.ENCODER_COST 的量级一致；不导入以免拖慢每个进程的启动）
+CODEC_COST = {
+    'libx264': 1.0,
+    'libx265': 2.5,
+    'h264_nvenc': 0.3,
+    'h264_qsv': 0.4,
+    'h264_videotoolbox': 0.35,
+    'h264_amf': 0.4,
+}
+
+BASE_ENCODERS = ['libx264', 'libx265', 'aac', 'mpeg4', 'png']
+
+DEFAULT_MEDIA = {'duration': 60.0, 'width': 1920, 'height': 1080, 'fps': 25.0,
+                 'video_codec': 'h264', 'audio_codec': 'aac', 'bit_rate': 5000000}
+
+# 输出扩展名 -> 不能直接复制（-c:a copy）进去的音频编码（只列出常见情况）
+MUX_REJECT = {
+    '.mp4': {'pcm_s16le', 'pcm_s24le', 'wmav2', 'dts', 'vorbis', 'flac'},
+    '.flv': {'pcm_s16le', 'pcm_s24le', 'wmav2', 'ac3', 'eac3', 'dts', 'opus', 'vorbis', 'flac'},
+    '.avi': {'opus', 'vorbis'},
+    '.wmv': {'aac', 'ac3', 'opus'},
+}
+
+# -progress 输出间隔（秒，与 ffmpeg 默认的 -stats_period 相同）
+PROGRESS_PERIOD = 0.5
+
+BANNER = [
+    "ffmpeg version 6.1-fake Copyright (c) 2000-2023 the FFmpeg developers",
+    "  built with gcc 12 (fake)",
+    "  configuration: --enable-gpl --enable-libass --enable-libx264 --enable-libfreetype",
+    "  libavutil      58. 29.100 / 58. 29.100",
+    "  libavcodec     60. 31.102 / 60. 31.102",
+    "  libavformat    60. 16.100 / 60. 16.100",
+    "  libavfilter     9. 12.100 /  9. 12.100",
+]
+
+CHATTER = [
+    "[Parsed_subtitles_0 @ 0x55d0c8a1e2c0] libass API version: 0x1701000",
+    "[Parsed_subtitles_0 @ 0x55d0c8a1e2c0] Shaper: FriBidi 1.0.13 (SIMPLE) HarfBuzz-ng 8.3.0 (COMPLEX)",
+    "[Parsed_subtitles_0 @ 0x55d0c8a1e2c0] fontselect: (Noto Sans, 400, 0) -> /fonts/NotoSans-Regular.ttf",
+    "[libx264 @ 0x55d0c8a3f100] frame I:1     Avg QP:20.15  size: 48211",
+    "[mp4 @ 0x55d0c8a40a80] Non-monotonous DTS in output stream 0:1; previous: 1234, current: 1233; changing to 1235.",
+]
+
+
+def env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def read_media(path):
+    """读取模拟媒体文件的参数（不是模拟文件时使用默认值）"""
+    media = dict(DEFAULT_MEDIA, duration=env_float('FAKE_FFMPEG_DURATION', DEFAULT_MEDIA['duration']))
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(64 * 1024)
+        data = json.loads(head.decode('utf-8'))
+        if isinstance(data, dict) and data.get('fake_media'):
+            media.update(data)
+    except (OSError, ValueError):
+        pass
+    return media
+
+
+def format_time(seconds):
+    hours, rest = divmod(max(seconds, 0.0), 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{secs:09.6f}"
+
+
+def err(line):
+    sys.stderr.write(line + '\n')
+    sys.stderr.flush()
+
+
+def probe(args):
+    """ffprobe 模式：按模拟媒体文件返回 format / streams（或空的 packets）"""
+    path = args[-1]
+    if not os.path.exists(path):
+        err(f"{path}: No such file or directory")
+        return 1
+    media = read_media(path)
+    if 'packet=pts_time,flags' in args:
+        # 关键帧索引：每 2 秒一个关键帧
+        packets = [{'pts_time': f"{t:.6f}", 'flags': 'K_'} for t in range(0, int(media['duration']), 2)]
+        print(json.dumps({'packets': packets}))
+        return 0
+    size = os.path.getsize(path)
+    frames = int(float(media['duration']) * float(media['fps']))
+    video = {'index': 0, 'codec_type': 'video', 'codec_name': media['video_codec'],
+             'width': media['width'], 'height': media['height'],
+             'r_frame_rate': f"{int(media['fps'])}/1", 'duration': str(media['duration'])}
+    # 与真实 ffprobe 一致：Matroska / WebM / FLV 的文件头中没有帧数
+    if os.path.splitext(path)[1].lower() not in ('.mkv', '.webm', '.flv'):
+        video['nb_frames'] = str(frames)
+    audio = {'index': 1, 'codec_type': 'audio', 'codec_name': media['audio_codec'], 'duration': str(media['duration'])}
+    if '-count_packets' in args:
+        video['nb_read_packets'] = str(frames)
+        audio['nb_read_packets'] = str(int(float(media['duration']) * 48000 / 1024))
+    result = {
+        'streams': [video, audio],
+        'format': {'filename': path, 'format_name': 'mov,mp4,m4a,3gp,3g2,mj2', 'duration': str(media['duration']),
+                   'size': str(size), 'bit_rate': str(media['bit_rate'])},
+    }
+    print(json.dumps(result))
+    return 0
+
+
+def parse_args(args):
+    """提取输入、输出、编码器和 -progress 目标"""
+    options = {'inputs': [], 'output': None, 'codec': 'libx264', 'audio_codec': None, 'progress': None,
+               'nostats': False, 'lavfi': False, 'seek': 0.0, 'limit': None, 'loglevel': 'info',
+               'format': None}
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        value = args[i + 1] if i + 1 < len(args) else None
+        if arg == '-i':
+            options['inputs'].append(value)
+            i += 2
+            continue
+        if arg == '-f':
+            options['format'] = value
+            if value == 'lavfi':
+                options['lavfi'] = True
+        elif arg in ('-c:v', '-vcodec'):
+            options['codec'] = value
+        elif arg in ('-c:a', '-acodec'):
+            options['audio_codec'] = value
+        elif arg == '-progress':
+            options['progress'] = value
+        elif arg == '-nostats':
+            options['nostats'] = True
+        elif arg == '-ss':
+            options['seek'] = float(value)
+        elif arg == '-t':
+            options['limit'] = float(value)
+        elif arg in ('-v', '-loglevel'):
+            options['loglevel'] = value
+        if arg.startswith('-') and arg not in ('-y', '-n', '-nostats', '-nostdin', '-hide_banner') and value is not None:
+            i += 2
+        else:
+            i += 1
+    if args and (args[-1] == '-' or not args[-1].startswith('-')):
+        options['output'] = args[-1]
+    return options
+
+
+def encode(args):
+    """编码模式：模拟编码过程"""
+    options = parse_args(args)
+    if not options['inputs'] or not options['output']:
+        err("At least one output file must be specified")
+        return 1
+
+    source = options['inputs'][0]
+    if not options['lavfi'] and not os.path.exists(source):
+        err(f"{source}: No such file or directory")
+        return 1
+
+    encoders = set(BASE_ENCODERS) | set(filter(None, os.environ.get('FAKE_FFMPEG_ENCODERS', '').split(',')))
+    if options['codec'] not in encoders and options['codec'] != 'copy':
+        err(f"Unknown encoder '{options['codec']}'")
+        return 1
+
+    media = read_media(source) if not options['lavfi'] else dict(DEFAULT_MEDIA, duration=1.0)
+    hardware = options['codec'] not in ('libx264', 'libx265', 'mpeg4', 'png', 'copy')
+    # 同一输出 + 编码器的结果可复现（换编码器重试时结果不同）
+    rng = random.Random(f"{os.environ.get('FAKE_FFMPEG_SEED', '')}|{options['output']}|{options['codec']}")
+
+    # -v error 时只输出错误
+    quiet = options['loglevel'] in ('quiet', 'panic', 'fatal', 'error')
+
+    def note(line):
+        if not quiet:
+            err(line)
+
+    # 解码校验（-f null -）：不注入失败，只报告输出文件中记录的损坏位置
+    decoding = options['format'] == 'null'
+    speed = env_float('FAKE_FFMPEG_SPEED', 50.0)
+    jitter = env_float('FAKE_FFMPEG_JITTER', 0.1)
+    duration = max(float(media['duration']) - options['seek'], 0.0)
+    if options['limit'] is not None:
+        duration = min(duration, options['limit'])
+    wall = duration / speed * CODEC_COST.get(options['codec'], 1.0) if speed > 0 else 0.0
+    wall *= 1 + rng.uniform(-jitter, jitter)
+
+    # 失败或卡住发生在编码过程中的某个位置
+    fail_at = rng.uniform(0.05, 0.95) if rng.random() < env_float('FAKE_FFMPEG_FAIL_RATE', 0.0) else None
+    hang_at = rng.uniform(0.05, 0.95) if rng.random() < env_float('FAKE_FFMPEG_HANG_RATE', 0.0) else None
+    if decoding:
+        fail_at = hang_at = None
+
+    if '-hide_banner' not in args:
+        for line in BANNER:
+            note(line)
+
+    # 硬件编码器在打开编码器时失败（不消耗编码时间）
+    if hardware and not decoding and rng.random() < env_float('FAKE_FFMPEG_GPU_FAIL_RATE', 0.0):
+        err(f"[{options['codec']} @ 0x55d0c8a3f100] OpenEncodeSessionEx failed: out of memory (10): (no details)")
+        err(f"[{options['codec']} @ 0x55d0c8a3f100] No capable devices found")
+        err("Error initializing output stream 0:0 -- Error while opening encoder for output stream #0:0")
+        return 1
+    note(f"Input #0, mov,mp4,m4a,3gp,3g2,mj2, from '{source}':")
+    note(f"  Duration: {format_time(duration)[:-3]}, start: 0.000000, bitrate: {media['bit_rate'] // 1000} kb/s")
+    note(f"  Stream #0:0: Video: {media['video_codec']}, yuv420p, {media['width']}x{media['height']}, {media['fps']} fps")
+    # 音频编码不被输出封装格式支持时，写文件头失败
+    audio_codec = media.get('audio_codec')
+    if options['audio_codec'] == 'copy' and audio_codec in MUX_REJECT.get(os.path.splitext(options['output'])[1].lower(), ()):
+        err(f"[{os.path.splitext(options['output'])[1].lstrip('.')} @ 0x55d0c8a40000] Could not find tag for codec "
+            f"{audio_codec} in stream #1, codec not currently supported in container")
+        err("Could not write header for output file #0 (incorrect codec parameters ?): Invalid argument")
+        return 1
+    note(f"Output #0, mp4, to '{options['output']}':")
+
+    progress_out = sys.stdout if options['progress'] == 'pipe:1' else None
+    stderr_rate = env_float('FAKE_FFMPEG_STDERR_RATE', 2.0)
+    fps = float(media['fps'])
+    started = time.time()
+    next_progress = 0.0
+    chatter_due = 0.0
+
+    while True:
+        elapsed = time.time() - started
+        fraction = min(elapsed / wall, 1.0) if wall > 0 else 1.0
+
+        if hang_at is not None and fraction >= hang_at:
+            # 卡住：不再输出任何进度（模拟损坏的源文件或硬件编码器无响应）
+            time.sleep(env_float('FAKE_FFMPEG_HANG_SECONDS', 3600.0))
+            hang_at = None
+            started = time.time() - elapsed
+            continue
+
+        if fail_at is not None and fraction >= fail_at:
+            err("[h264 @ 0x55d0c8a1f000] Invalid NAL unit size (1936 > 1024).")
+            err("[h264 @ 0x55d0c8a1f000] Error splitting the input into NAL units.")
+            err("Error while decoding stream #0:0: Invalid data found when processing input")
+            err("Conversion failed!")
+            return 1
+
+        out_time = duration * fraction
+        frame = int(out_time * fps)
+        done = fraction >= 1.0
+
+        if elapsed >= next_progress or done:
+            current_fps = frame / elapsed if elapsed > 0 else 0.0
+            current_speed = out_time / elapsed if elapsed > 0 else 0.0
+            if progress_out is not None:
+                progress_out.write(
+                    f"frame={frame}\nfps={current_fps:.2f}\nbitrate=N/A\n"
+                    f"out_time_us={int(out_time * 1e6)}\nout_time_ms={int(out_time * 1e6)}\n"
+                    f"out_time={format_time(out_time)}\nspeed={current_speed:.3g}x\n"
+                    f"progress={'end' if done else 'continue'}\n")
+                progress_out.flush()
+            if not options['nostats'] and not quiet:
+                sys.stderr.write(f"frame={frame:5d} fps={current_fps:.0f} q=28.0 size=N/A "
+                                 f"time={format_time(out_time)[:-4]} speed={current_speed:.3g}x\r")
+                sys.stderr.flush()
+            next_progress += PROGRESS_PERIOD
+
+        while stderr_rate > 0 and chatter_due <= elapsed:
+            note(rng.choice(CHATTER))
+            chatter_due += 1.0 / stderr_rate
+
+        if done:
+            break
+        time.sleep(min(PROGRESS_PERIOD, max(wall - elapsed, 0.0), 0.1) or 0.001)
+
+    corrupt_at = media.get('corrupt_at')
+    if decoding and corrupt_at is not None and options['seek'] <= corrupt_at <= options['seek'] + duration:
+        err("[h264 @ 0x55d0c8a1f000] corrupted macroblock 44 17 (total_coeff=-1)")
+        err("[h264 @ 0x55d0c8a1f000] error while decoding MB 44 17")
+
+    output = options['output']
+    if output not in ('-', 'pipe:1'):
+        out_dir = os.path.dirname(output)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        result = dict(media, fake_media=1, video_codec='h264', encoder=options['codec'])
+        if options['audio_codec'] not in (None, 'copy'):
+            result['audio_codec'] = options['audio_codec']
+        # 正常退出但输出被截断 / 中间某处损坏；这类问题是偶发的（磁盘写满、进程被杀），重试时不复现
+        if random.random() < env_float('FAKE_FFMPEG_TRUNCATE_RATE', 0.0):
+            result['duration'] = round(duration * random.uniform(0.1, 0.9), 3)
+        if random.random() < env_float('FAKE_FFMPEG_CORRUPT_RATE', 0.0):
+            result['corrupt_at'] = round(duration * random.uniform(0.05, 0.95), 3)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+    note(f"video:{int(duration * 100)}kB audio:{int(duration * 16)}kB subtitle:0kB muxing overhead: 0.1%")
+    return 0
+
+
+def main(argv):
+    args = argv[1:]
+    is_probe = 'ffprobe' in os.path.basename(argv[0]) or '--probe' in args
+    args = [a for a in args if a != '--probe']
+
+    if '-version' in args:
+        print(("ffprobe" if is_probe else "ffmpeg") + " version 6.1-fake Copyright (c) 2000-2023 the FFmpeg developers")
+        return 0
+    if is_probe or '-print_format' in args:
+        return probe(args)
+    if '-encoders' in args:
+        print("Encoders:\n ------")
+        extra = filter(None, os.environ.get('FAKE_FFMPEG_ENCODERS', '').split(','))
+        for name in BASE_ENCODERS + list(extra):
+            print(f" V....D {name:<20} {name} (fake)")
+        return 0
+    if '-hwaccels' in args:
+        print("Hardware acceleration methods:")
+        return 0
+    return encode(args)
+
+
+if __name__ == '__main__':
+    try:
+        sys.exit(main(sys.argv))
+    except (KeyboardInterrupt, BrokenPipeError):
+        sys.exit(255)
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ffmpeg 进程运行模块 - 逐行读取 stderr 到固定长度的尾部缓冲区（内存占用与编码时长无关），可选把完整输出压缩写入任务日志；看门狗在进度停滞或超时时结束进程组
+FFmpeg Runner Module - Streams stderr line by line into a bounded tail buffer (memory independent of encode length), optionally writing the full stream to a compressed per-task log; a watchdog kills the process group when progress stalls or the task overruns
+"""
+
+import gzip
+import os
+import re
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+
+from media_probe import CACHE_DIR
+
+# 任务日志目录
+FFMPEG_LOG_DIR = CACHE_DIR / 'ffmpeg_logs'
+
+# ffmpeg 可执行文件（可通过环境变量 FFMPEG_BIN 指定，压力测试时指向 fake_ffmpeg.py）
+FFMPEG_BIN = os.environ.get('FFMPEG_BIN', 'ffmpeg')
+
+# 保留的最后几行（用于错误报告）
+TAIL_LINES = 200
+
+# 单行最大长度（超出部分截断，防止没有换行的输出无限增长）
+MAX_LINE_BYTES = 4096
+
+READ_CHUNK = 64 * 1024
+
+# ffmpeg 的统计行用 \r 刷新，同样视为行结束
+LINE_SPLIT_RE = re.compile(rb'[\r\n]')
+
+# -progress 输出多久没有前进视为卡住（秒）
+STALL_TIMEOUT = 120.0
+
+# 任务总时长上限（可选）：固定余量 + 按本机实测吞吐预计的耗时 × 倍数
+TIME_LIMIT_GRACE = 300.0
+TIME_LIMIT_FACTOR = 10.0
+
+# 看门狗检查间隔（秒）
+WATCHDOG_INTERVAL = 1.0
+
+
+def task_time_limit(expected_seconds, factor=TIME_LIMIT_FACTOR, grace=TIME_LIMIT_GRACE):
+    """
+    按预计耗时计算任务的最长运行时间
+
+    Args:
+        expected_seconds: 按本机实测吞吐预计的耗时（秒），未知时为 0 或 None
+        factor: 允许超出预计耗时的倍数
+        grace: 固定余量（秒，包含启动和字体加载）
+
+    Returns:
+        float: 秒数，无法预计时返回None（只依赖停滞检测）
+    """
+    if not expected_seconds or expected_seconds <= 0:
+        return None
+    return grace + expected_seconds * factor
+
+
+def _format_seconds(seconds):
+    minutes, secs = divmod(int(seconds or 0), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+
+
+def task_log_path(output_path, log_dir=None):
+    """
+    任务日志路径：<日志目录>/<输出文件名>.<时间>.log.gz
+
+    Args:
+        output_path: 任务输出路径
+        log_dir: 日志目录（默认 cache/ffmpeg_logs）
+
+    Returns:
+        str: 日志文件路径
+    """
+    log_dir = str(log_dir or FFMPEG_LOG_DIR)
+    name = os.path.basename(output_path)
+    return os.path.join(log_dir, f"{name}.{time.strftime('%Y%m%d-%H%M%S')}.log.gz")
+
+
+class FFmpegRun:
+    """
+    运行一个 ffmpeg 进程并流式读取 stderr
+    """
+
+    def __init__(self, cmd, env=None, log_path=None, tail_lines=TAIL_LINES, on_progress=None,
+                 stall_timeout=None, time_limit=None):
+        """
+        Args:
+            cmd: 命令列表
+            env: 环境变量
+            log_path: 完整 stderr 的 gzip 日志路径（可选）
+            tail_lines: 保留的最后几行
+            on_progress: 进度回调（可选），命令需包含 -progress pipe:1，每个进度块调用一次 on_progress(dict)
+            stall_timeout: 进度停滞多少秒后结束进程（可选，命令需包含 -progress pipe:1）
+            time_limit: 最长运行时间（秒，可选）
+        """
+        self.cmd = cmd
+        self.env = env
+        self.log_path = log_path
+        self.on_progress = on_progress
+        self.stall_timeout = stall_timeout
+        self.time_limit = time_limit
+        self._progress_thread = None
+        self._watchdog_thread = None
+        self._finished = threading.Event()
+        self.started = None
+        # 最近一次进度前进的时间和进度块
+        self.last_advance = None
+        self.last_progress = {}
+        self._position = (-1, -1)
+        # 看门狗结束进程时的诊断信息
+        self.stalled = None
+        self.tail = deque(maxlen=tail_lines)
+        self.lines = 0
+        self.stderr_bytes = 0
+        self.process = None
+        self.returncode = None
+
+    def start(self):
+        """启动进程（stderr 通过管道读取；stdout 只在需要进度时读取，否则丢弃）"""
+        read_progress = self.on_progress is not None or bool(self.stall_timeout)
+        # 独立的进程组，看门狗可以连同子进程一起结束
+        if os.name == 'posix':
+            group = {'start_new_session': True}
+        else:
+            group = {'creationflags': getattr(subprocess, 'CREATE_NEW_PROCESS_GROUP', 0)}
+        self.started = self.last_advance = time.time()
+        self.process = subprocess.Popen(
+            self.cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE if read_progress else subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            env=self.env,
+            **group
+        )
+        if read_progress:
+            self._progress_thread = threading.Thread(target=self._read_progress, daemon=True)
+            self._progress_thread.start()
+        if self.stall_timeout or self.time_limit:
+            self._watchdog_thread = threading.Thread(target=self._watchdog, daemon=True)
+            self._watchdog_thread.start()
+        return self.process
+
+    def _read_progress(self):
+        """解析 -progress 输出（key=value 行，以 progress=continue/end 结束一个块）"""
+        block = {}
+        try:
+            for raw in self.process.stdout:
+                key, sep, value = raw.decode('utf-8', errors='replace').strip().partition('=')
+                if not sep:
+                    continue
+                block[key] = value
+                if key == 'progress':
+                    self._record_progress(block)
+                    if self.on_progress:
+                        try:
+                            self.on_progress(block)
+                        except Exception:
+                            pass
+                    block = {}
+        finally:
+            self.process.stdout.close()
+
+    def _record_progress(self, block):
+        """帧数或输出时间前进时刷新停滞计时（进度块照常输出但数值不变同样视为停滞）"""
+        try:
+            position = (int(block.get('frame') or 0), int(block.get('out_time_us') or 0))
+        except ValueError:
+            return
+        self.last_progress = block
+        if position[0] > self._position[0] or position[1] > self._position[1]:
+            self._position = position
+            self.last_advance = time.time()
+
+    def _watchdog(self):
+        while not self._finished.wait(WATCHDOG_INTERVAL):
+            if self.process.poll() is not None:
+                return
+            now = time.time()
+            if self.time_limit and now - self.started > self.time_limit:
+                self._abort('timeout', now)
+                return
+            if self.stall_timeout and now - self.last_advance > self.stall_timeout:
+                self._abort('stall', now)
+                return
+
+    def _abort(self, reason, now):
+        """记录诊断信息并结束进程组"""
+        progress = self.last_progress
+        self.stalled = {
+            'reason': reason,
+            'elapsed': round(now - self.started, 1),
+            'since_progress': round(now - self.last_advance, 1),
+            'limit': self.time_limit if reason == 'timeout' else self.stall_timeout,
+            'frame': int(progress.get('frame') or 0) if progress.get('frame', '').isdigit() else None,
+            'out_time': progress.get('out_time'),
+            'speed': progress.get('speed'),
+        }
+        self.kill()
+
+    def kill(self):
+        """强制结束进程（POSIX 下结束整个进程组）"""
+        if self.process is None or self.process.poll() is not None:
+            return
+        try:
+            if os.name == 'posix':
+                os.killpg(self.process.pid, signal.SIGKILL)
+            else:
+                self.process.kill()
+        except OSError:
+            pass
+
+    def stall_message(self):
+        """看门狗结束进程的原因（用于错误报告），未触发时返回None"""
+        if self.stalled is None:
+            return None
+        info = self.stalled
+        if info['reason'] == 'timeout':
+            text = f"运行 {_format_seconds(info['elapsed'])} 超过上限 {_format_seconds(info['limit'])}"
+        else:
+            text = f"{info['since_progress']:.0f} 秒没有进度"
+        position = []
+        if info['frame'] is not None:
+            position.append(f"帧 {info['frame']}")
+        if info['out_time']:
+            position.append(f"时间 {info['out_time'].split('.')[0]}")
+        if info['speed'] and info['speed'] != 'N/A':
+            position.append(f"速度 {info['speed']}")
+        if position:
+            text += f" (停在 {', '.join(position)})"
+        return text
+
+    def _add_line(self, line):
+        if not line:
+            return
+        self.lines += 1
+        self.tail.append(line[:MAX_LINE_BYTES].decode('utf-8', errors='replace'))
+
+    def wait(self):
+        """
+        读取 stderr 直到进程结束
+
+        Returns:
+            int: 退出码
+        """
+        log_file = None
+        if self.log_path:
+            try:
+                os.makedirs(os.path.dirname(self.log_path) or '.', exist_ok=True)
+                log_file = gzip.open(self.log_path, 'wb', compresslevel=3)
+            except OSError:
+                log_file = None
+
+        stream = self.process.stderr
+        pending = b''
+        try:
+            while True:
+                chunk = stream.read1(READ_CHUNK) if hasattr(stream, 'read1') else stream.read(READ_CHUNK)
+                if not chunk:
+                    break
+                self.stderr_bytes += len(chunk)
+                if log_file is not None:
+                    log_file.write(chunk)
+                parts = LINE_SPLIT_RE.split(pending + chunk)
+                pending = parts.pop()
+                for line in parts:
+                    self._add_line(line)
+                if len(pending) > MAX_LINE_BYTES:
+                    # 没有换行的超长输出：保留开头部分，丢弃其余
+                    pending = pending[:MAX_LINE_BYTES]
+            self._add_line(pending)
+        finally:
+            stream.close()
+            if log_file is not None:
+                log_file.close()
+
+        self.returncode = self.process.wait()
+        self._finished.set()
+        if self._progress_thread is not None:
+            self._progress_thread.join(timeout=5)
+        if self._watchdog_thread is not None:
+            self._watchdog_thread.join(timeout=WATCHDOG_INTERVAL + 1)
+        return self.returncode
+
+    def tail_text(self):
+        """最后几行 stderr（用于错误报告）"""
+        return '\n'.join(self.tail)
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内容指纹模块 - 大小 + 头尾 + N 个均匀分布的数据块做快速非加密哈希（可选全文件哈希），按 inode+修改时间+大小 缓存到 SQLite，多文件并行计算
+Fingerprint Module - Hashes size + head + tail + N evenly spaced blocks with a fast non-cryptographic hash (optional full-file mode), cached in SQLite by inode+mtime+size and computed in parallel
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from media_probe import CACHE_DIR
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+FINGERPRINT_DB = CACHE_DIR / 'fingerprints.sqlite3'
+
+# 采样块大小和数量（头尾之外再取 N 个均匀分布的块）
+BLOCK_SIZE = 1024 * 1024
+SAMPLE_BLOCKS = 16
+
+# 全文件哈希的读取缓冲
+FULL_READ_CHUNK = 8 * 1024 * 1024
+
+# 哈希算法：优先 xxh3-128，未安装 xxhash 时使用 blake2b
+HASH_NAME = 'xxh3_128' if xxhash is not None else 'blake2b'
+
+
+def _new_hash():
+    if xxhash is not None:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+
+def sample_offsets(size, blocks=SAMPLE_BLOCKS, block_size=BLOCK_SIZE):
+    """
+    采样块的起始偏移：头、尾和中间 blocks 个均匀分布的块
+
+    Args:
+        size: 文件大小
+        blocks: 中间采样块数
+        block_size: 块大小
+
+    Returns:
+        list: 偏移列表，文件小于全部采样量时返回None（应读取整个文件）
+    """
+    if size <= (blocks + 2) * block_size:
+        return None
+    last = size - block_size
+    step = last / (blocks + 1)
+    return [0] + [int(step * (i + 1)) for i in range(blocks)] + [last]
+
+
+def hash_file(path, full=False, blocks=SAMPLE_BLOCKS, block_size=BLOCK_SIZE):
+    """
+    计算文件内容指纹
+
+    Args:
+        path: 文件路径
+        full: 是否读取整个文件
+        blocks: 采样模式下中间采样块数
+        block_size: 采样块大小
+
+    Returns:
+        str: 十六进制指纹
+
+    Raises:
+        OSError: 文件无法读取
+    """
+    size = os.path.getsize(path)
+    digest = _new_hash()
+    digest.update(size.to_bytes(8, 'little'))
+    offsets = None if full else sample_offsets(size, blocks, block_size)
+    with open(path, 'rb') as f:
+        if offsets is None:
+            while True:
+                chunk = f.read(FULL_READ_CHUNK)
+                if not chunk:
+                    break
+                digest.update(chunk)
+        else:
+            for offset in offsets:
+                f.seek(offset)
+                digest.update(f.read(block_size))
+    return digest.hexdigest()
+
+
+class FingerprintService:
+    """
+    指纹服务：以 设备号+inode+大小+修改时间 为键缓存指纹，文件改名或移动（同一卷内）后仍然命中
+    """
+
+    def __init__(self, db_path=None, blocks=SAMPLE_BLOCKS, block_size=BLOCK_SIZE):
+        """
+        Args:
+            db_path: SQLite 数据库路径（默认 cache/fingerprints.sqlite3，传 ':memory:' 仅用内存）
+            blocks: 采样块数
+            block_size: 采样块大小
+        """
+        self.db_path = str(db_path or FINGERPRINT_DB)
+        if self.db_path != ':memory:':
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self.blocks = blocks
+        self.block_size = block_size
+        self.stats = {'hits': 0, 'computed': 0, 'bytes_hashed': 0, 'errors': 0}
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        if self.db_path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                dev INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                mode TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                path TEXT,
+                updated REAL,
+                PRIMARY KEY (dev, inode, mode)
+            )
+        ''')
+        self._conn.commit()
+
+    def mode(self, full=False):
+        """缓存键中的模式（算法或采样参数变化后旧记录自动失效）"""
+        if full:
+            return f"{HASH_NAME}:full"
+        return f"{HASH_NAME}:sampled:{self.blocks}x{self.block_size}"
+
+    def fingerprint(self, path, full=False):
+        """
+        获取单个文件的指纹（命中缓存时不读取文件内容）
+
+        Args:
+            path: 文件路径
+            full: 是否使用全文件哈希
+
+        Returns:
+            str: 指纹，文件无法读取时返回None
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        mode = self.mode(full)
+
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT size, mtime_ns, digest FROM fingerprints WHERE dev = ? AND inode = ? AND mode = ?',
+                (st.st_dev, st.st_ino, mode)
+            ).fetchone()
+        if row is not None and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            with self._lock:
+                self.stats['hits'] += 1
+            return row[2]
+
+        try:
+            digest = hash_file(path, full, self.blocks, self.block_size)
+        except OSError:
+            with self._lock:
+                self.stats['errors'] += 1
+            return None
+
+        offsets = None if full else sample_offsets(st.st_size, self.blocks, self.block_size)
+        hashed = st.st_size if offsets is None else len(offsets) * self.block_size
+        with self._lock:
+            self.stats['computed'] += 1
+            self.stats['bytes_hashed'] += hashed
+            self._conn.execute(
+                'INSERT OR REPLACE INTO fingerprints (dev, inode, mode, size, mtime_ns, digest, path, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (st.st_dev, st.st_ino, mode, st.st_size, st.st_mtime_ns, digest, os.path.abspath(path), time.time())
+            )
+            self._conn.commit()
+        return digest
+
+    def fingerprint_many(self, paths, full=False, max_workers=8):
+        """
+        并行获取多个文件的指纹
+
+        Args:
+            paths: 文件路径列表
+            full: 是否使用全文件哈希
+            max_workers: 并行线程数（哈希和读取都会释放 GIL）
+
+        Returns:
+            dict: 路径 -> 指纹（无法读取时为None）
+        """
+        unique_paths = list(dict.fromkeys(paths))
+        if not unique_paths:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(unique_paths))) as pool:
+            return dict(zip(unique_paths, pool.map(lambda p: self.fingerprint(p, full), unique_paths)))
+
+
+_default_service = None
+_default_service_lock = threading.Lock()
+
+
+def get_fingerprint_service():
+    """获取进程内共享的指纹服务"""
+    global _default_service
+    with _default_service_lock:
+        if _default_service is None:
+            try:
+                _default_service = FingerprintService()
+            except (OSError, sqlite3.Error) as e:
+                print(f"指纹缓存不可用，改用内存缓存: {e}")
+                _default_service = FingerprintService(':memory:')
+        return _default_service
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from readahead import format_bytes
+
+    parser = argparse.ArgumentParser(description="计算文件夹内所有文件的内容指纹")
+    parser.add_argument('folder', help="文件夹路径")
+    parser.add_argument('--full', action='store_true', help="全文件哈希（默认采样）")
+    parser.add_argument('--workers', type=int, default=8, help="并行线程数")
+    args = parser.parse_args()
+
+    files = []
+    for root, _, names in os.walk(args.folder):
+        files.extend(os.path.join(root, name) for name in names)
+
+    service = get_fingerprint_service()
+    started = time.perf_counter()
+    results = service.fingerprint_many(files, full=args.full, max_workers=args.workers)
+    elapsed = time.perf_counter() - started
+
+    total = sum(os.path.getsize(p) for p in files if results.get(p))
+    print(f"算法: {service.mode(args.full)}")
+    print(f"文件: {len(files)} 个 ({format_bytes(total)}), 耗时 {elapsed:.2f} 秒")
+    print(f"缓存命中: {service.stats['hits']}, 计算: {service.stats['computed']}, "
+          f"读取: {format_bytes(service.stats['bytes_hashed'])}")
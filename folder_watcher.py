@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件夹监听模块 - 监听视频/字幕文件夹，增量派发新的合成任务
+Folder Watcher Module - Watches video/subtitle folders and dispatches only newly possible tasks
+"""
+
+import os
+import select
+import struct
+import threading
+import time
+
+from container_preflight import preflight_containers
+
+VIDEO_EXTENSIONS = ['.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv']
+SUBTITLE_EXTENSIONS = ['.srt', '.str']
+
+# inotify 事件掩码（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF)
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+class InotifyBackend:
+    """基于 Linux inotify 的事件后端（通过 ctypes 调用 libc，无额外依赖）"""
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError("未找到libc")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError("当前系统不支持inotify")
+
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self._wd_to_path = {}
+        self._path_to_wd = {}
+
+    def add_watch(self, path):
+        """添加目录监听"""
+        if path in self._path_to_wd:
+            return
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            return
+        self._wd_to_path[wd] = path
+        self._path_to_wd[path] = wd
+
+    def wait(self, timeout):
+        """
+        等待文件系统事件
+
+        Args:
+            timeout: 最长等待秒数
+
+        Returns:
+            list: [(目录路径, 文件名, 事件掩码), ...]
+        """
+        events = []
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return events
+
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return events
+
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+
+            directory = self._wd_to_path.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                # 被监听的目录已删除
+                self._wd_to_path.pop(wd, None)
+                self._path_to_wd.pop(directory, None)
+                continue
+            events.append((directory, os.fsdecode(name), mask))
+
+        return events
+
+    def close(self):
+        """关闭 inotify 句柄"""
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+
+
+class PollingBackend:
+    """轮询后端：不支持 inotify 时（macOS/Windows/网络共享）使用"""
+
+    def add_watch(self, path):
+        pass
+
+    def wait(self, timeout):
+        """等待一个轮询周期；返回 None 表示需要重新扫描目录"""
+        time.sleep(timeout)
+        return None
+
+    def close(self):
+        pass
+
+
+def create_backend(use_inotify=True):
+    """
+    创建事件后端，inotify 不可用时回退到轮询
+
+    Args:
+        use_inotify: 是否尝试使用 inotify
+
+    Returns:
+        InotifyBackend 或 PollingBackend
+    """
+    if use_inotify:
+        try:
+            return InotifyBackend()
+        except (OSError, AttributeError):
+            pass
+    return PollingBackend()
+
+
+class FolderWatcher:
+    """
+    监听视频文件夹和各语种字幕文件夹，文件写入稳定后计算新增的 (视频, 语种) 组合，
+    并交给 on_tasks 回调派发到编码队列。已有输出的组合不会重复处理。
+    """
+
+    def __init__(self, merger, video_folder, subtitle_folder, output_folder, on_tasks,
+                 settle_time=5.0, poll_interval=2.0, use_inotify=True, process_existing=True, log=None):
+        """
+        Args:
+            merger: SubtitleMerger 实例（用于语种扫描、字幕匹配和任务构建）
+            video_folder: 视频文件夹
+            subtitle_folder: 字幕文件夹（包含语种子文件夹）
+            output_folder: 输出文件夹
+            on_tasks: 回调函数，参数为新任务列表
+            settle_time: 文件大小和修改时间保持不变多少秒后视为写入完成
+            poll_interval: 轮询/事件等待间隔（秒）
+            use_inotify: 是否优先使用 inotify
+            process_existing: 启动时是否派发已存在但尚无输出的组合
+            log: 日志函数（可选）
+        """
+        self.merger = merger
+        self.video_folder = video_folder
+        self.subtitle_folder = subtitle_folder
+        self.output_folder = output_folder
+        self.on_tasks = on_tasks
+        self.settle_time = settle_time
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.process_existing = process_existing
+        self.log = log or print
+
+        self.backend = None
+        self.videos = set()          # 已稳定的视频文件名
+        self.subtitles = {}          # 语种 -> 已稳定的字幕文件名集合
+        self.dispatched = set()      # 已派发或已有输出的 (视频文件名, 语种)
+        self._pending = {}           # 路径 -> (size, mtime, 首次观察到该状态的时间)
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        self.stats = {
+            'backend': '',
+            'dispatched': 0,
+            'skipped_existing': 0,
+            'pending_files': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """在后台线程中启动监听"""
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """停止监听"""
+        self._stop_event.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def run(self):
+        """监听主循环"""
+        self.backend = create_backend(self.use_inotify)
+        self.stats['backend'] = 'inotify' if isinstance(self.backend, InotifyBackend) else 'polling'
+        self.log(f"👀 开始监听文件夹 ({self.stats['backend']})")
+
+        try:
+            self._initial_scan()
+            while not self._stop_event.is_set():
+                events = self.backend.wait(self.poll_interval)
+                if events is None:
+                    self._rescan()
+                else:
+                    self._handle_events(events)
+                self._check_pending()
+        finally:
+            self.backend.close()
+            self.log("👀 已停止监听文件夹")
+
+    # ------------------------------------------------------------------
+    # 扫描与事件
+    # ------------------------------------------------------------------
+
+    def _initial_scan(self):
+        """启动时建立基线：已有文件直接视为稳定，已有输出的组合标记为已完成"""
+        self.backend.add_watch(self.video_folder)
+        self.backend.add_watch(self.subtitle_folder)
+
+        self.videos = set(self.merger.get_video_files(self.video_folder))
+        for lang in self.merger.scan_languages(self.subtitle_folder):
+            self._add_language(lang)
+
+        new_tasks = []
+        for lang in sorted(self.subtitles):
+            new_tasks.extend(self._pairs_for_language(lang, self.videos, dispatch=self.process_existing))
+        if new_tasks:
+            self._dispatch(new_tasks)
+
+    def _add_language(self, lang):
+        """登记语种文件夹并开始监听"""
+        lang_folder = os.path.join(self.subtitle_folder, lang)
+        self.backend.add_watch(lang_folder)
+        try:
+            files = os.listdir(lang_folder)
+        except OSError:
+            files = []
+        self.subtitles[lang] = {f for f in files if self._is_subtitle(f)}
+
+    def _handle_events(self, events):
+        """处理 inotify 事件，把可能变化的文件加入待稳定列表"""
+        for directory, name, mask in events:
+            path = os.path.join(directory, name)
+
+            if directory == self.subtitle_folder:
+                # 字幕根目录下新建语种文件夹
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    self.backend.add_watch(path)
+                    try:
+                        for file in os.listdir(path):
+                            if self._is_subtitle(file):
+                                self._mark_pending(os.path.join(path, file))
+                    except OSError:
+                        pass
+                continue
+
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self._forget(directory, name)
+                continue
+
+            if self._is_video(name) or self._is_subtitle(name):
+                self._mark_pending(path)
+
+    def _rescan(self):
+        """轮询模式：用 scandir 的 stat 信息找出新增或变化的文件"""
+        candidates = [self.video_folder]
+        try:
+            for entry in os.scandir(self.subtitle_folder):
+                if entry.is_dir():
+                    candidates.append(entry.path)
+        except OSError:
+            return
+
+        for directory in candidates:
+            is_video_dir = directory == self.video_folder
+            lang = os.path.basename(directory)
+            known = self.videos if is_video_dir else self.subtitles.get(lang, set())
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            names = set()
+            for entry in entries:
+                name = entry.name
+                if is_video_dir and not self._is_video(name):
+                    continue
+                if not is_video_dir and not self._is_subtitle(name):
+                    continue
+                names.add(name)
+                if name not in known and entry.path not in self._pending:
+                    self._mark_pending(entry.path)
+
+            # 已删除或移走的文件
+            for name in known - names:
+                self._forget(directory, name)
+
+    def _mark_pending(self, path):
+        """记录文件当前状态，等待其稳定"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        self._pending[path] = (st.st_size, st.st_mtime, time.monotonic())
+
+    def _forget(self, directory, name):
+        """文件删除或移走时从已知集合和已派发组合中移除（允许之后重新出现时再次处理）"""
+        path = os.path.join(directory, name)
+        self._pending.pop(path, None)
+        if directory == self.video_folder:
+            self.videos.discard(name)
+            self.dispatched = {key for key in self.dispatched if key[0] != name}
+        else:
+            lang = os.path.basename(directory)
+            self.subtitles.get(lang, set()).discard(name)
+            for video_file in self._videos_for_subtitle(name, lang):
+                self.dispatched.discard((video_file, lang))
+
+    def _check_pending(self):
+        """检查待稳定文件，稳定后计算新增任务"""
+        now = time.monotonic()
+        stable_videos = set()
+        stable_subtitles = {}
+
+        for path, (size, mtime, since) in list(self._pending.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self._pending[path]
+                continue
+
+            if st.st_size != size or st.st_mtime != mtime:
+                # 仍在写入，重新计时
+                self._pending[path] = (st.st_size, st.st_mtime, now)
+                continue
+            if now - since < self.settle_time:
+                continue
+
+            del self._pending[path]
+            directory, name = os.path.split(path)
+            if directory == self.video_folder:
+                stable_videos.add(name)
+            else:
+                stable_subtitles.setdefault(os.path.basename(directory), set()).add(name)
+
+        self.stats['pending_files'] = len(self._pending)
+        if not stable_videos and not stable_subtitles:
+            return
+
+        new_tasks = []
+
+        # 新视频：与所有已知语种组合
+        if stable_videos:
+            self.videos |= stable_videos
+            for lang in sorted(self.subtitles):
+                new_tasks.extend(self._pairs_for_language(lang, stable_videos))
+
+        # 新字幕：只与名称对应的视频组合
+        for lang, names in sorted(stable_subtitles.items()):
+            if lang not in self.subtitles:
+                self.subtitles[lang] = set()
+                self.log(f"🌍 发现新语种: {lang}")
+            self.subtitles[lang] |= names
+            candidate_videos = set()
+            for name in names:
+                candidate_videos |= self._videos_for_subtitle(name, lang)
+            new_tasks.extend(self._pairs_for_language(lang, candidate_videos))
+
+        if new_tasks:
+            self._dispatch(new_tasks)
+
+    # ------------------------------------------------------------------
+    # 任务计算
+    # ------------------------------------------------------------------
+
+    def _videos_for_subtitle(self, subtitle_name, lang):
+        """根据字幕文件名（<视频名>_<语种>.srt）反查对应的视频"""
+        base = os.path.splitext(subtitle_name)[0]
+        suffix = f"_{lang}"
+        if not base.endswith(suffix):
+            return set()
+        video_name = base[:-len(suffix)]
+        return {v for v in self.videos if os.path.splitext(v)[0] == video_name}
+
+    def _pairs_for_language(self, lang, videos, dispatch=True):
+        """
+        计算某语种与给定视频之间新出现的可处理组合
+
+        Args:
+            lang: 语种代码
+            videos: 候选视频文件名集合
+            dispatch: False 时只登记为已处理，不生成任务
+
+        Returns:
+            list: 新任务列表
+        """
+        tasks = []
+        lang_subtitle_folder = os.path.join(self.subtitle_folder, lang)
+        for video_file in sorted(videos):
+            key = (video_file, lang)
+            if key in self.dispatched:
+                continue
+
+            video_name = os.path.splitext(video_file)[0]
+            subtitle_file = self.merger.find_subtitle_file(lang_subtitle_folder, video_name, lang)
+            if not subtitle_file:
+                continue
+
+            task = self._planned_task(video_file, lang, subtitle_file)
+            self.dispatched.add(key)
+
+            if os.path.exists(task['output_path']):
+                # 已有输出，永不重做（输出先写临时文件、完成后才改名，存在即为完整输出）
+                self.stats['skipped_existing'] += 1
+                continue
+            if dispatch:
+                tasks.append(task)
+        return tasks
+
+    def _planned_task(self, video_file, lang, subtitle_file):
+        """
+        构建任务并按批处理相同的规则确定最终输出文件名
+
+        .wmv 等源文件的输出会改用 .mp4；与同名视频（如 a.wmv 和 a.mp4）的输出重名时在文件名中保留源扩展名。
+        已有输出的判断必须使用改名后的路径，否则这些视频每次启动都会重新编码。
+        """
+        video_name = os.path.splitext(video_file)[0]
+        tasks = [self.merger.build_task(self.video_folder, name, self.subtitle_folder,
+                                        lang, subtitle_file, self.output_folder)
+                 for name in sorted(self.videos | {video_file}) if os.path.splitext(name)[0] == video_name]
+        # 扩展名只取决于源文件，不需要媒体信息；音频处理方式在批处理开始时按探测结果重新确定
+        preflight_containers(tasks, {})
+        return next(t for t in tasks if t['video_file'] == video_file)
+
+    def _dispatch(self, tasks):
+        """把新任务交给回调"""
+        self.stats['dispatched'] += len(tasks)
+        self.log(f"📥 新增 {len(tasks)} 个任务")
+        self.on_tasks(tasks)
+
+    @staticmethod
+    def _is_video(name):
+        return any(name.lower().endswith(ext) for ext in VIDEO_EXTENSIONS)
+
+    @staticmethod
+    def _is_subtitle(name):
+        return any(name.endswith(ext) for ext in SUBTITLE_EXTENSIONS)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="监听文件夹并自动合成新增的视频字幕")
+    parser.add_argument('--video', required=True, help="原视频文件夹")
+    parser.add_argument('--subtitle', required=True, help="字幕文件夹")
+    parser.add_argument('--output', required=True, help="输出文件夹")
+    parser.add_argument('--settle', type=float, default=5.0, help="文件稳定等待时间（秒）")
+    parser.add_argument('--poll', action='store_true', help="强制使用轮询模式")
+    parser.add_argument('--gpu', action='store_true', help="使用GPU加速")
+    parser.add_argument('--workers', type=int, default=1, help="并行处理的任务数")
+    args = parser.parse_args()
+
+    from app import merger
+
+    merger.echo = True
+    merger.start_watch(args.video, args.subtitle, args.output, use_gpu=args.gpu,
+                       settle_time=args.settle, use_inotify=not args.poll, log=print,
+                       max_workers=max(1, args.workers))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        merger.stop_watch()
@@ -204,45 +204,21 @@ def normalize_font_path(font_path):
 
 def check_system_font_exists(font_name):
     """
-    检查系统是否安装了指定字体（仅Windows）
+    检查系统是否安装了指定字体（Windows / macOS / Linux）
+
+    系统字体在首次调用时枚举一次（字体目录、fc-list 或注册表），之后按名称 O(1) 查询。
 
     Args:
-        font_name: 字体名称
+        font_name: 字体名称（家族名、全名或 PostScript 名）
 
     Returns:
         bool: 字体是否存在
     """
+    from system_fonts import get_system_font_index
     try:
-        import platform
-        if platform.system() == 'Windows':
-            import winreg
-            # 检查注册表中的字体
-            key_path = r"SOFTWARE\Microsoft\Windows NT\CurrentVersion\Fonts"
-            try:
-                key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, key_path, 0, winreg.KEY_READ)
-                i = 0
-                while True:
-                    try:
-                        name, value, _ = winreg.EnumValue(key, i)
-                        if font_name.lower() in name.lower():
-                            winreg.CloseKey(key)
-                            return True
-                        i += 1
-                    except OSError:
-                        break
-                winreg.CloseKey(key)
-            except:
-                pass
-
-            # 检查字体文件夹
-            import os
-            fonts_dir = os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), 'Fonts')
-            if os.path.exists(fonts_dir):
-                for file in os.listdir(fonts_dir):
-                    if font_name.lower().replace(' ', '').replace('-', '') in file.lower().replace(' ', '').replace('-', ''):
-                        return True
-        return False
-    except:
+        return get_system_font_index().has_font(font_name)
+    except Exception as e:
+        print(f"系统字体检查失败: {e}")
         return False
 
 
@@ -328,15 +304,16 @@ def get_available_font_for_language(language_code, fonts_dir=None):
     if font_file:
         return ('file', font_file)
 
-    # 优先级2: 检查系统字体
+    # 优先级2: 检查系统字体（所有平台）
     recommended_fonts = get_font_for_language(language_code)
     for font in recommended_fonts:
         if check_system_font_exists(font):
             return ('name', font)
 
-    # 优先级3: 回退到Arial Unicode MS
-    if check_system_font_exists('Arial Unicode MS'):
-        return ('name', 'Arial Unicode MS')
+    # 优先级3: 回退到已安装的通用字体（Noto Sans / Arial Unicode MS / DejaVu Sans 等）
+    for font in FALLBACK_FONTS:
+        if check_system_font_exists(font):
+            return ('name', font)
 
     # 最后回退到Arial
     return ('name', 'Arial')
@@ -0,0 +1,678 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+字体字形覆盖索引 - 解析字体 cmap 表建立码位覆盖索引，按字幕实际用到的字符选择字体并在编码前发现缺字（方框）
+Font Coverage Index - Parses font cmap tables into codepoint coverage, selects fonts by the characters a subtitle uses and detects tofu before encoding
+"""
+
+import json
+import os
+import platform
+import re
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_right
+from pathlib import Path
+
+from font_config import FONTS_DIR, get_font_for_language
+from media_probe import CACHE_DIR
+from srt_parser import parse_srt_file
+
+FONT_INDEX_CACHE = CACHE_DIR / 'font_index.json'
+FONT_INDEX_VERSION = 1
+
+# 可解析 cmap 的字体格式（woff/woff2 为压缩格式，跳过）
+INDEXABLE_EXTENSIONS = ('.ttf', '.otf', '.ttc', '.otc')
+
+# 覆盖块大小：整块覆盖/完全未覆盖的块无需逐字符查找
+BLOCK_SHIFT = 7
+
+# cmap 子表优先级：(平台ID, 编码ID)，完整 Unicode 优先
+CMAP_PREFERENCE = [(3, 10), (0, 6), (0, 4), (3, 1), (0, 3), (0, 2), (0, 1), (0, 0)]
+
+# 不需要字形的字符：零宽字符、双向控制符、变体选择符、BOM 等
+IGNORABLE_RE = re.compile('[\x00-\x1f\x7f\u00ad\u034f\u061c\u180b-\u180e\u200b-\u200f\u2028-\u202e'
+                          '\u2060-\u206f\ufe00-\ufe0f\ufeff\U000e0000-\U000e0fff]')
+
+# SRT 中不会显示的标签：ASS 覆盖标签 {\...} 和 HTML 样式标签 <i> </font> 等
+TAG_RE = re.compile(r'\{\\[^}]*\}|</?[a-zA-Z][^>]*>')
+
+
+def system_font_dirs():
+    """
+    当前平台的系统字体目录
+
+    Returns:
+        list: 存在的目录路径
+    """
+    home = Path.home()
+    system = platform.system()
+    if system == 'Windows':
+        candidates = [
+            Path(os.environ.get('WINDIR', 'C:\\Windows')) / 'Fonts',
+            Path(os.environ.get('LOCALAPPDATA', home / 'AppData' / 'Local')) / 'Microsoft' / 'Windows' / 'Fonts',
+        ]
+    elif system == 'Darwin':
+        candidates = [
+            Path('/System/Library/Fonts'),
+            Path('/Library/Fonts'),
+            home / 'Library' / 'Fonts',
+        ]
+    else:
+        data_home = Path(os.environ.get('XDG_DATA_HOME', home / '.local' / 'share'))
+        candidates = [
+            Path('/usr/share/fonts'),
+            Path('/usr/local/share/fonts'),
+            data_home / 'fonts',
+            home / '.fonts',
+        ]
+    return [str(p) for p in candidates if p.is_dir()]
+
+
+# ----------------------------------------------------------------------
+# 码位覆盖集合
+# ----------------------------------------------------------------------
+
+class CoverageSet:
+    """
+    码位区间集合
+
+    - starts / ends: array('I')，已排序且互不相邻的闭区间
+    - full_blocks / any_blocks: 整块覆盖的块号 / 有覆盖的块号（块大小 128 个码位）
+    """
+
+    __slots__ = ('starts', 'ends', 'full_blocks', 'any_blocks')
+
+    def __init__(self, starts=None, ends=None):
+        self.starts = starts if starts is not None else array('I')
+        self.ends = ends if ends is not None else array('I')
+        self.full_blocks = set()
+        self.any_blocks = set()
+        for start, end in zip(self.starts, self.ends):
+            first, last = start >> BLOCK_SHIFT, end >> BLOCK_SHIFT
+            self.any_blocks.update(range(first, last + 1))
+            full_first = first if start == first << BLOCK_SHIFT else first + 1
+            full_last = last if end == ((last + 1) << BLOCK_SHIFT) - 1 else last - 1
+            if full_first <= full_last:
+                self.full_blocks.update(range(full_first, full_last + 1))
+
+    @classmethod
+    def from_ranges(cls, ranges):
+        """由 (起, 止) 区间列表构建（自动排序合并）"""
+        starts = array('I')
+        ends = array('I')
+        for start, end in sorted(ranges):
+            if end < start:
+                continue
+            if ends and start <= ends[-1] + 1:
+                if end > ends[-1]:
+                    ends[-1] = end
+            else:
+                starts.append(start)
+                ends.append(end)
+        return cls(starts, ends)
+
+    @classmethod
+    def from_flat(cls, flat):
+        """由 [起0, 止0, 起1, 止1, ...] 构建（磁盘缓存格式）"""
+        return cls(array('I', flat[0::2]), array('I', flat[1::2]))
+
+    def to_flat(self):
+        """转换为 [起0, 止0, 起1, 止1, ...]"""
+        flat = [0] * (2 * len(self.starts))
+        flat[0::2] = self.starts
+        flat[1::2] = self.ends
+        return flat
+
+    def __len__(self):
+        """覆盖的码位数"""
+        return sum(e - s + 1 for s, e in zip(self.starts, self.ends))
+
+    def __contains__(self, codepoint):
+        k = bisect_right(self.starts, codepoint) - 1
+        return k >= 0 and codepoint <= self.ends[k]
+
+    def covered(self, codepoints_by_block):
+        """
+        计算覆盖的码位
+
+        Args:
+            codepoints_by_block: {块号: [码位, ...]}（见 group_by_block）
+
+        Returns:
+            set: 覆盖的码位
+        """
+        result = set()
+        for block, codepoints in codepoints_by_block.items():
+            if block in self.full_blocks:
+                result.update(codepoints)
+            elif block in self.any_blocks:
+                result.update(cp for cp in codepoints if cp in self)
+        return result
+
+
+def group_by_block(codepoints):
+    """按覆盖块分组码位"""
+    groups = {}
+    for cp in codepoints:
+        groups.setdefault(cp >> BLOCK_SHIFT, []).append(cp)
+    return groups
+
+
+# ----------------------------------------------------------------------
+# sfnt / TTC 解析
+# ----------------------------------------------------------------------
+
+def _u16_array(data, offset, count):
+    values = array('H', data[offset:offset + 2 * count])
+    if sys.byteorder == 'little':
+        values.byteswap()
+    return values
+
+
+def _table_directory(data, offset):
+    """读取单个字体的表目录 {标签: (偏移, 长度)}"""
+    num_tables = struct.unpack_from('>H', data, offset + 4)[0]
+    tables = {}
+    for i in range(num_tables):
+        tag, _, table_offset, length = struct.unpack_from('>4sIII', data, offset + 12 + 16 * i)
+        tables[tag.decode('latin-1')] = (table_offset, length)
+    return tables
+
+
+def _parse_cmap_format4(data, offset):
+    seg_count = struct.unpack_from('>H', data, offset + 6)[0] // 2
+    ends_offset = offset + 14
+    starts_offset = ends_offset + 2 * seg_count + 2
+    deltas_offset = starts_offset + 2 * seg_count
+    range_offsets_offset = deltas_offset + 2 * seg_count
+
+    end_codes = _u16_array(data, ends_offset, seg_count)
+    start_codes = _u16_array(data, starts_offset, seg_count)
+    deltas = _u16_array(data, deltas_offset, seg_count)
+    range_offsets = _u16_array(data, range_offsets_offset, seg_count)
+
+    ranges = []
+    for i in range(seg_count):
+        start, end, delta, range_offset = start_codes[i], end_codes[i], deltas[i], range_offsets[i]
+        if start == 0xFFFF or end < start:
+            continue
+        if range_offset == 0:
+            # 字形号 = (码位 + delta) mod 65536，结果为0的码位没有字形
+            zero = (-delta) & 0xFFFF
+            if start <= zero <= end:
+                ranges.append((start, zero - 1))
+                ranges.append((zero + 1, end))
+            else:
+                ranges.append((start, end))
+            continue
+
+        base = range_offsets_offset + 2 * i + range_offset
+        glyphs = _u16_array(data, base, end - start + 1)
+        run_start = None
+        for j, glyph in enumerate(glyphs):
+            cp = start + j
+            if glyph and (glyph + delta) & 0xFFFF:
+                if run_start is None:
+                    run_start = cp
+            elif run_start is not None:
+                ranges.append((run_start, cp - 1))
+                run_start = None
+        if run_start is not None:
+            ranges.append((run_start, start + len(glyphs) - 1))
+    return ranges
+
+
+def _parse_cmap_format12(data, offset):
+    num_groups = struct.unpack_from('>I', data, offset + 12)[0]
+    groups = array('I', data[offset + 16:offset + 16 + 12 * num_groups])
+    if sys.byteorder == 'little':
+        groups.byteswap()
+    ranges = []
+    for i in range(0, len(groups), 3):
+        start, end, start_glyph = groups[i], groups[i + 1], groups[i + 2]
+        if start_glyph == 0:
+            # 映射到 .notdef 的首个码位不算覆盖
+            start += 1
+        if start <= end:
+            ranges.append((start, end))
+    return ranges
+
+
+def parse_cmap(data, table_offset):
+    """
+    解析 cmap 表，返回覆盖集合
+
+    Args:
+        data: 字体文件字节
+        table_offset: cmap 表偏移
+
+    Returns:
+        CoverageSet: 码位覆盖，没有可用子表时返回None
+    """
+    num_subtables = struct.unpack_from('>H', data, table_offset + 2)[0]
+    subtables = {}
+    for i in range(num_subtables):
+        platform_id, encoding_id, offset = struct.unpack_from('>HHI', data, table_offset + 4 + 8 * i)
+        subtables.setdefault((platform_id, encoding_id), table_offset + offset)
+
+    for key in CMAP_PREFERENCE:
+        if key not in subtables:
+            continue
+        offset = subtables[key]
+        fmt = struct.unpack_from('>H', data, offset)[0]
+        if fmt == 12:
+            return CoverageSet.from_ranges(_parse_cmap_format12(data, offset))
+        if fmt == 4:
+            return CoverageSet.from_ranges(_parse_cmap_format4(data, offset))
+    return None
+
+
+def _decode_name(platform_id, encoding_id, raw):
+    if platform_id in (0, 3):
+        return raw.decode('utf-16-be', errors='replace')
+    if platform_id == 1 and encoding_id == 0:
+        return raw.decode('mac_roman', errors='replace')
+    return None
+
+
+def parse_name_table(data, table_offset):
+    """
+    解析 name 表
+
+    Returns:
+        dict: {'family': 英文家族名, 'families': [所有家族名], 'full_names': [...], 'postscript': 名称, 'regular': 是否常规字重}
+    """
+    _, count, string_offset = struct.unpack_from('>HHH', data, table_offset)
+    storage = table_offset + string_offset
+    names = {}
+    for i in range(count):
+        platform_id, encoding_id, language_id, name_id, length, offset = struct.unpack_from(
+            '>6H', data, table_offset + 6 + 12 * i)
+        if name_id not in (1, 2, 4, 6, 16):
+            continue
+        value = _decode_name(platform_id, encoding_id, data[storage + offset:storage + offset + length])
+        if not value:
+            continue
+        english = (platform_id == 3 and language_id == 0x409) or (platform_id == 1 and language_id == 0)
+        names.setdefault(name_id, []).append((not english, value.strip('\x00').strip()))
+
+    def _values(name_id):
+        return list(dict.fromkeys(v for _, v in sorted(names.get(name_id, []), key=lambda x: x[0]) if v))
+
+    families = _values(16) + _values(1)
+    families = list(dict.fromkeys(families))
+    postscript = _values(6)
+    subfamily = (_values(2) or ['Regular'])[0].lower()
+    return {
+        # libass 按 name ID 1 的家族名匹配 FontName
+        'family': (_values(1) or families or [None])[0],
+        'families': families,
+        'full_names': _values(4),
+        'postscript': postscript[0] if postscript else None,
+        'regular': subfamily in ('regular', 'normal', 'book', 'roman', 'medium'),
+    }
+
+
+def read_font_faces(path):
+    """
+    读取字体文件中每个字体的名称和码位覆盖（支持 TTC/OTC 字体集合）
+
+    Args:
+        path: 字体文件路径
+
+    Returns:
+        list: [{'index', 'family', 'families', 'full_names', 'postscript', 'coverage'}, ...]
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    if data[:4] == b'ttcf':
+        num_fonts = struct.unpack_from('>I', data, 8)[0]
+        offsets = struct.unpack_from(f'>{num_fonts}I', data, 12)
+    else:
+        offsets = (0,)
+
+    faces = []
+    for index, offset in enumerate(offsets):
+        try:
+            tables = _table_directory(data, offset)
+            if 'cmap' not in tables:
+                continue
+            coverage = parse_cmap(data, tables['cmap'][0])
+            if coverage is None:
+                continue
+            names = parse_name_table(data, tables['name'][0]) if 'name' in tables else {
+                'family': None, 'families': [], 'full_names': [], 'postscript': None, 'regular': True}
+        except (struct.error, IndexError, KeyError):
+            continue
+        face = dict(names, index=index, coverage=coverage)
+        if not face['family']:
+            face['family'] = os.path.splitext(os.path.basename(path))[0]
+            face['families'] = [face['family']]
+        faces.append(face)
+    return faces
+
+
+# ----------------------------------------------------------------------
+# 字符集
+# ----------------------------------------------------------------------
+
+def rendered_charset(text):
+    """
+    字幕实际需要字形的字符（去除标签、空白和零宽控制符）
+
+    Args:
+        text: 字幕文本
+
+    Returns:
+        set: 字符集合
+    """
+    text = IGNORABLE_RE.sub('', TAG_RE.sub('', text))
+    return {c for c in text if not c.isspace()}
+
+
+def subtitle_charset(subtitle_path):
+    """读取 UTF-8 字幕文件并返回需要字形的字符集合"""
+    table = parse_srt_file(subtitle_path)
+    return rendered_charset(table.text_buffer.decode('utf-8', errors='replace'))
+
+
+# ----------------------------------------------------------------------
+# 字体索引
+# ----------------------------------------------------------------------
+
+class FontIndex:
+    """
+    字体码位覆盖索引
+
+    扫描 fonts/ 和系统字体目录，以 路径+大小+修改时间 为键把解析结果缓存到磁盘，
+    之后只需 stat 文件即可加载。
+    """
+
+    def __init__(self, font_dirs=None, cache_path=None):
+        """
+        Args:
+            font_dirs: 字体目录列表（默认 fonts/ + 系统字体目录）
+            cache_path: 磁盘缓存路径（默认 cache/font_index.json，传 None 以外的假值不缓存）
+        """
+        if font_dirs is None:
+            font_dirs = [str(FONTS_DIR)] + system_font_dirs()
+        self.font_dirs = [os.path.abspath(d) for d in font_dirs]
+        self.cache_path = str(FONT_INDEX_CACHE) if cache_path is None else cache_path
+        self.faces = []
+        self._by_family = {}
+        self._selection_cache = {}
+        self._lock = threading.Lock()
+
+    def _iter_font_files(self):
+        for font_dir in self.font_dirs:
+            for root, _, files in os.walk(font_dir):
+                for name in files:
+                    if name.lower().endswith(INDEXABLE_EXTENSIONS):
+                        yield os.path.join(root, name)
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get('version') != FONT_INDEX_VERSION:
+            return {}
+        return data.get('files', {})
+
+    def _save_cache(self, files):
+        if not self.cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = f"{self.cache_path}.tmp{os.getpid()}"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': FONT_INDEX_VERSION, 'files': files}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"保存字体索引缓存失败: {e}")
+
+    def scan(self):
+        """
+        扫描字体目录（未变化的文件直接使用磁盘缓存）
+
+        Returns:
+            dict: {'files', 'faces', 'parsed', 'cached'}
+        """
+        cached = self._load_cache()
+        files = {}
+        faces = []
+        parsed = 0
+        for path in self._iter_font_files():
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entry = cached.get(path)
+            if entry is None or entry['size'] != st.st_size or entry['mtime_ns'] != st.st_mtime_ns:
+                try:
+                    file_faces = read_font_faces(path)
+                except OSError:
+                    continue
+                parsed += 1
+                entry = {
+                    'size': st.st_size,
+                    'mtime_ns': st.st_mtime_ns,
+                    'faces': [dict(face, coverage=face['coverage'].to_flat()) for face in file_faces],
+                }
+            files[path] = entry
+            for face in entry['faces']:
+                face = dict(face, path=path, coverage=CoverageSet.from_flat(face['coverage']))
+                faces.append(face)
+
+        if parsed or set(files) != set(cached):
+            self._save_cache(files)
+
+        with self._lock:
+            self.faces = faces
+            self._by_family = {}
+            for face in faces:
+                for name in face['families'] + face['full_names'] + [face['postscript'] or '']:
+                    if name:
+                        self._by_family.setdefault(name.lower(), []).append(face)
+            # 同名字体中常规字重、覆盖最广的排在前面（libass 默认选用常规字重）
+            for matches in self._by_family.values():
+                matches.sort(key=lambda face: (not face['regular'], -len(face['coverage'])))
+            self._selection_cache = {}
+
+        return {'files': len(files), 'faces': len(faces), 'parsed': parsed, 'cached': len(files) - parsed}
+
+    def find_family(self, name):
+        """
+        按家族名/全名/PostScript 名查找字体（不区分大小写）
+
+        Returns:
+            list: 匹配的字体
+        """
+        return self._by_family.get((name or '').lower(), [])
+
+    def faces_for_file(self, path):
+        """字体文件中的所有字体"""
+        path = os.path.abspath(path)
+        return [face for face in self.faces if face['path'] == path]
+
+    def _preference(self, face, preferred):
+        """排序键：推荐字体优先（主家族名匹配优先于别名），其次常规字重、项目 fonts/ 目录中的字体"""
+        rank = len(preferred)
+        for name in face['families']:
+            if name.lower() in preferred:
+                penalty = 0 if name == face['family'] else 0.5
+                rank = min(rank, preferred[name.lower()] + penalty)
+        in_project = face['path'].startswith(os.path.abspath(FONTS_DIR))
+        return (rank, not face['regular'], not in_project, face['path'], face['index'])
+
+    def select_fonts(self, chars, language_code=None):
+        """
+        贪心集合覆盖：选出覆盖全部字符的最少字体
+
+        每一轮选择覆盖剩余字符最多的字体，覆盖数相同时优先该语种的推荐字体和项目 fonts/ 中的字体。
+
+        Args:
+            chars: 需要的字符集合
+            language_code: 语种代码（用于推荐字体排序）
+
+        Returns:
+            dict: {'fonts': [字体, ...], 'missing': 无任何字体覆盖的字符（字符串）}
+        """
+        codepoints = frozenset(ord(c) for c in chars)
+        cache_key = (codepoints, (language_code or '').upper())
+        with self._lock:
+            if cache_key in self._selection_cache:
+                return self._selection_cache[cache_key]
+            faces = list(self.faces)
+
+        preferred = {}
+        if language_code:
+            for i, name in enumerate(get_font_for_language(language_code)):
+                preferred.setdefault(name.lower(), i)
+        faces.sort(key=lambda face: self._preference(face, preferred))
+
+        remaining = set(codepoints)
+        selected = []
+        while remaining and faces:
+            by_block = group_by_block(remaining)
+            best, best_covered = None, set()
+            for face in faces:
+                covered = face['coverage'].covered(by_block)
+                if len(covered) > len(best_covered):
+                    best, best_covered = face, covered
+                    if len(covered) == len(remaining):
+                        break
+            if best is None:
+                break
+            selected.append(best)
+            remaining -= best_covered
+            faces.remove(best)
+
+        result = {
+            'fonts': selected,
+            'missing': ''.join(sorted(chr(cp) for cp in remaining)),
+        }
+        with self._lock:
+            self._selection_cache[cache_key] = result
+        return result
+
+    def missing_chars(self, chars, faces):
+        """
+        指定字体组合缺少的字符
+
+        Args:
+            chars: 需要的字符集合
+            faces: 字体列表
+
+        Returns:
+            str: 缺少的字符（排序后）
+        """
+        remaining = {ord(c) for c in chars}
+        for face in faces:
+            if not remaining:
+                break
+            remaining -= face['coverage'].covered(group_by_block(remaining))
+        return ''.join(sorted(chr(cp) for cp in remaining))
+
+
+def style_font_faces(index, subtitle_style):
+    """
+    样式中明确指定的字体（font_file 或 font_name）
+
+    Returns:
+        list: 字体列表；未指定返回None，指定了但不在索引中返回空列表
+    """
+    if not subtitle_style:
+        return None
+    for key in ('font_file', 'font_name'):
+        value = subtitle_style.get(key)
+        if not value:
+            continue
+        if key == 'font_file' or '/' in value or '\\' in value or value.lower().endswith(INDEXABLE_EXTENSIONS):
+            if os.path.exists(value):
+                return index.faces_for_file(value)
+            continue
+        return index.find_family(value)
+    return None
+
+
+def check_coverage(chars, subtitle_style=None, language_code=None, index=None):
+    """
+    检查字幕字符能否被完整显示
+
+    libass 会为主字体缺少的字形查找回退字体，所以只有索引中没有任何字体覆盖的字符才会显示为方框；
+    明确指定的字体缺少的字符单独列出（会使用回退字体显示）。
+
+    Args:
+        chars: 字幕需要的字符集合
+        subtitle_style: 字幕样式配置
+        language_code: 语种代码
+        index: FontIndex（默认使用共享索引）
+
+    Returns:
+        dict: {'checked': 是否完成检查, 'fonts': 选用的字体, 'missing': 无字体覆盖的字符, 'fallback': 主字体缺少的字符}
+    """
+    index = index or get_font_index()
+    if not index.faces:
+        return {'checked': False, 'fonts': [], 'missing': '', 'fallback': ''}
+
+    selection = index.select_fonts(chars, language_code)
+    result = {'checked': True, 'fonts': selection['fonts'], 'missing': selection['missing'], 'fallback': ''}
+
+    explicit = style_font_faces(index, subtitle_style)
+    if explicit:
+        result['fonts'] = explicit[:1]
+        result['fallback'] = index.missing_chars(chars, explicit[:1])
+    return result
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_font_index():
+    """获取进程内共享的字体索引（首次调用时扫描）"""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = FontIndex()
+            _default_index.scan()
+        return _default_index
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="字体码位覆盖索引")
+    parser.add_argument('subtitle', nargs='?', help="字幕文件：为其选择字体并检查缺字")
+    parser.add_argument('--lang', help="语种代码")
+    parser.add_argument('--dir', action='append', help="字体目录（可多次指定，默认 fonts/ + 系统字体目录）")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    font_index = FontIndex(args.dir) if args.dir else get_font_index()
+    stats = font_index.scan() if args.dir else None
+    print(f"字体: {len(font_index.faces)} 个 (耗时 {(time.perf_counter() - t0) * 1000:.1f} ms)")
+    if stats:
+        print(f"  解析 {stats['parsed']} 个文件，缓存命中 {stats['cached']} 个")
+
+    if args.subtitle:
+        t0 = time.perf_counter()
+        needed = subtitle_charset(args.subtitle)
+        selection = font_index.select_fonts(needed, args.lang)
+        print(f"字幕字符: {len(needed)} 个 (选择耗时 {(time.perf_counter() - t0) * 1000:.1f} ms)")
+        for face in selection['fonts']:
+            print(f"  ✓ {face['family']}  ({face['path']})")
+        if selection['missing']:
+            print(f"  ✗ 缺字 {len(selection['missing'])} 个: {selection['missing'][:80]}")
+    else:
+        for face in font_index.faces[:50]:
+            print(f"  {face['family']}: {len(face['coverage'])} 个码位 ({os.path.basename(face['path'])})")
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务字体目录模块 - 为每组字体生成只包含所需字体的最小 fontsdir（硬链接），可选按字幕字符子集化大字体
+Task Fonts Directory Module - Builds minimal per-task fontsdirs from hardlinks and optionally subsets large fonts to the glyphs a subtitle uses
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+import time
+
+from media_probe import CACHE_DIR
+
+try:
+    from fontTools import subset as ft_subset
+except ImportError:
+    ft_subset = None
+
+FONTSDIR_ROOT = CACHE_DIR / 'fontsdirs'
+SUBSET_DIR = CACHE_DIR / 'font_subsets'
+
+# 小于此大小的字体不值得子集化（libass 加载成本主要来自大型 CJK 字体）
+SUBSET_MIN_BYTES = 2 * 1024 * 1024
+
+# 字体缓存（fontsdirs + font_subsets）的空间上限和最长保留时间，批次开始时按最近使用时间淘汰
+FONT_CACHE_LIMIT = 2 * 1024 ** 3
+FONT_CACHE_MAX_AGE = 30 * 24 * 3600
+
+# 中断留下的临时目录超过此时间后删除（秒）
+STALE_TMP_SECONDS = 3600
+
+_build_lock = threading.Lock()
+
+
+def _signature(path):
+    st = os.stat(path)
+    return f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+
+
+def charset_hash(chars):
+    """字符集摘要（与顺序无关）"""
+    return hashlib.sha1(''.join(sorted(set(chars))).encode('utf-8', errors='surrogatepass')).hexdigest()[:16]
+
+
+def _link_or_copy(src, dst):
+    """硬链接 -> 符号链接 -> 复制（跨文件系统时硬链接不可用）"""
+    try:
+        os.link(src, dst)
+        return 'link'
+    except OSError:
+        pass
+    try:
+        os.symlink(os.path.abspath(src), dst)
+        return 'symlink'
+    except (OSError, NotImplementedError):
+        pass
+    shutil.copy2(src, dst)
+    return 'copy'
+
+
+def subset_font(font_path, chars, font_number=0):
+    """
+    把字体子集化为只包含指定字符的字形（按 字体+字符集 缓存）
+
+    保留全部 OpenType 布局特性和名称表，阿拉伯语、泰语等需要字形变换的文字仍能正确排版，
+    FontName 也与原字体一致。
+
+    Args:
+        font_path: 字体文件路径
+        chars: 需要的字符集合
+        font_number: TTC 字体集合中的字体序号
+
+    Returns:
+        str: 子集字体路径；未安装 fontTools、字体太小或失败时返回None
+    """
+    if ft_subset is None or not chars:
+        return None
+    try:
+        if os.path.getsize(font_path) < SUBSET_MIN_BYTES:
+            return None
+        key = hashlib.sha1(f"{_signature(font_path)}|{font_number}|{charset_hash(chars)}".encode('utf-8')).hexdigest()
+    except OSError:
+        return None
+
+    ext = os.path.splitext(font_path)[1].lower()
+    ext = '.otf' if ext in ('.otf', '.otc') else '.ttf'
+    output_path = SUBSET_DIR / f"{key}{ext}"
+    if output_path.exists():
+        return str(output_path)
+
+    options = ft_subset.Options()
+    options.font_number = font_number
+    options.layout_features = ['*']
+    options.name_IDs = ['*']
+    options.name_languages = ['*']
+    options.name_legacy = True
+    options.notdef_outline = True
+    options.glyph_names = False
+    options.hinting = False
+
+    try:
+        os.makedirs(SUBSET_DIR, exist_ok=True)
+        font = ft_subset.load_font(font_path, options, dontLoadGlyphNames=True)
+        subsetter = ft_subset.Subsetter(options)
+        subsetter.populate(unicodes={ord(c) for c in chars})
+        subsetter.subset(font)
+        tmp_path = f"{output_path}.tmp{os.getpid()}.{threading.get_ident()}"
+        ft_subset.save_font(font, tmp_path, options)
+        os.replace(tmp_path, output_path)
+    except Exception as e:
+        print(f"字体子集化失败，使用完整字体: {os.path.basename(font_path)}: {e}")
+        return None
+    return str(output_path)
+
+
+def fonts_signature(fonts, chars=None, subset=False):
+    """
+    字体组合的签名（只读取文件元数据，不生成目录）：相同签名的 build_fonts_dir 结果相同
+
+    Args:
+        fonts: 同 build_fonts_dir
+        chars: 字幕需要的字符集合（子集化时计入签名）
+        subset: 是否子集化
+
+    Returns:
+        str: 签名，fonts 为空时为空字符串
+    """
+    parts = []
+    for font in fonts:
+        path, index = (font, 0) if isinstance(font, str) else (font['path'], font.get('index', 0))
+        try:
+            parts.append(f"{_signature(path)}|{index}")
+        except OSError:
+            parts.append(f"{os.path.abspath(path)}|missing")
+    if parts and subset and chars:
+        parts.append(f"subset:{charset_hash(chars)}")
+    return '\n'.join(parts)
+
+
+def build_fonts_dir(fonts, chars=None, subset=False):
+    """
+    生成只包含指定字体的 fontsdir（内容相同的任务共享同一目录）
+
+    libass 启动时会读取 fontsdir 中的每个文件，指向整个 fonts/ 目录时每个 ffmpeg 进程都要加载全部字体。
+
+    Args:
+        fonts: 字体列表，元素为字体文件路径或 {'path', 'index'} 字典（font_index 的字体）
+        chars: 字幕需要的字符集合（子集化时使用）
+        subset: 是否把大字体子集化为只含 chars 的字形
+
+    Returns:
+        str: 目录路径，没有可用字体时返回None
+    """
+    sources = []
+    for font in fonts:
+        path, index = (font, 0) if isinstance(font, str) else (font['path'], font.get('index', 0))
+        if not os.path.isfile(path):
+            continue
+        if subset and chars:
+            path = subset_font(path, chars, index) or path
+        if path not in sources:
+            sources.append(path)
+
+    if not sources:
+        return None
+
+    try:
+        key = hashlib.sha1('\n'.join(_signature(p) for p in sources).encode('utf-8')).hexdigest()[:20]
+    except OSError:
+        return None
+    target = FONTSDIR_ROOT / key
+    if target.is_dir():
+        _touch(target)
+        return str(target)
+
+    with _build_lock:
+        if target.is_dir():
+            return str(target)
+        os.makedirs(FONTSDIR_ROOT, exist_ok=True)
+        tmp_dir = FONTSDIR_ROOT / f".{key}.tmp{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        used = set()
+        for path in sources:
+            name = os.path.basename(path)
+            # 不同目录中的同名字体加序号区分
+            stem, ext = os.path.splitext(name)
+            n = 1
+            while name.lower() in used:
+                name = f"{stem}_{n}{ext}"
+                n += 1
+            used.add(name.lower())
+            _link_or_copy(path, str(tmp_dir / name))
+        try:
+            os.rename(tmp_dir, target)
+        except OSError:
+            # 其他进程已生成同一目录
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return str(target)
+
+
+def _touch(path):
+    """更新 fontsdir 的修改时间作为最近使用时间（目录的时间不影响任何签名）"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _scandir(path):
+    try:
+        return list(os.scandir(path))
+    except OSError:
+        return []
+
+
+def evict_font_cache(max_bytes=FONT_CACHE_LIMIT, max_age=FONT_CACHE_MAX_AGE, now=None):
+    """
+    按最近使用时间 (LRU) 淘汰生成的 fontsdir 和子集字体（在批次开始、没有编码进行时调用）
+
+    fontsdir 每次复用时更新修改时间；超过 max_age 未使用或总大小超过 max_bytes 时从最久未使用的开始删除。
+    子集字体不再被任何 fontsdir 链接时一并删除。指向 fonts/ 和系统字体的硬链接不占用额外空间，不计入大小。
+
+    Args:
+        max_bytes: 空间上限（字节）
+        max_age: 最长保留时间（秒）
+        now: 当前时间（测试用）
+
+    Returns:
+        dict: {'removed': 删除的 fontsdir 数, 'subsets_removed', 'freed': 释放字节数, 'remaining': 剩余字节数}
+    """
+    now = time.time() if now is None else now
+    stats = {'removed': 0, 'subsets_removed': 0, 'freed': 0, 'remaining': 0}
+
+    with _build_lock:
+        # 子集字体：inode -> [路径, 大小, 链接它的 fontsdir 数]
+        subsets = {}
+        for entry in _scandir(SUBSET_DIR):
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            if entry.is_file(follow_symlinks=False):
+                subsets[(st.st_dev, st.st_ino)] = [entry.path, st.st_size, 0]
+
+        dirs = []
+        for entry in _scandir(FONTSDIR_ROOT):
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            try:
+                mtime = entry.stat(follow_symlinks=False).st_mtime
+            except OSError:
+                continue
+            if entry.name.startswith('.'):
+                if now - mtime > STALE_TMP_SECONDS:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                continue
+            own, linked = 0, []
+            for item in _scandir(entry.path):
+                try:
+                    # 跟随符号链接（无法硬链接时链接到子集字体）
+                    st = item.stat()
+                except OSError:
+                    continue
+                key = (st.st_dev, st.st_ino)
+                if key in subsets:
+                    subsets[key][2] += 1
+                    linked.append(key)
+                elif item.is_file(follow_symlinks=False) and st.st_nlink == 1:
+                    # 跨文件系统时复制的字体
+                    own += st.st_size
+            dirs.append((mtime, entry.path, own, linked))
+
+        total = sum(d[2] for d in dirs) + sum(s[1] for s in subsets.values())
+
+        def remove_subset(key):
+            nonlocal total
+            path, size, _ = subsets.pop(key)
+            try:
+                os.remove(path)
+            except OSError:
+                return
+            total -= size
+            stats['subsets_removed'] += 1
+            stats['freed'] += size
+
+        # 没有 fontsdir 使用的子集字体
+        for key in [k for k, s in subsets.items() if s[2] == 0]:
+            remove_subset(key)
+
+        for mtime, path, own, linked in sorted(dirs):
+            if now - mtime <= max_age and total <= max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= own
+            stats['removed'] += 1
+            stats['freed'] += own
+            for key in linked:
+                if key in subsets:
+                    subsets[key][2] -= 1
+                    if subsets[key][2] <= 0:
+                        remove_subset(key)
+
+    stats['remaining'] = total
+    return stats
+
+
+def clear_fonts_dirs():
+    """删除所有生成的 fontsdir 和子集字体（原字体不受影响）"""
+    shutil.rmtree(FONTSDIR_ROOT, ignore_errors=True)
+    shutil.rmtree(SUBSET_DIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) < 2:
+        print("用法: python font_workdir.py <字体文件> [字体文件...] [--subset 字幕文件]")
+        sys.exit(1)
+
+    args = sys.argv[1:]
+    subset_chars = None
+    if '--subset' in args:
+        from font_index import subtitle_charset
+        i = args.index('--subset')
+        subset_chars = subtitle_charset(args[i + 1])
+        args = args[:i] + args[i + 2:]
+        if ft_subset is None:
+            print("未安装 fontTools（pip install fonttools），跳过子集化")
+
+    directory = build_fonts_dir(args, subset_chars, subset=subset_chars is not None)
+    print(f"fontsdir: {directory}")
+    if directory:
+        for entry in sorted(os.listdir(directory)):
+            size = os.path.getsize(os.path.join(directory, entry))
+            print(f"  {entry}  {size / 1024:.0f} KB")
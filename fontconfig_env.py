@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+fontconfig 环境模块 - 生成私有 fontconfig 配置并预热持久缓存，所有 ffmpeg 子进程共享，避免 libass 每次启动重建字体缓存
+Fontconfig Environment Module - Generates a private fontconfig config with a pre-warmed persistent cache shared by every ffmpeg child
+"""
+
+import hashlib
+import os
+import platform
+import shutil
+import subprocess
+import threading
+from xml.sax.saxutils import escape
+
+from font_config import FONTS_DIR
+from font_index import system_font_dirs
+from media_probe import CACHE_DIR
+
+FONTCONFIG_DIR = CACHE_DIR / 'fontconfig'
+FONTCONFIG_FILE = FONTCONFIG_DIR / 'fonts.conf'
+FONTCONFIG_CACHE_DIR = FONTCONFIG_DIR / 'cache'
+WARM_STAMP = FONTCONFIG_DIR / 'warm.stamp'
+
+# 系统 fontconfig 规则目录（别名、替换规则等，不包含缓存目录设置）
+SYSTEM_CONF_D = '/etc/fonts/conf.d'
+
+FC_CACHE_BIN = os.environ.get('FC_CACHE_BIN', 'fc-cache')
+
+_env = None
+_env_lock = threading.Lock()
+
+
+def uses_fontconfig():
+    """libass 是否通过 fontconfig 查找字体（Windows 使用 DirectWrite，macOS 使用 CoreText）"""
+    return platform.system() not in ('Windows', 'Darwin')
+
+
+def font_dirs():
+    """私有配置中索引的字体目录：项目 fonts/ + 系统字体目录"""
+    dirs = [str(FONTS_DIR)] if FONTS_DIR.is_dir() else []
+    dirs.extend(system_font_dirs())
+    return list(dict.fromkeys(os.path.abspath(d) for d in dirs))
+
+
+def dirs_signature(dirs):
+    """
+    字体目录的签名（目录及子目录的修改时间），字体增删后签名变化
+
+    Returns:
+        str: 十六进制摘要
+    """
+    digest = hashlib.sha1()
+    for font_dir in dirs:
+        for root, subdirs, _ in os.walk(font_dir):
+            subdirs.sort()
+            try:
+                digest.update(f"{root}|{os.stat(root).st_mtime_ns}\n".encode('utf-8', errors='surrogateescape'))
+            except OSError:
+                continue
+    return digest.hexdigest()
+
+
+def write_config(dirs):
+    """
+    生成私有 fonts.conf
+
+    Args:
+        dirs: 字体目录列表
+
+    Returns:
+        str: 配置文件路径
+    """
+    lines = [
+        '<?xml version="1.0"?>',
+        '<!DOCTYPE fontconfig SYSTEM "urn:fontconfig:fonts.dtd">',
+        '<fontconfig>',
+    ]
+    lines.extend(f'  <dir>{escape(d)}</dir>' for d in dirs)
+    lines.append(f'  <cachedir>{escape(str(FONTCONFIG_CACHE_DIR.resolve()))}</cachedir>')
+    if os.path.isdir(SYSTEM_CONF_D):
+        lines.append(f'  <include ignore_missing="yes">{escape(SYSTEM_CONF_D)}</include>')
+    lines.append('</fontconfig>')
+    content = '\n'.join(lines) + '\n'
+
+    os.makedirs(FONTCONFIG_CACHE_DIR, exist_ok=True)
+    try:
+        with open(FONTCONFIG_FILE, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                return str(FONTCONFIG_FILE)
+    except OSError:
+        pass
+    tmp_path = f"{FONTCONFIG_FILE}.tmp{os.getpid()}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, FONTCONFIG_FILE)
+    return str(FONTCONFIG_FILE)
+
+
+def warm_cache(config_path, dirs, force=False, timeout=600):
+    """
+    运行 fc-cache 预热私有缓存（字体目录未变化时跳过，需要 fc-cache）
+
+    Args:
+        config_path: fonts.conf 路径
+        dirs: 字体目录列表
+        force: 是否强制重建
+        timeout: 超时时间（秒）
+
+    Returns:
+        bool: 缓存是否可用
+    """
+    signature = dirs_signature(dirs)
+    if not force:
+        try:
+            with open(WARM_STAMP, 'r', encoding='utf-8') as f:
+                if f.read().strip() == signature:
+                    return True
+        except OSError:
+            pass
+
+    env = dict(os.environ, FONTCONFIG_FILE=config_path)
+    cmd = [FC_CACHE_BIN] + (['-f'] if force else [])
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env, timeout=timeout)
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    if result.returncode != 0:
+        return False
+
+    with open(WARM_STAMP, 'w', encoding='utf-8') as f:
+        f.write(signature)
+    return True
+
+
+def prepare_fontconfig(force=False):
+    """
+    生成私有配置并预热缓存
+
+    Args:
+        force: 是否强制重建缓存
+
+    Returns:
+        dict: 需要传给 ffmpeg 子进程的环境变量（不使用 fontconfig 或预热失败时为空）
+    """
+    if not uses_fontconfig():
+        return {}
+    try:
+        dirs = font_dirs()
+        config_path = write_config(dirs)
+        if shutil.which(FC_CACHE_BIN) is None:
+            # 没有 fc-cache 时由第一个 ffmpeg 进程建立缓存，之后的进程共享
+            return {'FONTCONFIG_FILE': config_path}
+        if not warm_cache(config_path, dirs, force=force):
+            return {}
+    except OSError as e:
+        print(f"fontconfig 缓存不可用: {e}")
+        return {}
+    return {'FONTCONFIG_FILE': config_path}
+
+
+def ffmpeg_env():
+    """
+    ffmpeg 子进程使用的环境变量（首次调用时生成配置并预热缓存，之后直接复用）
+
+    Returns:
+        dict: 完整环境变量
+    """
+    global _env
+    with _env_lock:
+        if _env is None:
+            _env = dict(os.environ, **prepare_fontconfig())
+        return _env
+
+
+def reset_ffmpeg_env():
+    """字体目录变化后（如新增字体）重新生成环境"""
+    global _env
+    with _env_lock:
+        _env = None
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    t0 = time.perf_counter()
+    extra = prepare_fontconfig(force='--force' in sys.argv)
+    elapsed = time.perf_counter() - t0
+    if extra:
+        print(f"FONTCONFIG_FILE={extra['FONTCONFIG_FILE']}")
+        print(f"缓存目录: {FONTCONFIG_CACHE_DIR}")
+        print(f"字体目录: {', '.join(font_dirs())}")
+        print(f"已预热: {'是' if WARM_STAMP.exists() else '否（未安装 fc-cache，由第一个 ffmpeg 进程建立）'}")
+        print(f"耗时: {elapsed:.2f} 秒")
+    elif not uses_fontconfig():
+        print("当前平台的 libass 不使用 fontconfig，无需预热")
+    else:
+        print("未能生成或预热 fontconfig 缓存，ffmpeg 将使用系统默认配置")
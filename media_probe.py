@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+媒体信息探测模块 - 使用 ffprobe 获取视频时长、分辨率和编码信息，结果持久化缓存到 SQLite
+Media Probe Module - Uses ffprobe to get duration, resolution and codec info, cached persistently in SQLite
+"""
+
+import json
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+FFPROBE_BIN = os.environ.get('FFPROBE_BIN', 'ffprobe')
+
+# 缓存目录（可通过环境变量 BATCHSRT_CACHE_DIR 修改）
+CACHE_DIR = Path(os.environ.get('BATCHSRT_CACHE_DIR', Path(__file__).parent / 'cache'))
+METADATA_DB = CACHE_DIR / 'media_metadata.sqlite3'
+
+
+def run_ffprobe(path, extra_args=None, timeout=60):
+    """
+    运行 ffprobe 并返回 JSON 结果
+
+    Args:
+        path: 媒体文件路径
+        extra_args: 额外的 ffprobe 参数
+        timeout: 超时时间（秒）
+
+    Returns:
+        dict: ffprobe 的 JSON 输出，失败返回None
+    """
+    cmd = [FFPROBE_BIN, '-v', 'error', '-print_format', 'json']
+    cmd.extend(extra_args or ['-show_format', '-show_streams'])
+    cmd.append(path)
+
+    try:
+        result = subprocess.run(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=timeout
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+
+    if result.returncode != 0:
+        return None
+
+    try:
+        return json.loads(result.stdout.decode('utf-8', errors='replace'))
+    except ValueError:
+        return None
+
+
+def probe_keyframes(path, timeout=600):
+    """
+    读取视频流的关键帧时间点（只解复用数据包，不解码）
+
+    Args:
+        path: 视频文件路径
+        timeout: 超时时间（秒）
+
+    Returns:
+        list: 关键帧时间（秒），失败返回None
+    """
+    data = run_ffprobe(path, [
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+    ], timeout=timeout)
+    if data is None:
+        return None
+
+    keyframes = []
+    for packet in data.get('packets', []):
+        if 'K' in packet.get('flags', '') and packet.get('pts_time') not in (None, 'N/A'):
+            keyframes.append(float(packet['pts_time']))
+    keyframes.sort()
+    return keyframes
+
+
+def summarize_probe(data, size=0):
+    """
+    从 ffprobe JSON 中提取常用字段
+
+    Args:
+        data: ffprobe 输出（包含 format 和 streams）
+        size: 文件大小（字节）
+
+    Returns:
+        dict: {'duration', 'width', 'height', 'video_codec', 'audio_codec', 'bit_rate', 'size', ...}
+    """
+    fmt = data.get('format', {}) if data else {}
+    streams = data.get('streams', []) if data else []
+
+    video = next((s for s in streams if s.get('codec_type') == 'video'), {})
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), {})
+
+    def _float(value, default=0.0):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return default
+
+    duration = _float(fmt.get('duration')) or _float(video.get('duration'))
+
+    return {
+        'duration': duration,
+        'width': int(video.get('width') or 0),
+        'height': int(video.get('height') or 0),
+        'video_codec': video.get('codec_name'),
+        'audio_codec': audio.get('codec_name'),
+        'format_name': fmt.get('format_name'),
+        'bit_rate': int(_float(fmt.get('bit_rate'))),
+        'stream_count': len(streams),
+        'size': size or int(_float(fmt.get('size'))),
+    }
+
+
+class MetadataCache:
+    """
+    ffprobe 元数据持久化缓存
+
+    以 路径+大小+修改时间 为键保存 ffprobe 的 stream/format 信息和可选的关键帧索引，
+    文件变化后自动失效。内存中保留一层热缓存，多线程共享同一个连接。
+    """
+
+    def __init__(self, db_path=None):
+        """
+        Args:
+            db_path: SQLite 数据库路径（默认 cache/media_metadata.sqlite3，传 ':memory:' 仅用内存）
+        """
+        self.db_path = str(db_path or METADATA_DB)
+        if self.db_path != ':memory:':
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._memory = {}
+        self._path_locks = {}
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        if self.db_path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS media (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                probe TEXT,
+                keyframes BLOB,
+                updated REAL
+            )
+        ''')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS stats (
+                key TEXT PRIMARY KEY,
+                value REAL,
+                updated REAL
+            )
+        ''')
+        self._conn.commit()
+
+    @staticmethod
+    def _stat(path):
+        st = os.stat(path)
+        return os.path.abspath(path), st.st_size, st.st_mtime_ns
+
+    def _load_row(self, key, size, mtime_ns):
+        """读取数据库记录，大小或修改时间不一致视为失效"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT size, mtime_ns, probe, keyframes FROM media WHERE path = ?', (key,)
+            ).fetchone()
+        if row is None or row[0] != size or row[1] != mtime_ns:
+            return None
+        return row
+
+    def _save(self, key, size, mtime_ns, probe=None, keyframes=None):
+        """写入或更新记录（只更新提供的字段）"""
+        probe_json = json.dumps(probe, ensure_ascii=False) if probe is not None else None
+        keyframe_blob = array('d', keyframes).tobytes() if keyframes is not None else None
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT size, mtime_ns, probe, keyframes FROM media WHERE path = ?', (key,)
+            ).fetchone()
+            if row is not None and row[0] == size and row[1] == mtime_ns:
+                probe_json = probe_json if probe_json is not None else row[2]
+                keyframe_blob = keyframe_blob if keyframe_blob is not None else row[3]
+            self._conn.execute(
+                'INSERT OR REPLACE INTO media (path, size, mtime_ns, probe, keyframes, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, size, mtime_ns, probe_json, keyframe_blob, time.time())
+            )
+            self._conn.commit()
+
+    def get_probe(self, path, refresh=True):
+        """
+        获取 ffprobe 原始结果（format + streams）
+
+        Args:
+            path: 媒体文件路径
+            refresh: 缓存未命中时是否运行 ffprobe
+
+        Returns:
+            dict: ffprobe JSON，失败或未命中返回None
+        """
+        try:
+            key, size, mtime_ns = self._stat(path)
+        except OSError:
+            return None
+
+        memory_key = (key, size, mtime_ns)
+        with self._lock:
+            if memory_key in self._memory:
+                return self._memory[memory_key]
+
+        # 同一文件只允许一个线程运行 ffprobe（后台预热与调度可能同时请求）
+        with self._lock:
+            path_lock = self._path_locks.setdefault(key, threading.Lock())
+
+        with path_lock:
+            with self._lock:
+                if memory_key in self._memory:
+                    return self._memory[memory_key]
+
+            row = self._load_row(key, size, mtime_ns)
+            if row is not None and row[2] is not None:
+                probe = json.loads(row[2])
+            elif refresh:
+                probe = run_ffprobe(path)
+                if probe is None:
+                    return None
+                self._save(key, size, mtime_ns, probe=probe)
+            else:
+                return None
+
+            with self._lock:
+                self._memory[memory_key] = probe
+            return probe
+
+    def get_info(self, path, refresh=True):
+        """
+        获取媒体摘要信息（时长、分辨率、编码器等）
+
+        Returns:
+            dict: summarize_probe 的结果，失败返回None
+        """
+        probe = self.get_probe(path, refresh)
+        if probe is None:
+            return None
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        return summarize_probe(probe, size=size)
+
+    def is_cached(self, path):
+        """是否已有有效的元数据缓存"""
+        return self.get_probe(path, refresh=False) is not None
+
+    def get_keyframes(self, path, refresh=True):
+        """
+        获取关键帧时间索引
+
+        Args:
+            path: 视频文件路径
+            refresh: 缓存未命中时是否运行 ffprobe
+
+        Returns:
+            array: array('d') 关键帧时间（秒），失败返回None
+        """
+        try:
+            key, size, mtime_ns = self._stat(path)
+        except OSError:
+            return None
+
+        row = self._load_row(key, size, mtime_ns)
+        if row is not None and row[3] is not None:
+            keyframes = array('d')
+            keyframes.frombytes(row[3])
+            return keyframes
+
+        if not refresh:
+            return None
+        keyframes = probe_keyframes(path)
+        if keyframes is None:
+            return None
+        self._save(key, size, mtime_ns, keyframes=keyframes)
+        return array('d', keyframes)
+
+    def get_stat(self, key, default=None):
+        """读取本机统计值（如实测编码吞吐）"""
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM stats WHERE key = ?', (key,)).fetchone()
+        return row[0] if row is not None else default
+
+    def set_stat(self, key, value):
+        """保存本机统计值"""
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO stats (key, value, updated) VALUES (?, ?, ?)',
+                (key, value, time.time())
+            )
+            self._conn.commit()
+
+    def warm(self, paths, keyframes=False, max_workers=8):
+        """
+        并行填充缓存
+
+        Args:
+            paths: 媒体文件路径列表
+            keyframes: 是否同时建立关键帧索引
+            max_workers: 并行 ffprobe 数量
+
+        Returns:
+            dict: 路径 -> 媒体摘要信息
+        """
+        unique_paths = list(dict.fromkeys(paths))
+        if not unique_paths:
+            return {}
+
+        def _warm_one(path):
+            info = self.get_info(path)
+            if keyframes and info is not None:
+                self.get_keyframes(path)
+            return info
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(unique_paths))) as pool:
+            return dict(zip(unique_paths, pool.map(_warm_one, unique_paths)))
+
+    def warm_async(self, paths, keyframes=False, max_workers=8):
+        """在后台线程中填充缓存，不阻塞调用方"""
+        thread = threading.Thread(target=self.warm, args=(list(paths), keyframes, max_workers), daemon=True)
+        thread.start()
+        return thread
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_metadata_cache():
+    """获取进程内共享的默认元数据缓存"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            try:
+                _default_cache = MetadataCache()
+            except (OSError, sqlite3.Error) as e:
+                print(f"元数据缓存不可用，改用内存缓存: {e}")
+                _default_cache = MetadataCache(':memory:')
+        return _default_cache
+
+
+def probe_media(path):
+    """
+    获取媒体文件信息（带持久化缓存）
+
+    Args:
+        path: 媒体文件路径
+
+    Returns:
+        dict: summarize_probe 的结果，探测失败返回None
+    """
+    return get_metadata_cache().get_info(path)
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) < 2:
+        print("用法: python media_probe.py <视频文件路径> [--keyframes]")
+        sys.exit(1)
+
+    cache = get_metadata_cache()
+    info = cache.get_info(sys.argv[1])
+    print(json.dumps(info, ensure_ascii=False, indent=2))
+    if '--keyframes' in sys.argv:
+        keyframes = cache.get_keyframes(sys.argv[1])
+        print(f"关键帧: {len(keyframes) if keyframes is not None else '失败'}")
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+输出去重模块 - 源文件内容 + 规范化字幕 + 渲染参数相同的任务只编码一次，其余输出用 reflink / 硬链接复用结果
+Output Dedup Module - Tasks with identical source content, normalized subtitles and render settings are encoded once; the other outputs reuse the result via reflink / hardlink
+"""
+
+import hashlib
+import os
+import threading
+import uuid
+
+from fingerprint import get_fingerprint_service
+from srt_parser import parse_srt_bytes
+from staging import copy_file
+from subtitle_preflight import _decode_subtitle
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Linux FICLONE ioctl（btrfs / XFS / bcachefs 等支持写时复制的文件系统）
+FICLONE = 0x40049409
+
+
+def subtitle_fingerprint(path, language_code=None):
+    """
+    规范化字幕指纹：忽略编码、BOM、换行符、序号和行尾空白的差异
+
+    Args:
+        path: 字幕文件路径
+        language_code: 语种代码（非 UTF-8 时辅助判断编码）
+
+    Returns:
+        str: 指纹，无法读取或解码时返回None
+    """
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read()
+    except OSError:
+        return None
+    text, _ = _decode_subtitle(raw, language_code)
+    if text is None:
+        return None
+    text = '\n'.join(line.rstrip() for line in text.replace('\r\n', '\n').replace('\r', '\n').split('\n')).strip()
+    data = text.encode('utf-8')
+    table = parse_srt_bytes(data)
+    if len(table):
+        # 按解析后的时间轴和文本重新生成，序号和时间戳格式的差异不影响结果
+        data = table.to_srt().encode('utf-8')
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def reflink(src, dst):
+    """写时复制克隆（不支持时抛出 OSError）"""
+    if fcntl is None:
+        raise OSError("reflink not supported")
+    with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+        fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+
+
+def link_output(src, dst):
+    """
+    把已编码的输出复用到另一个输出路径：reflink → 硬链接 → 复制
+
+    先链接到临时文件再原子替换，目标已存在时不会出现中间状态。
+
+    Args:
+        src: 已完成的输出文件
+        dst: 目标输出路径
+
+    Returns:
+        str: 'reflink' / 'hardlink' / 'copy'
+    """
+    os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+    temp = os.path.join(os.path.dirname(dst) or '.', f".{os.path.basename(dst)}.{uuid.uuid4().hex[:8]}.link")
+    try:
+        try:
+            reflink(src, temp)
+            method = 'reflink'
+        except OSError:
+            if os.path.exists(temp):
+                os.remove(temp)
+            try:
+                os.link(src, temp)
+                method = 'hardlink'
+            except OSError:
+                copy_file(src, temp)
+                method = 'copy'
+        os.replace(temp, dst)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    return method
+
+
+class OutputDeduplicator:
+    """
+    任务去重：按 (源文件采样指纹, 字幕指纹, 输出扩展名, 渲染签名) 分组，每组只保留一个编码任务
+
+    采样指纹只读取文件的一部分；候选组中有不同的源文件时，再对这些文件计算全文件哈希确认后才合并。
+    """
+
+    def __init__(self, render_signature=None, full_hash=False):
+        """
+        Args:
+            render_signature: 函数 task -> str，返回除字幕路径外影响输出的参数（字幕滤镜、字体等）
+            full_hash: 源文件使用全文件哈希（默认采样哈希）
+        """
+        self.render_signature = render_signature
+        self.full_hash = full_hash
+        self._lock = threading.Lock()
+        self.stats = {
+            'groups': 0,
+            'duplicates': 0,
+            'full_hashed': 0,
+            'false_matches': 0,
+            'linked': 0,
+            'failed': 0,
+            'methods': {},
+        }
+
+    def group(self, tasks):
+        """
+        分组去重
+
+        Args:
+            tasks: 任务字典列表
+
+        Returns:
+            list: 需要编码的任务（重复任务挂在 task['duplicates'] 上）
+        """
+        # 源文件指纹并行计算，重复扫描时命中 inode 缓存
+        source_fps = get_fingerprint_service().fingerprint_many([t['video_path'] for t in tasks], full=self.full_hash)
+        buckets = {}
+        for task in tasks:
+            source_fp = source_fps.get(task['video_path'])
+            subtitle_fp = subtitle_fingerprint(task['subtitle_path'], task.get('lang'))
+            if source_fp is None or subtitle_fp is None:
+                buckets[('unique', id(task))] = [task]
+                continue
+            ext = os.path.splitext(task['output_path'])[1].lower()
+            buckets.setdefault((source_fp, subtitle_fp, ext), []).append(task)
+
+        if not self.full_hash:
+            buckets = self._confirm(buckets)
+
+        primaries = []
+        for candidates in buckets.values():
+            if len(candidates) == 1:
+                primaries.append(candidates[0])
+                continue
+            # 候选组内再按渲染签名细分（语种不同可能选用不同字体）
+            groups = {}
+            for task in candidates:
+                signature = self.render_signature(task) if self.render_signature else ''
+                groups.setdefault(signature, []).append(task)
+            for members in groups.values():
+                primary = members[0]
+                primary['duplicates'] = members[1:]
+                primaries.append(primary)
+                if len(members) > 1:
+                    self.stats['groups'] += 1
+                    self.stats['duplicates'] += len(members) - 1
+
+        # 保持原有顺序
+        order = {id(task): i for i, task in enumerate(tasks)}
+        primaries.sort(key=lambda t: order[id(t)])
+        return primaries
+
+    def _confirm(self, buckets):
+        """
+        用全文件哈希确认采样指纹相同的不同源文件（只读取候选文件），内容不同的拆成独立的组
+
+        Args:
+            buckets: {(源文件采样指纹, 字幕指纹, 扩展名): [任务]}
+
+        Returns:
+            dict: 确认后的分组
+        """
+        candidates = set()
+        for tasks in buckets.values():
+            paths = {t['video_path'] for t in tasks}
+            if len(paths) > 1:
+                candidates |= paths
+        if not candidates:
+            return buckets
+
+        full_fps = get_fingerprint_service().fingerprint_many(sorted(candidates), full=True)
+        self.stats['full_hashed'] += len(candidates)
+
+        confirmed = {}
+        for key, tasks in buckets.items():
+            if len({t['video_path'] for t in tasks}) == 1:
+                confirmed[key] = tasks
+                continue
+            split = {}
+            for task in tasks:
+                full_fp = full_fps.get(task['video_path'])
+                split.setdefault(full_fp if full_fp is not None else ('unique', id(task)), []).append(task)
+            self.stats['false_matches'] += len(split) - 1
+            for full_key, members in split.items():
+                confirmed[key + (full_key,)] = members
+        return confirmed
+
+    def link(self, task):
+        """
+        编码任务成功后，把输出复用到同组的其他输出路径
+
+        Args:
+            task: 已成功完成的编码任务
+
+        Returns:
+            list: [(重复任务, 方式或None, 错误信息)]
+        """
+        results = []
+        for duplicate in task.get('duplicates', ()):
+            try:
+                method = link_output(task['output_path'], duplicate['output_path'])
+            except OSError as e:
+                results.append((duplicate, None, str(e)))
+                with self._lock:
+                    self.stats['failed'] += 1
+                continue
+            results.append((duplicate, method, None))
+            with self._lock:
+                self.stats['linked'] += 1
+                self.stats['methods'][method] = self.stats['methods'].get(method, 0) + 1
+        return results
+
+    def summary(self):
+        """去重统计（用于日志和状态接口）；encodes_saved 为实际复用成功的输出数"""
+        with self._lock:
+            return dict(self.stats, methods=dict(self.stats['methods']), encodes_saved=self.stats['linked'])
@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+输出目标模块 - 本地目录 / S3 兼容对象存储 / SFTP，编码完成的输出在有界上传池中与后续编码并行上传（分片 + 重试）
+Output Sink Module - Local directory / S3-compatible object storage / SFTP; finished outputs upload through a bounded pool concurrently with ongoing encodes (multipart + retries)
+"""
+
+import os
+import posixpath
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+
+from staging import copy_file
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config as BotoConfig
+except ImportError:
+    boto3 = None
+
+try:
+    import paramiko
+except ImportError:
+    paramiko = None
+
+# 分片上传阈值和分片大小
+MULTIPART_THRESHOLD = 64 * 1024 * 1024
+MULTIPART_CHUNKSIZE = 16 * 1024 * 1024
+
+# 上传池默认并发数 / 排队上限（超过时编码线程等待，避免本地输出堆积）
+DEFAULT_UPLOAD_WORKERS = 4
+DEFAULT_MAX_PENDING = 8
+
+# 失败重试次数和初始退避时间（秒）
+DEFAULT_RETRIES = 3
+RETRY_BACKOFF = 2.0
+
+# SFTP 主机密钥不在 known_hosts 中时的处理方式（默认拒绝连接，其余需在配置中显式指定）
+HOST_KEY_POLICIES = ('reject', 'warning', 'auto-add')
+USER_KNOWN_HOSTS = os.path.expanduser('~/.ssh/known_hosts')
+
+
+class SinkError(Exception):
+    """输出目标配置或依赖错误"""
+
+
+class LocalSink:
+    """本地（或挂载的网络）目录"""
+
+    kind = 'local'
+
+    def __init__(self, root):
+        self.root = root
+
+    def describe(self):
+        return self.root
+
+    def upload(self, local_path, key):
+        """复制到 root/key（先写临时文件再原子改名），返回字节数"""
+        target = os.path.join(self.root, *key.split('/'))
+        if os.path.abspath(target) == os.path.abspath(local_path):
+            return 0
+        os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+        return copy_file(local_path, target)
+
+    def close(self):
+        pass
+
+
+class S3Sink:
+    """
+    S3 兼容对象存储（AWS S3、MinIO、Ceph RGW 等）
+
+    大文件由 boto3 传输管理器自动分片并发上传，分片失败时只重传该分片。
+    """
+
+    kind = 's3'
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, region=None,
+                 access_key=None, secret_key=None, multipart_threshold=MULTIPART_THRESHOLD,
+                 multipart_chunksize=MULTIPART_CHUNKSIZE, max_concurrency=4):
+        if boto3 is None:
+            raise SinkError("S3 输出需要安装 boto3: pip install boto3")
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.endpoint_url = endpoint_url
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            # 请求级重试由 botocore 处理，文件级重试由 UploadPool 处理；
+            # 自定义端点（MinIO 等）通常不支持虚拟主机式的 bucket 域名，使用路径式寻址
+            config=BotoConfig(retries={'max_attempts': 5, 'mode': 'standard'},
+                              s3={'addressing_style': 'path'} if endpoint_url else None)
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunksize,
+            max_concurrency=max_concurrency,
+        )
+
+    def describe(self):
+        location = f"s3://{self.bucket}/{self.prefix}"
+        return f"{location} ({self.endpoint_url})" if self.endpoint_url else location
+
+    def upload(self, local_path, key):
+        object_key = posixpath.join(self.prefix, key) if self.prefix else key
+        self.client.upload_file(local_path, self.bucket, object_key, Config=self.transfer_config)
+        return os.path.getsize(local_path)
+
+    def close(self):
+        pass
+
+
+class SFTPSink:
+    """
+    SFTP 服务器（每个上传线程一个连接，先写 .partial 再改名）
+
+    主机密钥按系统和当前用户的 known_hosts 校验，未知主机默认拒绝连接；
+    可以指定额外的 known_hosts 文件，或显式选择 'warning' / 'auto-add' 策略。
+    """
+
+    kind = 'sftp'
+
+    def __init__(self, host, root='.', port=22, username=None, password=None, key_filename=None,
+                 known_hosts=None, host_key_policy='reject'):
+        if paramiko is None:
+            raise SinkError("SFTP 输出需要安装 paramiko: pip install paramiko")
+        if host_key_policy not in HOST_KEY_POLICIES:
+            raise SinkError(f"未知的主机密钥策略: {host_key_policy}（可选 {', '.join(HOST_KEY_POLICIES)}）")
+        if known_hosts and not os.path.isfile(os.path.expanduser(known_hosts)):
+            raise SinkError(f"known_hosts 文件不存在: {known_hosts}")
+        self.host = host
+        self.port = port
+        self.root = root or '.'
+        self.username = username
+        self.password = password
+        self.key_filename = key_filename
+        self.known_hosts = os.path.expanduser(known_hosts) if known_hosts else None
+        self.host_key_policy = host_key_policy
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def describe(self):
+        return f"sftp://{self.username + '@' if self.username else ''}{self.host}:{self.port}{self.root}"
+
+    def _sftp(self):
+        sftp = getattr(self._local, 'sftp', None)
+        if sftp is not None:
+            return sftp
+        client = self._client()
+        try:
+            client.connect(self.host, port=self.port, username=self.username, password=self.password,
+                           key_filename=self.key_filename)
+            sftp = client.open_sftp()
+        except Exception:
+            client.close()
+            raise
+        self._local.sftp = sftp
+        self._local.client = client
+        with self._lock:
+            self._connections.append((sftp, client))
+        return sftp
+
+    def _client(self):
+        """加载 known_hosts 并设置未知主机策略的 SSHClient"""
+        client = paramiko.SSHClient()
+        client.load_system_host_keys()
+        if os.path.isfile(USER_KNOWN_HOSTS):
+            client.load_system_host_keys(USER_KNOWN_HOSTS)
+        if self.known_hosts:
+            client.load_host_keys(self.known_hosts)
+        policies = {
+            'reject': paramiko.RejectPolicy,
+            'warning': paramiko.WarningPolicy,
+            'auto-add': paramiko.AutoAddPolicy,
+        }
+        client.set_missing_host_key_policy(policies[self.host_key_policy]())
+        return client
+
+    def _reset(self):
+        """连接出错后关闭并丢弃当前线程的连接（重试时重新连接）"""
+        sftp = getattr(self._local, 'sftp', None)
+        client = getattr(self._local, 'client', None)
+        self._local.sftp = None
+        self._local.client = None
+        if sftp is None:
+            return
+        with self._lock:
+            self._connections = [c for c in self._connections if c[0] is not sftp]
+        for connection in (sftp, client):
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def _makedirs(self, sftp, remote_dir):
+        parts = []
+        while remote_dir not in ('', '/', '.'):
+            parts.append(remote_dir)
+            remote_dir = posixpath.dirname(remote_dir)
+        for path in reversed(parts):
+            try:
+                sftp.stat(path)
+            except IOError:
+                sftp.mkdir(path)
+
+    def upload(self, local_path, key):
+        remote_path = posixpath.join(self.root, key)
+        partial = f"{remote_path}.partial"
+        try:
+            sftp = self._sftp()
+            self._makedirs(sftp, posixpath.dirname(remote_path))
+            sftp.put(local_path, partial)
+            sftp.posix_rename(partial, remote_path)
+        except Exception:
+            self._reset()
+            raise
+        return os.path.getsize(local_path)
+
+    def close(self):
+        with self._lock:
+            for sftp, client in self._connections:
+                try:
+                    sftp.close()
+                    client.close()
+                except Exception:
+                    pass
+            self._connections = []
+
+
+def create_sink(spec):
+    """
+    根据配置创建输出目标
+
+    支持字符串或字典：
+      - "/mnt/nas/out" 或 {"type": "local", "path": "/mnt/nas/out"}
+      - "s3://bucket/prefix?endpoint=http://127.0.0.1:9000" 或
+        {"type": "s3", "bucket": "...", "prefix": "...", "endpoint_url": "...", "access_key": "...", "secret_key": "..."}
+      - "sftp://user@host:22/path?known_hosts=~/.ssh/batch_hosts" 或
+        {"type": "sftp", "host": "...", "path": "...", "username": "...", "password": "...",
+         "known_hosts": "...", "host_key_policy": "reject"}
+
+    Args:
+        spec: 输出目标配置
+
+    Returns:
+        LocalSink / S3Sink / SFTPSink
+    """
+    if isinstance(spec, str):
+        parsed = urlparse(spec)
+        query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        if parsed.scheme == 's3':
+            spec = {
+                'type': 's3',
+                'bucket': parsed.netloc,
+                'prefix': parsed.path,
+                'endpoint_url': query.get('endpoint'),
+                'region': query.get('region'),
+            }
+        elif parsed.scheme == 'sftp':
+            spec = {
+                'type': 'sftp',
+                'host': parsed.hostname,
+                'port': parsed.port or 22,
+                'path': parsed.path or '.',
+                'username': parsed.username,
+                'password': parsed.password,
+                'key_filename': query.get('key'),
+                'known_hosts': query.get('known_hosts'),
+                'host_key_policy': query.get('host_key_policy', 'reject'),
+            }
+        else:
+            spec = {'type': 'local', 'path': spec}
+
+    kind = spec.get('type', 'local')
+    if kind == 'local':
+        if not spec.get('path'):
+            raise SinkError("本地输出目标缺少 path")
+        return LocalSink(spec['path'])
+    if kind == 's3':
+        if not spec.get('bucket'):
+            raise SinkError("S3 输出目标缺少 bucket")
+        return S3Sink(
+            spec['bucket'],
+            prefix=spec.get('prefix', ''),
+            endpoint_url=spec.get('endpoint_url') or os.environ.get('BATCHSRT_S3_ENDPOINT'),
+            region=spec.get('region'),
+            access_key=spec.get('access_key'),
+            secret_key=spec.get('secret_key'),
+            multipart_threshold=int(spec.get('multipart_threshold', MULTIPART_THRESHOLD)),
+            multipart_chunksize=int(spec.get('multipart_chunksize', MULTIPART_CHUNKSIZE)),
+        )
+    if kind == 'sftp':
+        if not spec.get('host'):
+            raise SinkError("SFTP 输出目标缺少 host")
+        return SFTPSink(
+            spec['host'],
+            root=spec.get('path', '.'),
+            port=int(spec.get('port', 22)),
+            username=spec.get('username'),
+            password=spec.get('password'),
+            key_filename=spec.get('key_filename'),
+            known_hosts=spec.get('known_hosts'),
+            host_key_policy=spec.get('host_key_policy') or 'reject',
+        )
+    raise SinkError(f"不支持的输出目标类型: {kind}")
+
+
+class UploadPool:
+    """
+    有界上传池：编码完成的输出提交后在后台上传，排队数达到上限时 submit 阻塞
+    """
+
+    def __init__(self, sink, workers=DEFAULT_UPLOAD_WORKERS, max_pending=DEFAULT_MAX_PENDING,
+                 retries=DEFAULT_RETRIES, delete_local=False, log=None):
+        """
+        Args:
+            sink: 输出目标
+            workers: 并发上传数
+            max_pending: 排队+上传中的最大文件数
+            retries: 单个文件失败后的重试次数
+            delete_local: 上传成功后删除本地输出
+            log: 日志函数
+        """
+        self.sink = sink
+        self.retries = retries
+        self.delete_local = delete_local
+        self.log = log or (lambda message: None)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='upload')
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self._lock = threading.Lock()
+        self._started = None
+        self._busy_seconds = 0.0
+        self.stats = {
+            'queued': 0,
+            'active': 0,
+            'uploaded': 0,
+            'failed': 0,
+            'retries': 0,
+            'bytes': 0,
+        }
+        self.failures = []
+
+    def submit(self, local_path, key):
+        """
+        提交一个输出文件
+
+        Args:
+            local_path: 本地输出文件
+            key: 目标中的相对路径（'/' 分隔）
+        """
+        self._slots.acquire()
+        with self._lock:
+            if self._started is None:
+                self._started = time.time()
+            self.stats['queued'] += 1
+        self._executor.submit(self._upload, local_path, key)
+
+    def _upload(self, local_path, key):
+        try:
+            with self._lock:
+                self.stats['queued'] -= 1
+                self.stats['active'] += 1
+            error = None
+            for attempt in range(self.retries + 1):
+                started = time.time()
+                try:
+                    size = self.sink.upload(local_path, key)
+                except Exception as e:
+                    error = e
+                    if attempt < self.retries:
+                        with self._lock:
+                            self.stats['retries'] += 1
+                        self.log(f"⚠️ 上传失败，重试 ({attempt + 1}/{self.retries}): {key} {e}")
+                        time.sleep(RETRY_BACKOFF * (2 ** attempt))
+                    continue
+                with self._lock:
+                    self._busy_seconds += time.time() - started
+                    self.stats['uploaded'] += 1
+                    self.stats['bytes'] += size
+                self.log(f"☁️ 已上传: {key}")
+                if self.delete_local:
+                    try:
+                        os.remove(local_path)
+                    except OSError:
+                        pass
+                return True
+
+            with self._lock:
+                self.stats['failed'] += 1
+                self.failures.append({'key': key, 'path': local_path, 'error': str(error)})
+            self.log(f"✗ 上传失败: {key} {error}")
+            return False
+        finally:
+            with self._lock:
+                self.stats['active'] -= 1
+            self._slots.release()
+
+    def summary(self):
+        """上传统计（用于日志和状态接口）"""
+        with self._lock:
+            elapsed = time.time() - self._started if self._started else 0.0
+            return dict(
+                self.stats,
+                sink=self.sink.describe(),
+                kind=self.sink.kind,
+                # 墙钟吞吐（与编码并行时的实际速度）
+                throughput=self.stats['bytes'] / elapsed if elapsed > 0 else 0.0,
+                # 单连接吞吐（上传耗时内的平均速度）
+                stream_throughput=self.stats['bytes'] / self._busy_seconds if self._busy_seconds > 0 else 0.0,
+                failures=list(self.failures),
+            )
+
+    def close(self, wait=True):
+        """等待全部上传结束并关闭连接"""
+        self._executor.shutdown(wait=wait)
+        self.sink.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    from readahead import format_bytes
+
+    parser = argparse.ArgumentParser(description="上传文件到输出目标（可用于测试本地 MinIO 等）")
+    parser.add_argument('sink', help="输出目标，如 /mnt/out、s3://bucket/prefix?endpoint=http://127.0.0.1:9000、sftp://user@host/path")
+    parser.add_argument('files', nargs='+', help="要上传的文件")
+    parser.add_argument('--workers', type=int, default=DEFAULT_UPLOAD_WORKERS, help="并发上传数")
+    args = parser.parse_args()
+
+    try:
+        pool = UploadPool(create_sink(args.sink), workers=args.workers, log=print)
+    except SinkError as e:
+        print(e)
+        sys.exit(1)
+    for path in args.files:
+        pool.submit(path, os.path.basename(path))
+    pool.close()
+    result = pool.summary()
+    print(f"上传 {result['uploaded']} 个, 失败 {result['failed']} 个, {format_bytes(result['bytes'])}, "
+          f"{format_bytes(result['throughput'])}/s")
+    sys.exit(1 if result['failed'] else 0)
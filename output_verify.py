@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+输出校验模块 - 编码完成后用 ffprobe 元数据（不解码）核对输出的时长、流数量和数据包数量是否与源文件一致，可选抽样解码的深度校验
+Output Verification Module - After an encode, checks the output's duration, stream count and packet count against the source using ffprobe metadata (no decode), with an optional sampled-decode deep mode
+"""
+
+import os
+import subprocess
+import threading
+import time
+from collections import deque
+
+from ffmpeg_runner import FFMPEG_BIN
+from media_probe import get_metadata_cache, run_ffprobe
+
+VERIFY_MODES = ('quick', 'deep')
+
+# 时长允许的误差：取 秒数 和 源时长比例 中较大者（音视频起始时间差、B 帧延迟等）
+DURATION_TOLERANCE = 1.0
+DURATION_TOLERANCE_RATIO = 0.01
+
+# 视频数据包允许少于源帧数的比例（可变帧率源转为固定帧率时会丢帧/补帧）
+PACKET_TOLERANCE_RATIO = 0.02
+
+# 文件头中没有帧数的封装格式：快速校验按 时长 × 帧率 估算帧数（两侧相同算法），
+# 深度校验才读取全部数据包计数（只解复用，不解码，但要读完整个文件）
+COUNT_PACKETS_EXTENSIONS = {'.mkv', '.webm', '.flv'}
+
+# 深度校验：均匀分布的抽样点数和每个抽样点解码的秒数（包含开头和结尾）
+DEEP_SAMPLES = 4
+DEEP_SAMPLE_SECONDS = 1.0
+
+PROBE_TIMEOUT = 60
+DECODE_TIMEOUT = 120
+
+
+def _float(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _frame_rate(stream):
+    """'30000/1001' 形式的帧率，未知返回0"""
+    for key in ('avg_frame_rate', 'r_frame_rate'):
+        num, _, den = str(stream.get(key) or '').partition('/')
+        if _float(num) and _float(den or 1):
+            return _float(num) / _float(den or 1)
+    return 0.0
+
+
+def stream_facts(probe):
+    """
+    从 ffprobe 结果中提取用于比较的字段
+
+    Args:
+        probe: ffprobe JSON（format + streams）
+
+    Returns:
+        dict: {'duration', 'video', 'audio', 'frames', 'estimated_frames', 'audio_duration'}
+              frames 为数据包计数或文件头中的帧数，estimated_frames 为 时长 × 帧率（未知时为None）
+    """
+    streams = probe.get('streams', [])
+    video = [s for s in streams if s.get('codec_type') == 'video'
+             and not (s.get('disposition') or {}).get('attached_pic')]
+    audio = [s for s in streams if s.get('codec_type') == 'audio']
+    first = video[0] if video else {}
+    duration = _float(probe.get('format', {}).get('duration')) or _float(first.get('duration'))
+
+    frames = int(_float(first.get('nb_read_packets')) or _float(first.get('nb_frames'))) or None
+    rate = _frame_rate(first) if first else 0.0
+    estimated_frames = int(duration * rate) if duration and rate else None
+
+    return {
+        'duration': duration,
+        'video': len(video),
+        'audio': len(audio),
+        'frames': frames,
+        'estimated_frames': estimated_frames,
+        'audio_duration': _float(audio[0].get('duration')) if audio else 0.0,
+    }
+
+
+def compare_outputs(source, output):
+    """
+    比较源文件和输出的 stream_facts
+
+    Returns:
+        list: 问题说明，一致时为空列表
+    """
+    problems = []
+    tolerance = max(DURATION_TOLERANCE, source['duration'] * DURATION_TOLERANCE_RATIO)
+
+    if not output['video']:
+        problems.append("输出没有视频流")
+    if source['audio'] and not output['audio']:
+        problems.append("输出缺少音频流")
+
+    if source['duration'] and abs(output['duration'] - source['duration']) > tolerance:
+        problems.append(f"时长 {output['duration']:.1f}s 与源文件 {source['duration']:.1f}s 不一致")
+    elif source['audio'] and output['audio_duration'] and output['audio_duration'] < source['duration'] - tolerance:
+        problems.append(f"音频只有 {output['audio_duration']:.1f}s（源文件 {source['duration']:.1f}s）")
+
+    # 只检查数据包不足（截断）；固定帧率输出比可变帧率源多出的帧不算问题。
+    # 任一侧没有实际帧数时两侧都用 时长 × 帧率 估算，不混用计数和估算
+    if source['frames'] and output['frames']:
+        source_frames, output_frames = source['frames'], output['frames']
+    else:
+        source_frames, output_frames = source['estimated_frames'], output['estimated_frames']
+    if source_frames and output_frames is not None:
+        expected = source_frames * (1 - PACKET_TOLERANCE_RATIO) - 2
+        if output_frames < expected:
+            problems.append(f"视频数据包 {output_frames} 个，源文件约 {source_frames} 帧")
+
+    return problems
+
+
+def sample_decode(path, duration, samples=DEEP_SAMPLES, sample_seconds=DEEP_SAMPLE_SECONDS):
+    """
+    在均匀分布的几个位置各解码一小段，检查解码错误
+
+    Args:
+        path: 输出文件路径
+        duration: 输出时长（秒）
+        samples: 抽样点数
+        sample_seconds: 每个抽样点解码的秒数
+
+    Returns:
+        list: 问题说明
+    """
+    span = max(duration - sample_seconds, 0.0)
+    positions = sorted({round(span * i / max(samples - 1, 1), 3) for i in range(samples)})
+    problems = []
+    for position in positions:
+        cmd = [FFMPEG_BIN, '-hide_banner', '-nostdin', '-v', 'error', '-ss', f"{position:.3f}", '-i', path,
+               '-t', str(sample_seconds), '-map', '0:v:0', '-map', '0:a?', '-f', 'null', '-']
+        try:
+            result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=DECODE_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            problems.append(f"{position:.0f}s 处解码超时")
+            continue
+        except OSError as e:
+            problems.append(f"无法运行解码校验: {e}")
+            break
+        # -v error 下任何输出都是解码错误
+        errors = result.stderr.decode('utf-8', errors='replace').strip()
+        if result.returncode != 0 or errors:
+            problems.append(f"{position:.0f}s 处解码错误: {errors.splitlines()[-1] if errors else result.returncode}")
+    return problems
+
+
+def verify_output(output_path, source_probe, deep=False):
+    """
+    校验单个输出文件
+
+    Args:
+        output_path: 输出文件路径
+        source_probe: 源文件的 ffprobe 结果
+        deep: 是否额外抽样解码
+
+    Returns:
+        dict: {'ok', 'problems', 'mode', 'seconds', 'duration', 'frames'}
+    """
+    started = time.perf_counter()
+    extra = ['-show_format', '-show_streams']
+    if deep and os.path.splitext(output_path)[1].lower() in COUNT_PACKETS_EXTENSIONS:
+        extra.append('-count_packets')
+
+    output_probe = run_ffprobe(output_path, extra, timeout=PROBE_TIMEOUT)
+    if output_probe is None:
+        problems = ["ffprobe 无法读取输出（文件可能被截断）"]
+        output = {'duration': 0.0, 'frames': None, 'estimated_frames': None}
+    else:
+        output = stream_facts(output_probe)
+        problems = compare_outputs(stream_facts(source_probe), output)
+        if deep and not problems:
+            problems = sample_decode(output_path, output['duration'])
+
+    return {
+        'ok': not problems,
+        'problems': problems,
+        'mode': 'deep' if deep else 'quick',
+        'seconds': round(time.perf_counter() - started, 4),
+        'duration': output['duration'],
+        'frames': output['frames'] or output['estimated_frames'],
+    }
+
+
+class OutputVerifier:
+    """
+    批次内的输出校验和统计
+
+    在编码线程中紧接着编码完成后运行（其他线程的编码同时进行），
+    校验通过后才复用、上传输出；不一致的输出按失败处理，由重试策略重新编码。
+    """
+
+    def __init__(self, mode='quick'):
+        """
+        Args:
+            mode: 'quick' 只比较元数据，'deep' 额外抽样解码
+        """
+        if mode not in VERIFY_MODES:
+            raise ValueError(f"未知的校验模式: {mode}")
+        self.mode = mode
+        self._lock = threading.Lock()
+        self.stats = {'checked': 0, 'passed': 0, 'failed': 0, 'skipped': 0, 'seconds': 0.0}
+        self.recent = deque(maxlen=20)
+
+    def verify(self, task, output_path):
+        """
+        校验任务输出（源文件没有元数据缓存时跳过）
+
+        Args:
+            task: 任务字典
+            output_path: 实际写入的输出路径（启用本地暂存时为临时文件）
+
+        Returns:
+            dict: verify_output 的结果，跳过时返回None
+        """
+        source_probe = get_metadata_cache().get_probe(task['video_path'], refresh=False)
+        if source_probe is None:
+            with self._lock:
+                self.stats['skipped'] += 1
+            return None
+
+        result = verify_output(output_path, source_probe, deep=self.mode == 'deep')
+        with self._lock:
+            self.stats['checked'] += 1
+            self.stats['passed' if result['ok'] else 'failed'] += 1
+            self.stats['seconds'] += result['seconds']
+            if not result['ok']:
+                self.recent.append({'time': time.time(), 'task': task.get('output_file'),
+                                    'problems': result['problems']})
+        return result
+
+    def summary(self):
+        """校验统计（用于批次汇总和状态接口）"""
+        with self._lock:
+            checked = self.stats['checked']
+            return {
+                'mode': self.mode,
+                'checked': checked,
+                'passed': self.stats['passed'],
+                'failed': self.stats['failed'],
+                'skipped': self.stats['skipped'],
+                'avg_ms': round(self.stats['seconds'] / checked * 1000, 1) if checked else None,
+                'recent': list(self.recent),
+            }
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="核对输出文件与源文件的时长、流和数据包数量")
+    parser.add_argument('source', help="源视频文件")
+    parser.add_argument('output', help="输出视频文件")
+    parser.add_argument('--deep', action='store_true', help="额外抽样解码")
+    args = parser.parse_args()
+
+    probe = get_metadata_cache().get_probe(args.source)
+    if probe is None:
+        raise SystemExit(f"无法读取源文件: {args.source}")
+    report = verify_output(args.output, probe, deep=args.deep)
+    print(f"{'✓ 一致' if report['ok'] else '✗ 不一致'} ({report['mode']}, {report['seconds'] * 1000:.0f} ms)")
+    for problem in report['problems']:
+        print(f"  - {problem}")
+    raise SystemExit(0 if report['ok'] else 1)
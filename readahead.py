@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预读模块 - 当前视频编码时把下一个源文件预读进页缓存，并统计批处理从存储读取的字节数
+Readahead Module - Prefetches the next source into the page cache while the current one encodes, and accounts bytes read from storage
+"""
+
+import os
+import threading
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# 后台读取的块大小
+READ_CHUNK = 8 * 1024 * 1024
+
+# ru_inblock 的单位（Linux/macOS 为 512 字节块）
+BLOCK_SIZE = 512
+
+
+def read_block_count():
+    """
+    本进程及已结束子进程（ffmpeg）从存储读入的块数
+
+    Returns:
+        int: 块数，平台不支持时返回None
+    """
+    if resource is None:
+        return None
+    try:
+        own = resource.getrusage(resource.RUSAGE_SELF).ru_inblock
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_inblock
+    except (OSError, ValueError):
+        return None
+    return own + children
+
+
+def prefetch_file(path, stop_event=None):
+    """
+    把文件预读进页缓存
+
+    支持 posix_fadvise 时只发出 WILLNEED 提示（内核异步读取）；否则顺序读取整个文件。
+
+    Args:
+        path: 文件路径
+        stop_event: threading.Event，置位时中止顺序读取
+
+    Returns:
+        str: 'fadvise' / 'read'，失败返回None
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        if hasattr(os, 'posix_fadvise'):
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+                return 'fadvise'
+            except OSError:
+                pass
+        while not (stop_event and stop_event.is_set()):
+            if not os.read(fd, READ_CHUNK):
+                break
+        return 'read'
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
+
+class Prefetcher:
+    """
+    源文件预读器：按执行顺序在后台预读下一个尚未读取的源文件（每个文件只预读一次）
+    """
+
+    def __init__(self, source_order, enabled=True):
+        """
+        Args:
+            source_order: 按执行顺序排列的源文件路径（可重复，会去重）
+            enabled: 是否启用预读
+        """
+        self.order = list(dict.fromkeys(source_order))
+        self.position = {path: i for i, path in enumerate(self.order)}
+        self.enabled = enabled
+        self.prefetched = set()
+        self.prefetched_bytes = 0
+        self.method = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._start_blocks = read_block_count()
+
+    def on_task_start(self, source_path):
+        """任务开始时调用：预读执行顺序中的下一个源文件"""
+        if not self.enabled:
+            return
+        i = self.position.get(source_path)
+        if i is None or i + 1 >= len(self.order):
+            return
+        next_path = self.order[i + 1]
+        with self._lock:
+            if next_path in self.prefetched or self._stop.is_set():
+                return
+            self.prefetched.add(next_path)
+        thread = threading.Thread(target=self._prefetch, args=(next_path,), daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _prefetch(self, path):
+        method = prefetch_file(path, self._stop)
+        if method is None:
+            return
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        with self._lock:
+            self.method = method
+            self.prefetched_bytes += size
+
+    def stop(self):
+        """停止未完成的预读"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=1)
+
+    def bytes_read(self):
+        """批处理开始以来从存储读取的字节数（平台不支持时为None）"""
+        now = read_block_count()
+        if now is None or self._start_blocks is None:
+            return None
+        return (now - self._start_blocks) * BLOCK_SIZE
+
+    def stats(self):
+        """预读统计（用于日志和状态接口）"""
+        return {
+            'sources': len(self.order),
+            'prefetched': len(self.prefetched),
+            'prefetched_bytes': self.prefetched_bytes,
+            'method': self.method,
+            'bytes_read': self.bytes_read(),
+        }
+
+
+def format_bytes(size):
+    """字节数格式化"""
+    if size is None:
+        return '未知'
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
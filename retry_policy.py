@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+重试策略模块 - 按失败类型（GPU 会话数超限、驱动错误、卡住、磁盘已满、源文件损坏等）决定是否重试、是否改用 CPU 编码，熔断器暂停持续失败的执行器
+Retry Policy Module - Decides per failure class (GPU session limit, driver error, stall, disk full, corrupt input, ...) whether to retry and whether to fall back to CPU encoding; a circuit breaker pauses executors that keep failing
+"""
+
+import re
+import threading
+import time
+from collections import deque
+
+# 失败类型 -> 匹配 ffmpeg 错误输出的正则（按顺序匹配，先匹配到的优先）
+FAILURE_PATTERNS = [
+    ('disk_full', re.compile(r'No space left on device|Disk quota exceeded', re.I)),
+    ('gpu_session_limit', re.compile(
+        r'OpenEncodeSessionEx failed|incompatible client key|out of memory \(10\)|'
+        r'No NVENC capable devices|too many (concurrent )?(encod|session)', re.I)),
+    ('gpu_error', re.compile(
+        r'CUDA_ERROR|cuCtxCreate|Cannot load (libcuda|nvcuda|libnvidia-encode)|Device creation failed|'
+        r'Failed (to )?(setup|initiali[sz]e).*(qsv|vaapi|amf|videotoolbox|hw)|'
+        r'Error (while )?opening encoder.*(nvenc|qsv|amf|videotoolbox)|'
+        r'(nvenc|qsv|amf|videotoolbox).*(error|failed)|hwaccel.*(failed|error)|'
+        r'Error creating a (MFX|VAAPI|QSV)|VTCompressionSession', re.I)),
+    ('container_error', re.compile(r'codec not currently supported in container|Could not find tag for codec|'
+                                   r'Could not write header for output', re.I)),
+    ('verify_failed', re.compile(r'^输出校验失败')),
+    ('subtitle_error', re.compile(r'Unable to open .*\.(srt|ass|str)|Error initializing filter .subtitles|'
+                                  r'Unable to parse option value .*subtitles', re.I)),
+    ('input_error', re.compile(
+        r'Invalid data found when processing input|moov atom not found|No such file or directory|'
+        r'Error while decoding stream|corrupt|Invalid NAL unit', re.I)),
+]
+
+# 各失败类型的默认策略
+#   retries: 最多重试次数
+#   fallback_cpu: 重试时是否改用 CPU (libx264)
+#   gpu_only: 只有在 GPU 上失败时才重试（CPU 上失败说明问题在源文件或字幕本身）
+#   breaker: 是否计入执行器的熔断统计（源文件、字幕、磁盘问题与执行器无关）
+#   delay: 在原编码路径上重试前等待的秒数（等其他会话释放）
+RETRY_POLICY = {
+    'gpu_session_limit': {'retries': 3, 'fallback_cpu': True, 'gpu_only': False, 'breaker': True, 'delay': 5.0},
+    'gpu_error': {'retries': 2, 'fallback_cpu': True, 'gpu_only': False, 'breaker': True, 'delay': 2.0},
+    'stalled': {'retries': 1, 'fallback_cpu': True, 'gpu_only': False, 'breaker': True, 'delay': 0.0},
+    'timeout': {'retries': 1, 'fallback_cpu': True, 'gpu_only': False, 'breaker': True, 'delay': 0.0},
+    'input_error': {'retries': 1, 'fallback_cpu': True, 'gpu_only': True, 'breaker': False, 'delay': 0.0},
+    'container_error': {'retries': 0, 'fallback_cpu': False, 'gpu_only': False, 'breaker': False, 'delay': 0.0},
+    'verify_failed': {'retries': 1, 'fallback_cpu': True, 'gpu_only': False, 'breaker': True, 'delay': 0.0},
+    'subtitle_error': {'retries': 0, 'fallback_cpu': False, 'gpu_only': False, 'breaker': False, 'delay': 0.0},
+    'disk_full': {'retries': 0, 'fallback_cpu': False, 'gpu_only': False, 'breaker': False, 'delay': 0.0},
+    'unknown': {'retries': 1, 'fallback_cpu': True, 'gpu_only': False, 'breaker': True, 'delay': 0.0},
+}
+
+FAILURE_LABELS = {
+    'gpu_session_limit': 'GPU 编码会话数超限',
+    'gpu_error': 'GPU/驱动错误',
+    'stalled': '卡住',
+    'timeout': '超时',
+    'input_error': '源文件解码错误',
+    'container_error': '封装格式不支持',
+    'verify_failed': '输出校验失败',
+    'subtitle_error': '字幕错误',
+    'disk_full': '磁盘已满',
+    'unknown': '未知错误',
+}
+
+# 熔断器：连续失败几次后暂停执行器，暂停时长每次翻倍（有上限）
+BREAKER_THRESHOLD = 3
+BREAKER_COOLDOWN = 60.0
+BREAKER_MAX_COOLDOWN = 600.0
+
+
+def classify_failure(message, stalled=None):
+    """
+    根据 ffmpeg 错误输出判断失败类型
+
+    Args:
+        message: 错误信息（ffmpeg stderr 的最后几行）
+        stalled: 看门狗的诊断信息（可选）
+
+    Returns:
+        str: RETRY_POLICY 的键
+    """
+    if stalled:
+        return 'timeout' if stalled.get('reason') == 'timeout' else 'stalled'
+    for failure_class, pattern in FAILURE_PATTERNS:
+        if message and pattern.search(message):
+            return failure_class
+    return 'unknown'
+
+
+class CircuitBreaker:
+    """
+    按执行器（或编码路径）统计连续失败，超过阈值后在冷却期内不再分配任务
+
+    冷却结束后进入半开状态重新分配任务：成功则恢复，再次失败立即熔断且冷却时间翻倍。
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN, max_cooldown=BREAKER_MAX_COOLDOWN):
+        self.threshold = max(1, int(threshold))
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        # 执行器 -> {'failures', 'open_until', 'cooldown', 'trips'}；open_until 为 0 表示未熔断
+        self._states = {}
+
+    def _state(self, key):
+        return self._states.setdefault(key, {'failures': 0, 'open_until': 0.0, 'cooldown': self.cooldown, 'trips': 0})
+
+    def allow(self, key):
+        """是否可以向该执行器分配任务（熔断冷却期内返回 False）"""
+        with self._lock:
+            state = self._states.get(key)
+            return not state or time.time() >= state['open_until']
+
+    def record(self, key, success):
+        """
+        记录任务结果
+
+        Returns:
+            bool: 本次失败是否触发了熔断
+        """
+        with self._lock:
+            state = self._state(key)
+            if success:
+                state.update(failures=0, open_until=0.0, cooldown=self.cooldown)
+                return False
+            state['failures'] += 1
+            if state['open_until']:
+                if time.time() < state['open_until']:
+                    # 熔断前已开始的任务失败，不重复计算
+                    return False
+                # 半开状态下再次失败：冷却时间翻倍
+                state['cooldown'] = min(state['cooldown'] * 2, self.max_cooldown)
+            elif state['failures'] < self.threshold:
+                return False
+            state['open_until'] = time.time() + state['cooldown']
+            state['trips'] += 1
+            return True
+
+    def summary(self):
+        now = time.time()
+        with self._lock:
+            return {
+                key: {
+                    'state': 'closed' if not state['open_until'] else
+                    ('open' if now < state['open_until'] else 'half-open'),
+                    'consecutive_failures': state['failures'],
+                    'reopens_in': round(max(state['open_until'] - now, 0.0), 1) if state['open_until'] else None,
+                    'trips': state['trips'],
+                }
+                for key, state in self._states.items()
+            }
+
+
+class RetryPolicy:
+    """
+    失败任务的重试决策和统计
+
+    每个任务的尝试记录保存在 task['attempts'] 中：[{'path': 执行器, 'class': 失败类型}]。
+    """
+
+    def __init__(self, overrides=None, cpu_fallback=True, breaker=None):
+        """
+        Args:
+            overrides: {失败类型: {'retries': n, 'fallback_cpu': bool, ...}}，覆盖默认策略
+            cpu_fallback: 是否允许改用 CPU 重试（False 时在原编码路径上重试）
+            breaker: CircuitBreaker 实例（默认新建）
+        """
+        self.policy = {name: dict(rules) for name, rules in RETRY_POLICY.items()}
+        for name, rules in (overrides or {}).items():
+            self.policy.setdefault(name, dict(RETRY_POLICY['unknown'])).update(rules)
+        self.cpu_fallback = cpu_fallback
+        self.breaker = breaker or CircuitBreaker()
+        self._lock = threading.Lock()
+        self.stats = {
+            'failures': {},
+            'retries': {},
+            'retried': 0,
+            'fallbacks': 0,
+            'recovered': 0,
+            'gave_up': 0,
+            'breaker_trips': 0,
+        }
+        self.recent = deque(maxlen=20)
+
+    def _count(self, bucket, key):
+        self.stats[bucket][key] = self.stats[bucket].get(key, 0) + 1
+
+    def on_failure(self, task, path, failure_class, on_gpu):
+        """
+        记录一次失败并决定下一次尝试
+
+        Args:
+            task: 任务字典
+            path: 失败所在的执行器 / 编码路径名称
+            failure_class: classify_failure 的结果
+            on_gpu: 失败的尝试是否使用 GPU
+
+        Returns:
+            dict: {'cpu': 是否改用 CPU, 'reason': 说明, 'delay': 重试前等待秒数, 'class': 失败类型}，不再重试时返回None
+        """
+        rules = self.policy.get(failure_class, self.policy['unknown'])
+        attempts = task.setdefault('attempts', [])
+        attempts.append({'path': path, 'class': failure_class})
+        retries_used = sum(1 for a in attempts if a['class'] == failure_class) - 1
+
+        with self._lock:
+            self._count('failures', failure_class)
+            if rules['breaker'] and self.breaker.record(path, False):
+                self.stats['breaker_trips'] += 1
+                self.recent.append({'time': time.time(), 'task': task.get('output_file'),
+                                    'event': f"{path} 熔断 ({FAILURE_LABELS.get(failure_class, failure_class)})"})
+
+            if retries_used >= rules['retries'] or (rules['gpu_only'] and not on_gpu):
+                self.stats['gave_up'] += 1
+                return None
+
+            use_cpu = bool(on_gpu and rules['fallback_cpu'] and self.cpu_fallback)
+            reason = FAILURE_LABELS.get(failure_class, failure_class)
+            self.stats['retried'] += 1
+            self._count('retries', failure_class)
+            if use_cpu:
+                self.stats['fallbacks'] += 1
+            self.recent.append({'time': time.time(), 'task': task.get('output_file'),
+                                'event': f"{reason}，{'改用 CPU ' if use_cpu else ''}重试"})
+            return {'cpu': use_cpu, 'reason': reason, 'delay': 0.0 if use_cpu else rules.get('delay', 0.0),
+                    'class': failure_class}
+
+    def abandon(self, decision):
+        """已决定的重试无法执行（如所有执行器都已排除），改记为放弃"""
+        with self._lock:
+            self.stats['retried'] -= 1
+            self.stats['retries'][decision['class']] -= 1
+            if decision['cpu']:
+                self.stats['fallbacks'] -= 1
+            self.stats['gave_up'] += 1
+
+    def on_success(self, task, path):
+        """记录成功（重置该执行器的连续失败计数；重试后成功计入 recovered）"""
+        self.breaker.record(path, True)
+        if task.get('attempts'):
+            with self._lock:
+                self.stats['recovered'] += 1
+
+    def summary(self):
+        """重试统计（用于批次汇总和状态接口）"""
+        with self._lock:
+            return {
+                'failures': dict(self.stats['failures']),
+                'retries': dict(self.stats['retries']),
+                'retried': self.stats['retried'],
+                'fallbacks': self.stats['fallbacks'],
+                'recovered': self.stats['recovered'],
+                'gave_up': self.stats['gave_up'],
+                'breaker_trips': self.stats['breaker_trips'],
+                'breakers': self.breaker.summary(),
+                'recent': list(self.recent),
+            }
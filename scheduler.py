@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务调度模块 - 按预估处理时长的最长优先 (LPT) 或源文件局部性顺序排列任务并预测完成时间
+Scheduler Module - Longest-processing-time-first or source-locality ordering with makespan prediction
+"""
+
+import heapq
+import time
+
+from media_probe import get_metadata_cache
+
+# 参考分辨率 (1080p)，分辨率权重按像素数相对于它计算
+REFERENCE_PIXELS = 1920 * 1080
+
+# 各视频编码器的相对耗时（libx264 = 1.0）
+ENCODER_COST = {
+    'libx264': 1.0,
+    'h264_nvenc': 0.3,
+    'h264_videotoolbox': 0.4,
+    'h264_qsv': 0.4,
+    'h264_amf': 0.4,
+}
+
+# 每单位成本（1秒1080p libx264内容）对应的墙钟秒数，本机尚无实测数据时使用此默认值
+DEFAULT_SECONDS_PER_COST = 1.0
+
+# 实测吞吐的指数滑动平均系数
+THROUGHPUT_SMOOTHING = 0.3
+
+
+def load_seconds_per_cost(video_codec='libx264'):
+    """读取本机实测的 墙钟秒/成本（按编码器区分）"""
+    return get_metadata_cache().get_stat(f'seconds_per_cost:{video_codec}', DEFAULT_SECONDS_PER_COST)
+
+
+def record_seconds_per_cost(video_codec, seconds_per_cost):
+    """
+    保存一次批处理测得的吞吐（与历史值做滑动平均）
+
+    Args:
+        video_codec: 视频编码器
+        seconds_per_cost: 本次实测的 墙钟秒/成本
+    """
+    if seconds_per_cost <= 0:
+        return
+    cache = get_metadata_cache()
+    key = f'seconds_per_cost:{video_codec}'
+    previous = cache.get_stat(key)
+    if previous is not None:
+        seconds_per_cost = previous * (1 - THROUGHPUT_SMOOTHING) + seconds_per_cost * THROUGHPUT_SMOOTHING
+    cache.set_stat(key, seconds_per_cost)
+
+
+def resolution_weight(width, height):
+    """
+    分辨率权重（字幕烧录需要完整解码+编码，耗时近似与像素数成正比）
+
+    Args:
+        width: 视频宽度
+        height: 视频高度
+
+    Returns:
+        float: 相对于1080p的权重，未知分辨率返回1.0
+    """
+    if not width or not height:
+        return 1.0
+    return max(width * height / REFERENCE_PIXELS, 0.1)
+
+
+def estimate_cost(media_info, video_codec='libx264'):
+    """
+    估算单个任务的相对成本
+
+    Args:
+        media_info: probe_media 返回的媒体信息（可为None）
+        video_codec: 输出视频编码器
+
+    Returns:
+        float: 成本值，时长未知时返回None
+    """
+    if not media_info or not media_info.get('duration'):
+        return None
+    weight = resolution_weight(media_info.get('width'), media_info.get('height'))
+    return media_info['duration'] * weight * ENCODER_COST.get(video_codec, 1.0)
+
+
+def probe_sources(video_paths, max_workers=8):
+    """
+    并行探测多个视频的媒体信息（结果保存在共享的元数据缓存中）
+
+    Args:
+        video_paths: 视频路径列表
+        max_workers: 并行 ffprobe 数量
+
+    Returns:
+        dict: 视频路径 -> 媒体信息
+    """
+    return get_metadata_cache().warm(video_paths, max_workers=max_workers)
+
+
+def order_longest_first(tasks, video_codec='libx264', media_infos=None):
+    """
+    为任务计算成本并按最长优先排序
+
+    时长未知的任务使用已知任务的平均成本，排序稳定（成本相同时保持原顺序）。
+
+    Args:
+        tasks: 任务字典列表（需包含 video_path）
+        video_codec: 输出视频编码器
+        media_infos: 预先探测的 {视频路径: 媒体信息}（可选）
+
+    Returns:
+        list: 排序后的新任务列表，每个任务带有 'cost' 字段
+    """
+    if media_infos is None:
+        media_infos = probe_sources([t['video_path'] for t in tasks])
+
+    costs = [estimate_cost(media_infos.get(t['video_path']), video_codec) for t in tasks]
+    known = [c for c in costs if c is not None]
+    fallback = sum(known) / len(known) if known else 1.0
+
+    ordered = []
+    for task, cost in zip(tasks, costs):
+        task = dict(task)
+        task['cost'] = cost if cost is not None else fallback
+        task['cost_estimated'] = cost is None
+        ordered.append(task)
+
+    ordered.sort(key=lambda t: t['cost'], reverse=True)
+    return ordered
+
+
+def order_by_locality(tasks):
+    """
+    按源文件分组排序：同一视频的所有语种任务相邻（工作线程会并发处理它们），
+    源文件在页缓存中时就被全部读完；组之间按组总成本最长优先。
+
+    Args:
+        tasks: 已带 'cost' 字段的任务列表
+
+    Returns:
+        list: 排序后的新任务列表
+    """
+    groups = {}
+    for task in tasks:
+        groups.setdefault(task['video_path'], []).append(task)
+    ordered_groups = sorted(groups.values(), key=lambda g: sum(t['cost'] for t in g), reverse=True)
+    ordered = []
+    for group in ordered_groups:
+        ordered.extend(sorted(group, key=lambda t: t['cost'], reverse=True))
+    return ordered
+
+
+# 调度策略 -> 日志显示名称
+STRATEGIES = {
+    'longest-first': '最长优先',
+    'locality': '按源文件分组',
+}
+
+
+def predict_makespan(costs, workers):
+    """
+    模拟按给定顺序把任务分配给最先空闲的工作线程，返回总成本跨度
+
+    Args:
+        costs: 按执行顺序排列的成本列表
+        workers: 工作线程数
+
+    Returns:
+        float: 最后一个工作线程完成时的累计成本
+    """
+    workers = max(1, int(workers))
+    finish = [0.0] * min(workers, max(len(costs), 1))
+    heapq.heapify(finish)
+    for cost in costs:
+        heapq.heapreplace(finish, finish[0] + cost)
+    return max(finish) if finish else 0.0
+
+
+class BatchScheduler:
+    """
+    批量任务调度器：LPT 排序 + 根据实际完成情况修正预计完成时间
+    """
+
+    def __init__(self, tasks, workers=1, video_codec='libx264', media_infos=None, strategy='longest-first'):
+        """
+        Args:
+            tasks: 任务字典列表
+            workers: 并行工作线程数
+            video_codec: 输出视频编码器（影响成本权重）
+            media_infos: 预先探测的媒体信息（可选）
+            strategy: 'longest-first'（最长优先）或 'locality'（同一源文件的任务相邻，减少重复读取）
+        """
+        self.workers = max(1, int(workers))
+        self.video_codec = video_codec
+        self.strategy = strategy if strategy in STRATEGIES else 'longest-first'
+        self.tasks = order_longest_first(tasks, video_codec, media_infos)
+        if self.strategy == 'locality':
+            self.tasks = order_by_locality(self.tasks)
+        self.total_cost = sum(t['cost'] for t in self.tasks)
+        self.makespan_cost = predict_makespan([t['cost'] for t in self.tasks], self.workers)
+
+        self.start_time = time.time()
+        self.finished_cost = 0.0
+        self.done_cost = 0.0
+        self.done_seconds = 0.0
+        self.host_seconds_per_cost = load_seconds_per_cost(video_codec)
+
+    @property
+    def seconds_per_cost(self):
+        """根据已完成任务测得的 墙钟秒/成本，尚无数据时使用本机历史实测值"""
+        if self.done_cost > 0 and self.done_seconds > 0:
+            return self.done_seconds / self.done_cost
+        return self.host_seconds_per_cost
+
+    def save_throughput(self):
+        """批处理结束后保存实测吞吐，供下次规划和调度使用"""
+        if self.done_cost > 0 and self.done_seconds > 0:
+            record_seconds_per_cost(self.video_codec, self.done_seconds / self.done_cost)
+
+    def record_completion(self, task, elapsed, success=True):
+        """
+        记录任务完成，用于修正吞吐估计（失败的任务不计入吞吐）
+
+        Args:
+            task: 已完成的任务
+            elapsed: 任务实际耗时（秒）
+            success: 任务是否成功
+        """
+        self.finished_cost += task.get('cost', 0.0)
+        if success:
+            self.done_cost += task.get('cost', 0.0)
+            self.done_seconds += elapsed
+
+    def predicted_finish(self):
+        """
+        预计整批完成的时间
+
+        已完成部分按实际耗时计算，剩余部分按 LPT 跨度与总成本的比例和当前吞吐估计。
+
+        Returns:
+            float: Unix 时间戳
+        """
+        if self.total_cost <= 0:
+            return time.time()
+        remaining_fraction = max(self.total_cost - self.finished_cost, 0.0) / self.total_cost
+        remaining_seconds = self.makespan_cost * remaining_fraction * self.seconds_per_cost
+        return time.time() + remaining_seconds
+
+    def summary(self):
+        """返回调度摘要（用于日志和状态接口）"""
+        finish = self.predicted_finish()
+        return {
+            'strategy': self.strategy,
+            'workers': self.workers,
+            'tasks': len(self.tasks),
+            'total_cost': round(self.total_cost, 1),
+            'makespan_cost': round(self.makespan_cost, 1),
+            'seconds_per_cost': round(self.seconds_per_cost, 3),
+            'predicted_finish': finish,
+            'predicted_finish_text': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(finish)),
+        }
+
+
+if __name__ == '__main__':
+    # 测试代码：LPT 与原始顺序的跨度对比
+    demo_costs = [600, 600, 600, 600, 10800, 900, 1200, 300]
+    print("=== 调度测试 (3 workers) ===")
+    print(f"原始顺序跨度: {predict_makespan(demo_costs, 3):.0f}")
+    print(f"最长优先跨度: {predict_makespan(sorted(demo_costs, reverse=True), 3):.0f}")
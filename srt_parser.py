@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SRT 字幕解析模块 - 构建紧凑的数组化字幕时间表，支持覆盖/间隙/重叠/密度等批量查询
+SRT Parser Module - Builds a compact array-backed cue table with vectorized timing queries
+"""
+
+import mmap
+import os
+import re
+from array import array
+from bisect import bisect_right
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 时间轴行: 00:01:02,345 --> 00:01:04,000 [可选的位置信息]
+TIMING = rb'[ \t]*\d+:\d{1,2}:\d{1,2}[,.]\d{1,3}[ \t]*-->[ \t]*\d+:\d{1,2}:\d{1,2}[,.]\d{1,3}'
+TIMING_RE = re.compile(TIMING)
+
+# 一条字幕: [序号行] 时间轴行 文本（到空行为止）
+# 文本行不能是下一条字幕的 [序号行 +] 时间轴行（字幕之间缺少空行时不会被并入上一条）
+CUE_RE = re.compile(
+    rb'^[ \t]*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})[ \t]*-->[ \t]*'
+    rb'(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})[^\r\n]*\r?(?:\n|\Z)'
+    rb'((?:(?!(?:[ \t]*\d+[ \t]*\r?\n)?' + TIMING + rb')[^\r\n]*\S[^\r\n]*(?:\r?\n|\Z))*)',
+    re.MULTILINE
+)
+# 包含箭头的行（用于找出格式错误的时间轴）
+ARROW_LINE_RE = re.compile(rb'^[^\r\n]*-->[^\r\n]*\r?$', re.MULTILINE)
+INDEX_LINE_RE = re.compile(rb'[ \t]*\d+[ \t]*\r?$')
+
+UTF8_BOM = b'\xef\xbb\xbf'
+
+# 超过此大小的文件使用 mmap 读取
+MMAP_THRESHOLD = 4 * 1024 * 1024
+
+
+def _to_ms(hours, minutes, seconds, fraction):
+    """把时间轴各字段转换为毫秒（小数部分按位数补齐，如 ',5' 表示 500ms）"""
+    if len(fraction) < 3:
+        fraction = fraction.ljust(3, b'0')
+    return ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(fraction)
+
+
+def format_timestamp(ms):
+    """
+    毫秒转换为 SRT 时间格式
+
+    Args:
+        ms: 毫秒数
+
+    Returns:
+        str: 如 '00:01:02,345'
+    """
+    ms = max(int(ms), 0)
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{ms:03d}"
+
+
+class CueTable:
+    """
+    紧凑的字幕时间表
+
+    - starts / ends: array('q')，单位毫秒
+    - text_offsets: array('q')，长度为 n+1，第 i 条字幕文本为 text_buffer[text_offsets[i]:text_offsets[i+1]]
+    - text_buffer: 所有字幕文本拼接成的 UTF-8 字节串
+    - errors: 解析时发现的格式问题 [(行号, 说明), ...]
+    - unseparated: 与上一条字幕之间缺少空行的字幕所在行号（ffmpeg 会把它并入上一条字幕的文本）
+    """
+
+    __slots__ = ('starts', 'ends', 'text_offsets', 'text_buffer', 'errors', 'unseparated')
+
+    def __init__(self, starts=None, ends=None, text_offsets=None, text_buffer=b'', errors=None, unseparated=None):
+        self.starts = starts if starts is not None else array('q')
+        self.ends = ends if ends is not None else array('q')
+        self.text_offsets = text_offsets if text_offsets is not None else array('q', [0])
+        self.text_buffer = text_buffer
+        self.errors = errors if errors is not None else []
+        self.unseparated = unseparated if unseparated is not None else []
+
+    def __len__(self):
+        return len(self.starts)
+
+    # ------------------------------------------------------------------
+    # 基本访问
+    # ------------------------------------------------------------------
+
+    def text_bytes(self, index):
+        """第 index 条字幕的原始 UTF-8 字节"""
+        return self.text_buffer[self.text_offsets[index]:self.text_offsets[index + 1]]
+
+    def text(self, index):
+        """第 index 条字幕文本"""
+        return self.text_bytes(index).decode('utf-8', errors='replace')
+
+    def as_numpy(self):
+        """
+        以 NumPy int64 视图返回 (starts, ends)，不复制数据
+
+        Returns:
+            tuple: (starts, ends)，未安装 NumPy 时返回None
+        """
+        if np is None:
+            return None
+        return (np.frombuffer(self.starts, dtype=np.int64),
+                np.frombuffer(self.ends, dtype=np.int64))
+
+    @property
+    def duration_ms(self):
+        """最后一条字幕的结束时间"""
+        return max(self.ends) if len(self) else 0
+
+    def is_sorted(self):
+        """字幕是否按开始时间排序"""
+        starts = self.starts
+        return all(starts[i] <= starts[i + 1] for i in range(len(starts) - 1))
+
+    def sorted(self):
+        """返回按开始时间排序的新表（共享文本缓冲）"""
+        if self.is_sorted():
+            return self
+        order = sorted(range(len(self)), key=lambda i: (self.starts[i], self.ends[i]))
+        return self.take(order)
+
+    def take(self, indices):
+        """
+        按索引挑选字幕组成新表
+
+        Args:
+            indices: 索引序列
+
+        Returns:
+            CueTable: 新表（文本重新拼接为紧凑缓冲）
+        """
+        parts = []
+        offsets = array('q', [0])
+        total = 0
+        for i in indices:
+            chunk = self.text_bytes(i)
+            parts.append(chunk)
+            total += len(chunk)
+            offsets.append(total)
+        return CueTable(
+            array('q', (self.starts[i] for i in indices)),
+            array('q', (self.ends[i] for i in indices)),
+            offsets,
+            b''.join(parts),
+            list(self.errors),
+            list(self.unseparated)
+        )
+
+    # ------------------------------------------------------------------
+    # 批量查询
+    # ------------------------------------------------------------------
+
+    def negative_durations(self):
+        """结束时间不晚于开始时间的字幕索引"""
+        arrays = self.as_numpy()
+        if arrays is not None:
+            starts, ends = arrays
+            return np.nonzero(ends <= starts)[0].tolist()
+        return [i for i in range(len(self)) if self.ends[i] <= self.starts[i]]
+
+    def overlaps(self):
+        """
+        与下一条字幕（按开始时间排序后）时间重叠的字幕
+
+        Returns:
+            list: [(i, j), ...]，i、j 为原表中的索引，j 在 i 结束前开始
+        """
+        n = len(self)
+        if n < 2:
+            return []
+        arrays = self.as_numpy()
+        if arrays is not None:
+            starts, ends = arrays
+            order = np.argsort(starts, kind='stable')
+            s, e = starts[order], ends[order]
+            hits = np.nonzero(s[1:] < e[:-1])[0]
+            return [(int(order[k]), int(order[k + 1])) for k in hits]
+
+        order = sorted(range(n), key=lambda i: self.starts[i])
+        return [(order[k], order[k + 1]) for k in range(n - 1)
+                if self.starts[order[k + 1]] < self.ends[order[k]]]
+
+    def coverage_spans(self):
+        """
+        字幕显示时间的并集
+
+        Returns:
+            list: 合并后的 [(start_ms, end_ms), ...]
+        """
+        spans = []
+        for i in sorted(range(len(self)), key=lambda i: self.starts[i]):
+            start, end = self.starts[i], self.ends[i]
+            if end <= start:
+                continue
+            if spans and start <= spans[-1][1]:
+                if end > spans[-1][1]:
+                    spans[-1][1] = end
+            else:
+                spans.append([start, end])
+        return [tuple(span) for span in spans]
+
+    def coverage_ms(self):
+        """有字幕显示的总时长（毫秒）"""
+        return sum(end - start for start, end in self.coverage_spans())
+
+    def gaps(self, min_gap_ms=0):
+        """
+        相邻字幕之间的空白时段
+
+        Args:
+            min_gap_ms: 只返回不短于此长度的空白
+
+        Returns:
+            list: [(start_ms, end_ms), ...]
+        """
+        spans = self.coverage_spans()
+        return [(spans[k][1], spans[k + 1][0]) for k in range(len(spans) - 1)
+                if spans[k + 1][0] - spans[k][1] >= min_gap_ms]
+
+    def density(self, window_ms=60000):
+        """
+        每个时间窗口内开始的字幕数量
+
+        Args:
+            window_ms: 窗口长度（毫秒）
+
+        Returns:
+            array: array('q')，第 k 项为 [k*window, (k+1)*window) 内的字幕数
+        """
+        if not len(self):
+            return array('q')
+        buckets = max(self.starts) // window_ms + 1
+        arrays = self.as_numpy()
+        if arrays is not None:
+            starts, _ = arrays
+            counts = np.bincount(np.maximum(starts, 0) // window_ms, minlength=buckets)
+            return array('q', counts.tolist())
+        counts = array('q', bytes(8 * buckets))
+        for start in self.starts:
+            counts[max(start, 0) // window_ms] += 1
+        return counts
+
+    def shifted(self, offset_ms):
+        """
+        整体平移时间轴
+
+        Args:
+            offset_ms: 平移量（毫秒，可为负数，结果不小于0）
+
+        Returns:
+            CueTable: 新表（共享文本缓冲）
+        """
+        return CueTable(
+            array('q', (max(s + offset_ms, 0) for s in self.starts)),
+            array('q', (max(e + offset_ms, 0) for e in self.ends)),
+            self.text_offsets,
+            self.text_buffer,
+            list(self.errors),
+            list(self.unseparated)
+        )
+
+    def cue_at(self, time_ms):
+        """
+        查找某时刻正在显示的字幕（表需按开始时间排序）
+
+        Returns:
+            int: 字幕索引，没有则返回None
+        """
+        k = bisect_right(self.starts, time_ms) - 1
+        while k >= 0:
+            if self.starts[k] <= time_ms < self.ends[k]:
+                return k
+            if time_ms - self.starts[k] > 60000:
+                break
+            k -= 1
+        return None
+
+    def charset(self, start_ms=None, end_ms=None):
+        """
+        时间范围内出现的字符集合（不含空白）
+
+        Args:
+            start_ms: 起始时间（默认不限）
+            end_ms: 结束时间（默认不限）
+
+        Returns:
+            set: 字符集合
+        """
+        if start_ms is None and end_ms is None:
+            return {c for c in self.text_buffer.decode('utf-8', errors='replace') if not c.isspace()}
+
+        chars = set()
+        lo = start_ms if start_ms is not None else float('-inf')
+        hi = end_ms if end_ms is not None else float('inf')
+        for i in range(len(self)):
+            if self.starts[i] < hi and self.ends[i] > lo:
+                chars.update(c for c in self.text(i) if not c.isspace())
+        return chars
+
+    def window_charsets(self, window_ms=60000):
+        """
+        每个时间窗口内的字符集合
+
+        Returns:
+            list: 第 k 项为窗口 k 内显示的字幕字符集合
+        """
+        if not len(self):
+            return []
+        windows = [set() for _ in range(max(self.ends) // window_ms + 1)]
+        for i in range(len(self)):
+            start, end = max(self.starts[i], 0), self.ends[i]
+            if end <= start:
+                continue
+            chars = {c for c in self.text(i) if not c.isspace()}
+            for k in range(start // window_ms, (end - 1) // window_ms + 1):
+                windows[k] |= chars
+        return windows
+
+    def to_srt(self):
+        """序列化为 SRT 文本"""
+        lines = []
+        for i in range(len(self)):
+            lines.append(str(i + 1))
+            lines.append(f"{format_timestamp(self.starts[i])} --> {format_timestamp(self.ends[i])}")
+            lines.append(self.text(i))
+            lines.append('')
+        return '\n'.join(lines) + '\n' if lines else ''
+
+
+def _count(data, needle, end=None):
+    """统计出现次数（mmap 在旧版本 Python 中没有 count 方法）"""
+    end = len(data) if end is None else end
+    count = 0
+    pos = data.find(needle, 0, end)
+    while pos != -1:
+        count += 1
+        pos = data.find(needle, pos + len(needle), end)
+    return count
+
+
+def _line_number(data, offset):
+    return _count(data, b'\n', offset) + 1
+
+
+def _previous_line(data, start, base=0):
+    """start 所在行的上一行内容（start 为行首；没有上一行时返回None）"""
+    if start <= base:
+        return None
+    line_start = data.rfind(b'\n', base, start - 1) + 1
+    return bytes(data[max(line_start, base):start - 1])
+
+
+def _in_timing_position(data, start, base=0):
+    """该行是否位于时间轴的位置：文件开头或空行之后，或紧跟在这样的序号行之后"""
+    previous = _previous_line(data, start, base)
+    if previous is None or not previous.strip():
+        return True
+    if INDEX_LINE_RE.match(previous):
+        line_start = start - 1 - len(previous)
+        before = _previous_line(data, line_start, base)
+        return before is None or not before.strip()
+    return False
+
+
+def parse_srt_bytes(data):
+    """
+    解析 SRT 内容
+
+    Args:
+        data: bytes / mmap（UTF-8 编码）
+
+    Returns:
+        CueTable: 字幕时间表
+    """
+    base = len(UTF8_BOM) if data[:3] == UTF8_BOM else 0
+
+    starts = array('q')
+    ends = array('q')
+    offsets = array('q', [0])
+    parts = []
+    total = 0
+
+    matches = 0
+    unseparated = []
+    size = len(data)
+    for match in CUE_RE.finditer(data, base):
+        g = match.groups()
+        end = match.end()
+        # 文本在非空行处结束：下一条字幕紧跟在后面，中间没有空行
+        if end < size:
+            line_end = data.find(b'\n', end)
+            if bytes(data[end:line_end if line_end != -1 else size]).strip():
+                unseparated.append(_line_number(data, end))
+        starts.append(_to_ms(g[0], g[1], g[2], g[3]))
+        ends.append(_to_ms(g[4], g[5], g[6], g[7]))
+
+        chunk = g[8].strip()
+        if b'\r' in chunk:
+            chunk = chunk.replace(b'\r\n', b'\n')
+        parts.append(chunk)
+        total += len(chunk)
+        offsets.append(total)
+        matches += 1
+
+    errors = []
+    if _count(data, b'-->') != matches:
+        for line in ARROW_LINE_RE.finditer(data, base):
+            # 字幕文本中的箭头（如 "A --> B"）不是时间轴
+            if not TIMING_RE.match(data, line.start()) and _in_timing_position(data, line.start(), base):
+                snippet = bytes(line.group(0)).decode('utf-8', errors='replace').strip()
+                errors.append((_line_number(data, line.start()), f"时间轴格式错误: {snippet[:80]}"))
+
+    return CueTable(starts, ends, offsets, b''.join(parts), errors, unseparated)
+
+
+def parse_srt_file(file_path):
+    """
+    解析 SRT 文件（大文件使用 mmap，避免整体读入内存）
+
+    Args:
+        file_path: 字幕文件路径（UTF-8）
+
+    Returns:
+        CueTable: 字幕时间表
+    """
+    size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        if size == 0:
+            return CueTable()
+        if size < MMAP_THRESHOLD:
+            return parse_srt_bytes(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return parse_srt_bytes(mapped)
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    if len(sys.argv) < 2:
+        print("用法: python srt_parser.py <字幕文件路径>")
+        sys.exit(1)
+
+    t0 = time.perf_counter()
+    table = parse_srt_file(sys.argv[1])
+    elapsed = (time.perf_counter() - t0) * 1000
+
+    print(f"字幕条数: {len(table)} (解析耗时 {elapsed:.2f} ms)")
+    print(f"显示总时长: {table.coverage_ms() / 1000:.1f} 秒 / 结束于 {format_timestamp(table.duration_ms)}")
+    print(f"重叠: {len(table.overlaps())}  非正时长: {len(table.negative_durations())}  格式错误: {len(table.errors)}"
+          f"  缺少空行: {len(table.unseparated)}")
+    print(f"字符数: {len(table.charset())}")
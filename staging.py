@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地暂存模块 - 源文件每个视频只复制一次到本地高速盘，输出先写本地临时文件再顺序大块复制到目标并原子改名
+Local Staging Module - Copies each source once to fast local scratch, writes outputs locally, then moves them with large sequential copies and an atomic rename
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+
+# 默认暂存目录（可通过环境变量 BATCHSRT_SCRATCH_DIR 修改）
+DEFAULT_SCRATCH_DIR = os.environ.get('BATCHSRT_SCRATCH_DIR', os.path.join(tempfile.gettempdir(), 'batchsrt-scratch'))
+
+# 默认暂存空间上限
+DEFAULT_SCRATCH_LIMIT = 50 * 1024 ** 3
+
+# 复制缓冲区（网络存储上大块顺序读写）
+COPY_BUFFER = 16 * 1024 * 1024
+
+
+def copy_file(src, dst):
+    """
+    大块顺序复制（先写 .partial，fsync 后原子改名，目标不会出现不完整文件）
+
+    Args:
+        src: 源文件
+        dst: 目标文件
+
+    Returns:
+        int: 复制的字节数
+    """
+    partial = os.path.join(os.path.dirname(dst) or '.', f".{os.path.basename(dst)}.{uuid.uuid4().hex[:8]}.partial")
+    copied = 0
+    try:
+        with open(src, 'rb') as fin, open(partial, 'wb') as fout:
+            while True:
+                chunk = fin.read(COPY_BUFFER)
+                if not chunk:
+                    break
+                fout.write(chunk)
+                copied += len(chunk)
+            fout.flush()
+            os.fsync(fout.fileno())
+        shutil.copystat(src, partial)
+        os.replace(partial, dst)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return copied
+
+
+def partial_output_path(output_path):
+    """
+    输出文件在同一目录下的临时路径（隐藏文件，保留扩展名供 ffmpeg 选择封装格式），
+    编码完成并校验通过后再改名为 output_path，目标路径上不会出现不完整的输出
+
+    Args:
+        output_path: 最终输出路径
+
+    Returns:
+        str: 临时输出路径
+    """
+    stem, ext = os.path.splitext(os.path.basename(output_path))
+    return os.path.join(os.path.dirname(output_path) or '.', f".{stem}.{uuid.uuid4().hex[:8]}.partial{ext}")
+
+
+class ScratchStager:
+    """
+    本地暂存管理：源文件按引用计数共享，空间超出上限时按最近最少使用 (LRU) 释放未被使用的源文件
+    """
+
+    def __init__(self, scratch_dir=None, max_bytes=DEFAULT_SCRATCH_LIMIT):
+        """
+        Args:
+            scratch_dir: 本地暂存目录
+            max_bytes: 源文件暂存空间上限（字节）
+        """
+        self.root = os.path.join(scratch_dir or DEFAULT_SCRATCH_DIR, f"run-{os.getpid()}-{uuid.uuid4().hex[:8]}")
+        self.sources_dir = os.path.join(self.root, 'sources')
+        self.outputs_dir = os.path.join(self.root, 'outputs')
+        os.makedirs(self.sources_dir, exist_ok=True)
+        os.makedirs(self.outputs_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._source_locks = {}
+        # 源路径 -> {'local', 'size', 'refs'}，按最近使用顺序排列
+        self._entries = OrderedDict()
+        self.used_bytes = 0
+        self.stats = {
+            'sources_staged': 0,
+            'source_hits': 0,
+            'source_bypassed': 0,
+            'evictions': 0,
+            'bytes_in': 0,
+            'bytes_out': 0,
+            'outputs_committed': 0,
+        }
+
+    def _evict(self, needed):
+        """释放未被引用的最旧源文件，直到放得下 needed 字节（需持有 _lock）"""
+        for path in list(self._entries):
+            if self.used_bytes + needed <= self.max_bytes:
+                break
+            entry = self._entries[path]
+            if entry['refs'] > 0:
+                continue
+            try:
+                os.remove(entry['local'])
+            except OSError:
+                pass
+            self.used_bytes -= entry['size']
+            del self._entries[path]
+            self.stats['evictions'] += 1
+        return self.used_bytes + needed <= self.max_bytes
+
+    def acquire_source(self, source_path):
+        """
+        获取源文件的本地副本（同一视频的所有语种任务共享一份）
+
+        空间不足（正在使用的副本占满上限，或文件本身超过上限）时直接返回原路径。
+
+        Args:
+            source_path: 源文件路径
+
+        Returns:
+            str: 供 ffmpeg 读取的路径
+        """
+        key = os.path.abspath(source_path)
+        with self._lock:
+            source_lock = self._source_locks.setdefault(key, threading.Lock())
+
+        with source_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry['refs'] += 1
+                    self._entries.move_to_end(key)
+                    self.stats['source_hits'] += 1
+                    return entry['local']
+
+                try:
+                    size = os.path.getsize(source_path)
+                except OSError:
+                    return source_path
+                if size > self.max_bytes or not self._evict(size):
+                    self.stats['source_bypassed'] += 1
+                    return source_path
+                # 先占用空间，复制在锁外进行
+                self.used_bytes += size
+
+            local = os.path.join(self.sources_dir, f"{uuid.uuid4().hex[:12]}_{os.path.basename(source_path)}")
+            try:
+                copied = copy_file(source_path, local)
+            except OSError:
+                with self._lock:
+                    self.used_bytes -= size
+                    self.stats['source_bypassed'] += 1
+                return source_path
+
+            with self._lock:
+                self._entries[key] = {'local': local, 'size': size, 'refs': 1}
+                self.stats['sources_staged'] += 1
+                self.stats['bytes_in'] += copied
+            return local
+
+    def release_source(self, source_path):
+        """任务结束后释放源文件引用（副本保留到 LRU 淘汰，供同一视频的后续任务使用）"""
+        key = os.path.abspath(source_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['refs'] > 0:
+                entry['refs'] -= 1
+
+    def output_temp_path(self, output_path):
+        """输出文件的本地临时路径（保留扩展名，ffmpeg 按扩展名选择封装格式）"""
+        return os.path.join(self.outputs_dir, f"{uuid.uuid4().hex[:12]}_{os.path.basename(output_path)}")
+
+    def commit_output(self, temp_path, output_path):
+        """
+        把本地输出顺序复制到目标位置并原子改名，然后删除本地临时文件
+
+        Args:
+            temp_path: output_temp_path 返回的本地文件
+            output_path: 最终输出路径
+        """
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        copied = copy_file(temp_path, output_path)
+        os.remove(temp_path)
+        with self._lock:
+            self.stats['bytes_out'] += copied
+            self.stats['outputs_committed'] += 1
+
+    def discard_output(self, temp_path):
+        """删除失败任务的本地临时输出"""
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+    def summary(self):
+        """暂存统计（用于日志和状态接口）"""
+        with self._lock:
+            return dict(self.stats, used_bytes=self.used_bytes, max_bytes=self.max_bytes,
+                        cached_sources=len(self._entries))
+
+    def cleanup(self):
+        """删除本次运行的全部暂存文件"""
+        shutil.rmtree(self.root, ignore_errors=True)
+        with self._lock:
+            self._entries.clear()
+            self.used_bytes = 0
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+字幕预检模块 - 编码开始前并行检查所有字幕，提前发现时间轴错误和乱码
+Subtitle Preflight Module - Validates all matched subtitles in parallel before any encoding starts
+"""
+
+import hashlib
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from font_index import rendered_charset
+from media_probe import CACHE_DIR
+from srt_parser import parse_srt_bytes
+from subtitle_encoding import get_encoding_for_language
+
+# 规范化字幕缓存目录（UTF-8 + 修复后的时间轴），不修改原始字幕文件
+NORMALIZED_DIR = CACHE_DIR / 'normalized'
+
+# 修复时给非正时长字幕设置的默认显示时长（毫秒）
+DEFAULT_REPAIR_DURATION_MS = 2000
+
+# 乱码判定阈值
+REPLACEMENT_CHAR_FATAL_RATIO = 0.01
+CONTROL_CHAR_FATAL_RATIO = 0.01
+MOJIBAKE_FATAL_RATIO = 0.05
+
+# UTF-8 文本被按 Latin-1/CP1252 误读后再保存产生的典型字符对
+MOJIBAKE_RE = re.compile('[ÃÂØÙÐÑÕ×][\u0080-¿‘-›Œ-ƒ]')
+CONTROL_CHAR_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]')
+
+# 语种 -> 该语种文字应出现的 Unicode 区间
+LANGUAGE_SCRIPTS = {
+    'AR': [(0x0600, 0x06FF), (0x0750, 0x077F), (0xFB50, 0xFDFF), (0xFE70, 0xFEFF)],
+    'FA': [(0x0600, 0x06FF), (0xFB50, 0xFDFF), (0xFE70, 0xFEFF)],
+    'UR': [(0x0600, 0x06FF), (0xFB50, 0xFDFF), (0xFE70, 0xFEFF)],
+    'CN': [(0x4E00, 0x9FFF), (0x3400, 0x4DBF)],
+    'ZH': [(0x4E00, 0x9FFF), (0x3400, 0x4DBF)],
+    'TW': [(0x4E00, 0x9FFF), (0x3400, 0x4DBF)],
+    'HK': [(0x4E00, 0x9FFF), (0x3400, 0x4DBF)],
+    'JP': [(0x3040, 0x30FF), (0x4E00, 0x9FFF)],
+    'JA': [(0x3040, 0x30FF), (0x4E00, 0x9FFF)],
+    'KR': [(0xAC00, 0xD7AF), (0x1100, 0x11FF), (0x3130, 0x318F)],
+    'KO': [(0xAC00, 0xD7AF), (0x1100, 0x11FF), (0x3130, 0x318F)],
+    'TH': [(0x0E00, 0x0E7F)],
+    'HE': [(0x0590, 0x05FF)],
+    'RU': [(0x0400, 0x04FF)],
+    'EL': [(0x0370, 0x03FF)],
+    'HI': [(0x0900, 0x097F)],
+    'BN': [(0x0980, 0x09FF)],
+    'TA': [(0x0B80, 0x0BFF)],
+    'MY': [(0x1000, 0x109F)],
+}
+
+# 尝试解码的编码顺序（检测结果优先）
+FALLBACK_ENCODINGS = ['utf-8-sig', 'windows-1256', 'windows-1252', 'gbk', 'big5',
+                      'shift_jis', 'euc-kr', 'windows-1251', 'iso-8859-1']
+
+
+def _decode_subtitle(raw, language_code=None):
+    """
+    把原始字节解码为文本（不修改文件）
+
+    非UTF-8时依次尝试语种常用编码、chardet 检测结果和通用编码；
+    已知语种文字区间时，选择解码后该语种文字比例最高的编码。
+
+    Returns:
+        tuple: (text, encoding)，无法解码时 text 为None
+    """
+    try:
+        return raw.decode('utf-8-sig'), 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    candidates = []
+    if language_code:
+        candidates.extend(get_encoding_for_language(language_code))
+    try:
+        import chardet
+        detected = chardet.detect(raw[:256 * 1024])
+        if detected and detected.get('encoding'):
+            candidates.append(detected['encoding'])
+    except ImportError:
+        pass
+    candidates.extend(FALLBACK_ENCODINGS)
+
+    ranges = LANGUAGE_SCRIPTS.get((language_code or '').upper()[:2])
+    best = (None, None)
+    best_ratio = -1.0
+    for encoding in dict.fromkeys(candidates):
+        try:
+            text = raw.decode(encoding)
+        except (UnicodeDecodeError, LookupError):
+            continue
+        if not ranges:
+            return text, encoding
+        ratio = _script_ratio(text, ranges)
+        if ratio > best_ratio:
+            best, best_ratio = (text, encoding), ratio
+    return best
+
+
+def _script_ratio(text, ranges):
+    """文本中属于指定 Unicode 区间的字母比例"""
+    letters = 0
+    hits = 0
+    for char in text:
+        if not char.isalpha():
+            continue
+        letters += 1
+        code = ord(char)
+        if any(lo <= code <= hi for lo, hi in ranges):
+            hits += 1
+    return hits / letters if letters else 0.0
+
+
+def check_garbage(text, language_code=None):
+    """
+    检查解码后的文本是否为乱码（编码转换失败的典型症状）
+
+    Args:
+        text: 字幕文本
+        language_code: 语种代码（用于检查文字是否与语种相符）
+
+    Returns:
+        tuple: (fatal_list, warning_list)
+    """
+    fatal = []
+    warnings = []
+    length = max(len(text), 1)
+
+    replacement = text.count('�')
+    if replacement / length > REPLACEMENT_CHAR_FATAL_RATIO:
+        fatal.append(f"乱码: {replacement} 个无法解码的字符 (�)")
+    elif replacement:
+        warnings.append(f"包含 {replacement} 个无法解码的字符 (�)")
+
+    controls = len(CONTROL_CHAR_RE.findall(text))
+    if controls / length > CONTROL_CHAR_FATAL_RATIO:
+        fatal.append(f"乱码: {controls} 个控制字符，可能是二进制文件或编码错误")
+
+    letters = sum(1 for c in text if c.isalpha())
+    mojibake = len(MOJIBAKE_RE.findall(text))
+    if letters and mojibake / letters > MOJIBAKE_FATAL_RATIO:
+        fatal.append("乱码: 疑似UTF-8被按Latin-1/CP1252误转换 (如 'Ã©'、'Ø§')")
+
+    ranges = LANGUAGE_SCRIPTS.get((language_code or '').upper()[:2])
+    if ranges and letters and _script_ratio(text, ranges) < 0.1:
+        warnings.append(f"字幕文字与语种 {language_code} 不符，可能编码错误或放错文件夹")
+
+    return fatal, warnings
+
+
+def repair_timing(table):
+    """
+    修复时间轴问题：排序、补齐非正时长、截断与下一条重叠的字幕
+
+    Args:
+        table: CueTable
+
+    Returns:
+        tuple: (新的 CueTable, 修复说明列表)
+    """
+    notes = []
+    if not table.is_sorted():
+        table = table.sorted()
+        notes.append("按开始时间重新排序")
+    else:
+        table = table.take(range(len(table)))
+
+    starts, ends = table.starts, table.ends
+    fixed_negative = 0
+    trimmed_overlap = 0
+    for i in range(len(table)):
+        next_start = starts[i + 1] if i + 1 < len(table) else None
+        if ends[i] <= starts[i]:
+            end = starts[i] + DEFAULT_REPAIR_DURATION_MS
+            if next_start is not None and next_start > starts[i]:
+                end = min(end, next_start)
+            ends[i] = end
+            fixed_negative += 1
+        elif next_start is not None and next_start < ends[i] and next_start > starts[i]:
+            ends[i] = next_start
+            trimmed_overlap += 1
+
+    if fixed_negative:
+        notes.append(f"修复 {fixed_negative} 条非正时长字幕")
+    if trimmed_overlap:
+        notes.append(f"截断 {trimmed_overlap} 条重叠字幕")
+    return table, notes
+
+
+def normalized_path_for(subtitle_path, content):
+    """规范化缓存路径（按内容哈希，内容不变则复用）"""
+    digest = hashlib.sha1(content).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(subtitle_path))[0]
+    return NORMALIZED_DIR / f"{name}.{digest}.srt"
+
+
+def validate_subtitle(subtitle_path, language_code=None, repair=False, video_duration=None):
+    """
+    检查单个字幕文件
+
+    Args:
+        subtitle_path: 字幕文件路径
+        language_code: 语种代码
+        repair: 是否把修复后的字幕写入规范化缓存
+        video_duration: 视频时长（秒，可选，用于检查字幕是否超出视频）
+
+    Returns:
+        dict: {'path', 'lang', 'fatal', 'warnings', 'repairs', 'cues', 'encoding', 'normalized_path', 'charset'}
+    """
+    result = {
+        'path': subtitle_path,
+        'lang': language_code,
+        'fatal': [],
+        'warnings': [],
+        'repairs': [],
+        'cues': 0,
+        'encoding': None,
+        'normalized_path': None,
+        'charset': '',
+    }
+
+    try:
+        with open(subtitle_path, 'rb') as f:
+            raw = f.read()
+    except OSError as e:
+        result['fatal'].append(f"无法读取: {e}")
+        return result
+
+    if not raw.strip():
+        result['fatal'].append("字幕文件为空")
+        return result
+
+    text, encoding = _decode_subtitle(raw, language_code)
+    result['encoding'] = encoding
+    if text is None:
+        result['fatal'].append("无法识别字幕编码")
+        return result
+
+    garbage_fatal, garbage_warnings = check_garbage(text, language_code)
+    result['fatal'].extend(garbage_fatal)
+    result['warnings'].extend(garbage_warnings)
+
+    utf8 = text.encode('utf-8')
+    table = parse_srt_bytes(utf8)
+    result['cues'] = len(table)
+    # 字幕需要字形的字符（用于编码前的字体覆盖检查）
+    result['charset'] = ''.join(sorted(rendered_charset(table.text_buffer.decode('utf-8', errors='replace'))))
+
+    if not len(table):
+        result['fatal'].append("未找到任何有效的字幕时间轴")
+        return result
+
+    # 缺少空行时 ffmpeg 仍在每个时间轴行开始新字幕（并把紧邻的序号当作下一条的序号），只作为警告
+    unseparated = []
+    if table.unseparated:
+        unseparated.append(f"{len(table.unseparated)} 条字幕与上一条之间缺少空行 "
+                           f"(首个: 第{table.unseparated[0]}行)")
+
+    # 时间轴格式错误会让 ffmpeg 烧录的字幕与解析结果不一致（字幕丢失或并入上一条），只能修复或拒绝
+    structure_issues = []
+    if table.errors:
+        structure_issues.append(f"{len(table.errors)} 行时间轴格式错误 (首个: 第{table.errors[0][0]}行)，"
+                                f"编码时该字幕会丢失或并入上一条")
+
+    timing_issues = []
+    negative = table.negative_durations()
+    if negative:
+        timing_issues.append(f"{len(negative)} 条字幕结束时间不晚于开始时间")
+    overlaps = table.overlaps()
+    if overlaps:
+        timing_issues.append(f"{len(overlaps)} 处字幕时间重叠")
+    if not table.is_sorted():
+        timing_issues.append("字幕未按时间顺序排列")
+
+    if len(negative) == len(table):
+        result['fatal'].append("所有字幕时长均无效")
+
+    if video_duration and table.duration_ms > (video_duration + 1) * 1000:
+        result['warnings'].append(
+            f"字幕结束于 {table.duration_ms / 1000:.1f}s，超出视频时长 {video_duration:.1f}s")
+
+    needs_normalize = encoding != 'utf-8' or bool(timing_issues) or bool(structure_issues) or bool(unseparated)
+    if repair and needs_normalize and not result['fatal']:
+        if table.unseparated:
+            result['repairs'].append(f"补齐 {len(table.unseparated)} 处字幕之间的空行")
+        if table.errors:
+            result['repairs'].append(f"丢弃 {len(table.errors)} 条时间轴格式错误的字幕")
+        if timing_issues:
+            table, notes = repair_timing(table)
+            result['repairs'].extend(notes)
+        if timing_issues or structure_issues or unseparated:
+            content = table.to_srt().encode('utf-8')
+        else:
+            content = utf8
+        if encoding != 'utf-8':
+            result['repairs'].append(f"{encoding} -> UTF-8")
+
+        normalized = normalized_path_for(subtitle_path, content)
+        try:
+            os.makedirs(NORMALIZED_DIR, exist_ok=True)
+            if not normalized.exists():
+                tmp_path = f"{normalized}.tmp{os.getpid()}"
+                with open(tmp_path, 'wb') as f:
+                    f.write(content)
+                os.replace(tmp_path, normalized)
+            result['normalized_path'] = str(normalized)
+        except OSError as e:
+            result['warnings'].append(f"写入规范化缓存失败: {e}")
+            result['repairs'] = []
+
+    if not result['repairs']:
+        # 未修复的时间轴问题和缺少的空行只作为警告，libass / ffmpeg 可以容忍
+        result['warnings'].extend(unseparated)
+        result['warnings'].extend(timing_issues)
+    if structure_issues and not result['normalized_path']:
+        result['fatal'].extend(structure_issues)
+
+    return result
+
+
+def _validate_args(args):
+    return validate_subtitle(*args)
+
+
+def preflight_tasks(tasks, repair=False, max_workers=None, media_infos=None):
+    """
+    并行检查任务列表中的所有字幕（同一字幕文件只检查一次）
+
+    Args:
+        tasks: 任务字典列表（需包含 subtitle_path、lang、video_path）
+        repair: 是否自动修复并写入规范化缓存
+        max_workers: 并行进程数（默认CPU核数）
+        media_infos: {视频路径: 媒体信息}（可选，用于检查字幕是否超出视频时长）
+
+    Returns:
+        dict: 字幕路径 -> validate_subtitle 结果
+    """
+    jobs = {}
+    for task in tasks:
+        path = task['subtitle_path']
+        if path in jobs:
+            continue
+        info = (media_infos or {}).get(task.get('video_path'))
+        duration = info.get('duration') if info else None
+        jobs[path] = (path, task.get('lang'), repair, duration)
+
+    if not jobs:
+        return {}
+
+    args = list(jobs.values())
+    workers = min(max_workers or os.cpu_count() or 1, len(args))
+    try:
+        # 解析和编码检测是纯CPU计算，用进程池绕过GIL
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_validate_args, args, chunksize=max(1, len(args) // (workers * 4))))
+    except (OSError, RuntimeError, ImportError):
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_validate_args, args))
+
+    return {r['path']: r for r in results}
+
+
+def summarize_preflight(results):
+    """
+    汇总预检结果
+
+    Returns:
+        dict: {'checked', 'fatal', 'warnings', 'repaired'}
+    """
+    return {
+        'checked': len(results),
+        'fatal': sum(1 for r in results.values() if r['fatal']),
+        'warnings': sum(1 for r in results.values() if r['warnings'] and not r['fatal']),
+        'repaired': sum(1 for r in results.values() if r['normalized_path']),
+    }
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) < 2:
+        print("用法: python subtitle_preflight.py <字幕文件夹> [--repair]")
+        sys.exit(1)
+
+    subtitle_folder = sys.argv[1]
+    repair_mode = '--repair' in sys.argv
+
+    demo_tasks = []
+    for lang in sorted(os.listdir(subtitle_folder)):
+        lang_folder = os.path.join(subtitle_folder, lang)
+        if not os.path.isdir(lang_folder):
+            continue
+        for file in sorted(os.listdir(lang_folder)):
+            if file.endswith('.srt') or file.endswith('.str'):
+                demo_tasks.append({'subtitle_path': os.path.join(lang_folder, file), 'lang': lang})
+
+    report = preflight_tasks(demo_tasks, repair=repair_mode)
+    for path, item in sorted(report.items()):
+        status = '✗' if item['fatal'] else ('⚠' if item['warnings'] else '✓')
+        print(f"{status} {path} ({item['cues']} 条, {item['encoding']})")
+        for message in item['fatal']:
+            print(f"    致命: {message}")
+        for message in item['warnings']:
+            print(f"    警告: {message}")
+        for message in item['repairs']:
+            print(f"    修复: {message}")
+    print(summarize_preflight(report))
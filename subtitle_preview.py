@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+字幕样式预览模块 - 只渲染一帧 (JPEG) 或几秒短片 (MP4)，按 视频+字幕+样式+时间点 缓存
+Subtitle Preview Module - Renders a single frame (JPEG) or a short clip (MP4), cached by video+subtitle+style+timestamp
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+import threading
+import time
+
+from ffmpeg_runner import FFMPEG_BIN
+from fontconfig_env import ffmpeg_env
+from media_probe import CACHE_DIR
+from srt_parser import parse_srt_file
+from subtitle_encoding import is_utf8
+from subtitle_preflight import validate_subtitle
+
+PREVIEW_DIR = CACHE_DIR / 'previews'
+
+# 预览类型 -> 文件扩展名
+PREVIEW_KINDS = {
+    'frame': '.jpg',
+    'clip': '.mp4',
+}
+
+DEFAULT_CLIP_SECONDS = 3.0
+MAX_CLIP_SECONDS = 15.0
+
+# 同一预览只渲染一次（前端连续调整样式时可能并发请求）
+_render_locks = {}
+_render_locks_guard = threading.Lock()
+
+
+def _file_signature(path):
+    """路径+大小+修改时间，文件变化后缓存自动失效"""
+    st = os.stat(path)
+    return [os.path.abspath(path), st.st_size, st.st_mtime_ns]
+
+
+def preview_cache_key(video_path, subtitle_path, subtitle_style, timestamp, kind='frame',
+                      duration=DEFAULT_CLIP_SECONDS, language_code=None):
+    """
+    计算预览缓存键
+
+    Args:
+        video_path: 视频文件路径
+        subtitle_path: 字幕文件路径
+        subtitle_style: 字幕样式配置
+        timestamp: 预览时间点（秒）
+        kind: 'frame' 或 'clip'
+        duration: 短片时长（秒，仅 clip）
+        language_code: 语种代码（影响自动字体）
+
+    Returns:
+        str: 十六进制摘要
+    """
+    payload = {
+        'video': _file_signature(video_path),
+        'subtitle': _file_signature(subtitle_path),
+        'style': subtitle_style or {},
+        'lang': language_code,
+        'timestamp': round(float(timestamp), 3),
+        'kind': kind,
+        'duration': round(float(duration), 3) if kind == 'clip' else None,
+    }
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha1(data).hexdigest()
+
+
+def default_preview_time(subtitle_path, cue_index=0):
+    """
+    选择预览时间点：指定字幕条目的显示中点（保证画面中有字幕）
+
+    Args:
+        subtitle_path: 字幕文件路径
+        cue_index: 字幕条目索引（按开始时间排序后，超出范围时取最后一条）
+
+    Returns:
+        float: 时间点（秒），字幕为空时返回0
+    """
+    try:
+        table = parse_srt_file(subtitle_path).sorted()
+    except (OSError, ValueError):
+        return 0.0
+    if not len(table):
+        return 0.0
+    index = min(max(int(cue_index), 0), len(table) - 1)
+    return (table.starts[index] + table.ends[index]) / 2000.0
+
+
+def build_preview_command(video_path, subtitle_filter, output_path, timestamp, kind='frame',
+                          duration=DEFAULT_CLIP_SECONDS):
+    """
+    构建预览 ffmpeg 命令
+
+    -ss 放在 -i 之前做输入端快速定位（只从最近的关键帧开始解码），
+    配合 -copyts 保留原始时间戳，subtitles 滤镜才能按原时间轴显示对应字幕。
+
+    Args:
+        video_path: 视频文件路径
+        subtitle_filter: build_subtitle_filter 生成的滤镜
+        output_path: 输出文件路径
+        timestamp: 时间点（秒）
+        kind: 'frame' 或 'clip'
+        duration: 短片时长（秒）
+
+    Returns:
+        list: ffmpeg 命令
+    """
+    cmd = [FFMPEG_BIN, '-hide_banner', '-loglevel', 'error', '-ss', f"{timestamp:.3f}"]
+    if kind == 'clip':
+        cmd.extend(['-t', f"{duration:.3f}"])
+    cmd.extend(['-copyts', '-i', video_path])
+
+    if kind == 'clip':
+        # 滤镜之后把时间戳归零，短片从0开始播放
+        cmd.extend([
+            '-vf', f"{subtitle_filter},setpts=PTS-STARTPTS",
+            '-af', 'asetpts=PTS-STARTPTS',
+            '-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '23', '-pix_fmt', 'yuv420p',
+            '-c:a', 'aac', '-b:a', '128k',
+            '-movflags', '+faststart',
+            '-f', 'mp4',
+        ])
+    else:
+        cmd.extend([
+            '-vf', subtitle_filter,
+            '-frames:v', '1', '-an', '-q:v', '3',
+            '-f', 'image2', '-update', '1',
+        ])
+
+    cmd.extend(['-y', output_path])
+    return cmd
+
+
+def render_preview(merger, video_path, subtitle_path, subtitle_style=None, language_code=None,
+                   timestamp=None, cue_index=0, kind='frame', duration=DEFAULT_CLIP_SECONDS, timeout=60):
+    """
+    渲染字幕预览（命中缓存时直接返回）
+
+    Args:
+        merger: SubtitleMerger 实例（用于生成与正式合成一致的字幕滤镜）
+        video_path: 视频文件路径
+        subtitle_path: 字幕文件路径
+        subtitle_style: 字幕样式配置
+        language_code: 语种代码
+        timestamp: 预览时间点（秒），为None时使用 cue_index 对应字幕的中点
+        cue_index: 字幕条目索引
+        kind: 'frame' (JPEG) 或 'clip' (MP4)
+        duration: 短片时长（秒）
+        timeout: ffmpeg 超时时间（秒）
+
+    Returns:
+        dict: {'success', 'path', 'cached', 'timestamp', 'kind', 'elapsed', 'error'}
+    """
+    started = time.perf_counter()
+    result = {
+        'success': False,
+        'path': None,
+        'cached': False,
+        'timestamp': None,
+        'kind': kind,
+        'elapsed': 0.0,
+        'error': None,
+    }
+
+    if kind not in PREVIEW_KINDS:
+        result['error'] = f"不支持的预览类型: {kind}"
+        return result
+    if not os.path.isfile(video_path):
+        result['error'] = '视频文件不存在'
+        return result
+    if not os.path.isfile(subtitle_path):
+        result['error'] = '字幕文件不存在'
+        return result
+
+    duration = min(max(float(duration), 0.5), MAX_CLIP_SECONDS)
+    if timestamp is None:
+        timestamp = default_preview_time(subtitle_path, cue_index)
+    timestamp = max(float(timestamp), 0.0)
+    result['timestamp'] = timestamp
+
+    key = preview_cache_key(video_path, subtitle_path, subtitle_style, timestamp, kind, duration, language_code)
+    output_path = str(PREVIEW_DIR / f"{key}{PREVIEW_KINDS[kind]}")
+    result['path'] = output_path
+
+    with _render_locks_guard:
+        lock = _render_locks.setdefault(key, threading.Lock())
+
+    with lock:
+        if os.path.exists(output_path):
+            result['success'] = True
+            result['cached'] = True
+            result['elapsed'] = round(time.perf_counter() - started, 3)
+            return result
+
+        # subtitles 滤镜按 UTF-8 读取字幕，非 UTF-8 时使用规范化副本（不修改原文件）
+        filter_subtitle = subtitle_path
+        if not is_utf8(subtitle_path):
+            check = validate_subtitle(subtitle_path, language_code, repair=True)
+            if check['normalized_path']:
+                filter_subtitle = check['normalized_path']
+
+        os.makedirs(PREVIEW_DIR, exist_ok=True)
+        subtitle_filter = merger.build_subtitle_filter(filter_subtitle, subtitle_style, language_code)
+        temp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        cmd = build_preview_command(video_path, subtitle_filter, temp_path, timestamp, kind, duration)
+
+        try:
+            process = subprocess.run(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                env=ffmpeg_env(),
+                timeout=timeout
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            result['error'] = str(e)
+        else:
+            if process.returncode == 0 and os.path.exists(temp_path) and os.path.getsize(temp_path) > 0:
+                # 先写临时文件再改名，避免并发读取到不完整的预览
+                os.replace(temp_path, output_path)
+                result['success'] = True
+            else:
+                result['error'] = process.stderr.decode('utf-8', errors='replace')[-2000:] or '预览生成失败'
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    result['elapsed'] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def clear_preview_cache():
+    """
+    清空预览缓存
+
+    Returns:
+        int: 删除的文件数
+    """
+    removed = 0
+    if not PREVIEW_DIR.exists():
+        return removed
+    for entry in PREVIEW_DIR.iterdir():
+        if entry.suffix in PREVIEW_KINDS.values():
+            try:
+                entry.unlink()
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="字幕样式预览")
+    parser.add_argument('video', help="视频文件路径")
+    parser.add_argument('subtitle', help="字幕文件路径")
+    parser.add_argument('--lang', help="语种代码")
+    parser.add_argument('--time', type=float, help="预览时间点（秒）")
+    parser.add_argument('--cue', type=int, default=0, help="未指定时间点时使用第几条字幕")
+    parser.add_argument('--clip', action='store_true', help="生成短片而不是单帧")
+    parser.add_argument('--duration', type=float, default=DEFAULT_CLIP_SECONDS, help="短片时长（秒）")
+    parser.add_argument('--font-size', type=int, help="字体大小")
+    parser.add_argument('--margin-v', type=int, help="垂直边距")
+    args = parser.parse_args()
+
+    from app import merger
+
+    style = {}
+    if args.font_size:
+        style['font_size'] = args.font_size
+    if args.margin_v:
+        style['margin_v'] = args.margin_v
+
+    preview = render_preview(merger, args.video, args.subtitle, style or None, args.lang,
+                             timestamp=args.time, cue_index=args.cue,
+                             kind='clip' if args.clip else 'frame', duration=args.duration)
+    print(json.dumps(preview, ensure_ascii=False, indent=2))
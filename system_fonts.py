@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+系统字体发现模块 - 跨平台枚举已安装字体（字体目录 / fc-list / Windows 注册表），按名称建立索引，O(1) 查询
+System Font Discovery Module - Enumerates installed fonts once (font dirs / fc-list / Windows registry) and indexes them by name for O(1) lookups
+"""
+
+import os
+import platform
+import re
+import shutil
+import subprocess
+import threading
+
+from font_config import FONTS_DIR
+from font_index import get_font_index
+
+FC_LIST_BIN = os.environ.get('FC_LIST_BIN', 'fc-list')
+
+# 注册表字体名称后缀，如 "Arial Bold (TrueType)"
+REGISTRY_SUFFIX_RE = re.compile(r'\s*\((TrueType|OpenType|Type 1|All res)\)\s*$', re.IGNORECASE)
+
+
+def normalize_font_name(name):
+    """名称归一化：忽略大小写、空格、连字符和下划线"""
+    return re.sub(r'[\s\-_]+', '', name or '').lower()
+
+
+class SystemFontIndex:
+    """
+    系统字体名称索引：归一化名称 -> 字体文件路径列表（只在构建时扫描一次）
+    """
+
+    def __init__(self):
+        self._names = {}
+        self.sources = []
+
+    def add(self, name, path=None):
+        """登记一个字体名称（家族名、全名或 PostScript 名）"""
+        key = normalize_font_name(name)
+        if not key:
+            return
+        paths = self._names.setdefault(key, [])
+        if path and path not in paths:
+            paths.append(path)
+
+    def build(self):
+        """
+        枚举系统字体
+
+        - 字体目录：解析 name 表（复用 font_index 的磁盘缓存）
+        - Linux 等：fc-list（包含 fontconfig 配置的其他目录）
+        - Windows：注册表中登记的字体
+
+        Returns:
+            SystemFontIndex: self
+        """
+        self._add_from_font_dirs()
+        if platform.system() == 'Windows':
+            self._add_from_registry()
+        elif shutil.which(FC_LIST_BIN):
+            self._add_from_fc_list()
+        return self
+
+    def _add_from_font_dirs(self):
+        project_dir = os.path.abspath(FONTS_DIR)
+        count = 0
+        for face in get_font_index().faces:
+            # 项目 fonts/ 目录不是系统字体
+            if face['path'].startswith(project_dir + os.sep):
+                continue
+            for name in face['families'] + face['full_names'] + [face['postscript']]:
+                self.add(name, face['path'])
+            count += 1
+        if count:
+            self.sources.append('font_dirs')
+
+    def _add_from_fc_list(self, timeout=30):
+        try:
+            result = subprocess.run(
+                [FC_LIST_BIN, '--format', '%{family}\t%{fullname}\t%{postscriptname}\t%{file}\n'],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                timeout=timeout
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            return
+        if result.returncode != 0:
+            return
+
+        for line in result.stdout.decode('utf-8', errors='replace').splitlines():
+            parts = line.split('\t')
+            if len(parts) != 4:
+                continue
+            families, full_names, postscript, path = parts
+            # fc-list 用逗号分隔多语言名称
+            for name in families.split(',') + full_names.split(',') + [postscript]:
+                self.add(name, path)
+        self.sources.append('fc-list')
+
+    def _add_from_registry(self):
+        try:
+            import winreg
+        except ImportError:
+            return
+        fonts_dir = os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), 'Fonts')
+        key_path = r"SOFTWARE\Microsoft\Windows NT\CurrentVersion\Fonts"
+        for root in (winreg.HKEY_LOCAL_MACHINE, winreg.HKEY_CURRENT_USER):
+            try:
+                key = winreg.OpenKey(root, key_path, 0, winreg.KEY_READ)
+            except OSError:
+                continue
+            i = 0
+            while True:
+                try:
+                    name, value, _ = winreg.EnumValue(key, i)
+                except OSError:
+                    break
+                i += 1
+                path = value if os.path.isabs(value) else os.path.join(fonts_dir, value)
+                # "MS Gothic & MS PGothic (TrueType)" 之类的组合名称
+                for part in REGISTRY_SUFFIX_RE.sub('', name).split(' & '):
+                    self.add(part, path)
+            winreg.CloseKey(key)
+        self.sources.append('registry')
+
+    def has_font(self, name):
+        """系统是否安装了指定名称的字体"""
+        return normalize_font_name(name) in self._names
+
+    def find_font_file(self, name):
+        """
+        查找字体文件路径
+
+        Returns:
+            str: 第一个匹配的文件路径，未找到返回None
+        """
+        paths = self._names.get(normalize_font_name(name))
+        return paths[0] if paths else None
+
+    def __len__(self):
+        return len(self._names)
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_system_font_index():
+    """获取进程内共享的系统字体索引（首次调用时构建）"""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = SystemFontIndex().build()
+        return _default_index
+
+
+def reset_system_font_index():
+    """安装新字体后重新构建索引"""
+    global _default_index
+    with _default_index_lock:
+        _default_index = None
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    t0 = time.perf_counter()
+    index = get_system_font_index()
+    print(f"系统字体名称: {len(index)} 个，来源: {', '.join(index.sources) or '无'} "
+          f"(耗时 {(time.perf_counter() - t0) * 1000:.1f} ms)")
+    for font_name in sys.argv[1:] or ['Arial', 'DejaVu Sans', 'Noto Sans CJK SC']:
+        path = index.find_font_file(font_name)
+        print(f"  {font_name}: {'✓ ' + (path or '') if index.has_font(font_name) else '✗ 未安装'}")
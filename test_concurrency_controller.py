@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""测试自适应并发控制器的帧数统计（重试时 ffmpeg 帧数从 0 重新开始）
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from concurrency_controller import ConcurrencyController
+
+
+class IdleSampler:
+    def cpu_utilization(self):
+        return 0.5
+
+    def memory_available(self):
+        return 0.5
+
+    def memory_pressure(self):
+        return None
+
+
+def test_retried_run_counts_frames_from_zero():
+    controller = ConcurrencyController(2, 4, sampler=IdleSampler())
+    controller.task_started(weight=2.0)
+    controller.run_started()
+    controller.report_progress({'frame': '1000'})
+    assert controller._weighted_frames == 2000.0
+
+    # 第一次运行失败后重试：新进程的帧数低于上次的基线，仍要全部计入
+    controller.run_started()
+    controller.report_progress({'frame': '400'})
+    controller.report_progress({'frame': '600'})
+
+    assert controller._weighted_frames == 3200.0
+
+
+def test_progress_from_reader_thread_uses_owner():
+    controller = ConcurrencyController(2, 4, sampler=IdleSampler())
+    controller.task_started(weight=1.0)
+    controller.run_started(owner=42)
+    controller.report_progress({'frame': '50'}, owner=42)
+    controller.report_progress({'frame': 'N/A'}, owner=42)
+
+    assert controller._weighted_frames == 50.0
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""测试封装格式预检：音频复制/转码决策和更换扩展名后的重名处理
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from container_preflight import audio_copyable, plan_container, preflight_containers
+
+
+def make_task(name, lang='EN', folder='/out'):
+    stem, ext = os.path.splitext(name)
+    output_file = f"{stem}_{lang}{ext}"
+    return {'video_path': f'/in/{name}', 'lang': lang, 'output_file': output_file,
+            'output_path': os.path.join(folder, lang, output_file)}
+
+
+def test_audio_copyable_by_container():
+    assert audio_copyable('aac', 'mp4')
+    assert not audio_copyable('pcm_s16le', 'mp4')
+    assert audio_copyable('pcm_s16le', 'mov')
+    assert audio_copyable('truehd', 'matroska')
+    assert not audio_copyable('ac3', 'flv')
+    assert not audio_copyable('aac', None)
+
+
+def test_plan_container_decisions():
+    assert plan_container({'audio_codec': 'aac'}, '/in/a.mp4') == {
+        'output_ext': '.mp4', 'audio': 'copy', 'reason': None, 'known': True}
+
+    pcm = plan_container({'audio_codec': 'pcm_s16le'}, '/in/a.MP4')
+    assert pcm['audio'] == 'aac' and pcm['output_ext'] == '.mp4'
+    assert 'pcm_s16le' in pcm['reason']
+
+    # .wmv 改为 .mp4，WMA 音频无法放入 mp4，同时转码
+    wmv = plan_container({'audio_codec': 'wmav2'}, '/in/a.wmv')
+    assert wmv['output_ext'] == '.mp4' and wmv['audio'] == 'aac'
+
+    # 没有媒体信息时保持音频复制，但仍然更换不适合的封装格式
+    unknown = plan_container(None, '/in/a.wmv')
+    assert unknown == {'output_ext': '.mp4', 'audio': 'copy', 'reason': unknown['reason'], 'known': False}
+
+
+def test_preflight_renames_and_avoids_collisions():
+    tasks = [make_task('a.wmv'), make_task('a.mp4'), make_task('b.wmv'), make_task('c.flv')]
+    infos = {'/in/a.wmv': {'audio_codec': 'wmav2'}, '/in/a.mp4': {'audio_codec': 'aac'},
+             '/in/c.flv': {'audio_codec': 'ac3'}}
+
+    summary = preflight_containers(tasks, infos)
+
+    assert [t['output_file'] for t in tasks] == ['a_EN_wmv.mp4', 'a_EN.mp4', 'b_EN.mp4', 'c_EN.flv']
+    assert tasks[0]['output_path'] == os.path.join('/out', 'EN', 'a_EN_wmv.mp4')
+    assert [t['audio_codec'] for t in tasks] == ['aac', 'copy', 'copy', 'aac']
+    assert summary['container_changed'] == 2
+    assert summary['audio_transcode'] == 2 and summary['audio_copy'] == 2
+    assert summary['unknown'] == 1
+
+
+def test_preflight_collision_with_later_task():
+    # 后面的 a.mp4 任务已占用 a_EN.mp4；不同语种的输出目录不同，不算重名
+    tasks = [make_task('a.wmv', 'EN'), make_task('a.wmv', 'CN'), make_task('a.mp4', 'EN')]
+
+    preflight_containers(tasks, {})
+
+    assert [t['output_file'] for t in tasks] == ['a_EN_wmv.mp4', 'a_CN.mp4', 'a_EN.mp4']
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""测试混合执行器调度（桩执行器，不需要 ffmpeg 或 GPU）
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from executors import Executor, HybridScheduler
+
+
+class StubRunner:
+    """模拟编码：耗时 = 成本 × 执行器的相对耗时 × 缩放系数"""
+
+    def __init__(self, scale=0.002, fail=None):
+        self.scale = scale
+        self.fail = fail or set()
+        self.lock = threading.Lock()
+        self.running = {}
+        self.peak = {}
+        self.runs = []
+
+    def __call__(self, task, executor):
+        with self.lock:
+            self.running[executor.name] = self.running.get(executor.name, 0) + 1
+            self.peak[executor.name] = max(self.peak.get(executor.name, 0), self.running[executor.name])
+            self.runs.append((task['id'], executor.name))
+        time.sleep(task['cost'] * executor.relative_cost * self.scale)
+        with self.lock:
+            self.running[executor.name] -= 1
+        return task['id'] not in self.fail
+
+
+def make_tasks(costs):
+    tasks = [{'id': i, 'cost': cost} for i, cost in enumerate(costs)]
+    return sorted(tasks, key=lambda t: t['cost'], reverse=True)
+
+
+def test_every_task_runs_once_within_slot_limits():
+    executors = [Executor('cpu', slots=2), Executor('nvenc', slots=3)]
+    runner = StubRunner()
+    tasks = make_tasks([5, 1, 3, 8, 2, 2, 6, 1, 4, 7, 3, 2])
+
+    HybridScheduler(executors, tasks, seconds_per_cost=runner.scale).run(runner)
+
+    assert sorted(task_id for task_id, _ in runner.runs) == list(range(len(tasks)))
+    assert runner.peak['cpu'] <= 2
+    assert runner.peak['nvenc'] <= 3
+    assert sum(e.completed for e in executors) == len(tasks)
+
+
+def test_slow_executor_leaves_longest_task_to_fast_executor():
+    executors = [Executor('nvenc', slots=1), Executor('cpu', slots=1)]
+    runner = StubRunner()
+    tasks = make_tasks([40, 1, 1, 1])
+
+    HybridScheduler(executors, tasks, seconds_per_cost=runner.scale).run(runner)
+
+    assignment = dict(runner.runs)
+    # 40 在 libx264 上需要 40 个单位，在 NVENC 上只需 12 个
+    assert assignment[0] == 'nvenc'
+    assert any(name == 'cpu' for name in assignment.values())
+
+
+def test_failures_are_counted_per_executor():
+    executors = [Executor('cpu', slots=1)]
+    runner = StubRunner(fail={1, 3})
+
+    HybridScheduler(executors, make_tasks([1, 1, 1, 1]), seconds_per_cost=runner.scale).run(runner)
+
+    assert executors[0].completed == 2
+    assert executors[0].failed == 2
+
+
+def test_stop_prevents_new_dispatch():
+    executors = [Executor('cpu', slots=1), Executor('qsv', slots=1)]
+    runner = StubRunner()
+    stop = threading.Event()
+
+    def run_and_stop(task, executor):
+        stop.set()
+        return runner(task, executor)
+
+    HybridScheduler(executors, make_tasks([1] * 20), seconds_per_cost=runner.scale).run(run_and_stop, stop.is_set)
+
+    # 两个槽位各自最多已经开始一个任务
+    assert len(runner.runs) <= 2
+
+
+def test_requeued_task_moves_to_another_executor():
+    executors = [Executor('nvenc', slots=1), Executor('cpu', slots=1)]
+    runner = StubRunner()
+    tasks = make_tasks([5, 1])
+    scheduler = HybridScheduler(executors, tasks, seconds_per_cost=runner.scale)
+
+    def run_one(task, executor):
+        # 模拟在 NVENC 上卡住：换到其他执行器重试
+        if executor.name == 'nvenc' and task['id'] == 0:
+            assert scheduler.requeue(task, executor.name)
+            return False
+        return runner(task, executor)
+
+    scheduler.run(run_one)
+
+    assert (0, 'cpu') in runner.runs
+    assert executors[0].failed == 1
+
+
+def test_requeue_refused_when_every_executor_excluded():
+    executors = [Executor('cpu', slots=1)]
+    task = {'id': 0, 'cost': 1}
+    scheduler = HybridScheduler(executors, [task])
+    assert not scheduler.requeue(task, 'cpu')
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""测试监听模式的增量派发（轮询后端，直接驱动扫描，不启动线程）
+"""
+
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app
+from app import SubtitleMerger
+from folder_watcher import FolderWatcher, PollingBackend
+
+
+def make_watcher(tmp_path):
+    video_folder = tmp_path / 'videos'
+    subtitle_folder = tmp_path / 'subtitles'
+    (subtitle_folder / 'EN').mkdir(parents=True)
+    video_folder.mkdir()
+    dispatched = []
+    watcher = FolderWatcher(SubtitleMerger(), str(video_folder), str(subtitle_folder), str(tmp_path / 'output'),
+                            on_tasks=dispatched.extend, settle_time=0, use_inotify=False, log=lambda message: None)
+    watcher.backend = PollingBackend()
+    return watcher, dispatched
+
+
+def poll(watcher):
+    """一个轮询周期：扫描 + 检查稳定文件（settle_time=0 时第二次检查即派发）"""
+    watcher._rescan()
+    watcher._check_pending()
+    watcher._check_pending()
+
+
+def test_removed_and_readded_video_is_dispatched_again(tmp_path):
+    watcher, dispatched = make_watcher(tmp_path)
+    (tmp_path / 'subtitles' / 'EN' / 'a_EN.srt').write_text("1\n00:00:01,000 --> 00:00:02,000\nHi\n")
+    video = tmp_path / 'videos' / 'a.mp4'
+    video.write_bytes(b'video')
+    watcher._initial_scan()
+    assert [t['output_file'] for t in dispatched] == ['a_EN.mp4']
+
+    video.unlink()
+    poll(watcher)
+    assert ('a.mp4', 'EN') not in watcher.dispatched
+
+    video.write_bytes(b'new video')
+    poll(watcher)
+    assert [t['output_file'] for t in dispatched] == ['a_EN.mp4', 'a_EN.mp4']
+
+
+def test_interrupted_encode_leaves_no_output(tmp_path):
+    # 编码写了一半后失败：输出目录中不能留下监听模式会当作已完成的文件；成功后才出现最终文件名
+    merger = SubtitleMerger()
+    subtitle = tmp_path / 'a_EN.srt'
+    subtitle.write_text("1\n00:00:01,000 --> 00:00:02,000\nHi\n")
+    written = []
+    results = [(False, 'Conversion failed!'), (True, '')]
+
+    def merge_subtitle(video_path, subtitle_path, output_path, *args, **kwargs):
+        written.append(output_path)
+        with open(output_path, 'wb') as f:
+            f.write(b'data')
+        return results[len(written) - 1]
+
+    merger.merge_subtitle = merge_subtitle
+    output = tmp_path / 'output' / 'EN' / 'a_EN.mp4'
+    output.parent.mkdir(parents=True)
+    task = {'video_file': 'a.mp4', 'video_path': str(tmp_path / 'a.mp4'), 'lang': 'EN',
+            'subtitle_path': str(subtitle), 'output_file': 'a_EN.mp4', 'output_path': str(output)}
+
+    assert not merger.process_task(task)
+    assert written[0] != str(output) and written[0].endswith('.mp4')
+    assert os.listdir(output.parent) == []
+
+    assert merger.process_task(task)
+    assert os.listdir(output.parent) == ['a_EN.mp4']
+
+
+def test_existing_output_of_remapped_container_is_not_redone(tmp_path):
+    # .wmv 的输出为 .mp4；与 b.mp4 重名时为 b_EN_wmv.mp4，已存在的输出都不能重做
+    watcher, dispatched = make_watcher(tmp_path)
+    for name in ('a', 'b'):
+        (tmp_path / 'subtitles' / 'EN' / f'{name}_EN.srt').write_text("1\n00:00:01,000 --> 00:00:02,000\nHi\n")
+    for name in ('a.wmv', 'b.wmv', 'b.mp4'):
+        (tmp_path / 'videos' / name).write_bytes(b'video')
+    output = tmp_path / 'output' / 'EN'
+    output.mkdir(parents=True)
+    (output / 'a_EN.mp4').write_bytes(b'done')
+    (output / 'b_EN_wmv.mp4').write_bytes(b'done')
+
+    watcher._initial_scan()
+
+    assert [t['output_file'] for t in dispatched] == ['b_EN.mp4']
+    assert watcher.stats['skipped_existing'] == 2
+
+
+def test_manual_batch_and_watch_batch_cannot_both_claim(monkeypatch):
+    monkeypatch.setitem(app.processing_status, 'is_processing', False)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(app.claim_processing())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == [False] * 7 + [True]
+
+    # 已被认领时手动批处理直接拒绝，不启动线程
+    response = app.app.test_client().post('/api/start_merge', json={'plan': {'video_folder': '.'}})
+    assert response.get_json() == {'success': False, 'error': '正在处理中，请等待'}
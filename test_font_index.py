@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""测试字体码位索引：cmap 格式 4 / 12 解析、区间集合、贪心选择最少字体（使用 fonts/ 中自带的字体）
+"""
+
+import os
+import shutil
+import struct
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from font_index import (CoverageSet, FONTS_DIR, FontIndex, _parse_cmap_format4, _parse_cmap_format12,
+                        _table_directory, group_by_block, read_font_faces)
+
+ARIAL = os.path.join(FONTS_DIR, 'arial.ttf')
+NOTO_ARABIC = os.path.join(FONTS_DIR, 'NotoSansArabic-Regular.ttf')
+
+
+def cmap_subtables(path):
+    """{(平台, 编码): (格式, 偏移)}"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    table_offset = _table_directory(data, 0)['cmap'][0]
+    subtables = {}
+    for i in range(struct.unpack_from('>H', data, table_offset + 2)[0]):
+        platform_id, encoding_id, offset = struct.unpack_from('>HHI', data, table_offset + 4 + 8 * i)
+        subtables[(platform_id, encoding_id)] = (struct.unpack_from('>H', data, table_offset + offset)[0],
+                                                 table_offset + offset)
+    return data, subtables
+
+
+@pytest.fixture
+def index(tmp_path):
+    for path in (ARIAL, NOTO_ARABIC):
+        shutil.copy(path, tmp_path)
+    font_index = FontIndex([str(tmp_path)], cache_path='')
+    font_index.scan()
+    return font_index
+
+
+def test_coverage_set_merges_ranges_and_blocks():
+    coverage = CoverageSet.from_ranges([(0x80, 0xFF), (0x41, 0x5A), (0x100, 0x17F), (0x5B, 0x5B), (9, 3)])
+
+    assert list(coverage.starts) == [0x41, 0x80] and list(coverage.ends) == [0x5B, 0x17F]
+    assert len(coverage) == 27 + 256
+    assert 0x41 in coverage and 0x5B in coverage and 0x5C not in coverage and 0x40 not in coverage
+    assert coverage.full_blocks == {1, 2} and coverage.any_blocks == {0, 1, 2}
+    assert CoverageSet.from_flat(coverage.to_flat()).to_flat() == coverage.to_flat()
+
+    assert coverage.covered(group_by_block([0x41, 0x60, 0x90, 0x180])) == {0x41, 0x90}
+
+
+def test_bundled_fonts_cover_known_codepoints():
+    arial = read_font_faces(ARIAL)[0]
+    arabic = read_font_faces(NOTO_ARABIC)[0]
+
+    assert arial['family'] == 'Arial' and arabic['family'] == 'Noto Sans Arabic'
+    for char in 'Aé€Ωا':
+        assert ord(char) in arial['coverage']
+    assert ord('中') not in arial['coverage']
+    assert 0x0627 in arabic['coverage'] and 0x0870 in arabic['coverage']
+    assert 0x0870 not in arial['coverage'] and 0x03A9 not in arabic['coverage']
+
+
+def test_format4_and_format12_subtables_agree():
+    data, subtables = cmap_subtables(NOTO_ARABIC)
+    assert subtables[(3, 1)][0] == 4 and subtables[(3, 10)][0] == 12
+
+    bmp = _parse_cmap_format4(data, subtables[(3, 1)][1])
+    full = _parse_cmap_format12(data, subtables[(3, 10)][1])
+
+    # 格式 12 额外包含 BMP 之外的码位（如 U+10EFD），BMP 部分与格式 4 一致
+    assert CoverageSet.from_ranges(bmp).to_flat() == CoverageSet.from_ranges(r for r in full if r[1] <= 0xFFFF).to_flat()
+    assert 0x10EFD in CoverageSet.from_ranges(full) and 0x10EFD not in CoverageSet.from_ranges(bmp)
+
+
+def test_select_fonts_picks_smallest_set(index):
+    # 两个字体都覆盖拉丁字母和基本阿拉伯字母，只需要一个字体
+    selection = index.select_fonts(set('Hello مرحبا'))
+    assert len(selection['fonts']) == 1 and selection['missing'] == ''
+
+    # 希腊字母只有 Arial 有，扩展阿拉伯字母只有 Noto Sans Arabic 有
+    selection = index.select_fonts(set('Ω مرحبا ࡰ'))
+    assert sorted(face['family'] for face in selection['fonts']) == ['Arial', 'Noto Sans Arabic']
+
+    selection = index.select_fonts(set('مرحبا 中'))
+    assert len(selection['fonts']) == 1 and selection['missing'] == '中'
+    assert index.missing_chars(set('Ω中'), index.find_family('Noto Sans Arabic')) == 'Ω中'
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""测试任务字体目录缓存的 LRU 淘汰（临时缓存目录，不需要 fontTools）
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import font_workdir
+from font_workdir import build_fonts_dir, evict_font_cache
+
+DAY = 24 * 3600
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(font_workdir, 'FONTSDIR_ROOT', tmp_path / 'fontsdirs')
+    monkeypatch.setattr(font_workdir, 'SUBSET_DIR', tmp_path / 'font_subsets')
+    (tmp_path / 'font_subsets').mkdir()
+    return tmp_path
+
+
+def make_dir(cache, name, size, age, subset=True):
+    """生成链接一个字体的 fontsdir，并把最近使用时间设为 age 秒前"""
+    font = cache / ('font_subsets' if subset else 'fonts') / f'{name}.ttf'
+    font.parent.mkdir(exist_ok=True)
+    font.write_bytes(b'x' * size)
+    directory = build_fonts_dir([str(font)])
+    used = time.time() - age
+    os.utime(directory, (used, used))
+    return directory, font
+
+
+def test_unused_dirs_expire(cache):
+    old, old_font = make_dir(cache, 'old', 100, 40 * DAY, subset=False)
+    recent, _ = make_dir(cache, 'recent', 100, DAY, subset=False)
+
+    stats = evict_font_cache()
+
+    assert stats['removed'] == 1
+    assert not os.path.exists(old) and os.path.isdir(recent)
+    # 只删除链接，不影响原字体
+    assert old_font.exists()
+
+
+def test_size_limit_evicts_least_recently_used(cache):
+    first, first_font = make_dir(cache, 'first', 1000, 300)
+    second, _ = make_dir(cache, 'second', 1000, 200)
+    third, _ = make_dir(cache, 'third', 1000, 100)
+    # 复用 first 后它变为最近使用
+    assert build_fonts_dir([str(first_font)]) == first
+
+    stats = evict_font_cache(max_bytes=2500)
+
+    assert stats['removed'] == 1 and stats['subsets_removed'] == 1
+    assert not os.path.exists(second)
+    assert os.path.isdir(first) and os.path.isdir(third)
+    assert stats['remaining'] == 2000
+    assert sorted(os.listdir(cache / 'font_subsets')) == ['first.ttf', 'third.ttf']
+
+
+def test_orphaned_subsets_are_removed(cache):
+    (cache / 'font_subsets' / 'orphan.ttf').write_bytes(b'x' * 10)
+    kept, _ = make_dir(cache, 'kept', 10, 0)
+
+    stats = evict_font_cache()
+
+    assert stats['subsets_removed'] == 1 and stats['removed'] == 0
+    assert os.listdir(cache / 'font_subsets') == ['kept.ttf']
+    assert os.path.isdir(kept)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""测试输出去重：渲染签名（不生成字体目录）、采样指纹相同的源文件需全文件哈希确认
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import font_workdir
+import output_dedup
+from app import SubtitleMerger
+from fingerprint import FingerprintService
+from output_dedup import OutputDeduplicator
+
+SUBTITLE = "1\n00:00:01,000 --> 00:00:02,000\nHola\n"
+
+
+def make_merger(tmp_path, monkeypatch):
+    monkeypatch.setattr(font_workdir, 'FONTSDIR_ROOT', tmp_path / 'fontsdirs')
+    merger = SubtitleMerger()
+    merger.logs = []
+    merger.log = merger.logs.append
+    return merger
+
+
+def make_task(tmp_path, lang):
+    path = tmp_path / lang / f'a_{lang}.srt'
+    path.parent.mkdir(exist_ok=True)
+    path.write_text(SUBTITLE, encoding='utf-8')
+    return {'subtitle_path': str(path), 'lang': lang}
+
+
+def test_render_signature_does_not_build_fonts_dir(tmp_path, monkeypatch):
+    merger = make_merger(tmp_path, monkeypatch)
+    font = tmp_path / 'Custom.ttf'
+    font.write_bytes(b'font data')
+    style = {'font_file': str(font), 'font_size': 24}
+    es, es_419 = make_task(tmp_path, 'ES'), make_task(tmp_path, 'ES-419')
+
+    signature = merger.render_signature(es, style)
+
+    assert not (tmp_path / 'fontsdirs').exists()
+    assert merger.logs == []
+    # 字体和样式相同：不同语种文件夹的相同字幕可以合并
+    assert merger.render_signature(es_419, style) == signature
+    assert merger.render_signature(es, dict(style, font_size=30)) != signature
+
+    # 字体文件变化后签名随之变化
+    font.write_bytes(b'other font data')
+    assert merger.render_signature(es, style) != signature
+
+
+def test_subtitle_filter_uses_resolved_fonts(tmp_path, monkeypatch):
+    merger = make_merger(tmp_path, monkeypatch)
+    font = tmp_path / 'Custom.ttf'
+    font.write_bytes(b'font data')
+    task = make_task(tmp_path, 'ES')
+
+    subtitle_filter = merger.build_subtitle_filter(task['subtitle_path'], {'font_file': str(font)}, 'ES')
+
+    assert ":fontsdir='" in subtitle_filter
+    assert "force_style='FontName=Custom.ttf,Outline=0,Shadow=0'" in subtitle_filter
+    assert len(os.listdir(tmp_path / 'fontsdirs')) == 1
+
+
+def test_sampled_match_is_confirmed_by_full_hash(tmp_path, monkeypatch):
+    # 采样 3 个 16 字节的块（偏移 0 / 42 / 84），两个文件只在未采样的第 20 字节不同
+    service = FingerprintService(':memory:', blocks=1, block_size=16)
+    monkeypatch.setattr(output_dedup, 'get_fingerprint_service', lambda: service)
+    original = bytes(range(100))
+    changed = bytearray(original)
+    changed[20] ^= 0xFF
+    (tmp_path / 'a.mp4').write_bytes(original)
+    (tmp_path / 'b.mp4').write_bytes(bytes(changed))
+    (tmp_path / 'c.mp4').write_bytes(original)
+    assert service.fingerprint(str(tmp_path / 'a.mp4')) == service.fingerprint(str(tmp_path / 'b.mp4'))
+
+    tasks = []
+    for name in ('a', 'b', 'c'):
+        task = make_task(tmp_path, 'ES')
+        task.update(video_path=str(tmp_path / f'{name}.mp4'), output_path=str(tmp_path / 'out' / f'{name}_ES.mp4'))
+        tasks.append(task)
+
+    deduplicator = OutputDeduplicator()
+    primaries = deduplicator.group(tasks)
+
+    assert [os.path.basename(t['video_path']) for t in primaries] == ['a.mp4', 'b.mp4']
+    assert [d['video_path'] for d in primaries[0]['duplicates']] == [str(tmp_path / 'c.mp4')]
+    assert not primaries[1].get('duplicates')
+    assert deduplicator.summary()['false_matches'] == 1
+    assert deduplicator.summary()['duplicates'] == 1
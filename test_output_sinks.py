@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""测试输出目标：S3 分片上传（本地最小 S3 兼容服务）、上传后删除本地输出、SFTP 主机密钥策略
+"""
+
+import hashlib
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import output_sinks
+from output_sinks import LocalSink, SinkError, UploadPool, create_sink
+
+MB = 1024 * 1024
+
+
+class StubS3Handler(BaseHTTPRequestHandler):
+    """只实现 PutObject 和分片上传的 S3 兼容服务（路径式寻址）"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _body(self):
+        data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if 'aws-chunked' in self.headers.get('Content-Encoding', ''):
+            # botocore 附带校验和时使用的分块编码：<十六进制长度>[;扩展]\r\n<数据>\r\n ... 0\r\n<trailer>
+            chunks, rest = [], data
+            while rest:
+                line, _, rest = rest.partition(b'\r\n')
+                size = int(line.split(b';')[0], 16)
+                if not size:
+                    break
+                chunks.append(rest[:size])
+                rest = rest[size + 2:]
+            data = b''.join(chunks)
+        return data
+
+    def _reply(self, status=200, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _target(self):
+        parsed = urlparse(self.path)
+        bucket, _, key = parsed.path.lstrip('/').partition('/')
+        return bucket, key, parse_qs(parsed.query, keep_blank_values=True)
+
+    def do_PUT(self):
+        bucket, key, query = self._target()
+        body = self._body()
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        state = self.server.state
+        with state['lock']:
+            if 'uploadId' in query:
+                state['parts'][(query['uploadId'][0], int(query['partNumber'][0]))] = body
+            else:
+                state['objects'][(bucket, key)] = body
+            state['requests'].append(('PUT', 'UploadPart' if 'uploadId' in query else 'PutObject'))
+        self._reply(headers={'ETag': etag})
+
+    def do_POST(self):
+        bucket, key, query = self._target()
+        self._body()
+        state = self.server.state
+        with state['lock']:
+            if 'uploads' in query:
+                state['requests'].append(('POST', 'CreateMultipartUpload'))
+                upload_id = f"upload-{len(state['requests'])}"
+                body = (f'<?xml version="1.0" encoding="UTF-8"?><InitiateMultipartUploadResult>'
+                        f'<Bucket>{bucket}</Bucket><Key>{key}</Key><UploadId>{upload_id}</UploadId>'
+                        f'</InitiateMultipartUploadResult>')
+            else:
+                state['requests'].append(('POST', 'CompleteMultipartUpload'))
+                upload_id = query['uploadId'][0]
+                numbers = sorted(n for u, n in state['parts'] if u == upload_id)
+                state['objects'][(bucket, key)] = b''.join(state['parts'].pop((upload_id, n)) for n in numbers)
+                body = (f'<?xml version="1.0" encoding="UTF-8"?><CompleteMultipartUploadResult>'
+                        f'<Bucket>{bucket}</Bucket><Key>{key}</Key><ETag>"done"</ETag>'
+                        f'</CompleteMultipartUploadResult>')
+        self._reply(body=body.encode('utf-8'), headers={'Content-Type': 'application/xml'})
+
+
+@pytest.fixture
+def stub_s3():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubS3Handler)
+    server.state = {'lock': threading.Lock(), 'objects': {}, 'parts': {}, 'requests': []}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_s3_multipart_upload_and_delete_local(stub_s3, tmp_path):
+    pytest.importorskip('boto3')
+    data = os.urandom(11 * MB)
+    local = tmp_path / 'video_EN.mp4'
+    local.write_bytes(data)
+    sink = create_sink({
+        'type': 's3',
+        'bucket': 'media',
+        'prefix': 'out',
+        'endpoint_url': f'http://127.0.0.1:{stub_s3.server_address[1]}',
+        'region': 'us-east-1',
+        'access_key': 'test',
+        'secret_key': 'test',
+        # boto3 的最小分片为 5 MB：11 MB 分为 3 片
+        'multipart_threshold': 5 * MB,
+        'multipart_chunksize': 5 * MB,
+    })
+
+    pool = UploadPool(sink, workers=2, delete_local=True)
+    pool.submit(str(local), 'EN/video_EN.mp4')
+    pool.close()
+    result = pool.summary()
+
+    operations = [name for _, name in stub_s3.state['requests']]
+    assert result['uploaded'] == 1 and result['failed'] == 0
+    assert operations.count('CreateMultipartUpload') == 1
+    assert operations.count('UploadPart') == 3
+    assert operations.count('CompleteMultipartUpload') == 1
+    assert stub_s3.state['objects'][('media', 'out/EN/video_EN.mp4')] == data
+    assert not local.exists()
+
+
+class FlakySink(LocalSink):
+    """前 failures 次上传失败的本地目录"""
+
+    def __init__(self, root, failures):
+        super().__init__(root)
+        self.failures = failures
+
+    def upload(self, local_path, key):
+        if self.failures:
+            self.failures -= 1
+            raise IOError("connection reset")
+        return super().upload(local_path, key)
+
+
+def test_failed_upload_keeps_local_output(tmp_path, monkeypatch):
+    monkeypatch.setattr(output_sinks, 'RETRY_BACKOFF', 0.0)
+    local = tmp_path / 'video_EN.mp4'
+    local.write_bytes(b'data')
+
+    pool = UploadPool(FlakySink(str(tmp_path / 'remote'), failures=5), retries=2, delete_local=True)
+    pool.submit(str(local), 'video_EN.mp4')
+    pool.close()
+
+    assert pool.summary()['failed'] == 1
+    assert pool.summary()['retries'] == 2
+    assert local.exists()
+
+
+def test_retried_upload_deletes_local_output(tmp_path, monkeypatch):
+    monkeypatch.setattr(output_sinks, 'RETRY_BACKOFF', 0.0)
+    local = tmp_path / 'video_EN.mp4'
+    local.write_bytes(b'data')
+
+    pool = UploadPool(FlakySink(str(tmp_path / 'remote'), failures=1), retries=2, delete_local=True)
+    pool.submit(str(local), 'EN/video_EN.mp4')
+    pool.close()
+
+    assert pool.summary()['uploaded'] == 1
+    assert (tmp_path / 'remote' / 'EN' / 'video_EN.mp4').read_bytes() == b'data'
+    assert not local.exists()
+
+
+def test_sftp_rejects_unknown_hosts_by_default(tmp_path):
+    paramiko = pytest.importorskip('paramiko')
+    key = paramiko.RSAKey.generate(1024)
+    known_hosts = tmp_path / 'known_hosts'
+    known_hosts.write_text(f"nas.example {key.get_name()} {key.get_base64()}\n")
+
+    sink = create_sink(f"sftp://user@nas.example/out?known_hosts={known_hosts}")
+    client = sink._client()
+
+    assert isinstance(client._policy, paramiko.RejectPolicy)
+    assert client.get_host_keys().lookup('nas.example')
+
+
+def test_sftp_host_key_policy_must_be_explicit():
+    pytest.importorskip('paramiko')
+
+    sink = create_sink({'type': 'sftp', 'host': 'nas.example', 'host_key_policy': 'warning'})
+    assert sink.host_key_policy == 'warning'
+    with pytest.raises(SinkError):
+        create_sink({'type': 'sftp', 'host': 'nas.example', 'host_key_policy': 'accept-all'})
+
+
+class FakeConnection:
+    """记录 close 调用的 SSHClient / SFTPClient 替身"""
+
+    def __init__(self, fail_put=False):
+        self.closed = False
+        self.fail_put = fail_put
+
+    def connect(self, *args, **kwargs):
+        pass
+
+    def open_sftp(self):
+        self.sftp = FakeConnection(self.fail_put)
+        return self.sftp
+
+    def stat(self, path):
+        pass
+
+    def put(self, local_path, remote_path):
+        if self.fail_put:
+            raise IOError("connection reset")
+
+    def posix_rename(self, source, target):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def test_sftp_failed_upload_closes_the_ssh_client(tmp_path, monkeypatch):
+    pytest.importorskip('paramiko')
+    local = tmp_path / 'video_EN.mp4'
+    local.write_bytes(b'data')
+    clients = [FakeConnection(fail_put=True), FakeConnection()]
+    sink = create_sink({'type': 'sftp', 'host': 'nas.example', 'path': '/out'})
+    monkeypatch.setattr(sink, '_client', iter(clients).__next__)
+
+    with pytest.raises(IOError):
+        sink.upload(str(local), 'EN/video_EN.mp4')
+    assert clients[0].closed and clients[0].sftp.closed
+    assert sink._connections == []
+
+    # 重试时重新连接
+    assert sink.upload(str(local), 'EN/video_EN.mp4') == 4
+    assert sink._connections == [(clients[1].sftp, clients[1])]
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""测试输出校验：帧数比较和 ffprobe 参数（替换 run_ffprobe，不运行 ffprobe）
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import output_verify
+from output_verify import compare_outputs, stream_facts, verify_output
+
+
+def make_probe(duration, nb_frames=None, nb_read_packets=None, fps='25/1'):
+    video = {'codec_type': 'video', 'avg_frame_rate': fps, 'duration': str(duration)}
+    if nb_frames is not None:
+        video['nb_frames'] = str(nb_frames)
+    if nb_read_packets is not None:
+        video['nb_read_packets'] = str(nb_read_packets)
+    audio = {'codec_type': 'audio', 'duration': str(duration)}
+    return {'format': {'duration': str(duration)}, 'streams': [video, audio]}
+
+
+def test_missing_header_frame_count_uses_estimate_on_both_sides():
+    # 源文件 mp4 的文件头帧数（可变帧率，少于 时长 × 帧率）与 mkv 输出的估算值不能直接比较
+    source = stream_facts(make_probe(100.0, nb_frames=2300))
+    output = stream_facts(make_probe(100.0))
+
+    assert output['frames'] is None
+    assert output['estimated_frames'] == 2500
+    assert compare_outputs(source, output) == []
+
+
+def test_truncated_frame_count_is_reported():
+    source = stream_facts(make_probe(100.0, nb_frames=2500))
+    output = stream_facts(make_probe(100.0, nb_frames=1200))
+
+    assert any('视频数据包' in problem for problem in compare_outputs(source, output))
+
+
+def test_quick_mode_does_not_count_packets(monkeypatch):
+    calls = []
+
+    def run_ffprobe(path, extra, timeout=None):
+        calls.append(extra)
+        return make_probe(100.0, nb_read_packets=2500 if '-count_packets' in extra else None)
+
+    monkeypatch.setattr(output_verify, 'run_ffprobe', run_ffprobe)
+    monkeypatch.setattr(output_verify, 'sample_decode', lambda path, duration: [])
+    source = make_probe(100.0)
+
+    assert verify_output('out.mkv', source)['ok']
+    assert '-count_packets' not in calls[-1]
+    assert verify_output('out.mkv', source, deep=True)['ok']
+    assert '-count_packets' in calls[-1]
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""测试失败分类、重试决策和熔断器状态转换（替换时钟，不需要等待冷却）
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import retry_policy
+from retry_policy import CircuitBreaker, RetryPolicy, classify_failure
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(retry_policy, 'time', fake)
+    return fake
+
+
+@pytest.mark.parametrize('message, expected', [
+    ("[h264_nvenc @ 0x55] OpenEncodeSessionEx failed: out of memory (10)", 'gpu_session_limit'),
+    ("[h264_nvenc @ 0x55] Cannot load libnvidia-encode.so.1", 'gpu_error'),
+    ("av_interleaved_write_frame(): No space left on device", 'disk_full'),
+    ("[mp4 @ 0x55] Could not find tag for codec pcm_s16le in stream #1", 'container_error'),
+    ("输出校验失败: 时长 10.0s 与源文件 60.0s 不一致", 'verify_failed'),
+    ("[Parsed_subtitles_0 @ 0x55] Unable to open /in/a_EN.srt", 'subtitle_error'),
+    ("/in/a.mp4: Invalid data found when processing input", 'input_error'),
+    ("Conversion failed!", 'unknown'),
+    (None, 'unknown'),
+])
+def test_classify_failure(message, expected):
+    assert classify_failure(message) == expected
+
+
+def test_classify_stalled_before_message():
+    assert classify_failure("No space left on device", {'reason': 'stalled'}) == 'stalled'
+    assert classify_failure(None, {'reason': 'timeout'}) == 'timeout'
+
+
+def test_breaker_opens_after_threshold_and_half_opens(clock):
+    breaker = CircuitBreaker(threshold=3, cooldown=60, max_cooldown=600)
+
+    assert not breaker.record('nvenc', False)
+    assert not breaker.record('nvenc', False)
+    assert breaker.allow('nvenc')
+    assert breaker.record('nvenc', False)
+    assert not breaker.allow('nvenc')
+    assert breaker.summary()['nvenc']['state'] == 'open'
+
+    # 熔断前已开始的任务在冷却期内失败，不重复熔断
+    assert not breaker.record('nvenc', False)
+    assert breaker.summary()['nvenc']['trips'] == 1
+
+    clock.now += 60
+    assert breaker.allow('nvenc')
+    assert breaker.summary()['nvenc']['state'] == 'half-open'
+
+
+def test_half_open_failure_doubles_cooldown_up_to_limit(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=60, max_cooldown=200)
+    assert breaker.record('qsv', False)
+
+    clock.now += 60
+    assert breaker.record('qsv', False)
+    clock.now += 119
+    assert not breaker.allow('qsv')
+    clock.now += 1
+    assert breaker.allow('qsv')
+
+    # 120 → 240 超过上限，按 200 计算
+    assert breaker.record('qsv', False)
+    clock.now += 199
+    assert not breaker.allow('qsv')
+    clock.now += 1
+    assert breaker.allow('qsv')
+    assert breaker.summary()['qsv']['trips'] == 3
+
+
+def test_success_closes_breaker_and_resets_cooldown(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=60)
+    breaker.record('nvenc', False)
+    clock.now += 60
+    breaker.record('nvenc', False)
+    clock.now += 120
+
+    breaker.record('nvenc', True)
+    assert breaker.summary()['nvenc']['state'] == 'closed'
+
+    breaker.record('nvenc', False)
+    clock.now += 60
+    assert breaker.allow('nvenc')
+
+
+def test_gpu_failure_falls_back_to_cpu_then_gives_up(clock):
+    policy = RetryPolicy()
+    task = {'output_file': 'a_EN.mp4'}
+
+    decision = policy.on_failure(task, 'gpu', 'gpu_error', on_gpu=True)
+    assert decision == {'cpu': True, 'reason': 'GPU/驱动错误', 'delay': 0.0, 'class': 'gpu_error'}
+    assert policy.on_failure(task, 'cpu', 'gpu_error', on_gpu=False)['cpu'] is False
+    assert policy.on_failure(task, 'cpu', 'gpu_error', on_gpu=False) is None
+
+    summary = policy.summary()
+    assert summary['retried'] == 2 and summary['fallbacks'] == 1 and summary['gave_up'] == 1
+    assert [a['path'] for a in task['attempts']] == ['gpu', 'cpu', 'cpu']
+
+
+def test_session_limit_waits_on_same_path_without_cpu_fallback(clock):
+    policy = RetryPolicy(cpu_fallback=False)
+
+    decision = policy.on_failure({}, 'gpu', 'gpu_session_limit', on_gpu=True)
+
+    assert decision['cpu'] is False
+    assert decision['delay'] == 5.0
+
+
+def test_input_error_is_retried_only_after_gpu_failure(clock):
+    policy = RetryPolicy()
+
+    assert policy.on_failure({}, 'cpu', 'input_error', on_gpu=False) is None
+    assert policy.on_failure({}, 'gpu', 'input_error', on_gpu=True)['cpu'] is True
+    assert policy.on_failure({}, 'cpu', 'disk_full', on_gpu=False) is None
+    assert policy.on_failure({}, 'cpu', 'container_error', on_gpu=False) is None
+
+
+def test_only_executor_failures_trip_the_breaker(clock):
+    policy = RetryPolicy(breaker=CircuitBreaker(threshold=2))
+
+    for _ in range(3):
+        policy.on_failure({}, 'nvenc', 'input_error', on_gpu=True)
+    assert policy.breaker.allow('nvenc')
+
+    policy.on_failure({}, 'nvenc', 'gpu_error', on_gpu=True)
+    policy.on_failure({}, 'nvenc', 'verify_failed', on_gpu=True)
+    assert not policy.breaker.allow('nvenc')
+    assert policy.summary()['breaker_trips'] == 1
+
+
+def test_overrides_abandon_and_recovery(clock):
+    policy = RetryPolicy({'unknown': {'retries': 2}, 'stalled': {'retries': 0}})
+    task = {}
+
+    assert policy.on_failure({}, 'cpu', 'stalled', on_gpu=False) is None
+    decision = policy.on_failure(task, 'cpu', 'unknown', on_gpu=False)
+    policy.abandon(decision)
+    assert policy.summary()['retried'] == 0
+    assert policy.summary()['gave_up'] == 2
+
+    policy.on_success(task, 'cpu')
+    assert policy.summary()['recovered'] == 1
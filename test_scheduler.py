@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""测试任务调度：成本估算、最长优先 (LPT) 排序、按源文件分组和完成时间预测（不探测媒体、不读写缓存）
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import scheduler
+from scheduler import BatchScheduler, estimate_cost, order_by_locality, order_longest_first, predict_makespan
+
+INFOS = {
+    '/in/short.mp4': {'duration': 60, 'width': 1920, 'height': 1080},
+    '/in/long.mp4': {'duration': 600, 'width': 1920, 'height': 1080},
+    '/in/4k.mp4': {'duration': 100, 'width': 3840, 'height': 2160},
+}
+
+
+def make_tasks(*entries):
+    return [{'video_path': f'/in/{name}.mp4', 'lang': lang} for name, lang in entries]
+
+
+@pytest.fixture(autouse=True)
+def host_throughput(monkeypatch):
+    monkeypatch.setattr(scheduler, 'load_seconds_per_cost', lambda video_codec='libx264': 2.0)
+
+
+def test_estimate_cost_weights_resolution_and_encoder():
+    assert estimate_cost(INFOS['/in/short.mp4']) == 60
+    assert estimate_cost(INFOS['/in/4k.mp4']) == 400
+    assert estimate_cost(INFOS['/in/long.mp4'], 'h264_nvenc') == pytest.approx(180)
+    assert estimate_cost({'duration': 10}) == 10
+    assert estimate_cost(None) is None and estimate_cost({'duration': 0}) is None
+
+
+def test_longest_first_is_stable_and_estimates_unknown_durations():
+    tasks = make_tasks(('short', 'EN'), ('unknown', 'EN'), ('long', 'EN'), ('4k', 'EN'), ('short', 'CN'))
+
+    ordered = order_longest_first(tasks, media_infos=INFOS)
+
+    assert [(t['video_path'], t['lang']) for t in ordered] == [
+        ('/in/long.mp4', 'EN'), ('/in/4k.mp4', 'EN'), ('/in/unknown.mp4', 'EN'),
+        ('/in/short.mp4', 'EN'), ('/in/short.mp4', 'CN')]
+    # 时长未知的任务按已知任务的平均成本
+    unknown = ordered[2]
+    assert unknown['cost_estimated'] and unknown['cost'] == pytest.approx((60 + 600 + 400 + 60) / 4)
+    assert 'cost' not in tasks[0]
+
+
+def test_predict_makespan():
+    assert predict_makespan([], 3) == 0.0
+    assert predict_makespan([5], 0) == 5
+    assert predict_makespan([10800, 1200, 900, 600, 600, 600, 600, 300], 3) == 10800
+    # 最长任务排在最后时跨度变长
+    assert predict_makespan([300, 600, 600, 600, 600, 900, 1200, 10800], 3) == 12000
+    # 模拟的是贪心分配，不是最优解（最优为 4+3 / 3+2+2 = 7）
+    assert predict_makespan([4, 3, 3, 2, 2], 2) == 8
+
+
+def test_locality_keeps_source_tasks_together():
+    tasks = order_longest_first(make_tasks(('short', 'EN'), ('long', 'EN'), ('short', 'CN'), ('4k', 'EN'),
+                                           ('short', 'JA')), media_infos=INFOS)
+
+    ordered = order_by_locality(tasks)
+
+    # 组总成本: long 600 > 4k 400 > short 180
+    assert [t['video_path'] for t in ordered] == ['/in/long.mp4', '/in/4k.mp4'] + ['/in/short.mp4'] * 3
+    assert [t['lang'] for t in ordered[2:]] == ['EN', 'CN', 'JA']
+
+
+def test_batch_scheduler_corrects_prediction_with_measured_throughput(monkeypatch):
+    tasks = make_tasks(('short', 'EN'), ('long', 'EN'), ('4k', 'EN'))
+    batch = BatchScheduler(tasks, workers=2, media_infos=INFOS)
+
+    assert [t['video_path'] for t in batch.tasks] == ['/in/long.mp4', '/in/4k.mp4', '/in/short.mp4']
+    assert batch.total_cost == 1060 and batch.makespan_cost == 600
+    assert batch.seconds_per_cost == 2.0
+    assert batch.summary()['strategy'] == 'longest-first'
+
+    batch.record_completion(batch.tasks[2], elapsed=30)
+    batch.record_completion(batch.tasks[1], elapsed=999, success=False)
+    assert batch.seconds_per_cost == 0.5
+    assert batch.finished_cost == 460
+
+    saved = []
+    monkeypatch.setattr(scheduler, 'record_seconds_per_cost', lambda codec, value: saved.append((codec, value)))
+    batch.save_throughput()
+    assert saved == [('libx264', 0.5)]
+
+
+def test_unknown_strategy_falls_back_to_longest_first():
+    batch = BatchScheduler(make_tasks(('short', 'EN')), media_infos=INFOS, strategy='random')
+
+    assert batch.strategy == 'longest-first'
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""测试 SRT 解析的边界情况（缺少空行、文本中的箭头）
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from srt_parser import parse_srt_bytes
+
+UNSEPARATED = b"1\n00:00:01,000 --> 00:00:02,000\nHello\n2\n00:00:03,000 --> 00:00:04,000\nBye\n"
+
+
+def test_cues_without_blank_line_are_not_merged():
+    table = parse_srt_bytes(UNSEPARATED)
+
+    assert len(table) == 2
+    assert [table.text(i) for i in range(len(table))] == ['Hello', 'Bye']
+    assert table.starts[1] == 3000
+    # 第 4 行的序号紧跟在上一条字幕文本之后
+    assert table.unseparated == [4]
+
+
+def test_unseparated_cue_without_index_line():
+    table = parse_srt_bytes(b"00:00:01,000 --> 00:00:02,000\r\nHello\r\n00:00:03,000 --> 00:00:04,000\r\nBye")
+
+    assert [table.text(i) for i in range(len(table))] == ['Hello', 'Bye']
+    assert table.unseparated == [3]
+
+
+def test_arrow_in_text_is_not_a_timing_error():
+    table = parse_srt_bytes(b"1\n00:00:01,000 --> 00:00:02,000\nA --> B\n\n2\n00:00:03,000 --> 00:00:04,000\nBye\n")
+
+    assert len(table) == 2
+    assert table.text(0) == 'A --> B'
+    assert table.errors == []
+    assert table.unseparated == []
+
+
+def test_malformed_timing_line_is_reported():
+    table = parse_srt_bytes(b"1\n00:00:01,000 --> 00:00:02,000\nHi\n\n2\n00:00:03 --> soon\nBye\n")
+
+    assert len(table) == 1
+    assert len(table.errors) == 1
+    assert table.errors[0][0] == 6
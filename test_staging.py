@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""测试本地暂存：源文件引用计数、LRU 淘汰、超出上限时直接读取原文件、输出提交
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import staging
+from staging import ScratchStager
+
+
+def make_source(tmp_path, name, size):
+    path = tmp_path / 'nas' / name
+    path.parent.mkdir(exist_ok=True)
+    path.write_bytes(b'v' * size)
+    return str(path)
+
+
+def test_sources_are_shared_and_least_recently_used_evicted(tmp_path):
+    stager = ScratchStager(str(tmp_path / 'scratch'), max_bytes=250)
+    a, b, c = (make_source(tmp_path, f'{name}.mp4', 100) for name in 'abc')
+
+    local_a = stager.acquire_source(a)
+    assert stager.acquire_source(a) == local_a
+    local_b = stager.acquire_source(b)
+    stager.release_source(b)
+
+    # a 仍被引用：跳过 a，淘汰未被引用的 b
+    local_c = stager.acquire_source(c)
+    assert local_c != c
+    assert os.path.exists(local_a) and not os.path.exists(local_b)
+
+    summary = stager.summary()
+    assert summary['sources_staged'] == 3 and summary['source_hits'] == 1
+    assert summary['evictions'] == 1 and summary['used_bytes'] == 200
+
+    # a 和 c 都在使用中，放不下 b 时直接读取原文件
+    assert stager.acquire_source(b) == b
+    assert stager.summary()['source_bypassed'] == 1
+
+    stager.cleanup()
+    assert not os.path.exists(stager.root)
+
+
+def test_source_larger_than_limit_is_bypassed(tmp_path):
+    stager = ScratchStager(str(tmp_path / 'scratch'), max_bytes=50)
+    source = make_source(tmp_path, 'big.mp4', 100)
+
+    assert stager.acquire_source(source) == source
+    assert os.listdir(stager.sources_dir) == []
+    assert stager.summary()['source_bypassed'] == 1 and stager.used_bytes == 0
+
+
+def test_failed_copy_releases_reserved_space(tmp_path, monkeypatch):
+    stager = ScratchStager(str(tmp_path / 'scratch'), max_bytes=150)
+    source = make_source(tmp_path, 'a.mp4', 100)
+
+    def fail(src, dst):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(staging, 'copy_file', fail)
+    assert stager.acquire_source(source) == source
+    assert stager.used_bytes == 0
+
+    monkeypatch.undo()
+    assert stager.acquire_source(source) != source
+    assert stager.used_bytes == 100
+
+
+def test_commit_output_moves_local_output(tmp_path):
+    stager = ScratchStager(str(tmp_path / 'scratch'))
+    output_path = tmp_path / 'out' / 'EN' / 'a_EN.mp4'
+    temp_path = stager.output_temp_path(str(output_path))
+    assert temp_path.endswith('_a_EN.mp4')
+    with open(temp_path, 'wb') as f:
+        f.write(b'encoded')
+
+    stager.commit_output(temp_path, str(output_path))
+
+    assert output_path.read_bytes() == b'encoded'
+    assert os.listdir(output_path.parent) == ['a_EN.mp4']
+    assert os.listdir(stager.outputs_dir) == []
+    assert stager.summary()['outputs_committed'] == 1 and stager.summary()['bytes_out'] == 7
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""测试字幕预检对结构问题的处理（缺少空行只是警告，时间轴格式错误会导致字幕丢失）
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import subtitle_preflight
+from srt_parser import parse_srt_file
+from subtitle_preflight import validate_subtitle
+
+UNSEPARATED = b"1\n00:00:01,000 --> 00:00:02,000\nHello\n2\n00:00:03,000 --> 00:00:04,000\nBye\n"
+
+
+def write_subtitle(tmp_path, content):
+    path = tmp_path / 'video_EN.srt'
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_unseparated_cues_are_a_warning_without_repair(tmp_path):
+    # ffmpeg 的 SRT 解析在每个时间轴行开始新字幕，原文件可以直接烧录
+    result = validate_subtitle(write_subtitle(tmp_path, UNSEPARATED), 'EN')
+
+    assert result['cues'] == 2
+    assert result['fatal'] == []
+    assert any('缺少空行' in message for message in result['warnings'])
+    assert result['normalized_path'] is None
+
+
+def test_unseparated_cues_are_repaired(tmp_path, monkeypatch):
+    monkeypatch.setattr(subtitle_preflight, 'NORMALIZED_DIR', tmp_path / 'normalized')
+    result = validate_subtitle(write_subtitle(tmp_path, UNSEPARATED), 'EN', repair=True)
+
+    assert result['fatal'] == []
+    assert result['normalized_path']
+    repaired = parse_srt_file(result['normalized_path'])
+    assert [repaired.text(i) for i in range(len(repaired))] == ['Hello', 'Bye']
+    assert repaired.unseparated == []
+
+
+def test_malformed_timing_line_is_fatal_without_repair(tmp_path):
+    content = b"1\n00:00:01,000 --> 00:00:02,000\nHi\n\n2\n00:00:03 --> soon\nBye\n\n3\n00:00:05,000 --> 00:00:06,000\nOk\n"
+    result = validate_subtitle(write_subtitle(tmp_path, content), 'EN')
+
+    assert any('时间轴格式错误' in message for message in result['fatal'])
+
+
+def test_clean_subtitle_passes(tmp_path):
+    content = b"1\n00:00:01,000 --> 00:00:02,000\nA --> B\n\n2\n00:00:03,000 --> 00:00:04,000\nBye\n"
+    result = validate_subtitle(write_subtitle(tmp_path, content), 'EN')
+
+    assert result['fatal'] == []
+    assert result['cues'] == 2
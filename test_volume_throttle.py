@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""测试存储卷并发上限的自适应调整（直接输入吞吐样本，不读取磁盘）
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from volume_throttle import VolumeState, device_io_bytes
+
+
+def run_samples(state, throughput, count=200):
+    """按当前上限反复输入吞吐样本，返回上限的变化过程"""
+    limits = []
+    for _ in range(count):
+        state.record(state.limit, throughput(state.limit))
+        limits.append(state.limit)
+    return limits
+
+
+def test_flat_throughput_keeps_high_concurrency():
+    # CPU 受限的批次：卷吞吐与并发数无关
+    state = VolumeState(1, '/', 8)
+    limits = run_samples(state, lambda level: 100.0)
+
+    assert min(limits) >= 7
+    assert state.limit == 8
+    assert not state.exploring
+
+
+def test_saturated_volume_settles_at_fastest_level():
+    # 机械硬盘：并发越少越快，2 个并发时吞吐最高
+    speeds = {1: 90.0, 2: 150.0, 3: 120.0, 4: 100.0}
+    state = VolumeState(1, '/', 4)
+    limits = run_samples(state, lambda level: speeds[level])
+
+    assert state.limit == 2
+    # 定期试探高一档后会退回
+    assert limits[-20:].count(2) > limits[-20:].count(3)
+
+
+def test_small_differences_do_not_lower_limit():
+    # 低一档只快 2%（在误差范围内）时不降低
+    state = VolumeState(1, '/', 4)
+    run_samples(state, lambda level: 100.0 * (1 + 0.02 * (4 - level)))
+
+    assert state.limit == 4
+
+
+def test_unknown_device_is_not_measured():
+    assert device_io_bytes(None) is None
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+存储卷限流模块 - 按设备号统计每个源/输出卷的读写吞吐，自适应限制每卷并发任务数，并按码率×时长预估输出大小做剩余空间检查
+Volume Throttle Module - Tracks read/write throughput per source and output volume (device id), adaptively caps concurrent tasks per volume and gates tasks on free space estimated from bitrate × duration
+"""
+
+import os
+import shutil
+import threading
+import time
+
+# 输出卷至少保留的剩余空间
+FREE_SPACE_MARGIN = 1024 ** 3
+
+# 输出大小预估的安全系数（重新编码后的码率与源文件接近，留出余量）
+OUTPUT_SIZE_FACTOR = 1.1
+
+# 并发档位吞吐的指数滑动平均系数
+LEVEL_SMOOTHING = 0.5
+
+# 每个并发档位至少完成多少个任务后才参与比较
+MIN_LEVEL_SAMPLES = 2
+
+# 低一档并发的卷吞吐高于当前档的 (1 + TOLERANCE) 倍时才降低上限（持平时保持较高并发）
+TOLERANCE = 0.05
+
+# 在当前上限下每完成多少个任务尝试一次提高上限
+PROBE_INTERVAL = 4
+
+# 卷吞吐取自 /proc/diskstats 的设备读写扇区数（与编码耗时无关）；两次采样至少间隔的秒数
+DISKSTATS_PATH = '/proc/diskstats'
+SECTOR_SIZE = 512
+MIN_SAMPLE_SECONDS = 2.0
+
+
+class DiskSpaceError(Exception):
+    """输出卷剩余空间不足"""
+
+
+def existing_parent(path):
+    """返回 path 或其最近的已存在上级目录"""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def volume_id(path):
+    """
+    文件所在存储卷的设备号
+
+    Args:
+        path: 文件路径（不存在时使用最近的已存在上级目录）
+
+    Returns:
+        int: st_dev，无法获取时返回None
+    """
+    try:
+        return os.stat(existing_parent(path)).st_dev
+    except OSError:
+        return None
+
+
+def device_io_bytes(dev):
+    """
+    设备累计读写字节数（/proc/diskstats）
+
+    Args:
+        dev: st_dev 设备号
+
+    Returns:
+        int: 读写字节数之和，无法获取时（非 Linux、网络文件系统等）返回None
+    """
+    if dev is None:
+        return None
+    major, minor = os.major(dev), os.minor(dev)
+    try:
+        with open(DISKSTATS_PATH, encoding='ascii') as f:
+            for line in f:
+                parts = line.split()
+                # major minor name reads merged sectors_read ms writes merged sectors_written ...
+                if len(parts) >= 10 and int(parts[0]) == major and int(parts[1]) == minor:
+                    return (int(parts[5]) + int(parts[9])) * SECTOR_SIZE
+    except (OSError, ValueError):
+        return None
+    return None
+
+
+def estimate_output_size(media_info, source_size=0):
+    """
+    预估输出文件大小：探测到的总码率 × 时长，未知时按源文件大小
+
+    Args:
+        media_info: probe_media 返回的媒体信息（可为None）
+        source_size: 源文件大小（字节）
+
+    Returns:
+        int: 预估字节数
+    """
+    info = media_info or {}
+    bit_rate = info.get('bit_rate') or 0
+    duration = info.get('duration') or 0
+    if bit_rate > 0 and duration > 0:
+        estimate = bit_rate * duration / 8
+    else:
+        estimate = info.get('size') or source_size
+    return int(estimate * OUTPUT_SIZE_FACTOR)
+
+
+class VolumeState:
+    """单个存储卷的并发、吞吐和空间预留状态"""
+
+    def __init__(self, dev, path, max_limit):
+        self.dev = dev
+        self.path = path
+        self.max_limit = max_limit
+        self.limit = max_limit
+        self.active = 0
+        self.reserved = 0
+        self.read_bytes = 0
+        self.write_bytes = 0
+        self.busy_seconds = 0.0
+        # 并发档位 -> [总吞吐滑动平均, 样本数]
+        self.levels = {}
+        self.completed_at_limit = 0
+        # 单并发时无需试探
+        self.exploring = max_limit > 1
+        # 上一次设备读写量采样 (时间, 字节数)；None 表示无法测量，不自适应
+        self.io_sample = None
+
+    def record(self, level, aggregate):
+        """
+        记录一个任务在 level 个并发下测得的卷总吞吐，并调整并发上限
+
+        开始时从最大并发逐档向下试探，只要少一个并发明显更快就继续降低，否则回到上一档；
+        之后在当前上限下定期试探高一档，低一档明显更快时退回。吞吐持平时保持较高的并发。
+        """
+        entry = self.levels.get(level)
+        if entry is None:
+            self.levels[level] = [aggregate, 1]
+        else:
+            entry[0] = entry[0] * (1 - LEVEL_SMOOTHING) + aggregate * LEVEL_SMOOTHING
+            entry[1] += 1
+
+        current = self._measured(self.limit)
+        if current is None:
+            return
+        upper = self._measured(self.limit + 1)
+        lower = self._measured(self.limit - 1)
+
+        if self.exploring:
+            if upper is not None and not current > upper * (1 + TOLERANCE):
+                # 少一个并发没有明显更快：上一档就是最佳点
+                self._set_limit(self.limit + 1)
+                self.exploring = False
+            elif self.limit > 1:
+                self._set_limit(self.limit - 1)
+            else:
+                self.exploring = False
+            return
+
+        if lower is not None and lower > current * (1 + TOLERANCE):
+            # 少一个并发明显更快：卷已过饱和
+            self._set_limit(self.limit - 1)
+            return
+
+        self.completed_at_limit += 1
+        if self.limit < self.max_limit and self.completed_at_limit >= PROBE_INTERVAL:
+            # 定期试探更高并发（负载变化后可能恢复）；丢弃上一档的旧样本重新测量
+            self.levels.pop(self.limit + 1, None)
+            self._set_limit(self.limit + 1)
+
+    def _measured(self, level):
+        entry = self.levels.get(level)
+        return entry[0] if entry and entry[1] >= MIN_LEVEL_SAMPLES else None
+
+    def _set_limit(self, limit):
+        self.limit = min(max(limit, 1), self.max_limit)
+        self.completed_at_limit = 0
+
+    def best_level(self):
+        measured = [(v[0], level) for level, v in self.levels.items() if v[1] >= MIN_LEVEL_SAMPLES]
+        return max(measured)[1] if measured else None
+
+    def summary(self):
+        return {
+            'path': self.path,
+            'limit': self.limit,
+            'max_limit': self.max_limit,
+            'active': self.active,
+            'reserved_bytes': self.reserved,
+            'read_bytes': self.read_bytes,
+            'write_bytes': self.write_bytes,
+            'throughput': (self.read_bytes + self.write_bytes) / self.busy_seconds if self.busy_seconds > 0 else 0.0,
+            'best_level': self.best_level(),
+            'levels': {level: round(v[0]) for level, v in sorted(self.levels.items())},
+        }
+
+
+class VolumeThrottle:
+    """
+    存储卷限流器：任务开始前等待源卷和输出卷都有空闲并发名额，且输出卷剩余空间足够
+    """
+
+    def __init__(self, max_per_volume, media_infos=None, adaptive=False, min_free_bytes=FREE_SPACE_MARGIN):
+        """
+        Args:
+            max_per_volume: 每个卷的最大并发任务数（通常等于工作线程数）
+            media_infos: 预先探测的媒体信息 {视频路径: info}
+            adaptive: 是否根据设备实测读写吞吐自动降低/恢复每卷并发上限（只对能读取 /proc/diskstats 的卷生效）
+            min_free_bytes: 输出卷至少保留的剩余空间
+        """
+        self.max_per_volume = max(1, int(max_per_volume))
+        self.media_infos = media_infos or {}
+        self.adaptive = adaptive
+        self.min_free_bytes = min_free_bytes
+        self.volumes = {}
+        self.waits = 0
+        self.space_waits = 0
+        self._cond = threading.Condition()
+
+    def _volume(self, path):
+        dev = volume_id(path)
+        state = self.volumes.get(dev)
+        if state is None:
+            state = VolumeState(dev, existing_parent(os.path.dirname(path) or '.'), self.max_per_volume)
+            if self.adaptive:
+                io_bytes = device_io_bytes(dev)
+                if io_bytes is None:
+                    state.exploring = False
+                else:
+                    state.io_sample = (time.time(), io_bytes)
+            self.volumes[dev] = state
+        return state
+
+    def _space_ok(self, state, estimate):
+        """输出卷剩余空间 - 进行中任务的预留 >= 本任务预估 + 保留空间"""
+        try:
+            free = shutil.disk_usage(state.path).free
+        except OSError:
+            return True
+        return free - state.reserved >= estimate + self.min_free_bytes
+
+    def acquire(self, task, should_stop=None):
+        """
+        等待任务可以开始（源卷、输出卷都未达到并发上限，输出卷空间足够）
+
+        Args:
+            task: 任务字典（video_path / output_path）
+            should_stop: 返回 True 时放弃等待
+
+        Returns:
+            dict: 释放时使用的票据，放弃等待时返回None
+
+        Raises:
+            DiskSpaceError: 输出卷上没有进行中的任务，空间仍不足
+        """
+        try:
+            source_size = os.path.getsize(task['video_path'])
+        except OSError:
+            source_size = 0
+        estimate = estimate_output_size(self.media_infos.get(task['video_path']), source_size)
+
+        with self._cond:
+            source = self._volume(task['video_path'])
+            output = self._volume(task['output_path'])
+            volumes = [source] if source is output else [source, output]
+            waited = False
+            space_waited = False
+            while True:
+                if should_stop and should_stop():
+                    return None
+                if any(v.active >= v.limit for v in volumes):
+                    waited = True
+                    self._cond.wait(timeout=1.0)
+                    continue
+                if not self._space_ok(output, estimate):
+                    if output.active == 0:
+                        raise DiskSpaceError(f"输出磁盘空间不足: {output.path} 需要约 {estimate / 1024 ** 3:.1f} GB")
+                    # 等进行中的任务结束、释放预留后再判断
+                    space_waited = waited = True
+                    self._cond.wait(timeout=1.0)
+                    continue
+                break
+
+            if waited:
+                self.waits += 1
+            if space_waited:
+                self.space_waits += 1
+            for v in volumes:
+                v.active += 1
+            output.reserved += estimate
+            return {
+                'source': source,
+                'output': output,
+                'volumes': volumes,
+                'levels': {id(v): v.active for v in volumes},
+                'output_path': task['output_path'],
+                'estimate': estimate,
+                'source_size': source_size,
+                'started': time.time(),
+            }
+
+    def release(self, ticket, success=True):
+        """
+        任务结束：释放并发名额和空间预留，成功的任务计入卷读写统计；自适应时按设备读写量采样卷吞吐
+
+        Args:
+            ticket: acquire 返回的票据
+            success: 任务是否成功
+        """
+        if ticket is None:
+            return
+        elapsed = time.time() - ticket['started']
+        written = 0
+        if success:
+            try:
+                written = os.path.getsize(ticket['output_path'])
+            except OSError:
+                written = 0
+
+        # 在锁外读取 /proc/diskstats
+        now = time.time()
+        io_bytes = {id(v): device_io_bytes(v.dev) for v in ticket['volumes'] if v.io_sample is not None}
+
+        with self._cond:
+            source, output = ticket['source'], ticket['output']
+            output.reserved -= ticket['estimate']
+            for v in ticket['volumes']:
+                # 本任务运行期间该卷的并发数取开始和结束时的较大值
+                level = max(ticket['levels'][id(v)], v.active)
+                v.active -= 1
+                sampled = io_bytes.get(id(v))
+                if sampled is not None and v.io_sample is not None and now - v.io_sample[0] >= MIN_SAMPLE_SECONDS:
+                    # 两次采样之间设备的实际读写速率
+                    sample_time, sample_bytes = v.io_sample
+                    v.io_sample = (now, sampled)
+                    if sampled > sample_bytes:
+                        v.record(level, (sampled - sample_bytes) / (now - sample_time))
+                if not success or elapsed <= 0:
+                    continue
+                if v is source:
+                    v.read_bytes += ticket['source_size']
+                if v is output:
+                    v.write_bytes += written
+                v.busy_seconds += elapsed
+            self._cond.notify_all()
+
+    def summary(self):
+        """各卷的并发上限、吞吐和预留空间（用于日志和状态接口）"""
+        with self._cond:
+            return {
+                'waits': self.waits,
+                'space_waits': self.space_waits,
+                'volumes': [v.summary() for v in self.volumes.values()],
+            }